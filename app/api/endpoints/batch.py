@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.db.postgresql import get_db
+from app.schemas.batch import BatchRequest, BatchResponse
+from app.servicies.batch import BatchService
+
+router = APIRouter()
+
+
+def get_batch_service(db: Session = Depends(get_db)):
+    return BatchService(db_session=db)
+
+
+@router.post("/", response_model=BatchResponse)
+def run_batch(batch: BatchRequest, service: BatchService = Depends(get_batch_service)):
+    try:
+        return service.run(batch)
+    except ValueError as error:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error))
@@ -0,0 +1,23 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.db.postgresql import get_db
+from app.schemas.changes import ChangePage
+from app.servicies.changes import ChangeFeedService
+
+router = APIRouter()
+
+
+def get_change_feed_service(db: Session = Depends(get_db)):
+    return ChangeFeedService(db_session=db)
+
+
+@router.get("/", response_model=ChangePage)
+def read_changes(since: Optional[str] = None, limit: int = Query(500, ge=1, le=5000),
+                 service: ChangeFeedService = Depends(get_change_feed_service)):
+    try:
+        return service.get_changes(since, limit)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
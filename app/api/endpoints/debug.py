@@ -0,0 +1,66 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, Response
+
+from app.core.admission import admission_controller
+from app.core.cache import entity_cache
+from app.core.coalescing import coalescing_stats
+from app.core.profiling import is_authorized, profile_store
+from app.db.session import session_metrics
+from app.db.slow_queries import slow_query_log
+from app.schemas.debug import ProfileSummary, SessionStats, SlowQueryTemplate
+
+router = APIRouter()
+
+
+def require_debug_token(x_debug_profile: Optional[str] = Header(None)):
+    if not is_authorized(x_debug_profile):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid debug token")
+
+
+@router.get("/profiles", response_model=List[ProfileSummary], dependencies=[Depends(require_debug_token)])
+def read_profiles():
+    return [profile.summary() for profile in profile_store.list()]
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_debug_token)])
+def read_profile(profile_id: str, format: str = "text"):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "pstats":
+        return Response(profile.pstats_dump(), media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'})
+    return PlainTextResponse(profile.text_report())
+
+
+@router.get("/slow-queries", response_model=List[SlowQueryTemplate], dependencies=[Depends(require_debug_token)])
+def read_slow_queries(limit: int = 20, order_by: str = Query("total_ms", pattern="^(total_ms|max_ms|mean_ms|count)$")):
+    return slow_query_log.worst(limit=limit, order_by=order_by)
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_debug_token)])
+def reset_slow_queries():
+    slow_query_log.reset()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/sessions", response_model=SessionStats, dependencies=[Depends(require_debug_token)])
+def read_session_stats():
+    return session_metrics.snapshot()
+
+
+@router.get("/admission", dependencies=[Depends(require_debug_token)])
+def read_admission_stats():
+    return admission_controller.stats()
+
+
+@router.get("/coalescing", dependencies=[Depends(require_debug_token)])
+def read_coalescing_stats():
+    return coalescing_stats.snapshot()
+
+
+@router.get("/cache", dependencies=[Depends(require_debug_token)])
+def read_cache_stats():
+    return entity_cache.stats()
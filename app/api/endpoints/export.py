@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.db.postgresql import get_db
+from app.schemas.export import ExportSummary
+
+router = APIRouter()
+
+
+def get_export_service(db: Session = Depends(get_db)):
+    # Imported on first use: PyArrow is only needed by exports, not at application startup.
+    from app.servicies.export import WarehouseExportService
+    return WarehouseExportService(db_session=db)
+
+
+@router.post("/invoice-lines", response_model=ExportSummary)
+def export_invoice_lines(full: bool = False, service=Depends(get_export_service)):
+    return service.export_invoice_lines(full=full)
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from app.db.postgresql import database_ready
+
+router = APIRouter()
+
+
+@router.get("")
+def liveness():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+def readiness():
+    if not database_ready.is_set():
+        return JSONResponse({"status": "starting"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready"}
@@ -1,9 +1,10 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
+from app.core.coalescing import coalesce
 from app.db.postgresql import get_db
 from app.schemas.invoice_header import InvoiceHeaderCreate, InvoiceHeader  #InvoiceHeaderUpdate
 from app.servicies.invoice_header import InvoiceHeaderService
@@ -15,6 +16,12 @@ def get_invoice_header_service(db: Session = Depends(get_db)):
     return InvoiceHeaderService(db_session=db)
 
 
+def get_invoice_rendering_service(db: Session = Depends(get_db)):
+    # Imported on first use: the templates are only needed by document requests, not at application startup.
+    from app.servicies.invoice_rendering import InvoiceRenderingService
+    return InvoiceRenderingService(db_session=db)
+
+
 @router.post("/", response_model=InvoiceHeader, status_code=status.HTTP_201_CREATED)
 def create_invoice_header(invoice_header_create: InvoiceHeaderCreate,
                           service: InvoiceHeaderService = Depends(get_invoice_header_service)):
@@ -22,6 +29,7 @@ def create_invoice_header(invoice_header_create: InvoiceHeaderCreate,
 
 
 @router.get("/{invoice_header_id}", response_model=InvoiceHeader)
+@coalesce()
 def read_invoice_header(invoice_header_id: int, service: InvoiceHeaderService = Depends(get_invoice_header_service)):
     invoice_header = service.get_invoice_header(invoice_header_id)
     if invoice_header is None:
@@ -29,7 +37,18 @@ def read_invoice_header(invoice_header_id: int, service: InvoiceHeaderService =
     return invoice_header
 
 
+@router.get("/{invoice_header_id}/document")
+def read_invoice_document(invoice_header_id: int, format: str = Query("pdf", pattern="^(html|pdf)$"),
+                          service=Depends(get_invoice_rendering_service)):
+    document = service.render_invoice(invoice_header_id, format)
+    if document is None:
+        raise HTTPException(status_code=404, detail="InvoiceHeader not found")
+    return Response(content=document, media_type="text/html" if format == "html" else "application/pdf",
+                    headers={"Content-Disposition": f'inline; filename="invoice-{invoice_header_id}.{format}"'})
+
+
 @router.get("/", response_model=List[InvoiceHeader])
+@coalesce()
 def read_invoice_headers(service: InvoiceHeaderService = Depends(get_invoice_header_service)):
     return service.get_all_invoice_headers()
 
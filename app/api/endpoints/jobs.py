@@ -0,0 +1,47 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session
+
+from app.core.files import file_response
+from app.db.postgresql import get_db
+from app.schemas.job import Job, JobCreate
+from app.servicies.jobs import JobService
+
+router = APIRouter()
+
+ARTIFACT_TYPES = {".zip": "application/zip", ".json": "application/json"}
+
+
+def get_job_service(db: Session = Depends(get_db)):
+    return JobService(db_session=db)
+
+
+@router.post("/", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+def create_job(job_create: JobCreate, service: JobService = Depends(get_job_service)):
+    try:
+        return service.submit(job_create)
+    except ValueError as error:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error))
+
+
+@router.get("/{job_id}", response_model=Job)
+def read_job(job_id: int, service: JobService = Depends(get_job_service)):
+    return service.get_job(job_id)
+
+
+@router.post("/{job_id}/cancel", response_model=Job)
+def cancel_job(job_id: int, service: JobService = Depends(get_job_service)):
+    return service.cancel(job_id)
+
+
+@router.get("/{job_id}/artifact")
+def read_job_artifact(job_id: int, request: Request, service: JobService = Depends(get_job_service)):
+    path = service.artifact(job_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Artifact not available")
+    stat = os.stat(path)
+    response = file_response(request, path, ARTIFACT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream"),
+                             f"{job_id}-{stat.st_size}-{int(stat.st_mtime)}")
+    response.headers["content-disposition"] = f'attachment; filename="{os.path.basename(path)}"'
+    return response
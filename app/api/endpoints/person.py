@@ -1,12 +1,14 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
 from app.db.postgresql import get_db
 from app.schemas.person import PersonCreate, Person, PersonUpdate
+from app.schemas.search import PersonSearchPage
 from app.servicies.person import PersonService
+from app.servicies.search import SearchService
 
 router = APIRouter()
 
@@ -15,11 +17,24 @@ def get_person_service(db: Session = Depends(get_db)):
     return PersonService(db_session=db)
 
 
+def get_search_service(db: Session = Depends(get_db)):
+    return SearchService(db_session=db)
+
+
 @router.post("/", response_model=Person, status_code=status.HTTP_201_CREATED)
 def create_person(person_create: PersonCreate, service: PersonService = Depends(get_person_service)):
     return service.create_person(person_create)
 
 
+@router.get("/search", response_model=PersonSearchPage)
+def search_persons(q: str = Query(..., min_length=2, max_length=200), limit: int = Query(20, ge=1, le=100),
+                   cursor: Optional[str] = None, service: SearchService = Depends(get_search_service)):
+    try:
+        return service.search_persons(q, limit, cursor)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
 @router.get("/{person_id}", response_model=Person)
 def read_person(person_id: int, service: PersonService = Depends(get_person_service)):
     person = service.get_person(person_id)
@@ -33,6 +48,14 @@ def read_persons(service: PersonService = Depends(get_person_service)):
     return service.get_all_persons()
 
 
+@router.put("/by-document", response_model=Person)
+def upsert_person_by_document(person: PersonCreate, response: Response,
+                              service: PersonService = Depends(get_person_service)):
+    db_person, created = service.upsert_person_by_document(person)
+    response.status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    return db_person
+
+
 @router.put("/{person_id}", response_model=Person)
 def update_person(person_id: int, person_update: PersonUpdate, service: PersonService = Depends(get_person_service)):
     return service.update_person(person_id, person_update)
@@ -1,12 +1,19 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
+from app.core.coalescing import coalesce
+from app.core.files import file_response
+from app.core.images import ImageTooLarge, UnsupportedImage
 from app.db.postgresql import get_db
-from app.schemas.product import ProductCreate, Product, ProductUpdate
+from app.schemas.product import PriceListItem, PriceListResult, ProductCreate, Product, ProductUpdate
+from app.schemas.product_image import ProductImage
+from app.schemas.search import ProductSearchPage
 from app.servicies.product import ProductService
+from app.servicies.product_image import ProductImageService
+from app.servicies.search import SearchService
 
 router = APIRouter()
 
@@ -15,12 +22,31 @@ def get_product_service(db: Session = Depends(get_db)):
     return ProductService(db_session=db)
 
 
+def get_search_service(db: Session = Depends(get_db)):
+    return SearchService(db_session=db)
+
+
+def get_product_image_service(db: Session = Depends(get_db)):
+    return ProductImageService(db_session=db)
+
+
 @router.post("/", response_model=Product, status_code=status.HTTP_201_CREATED)
 def create_product(product_create: ProductCreate, service: ProductService = Depends(get_product_service)):
     return service.create_product(product_create)
 
 
+@router.get("/search", response_model=ProductSearchPage)
+@coalesce()
+def search_products(q: str = Query(..., min_length=2, max_length=200), limit: int = Query(20, ge=1, le=100),
+                   cursor: Optional[str] = None, service: SearchService = Depends(get_search_service)):
+    try:
+        return service.search_products(q, limit, cursor)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
 @router.get("/{product_id}", response_model=Product)
+@coalesce()
 def read_product(product_id: int, service: ProductService = Depends(get_product_service)):
     product = service.get_product(product_id)
     if product is None:
@@ -29,10 +55,16 @@ def read_product(product_id: int, service: ProductService = Depends(get_product_
 
 
 @router.get("/", response_model=List[Product])
+@coalesce()
 def read_products(service: ProductService = Depends(get_product_service)):
     return service.get_all_products()
 
 
+@router.put("/price-list", response_model=PriceListResult)
+def apply_price_list(items: List[PriceListItem], service: ProductService = Depends(get_product_service)):
+    return service.apply_price_list(items)
+
+
 @router.put("/{product_id}", response_model=Product)
 def update_product(product_id: int, product_update: ProductUpdate,
                    service: ProductService = Depends(get_product_service)):
@@ -43,3 +75,38 @@ def update_product(product_id: int, product_update: ProductUpdate,
 def delete_product(product_id: int, service: ProductService = Depends(get_product_service)):
     service.delete_product(product_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/{product_id}/images", response_model=ProductImage, status_code=status.HTTP_201_CREATED)
+def upload_product_image(product_id: int, file: UploadFile = File(...),
+                         service: ProductImageService = Depends(get_product_image_service)):
+    try:
+        return service.add_image(product_id, file.file)
+    except UnsupportedImage as error:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(error))
+    except ImageTooLarge as error:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(error))
+
+
+@router.get("/{product_id}/images", response_model=List[ProductImage])
+def read_product_images(product_id: int, service: ProductImageService = Depends(get_product_image_service)):
+    return service.get_images(product_id)
+
+
+@router.get("/images/{name}")
+def read_image(name: str, request: Request, service: ProductImageService = Depends(get_product_image_service)):
+    original = service.original(name)
+    if original is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    path, content_type, digest = original
+    return file_response(request, path, content_type, digest, cache_control="public, max-age=31536000, immutable")
+
+
+@router.get("/images/{digest}/thumbnails/{size}.jpg")
+def read_thumbnail(digest: str, size: int, request: Request,
+                   service: ProductImageService = Depends(get_product_image_service)):
+    path = service.thumbnail(digest, size)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    return file_response(request, path, "image/jpeg", f"{digest}-{size}",
+                         cache_control="public, max-age=31536000, immutable")
@@ -0,0 +1,50 @@
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.postgresql import get_db
+from app.schemas.reports import LiveTopProducts, MarginReport, MarginReportRequest, RevenueSeries
+from app.servicies.live_sales import LiveSalesService
+from app.servicies.revenue_rollups import RevenueRollupService
+
+router = APIRouter()
+
+
+def get_analytics_service(db: Session = Depends(get_db)):
+    # Imported on first use: NumPy is only needed by report requests, not at application startup.
+    from app.servicies.analytics import AnalyticsService
+    return AnalyticsService(db_session=db)
+
+
+def get_live_sales_service(db: Session = Depends(get_db)):
+    return LiveSalesService(db_session=db)
+
+
+def get_revenue_rollup_service(db: Session = Depends(get_db)):
+    return RevenueRollupService(db_session=db)
+
+
+@router.post("/margin", response_model=MarginReport)
+def margin_report(report_request: MarginReportRequest, service=Depends(get_analytics_service)):
+    rows = service.margin_report(report_request.group_by, report_request.period,
+                                 report_request.start_date, report_request.end_date,
+                                 report_request.price_overrides, report_request.cost_overrides)
+    return MarginReport(group_by=report_request.group_by, rows=rows)
+
+
+@router.get("/top-products/live", response_model=LiveTopProducts)
+def live_top_products(window: Literal["5m", "1h", "1d"] = "1h", metric: Literal["quantity", "revenue"] = "revenue",
+                      limit: int = Query(10, ge=1, le=settings.LIVE_SALES_CAPACITY),
+                      service: LiveSalesService = Depends(get_live_sales_service)):
+    return service.top_products(window, metric, limit)
+
+
+@router.get("/revenue/{dimension}", response_model=RevenueSeries)
+def revenue_series(dimension: Literal["product", "person"], grain: Literal["day", "month"] = "day",
+                   key_id: Optional[int] = None, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                   service: RevenueRollupService = Depends(get_revenue_rollup_service)):
+    points = service.series(dimension, grain, key_id, start_date, end_date)
+    return RevenueSeries(dimension=dimension, grain=grain, key_id=key_id, points=points)
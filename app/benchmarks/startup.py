@@ -0,0 +1,113 @@
+"""
+Cold-start benchmark: `python -m app.benchmarks.startup [--runs 3] [--top 25]`.
+
+Reports the import time of `app.main` per top-level package and for the slowest modules (from
+`python -X importtime`), then starts the application with uvicorn in a fresh process and measures the
+time until it answers its first request (`GET /health`) and until it is ready (`GET /health/ready`).
+The database settings of the environment are used; readiness is not reached without a database.
+"""
+
+import argparse
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+
+def import_times() -> List[Tuple[str, int, int]]:
+    """
+    Imports `app.main` in a fresh interpreter under `-X importtime`.
+
+    Returns:
+        List[Tuple[str, int, int]]: (module, self microseconds, cumulative microseconds) per imported module.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, started: float, timeout: float) -> Optional[float]:
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def time_to_first_request(timeout: float = 30.0) -> Dict[str, Optional[float]]:
+    """
+    Starts the application in a new uvicorn process and measures how long it takes to answer.
+
+    Args:
+        timeout (float): Seconds to wait for each of the two probes.
+
+    Returns:
+        Dict[str, Optional[float]]: Seconds until `/health` and `/health/ready` answered 200, None on timeout.
+    """
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                                "--log-level", "warning"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first = _wait_for(f"http://127.0.0.1:{port}/health", started, timeout)
+        ready = _wait_for(f"http://127.0.0.1:{port}/health/ready", started, timeout) if first else None
+        return {"first_request": first, "ready": ready}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _seconds(value: Optional[float]) -> str:
+    return "timeout" if value is None else f"{value * 1000:.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Number of cold starts measured.")
+    parser.add_argument("--top", type=int, default=25, help="Number of slowest modules listed.")
+    args = parser.parse_args()
+
+    modules = import_times()
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+    total_us = max(cumulative for name, _, cumulative in modules if name == "app.main")
+    print(f"import app.main: {total_us / 1000:.1f} ms\n\nSelf time per package:")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:15]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+    print("\nSlowest modules (cumulative):")
+    for name, _, cumulative_us in sorted(modules, key=lambda module: module[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    runs = [time_to_first_request() for _ in range(args.runs)]
+    print("\nCold starts:")
+    for run in runs:
+        print(f"  first request {_seconds(run['first_request'])}, ready {_seconds(run['ready'])}")
+    firsts = [run["first_request"] for run in runs if run["first_request"] is not None]
+    if firsts:
+        print(f"  median time to first request: {statistics.median(firsts) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
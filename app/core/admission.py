@@ -0,0 +1,243 @@
+"""
+This module implements admission control for database-bound requests.
+
+Each worker admits at most as many database-bound requests as its connection pool can serve at once
+(`DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW`). Requests beyond that wait in a bounded queue per route
+class, invoice writes being served before reads when a slot frees up. A request is turned away right
+away with `503 Service Unavailable` and a `Retry-After` header when its class queue is full or when the
+expected wait, estimated from the recent service time, exceeds the deadline of its class; it is also
+turned away if it actually waits longer than that. Clients thus fail fast instead of waiting for
+`DATABASE_POOL_TIMEOUT` and retrying into an already saturated service.
+
+The anyio threadpool running synchronous endpoints is sized to the same capacity, plus
+`THREADPOOL_HEADROOM` threads for the exempt routes, so admitted requests never queue for a thread.
+
+Attributes:
+    EXEMPT_PREFIXES (Tuple[str, ...]): Paths that never touch the database and are always admitted.
+    THREADPOOL_HEADROOM (int): Threads added to the pool capacity for requests exempt from admission control.
+    admission_controller (AdmissionController): The controller of this worker.
+
+Functions:
+    configure_threadpool(): Sizes the anyio threadpool after the database pool.
+
+Classes:
+    RouteClass: Queue bounds of a class of routes.
+    AdmissionController: Counts in-flight requests and queues or rejects the others.
+    AdmissionControlMiddleware: ASGI middleware applying the controller to every request.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+
+EXEMPT_PREFIXES = ("/health", "/debug", "/docs", "/redoc", "/openapi.json", "/product/images/")
+
+WRITE_PREFIXES = ("/invoice", "/invoice_detail", "/batch")
+
+THREADPOOL_HEADROOM = 4
+
+
+class RouteClass:
+    """
+    Queue bounds and counters of a class of routes.
+
+    Attributes:
+        name (str): Name of the class ('read' or 'write').
+        max_queue (int): Maximum number of requests waiting for a slot.
+        max_wait (float): Maximum seconds a request may wait for a slot.
+        waiters (Deque[asyncio.Future]): Requests waiting for a slot, oldest first.
+        admitted (int): Requests admitted so far.
+        rejected (int): Requests turned away so far.
+    """
+
+    def __init__(self, name: str, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+
+
+class Rejected(Exception):
+    """
+    Raised when a request is not admitted.
+
+    Attributes:
+        retry_after (int): Seconds after which the client should retry.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admits up to `capacity` concurrent requests and queues the others per route class. Runs on the event
+    loop only, so it needs no locking.
+
+    Attributes:
+        capacity (int): Maximum number of requests in flight.
+        in_flight (int): Requests currently admitted.
+        classes (Dict[str, RouteClass]): Route classes by name, in slot granting priority order.
+        service_time (float): Moving average of the seconds a request holds its slot.
+
+    Methods:
+        classify(self, method: str, path: str) -> Optional[RouteClass]: Returns the class of a request.
+        acquire(self, route_class: RouteClass): Waits for a slot or raises Rejected.
+        release(self, held: float): Frees a slot held for `held` seconds.
+        stats(self) -> dict: Returns the current state and counters.
+    """
+
+    def __init__(self, capacity: int, classes: Tuple[RouteClass, ...]):
+        self.capacity = capacity
+        self.in_flight = 0
+        self.classes: Dict[str, RouteClass] = {route_class.name: route_class for route_class in classes}
+        self.service_time = 0.05
+
+    def classify(self, method: str, path: str) -> Optional[RouteClass]:
+        """
+        Returns the class of a request: 'write' for invoice changes and batches, None for paths that never use the
+        database, 'read' for everything else.
+        """
+        if path.startswith(EXEMPT_PREFIXES):
+            return None
+        if method not in ("GET", "HEAD") and path.startswith(WRITE_PREFIXES):
+            return self.classes["write"]
+        return self.classes["read"]
+
+    def _expected_wait(self, queued_ahead: int) -> float:
+        return (queued_ahead + 1) * self.service_time / self.capacity
+
+    def _reject(self, route_class: RouteClass, expected_wait: float):
+        route_class.rejected += 1
+        raise Rejected(max(1, math.ceil(expected_wait)))
+
+    async def acquire(self, route_class: RouteClass):
+        """
+        Takes a slot, waiting in the queue of the route class when none is free.
+
+        Args:
+            route_class (RouteClass): The class of the request.
+
+        Raises:
+            Rejected: If the queue is full, the expected wait exceeds the class deadline, or the deadline passed.
+        """
+        if self.in_flight < self.capacity and not any(rc.waiters for rc in self.classes.values()):
+            self.in_flight += 1
+            route_class.admitted += 1
+            return
+
+        queued_ahead = sum(len(rc.waiters) for rc in self.classes.values())
+        expected_wait = self._expected_wait(queued_ahead)
+        if len(route_class.waiters) >= route_class.max_queue or expected_wait > route_class.max_wait:
+            self._reject(route_class, expected_wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), route_class.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The slot was granted just as the deadline passed: hand it on.
+                self.release(0.0)
+            self._reject(route_class, self._expected_wait(queued_ahead))
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release(0.0)
+            raise
+        finally:
+            if waiter in route_class.waiters:
+                route_class.waiters.remove(waiter)
+        route_class.admitted += 1
+
+    def release(self, held: float):
+        """
+        Frees a slot and grants it to the oldest waiter of the highest priority class.
+
+        Args:
+            held (float): Seconds the slot was held, folded into the service time estimate.
+        """
+        if held:
+            self.service_time = 0.9 * self.service_time + 0.1 * held
+        for route_class in self.classes.values():
+            while route_class.waiters:
+                waiter = route_class.waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        """
+        Returns the capacity, in-flight count, service time estimate and per-class queue length and counters.
+        """
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "service_time_ms": round(self.service_time * 1000, 3),
+            "classes": {name: {"queued": len(rc.waiters), "max_queue": rc.max_queue, "max_wait": rc.max_wait,
+                               "admitted": rc.admitted, "rejected": rc.rejected}
+                        for name, rc in self.classes.items()},
+        }
+
+
+admission_controller = AdmissionController(
+    settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW,
+    (RouteClass("write", settings.ADMISSION_WRITE_QUEUE, settings.ADMISSION_WRITE_MAX_WAIT),
+     RouteClass("read", settings.ADMISSION_READ_QUEUE, settings.ADMISSION_READ_MAX_WAIT)),
+)
+
+
+def configure_threadpool():
+    """
+    Sizes the anyio threadpool running synchronous endpoints and dependencies to the database pool
+    capacity plus THREADPOOL_HEADROOM, or to `settings.THREADPOOL_SIZE` when set. Must run on the event loop.
+    """
+    limiter = current_default_thread_limiter()
+    limiter.total_tokens = settings.THREADPOOL_SIZE or admission_controller.capacity + THREADPOOL_HEADROOM
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware admitting database-bound requests through an AdmissionController and answering
+    `503` with `Retry-After` to those it rejects.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        controller (AdmissionController): The controller deciding admissions.
+    """
+
+    def __init__(self, app, controller: AdmissionController = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        route_class = self.controller.classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(route_class)
+        except Rejected as rejected:
+            response = JSONResponse({"detail": "Service overloaded, retry later"},
+                                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    headers={"Retry-After": str(rejected.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.perf_counter() - started)
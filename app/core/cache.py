@@ -0,0 +1,98 @@
+"""
+This module provides the in-process cache of reference entities (products and persons) read by id.
+
+Entries are immutable pydantic snapshots, never ORM instances, so they can outlive the session that
+loaded them and be shared between threads. Entries are evicted when the row changes, by any worker,
+through the change notifications of `app.db.notifications`.
+
+Attributes:
+    entity_cache (EntityCache): The cache of this worker, bounded by `settings.ENTITY_CACHE_SIZE`.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class EntityCache:
+    """
+    Thread-safe LRU cache of entity snapshots keyed by entity type and id.
+
+    A load started before an eviction is not stored once it completes, so a reader racing with a write
+    cannot put back the value the write just invalidated.
+
+    Attributes:
+        capacity (int): Maximum number of entries; the least recently used are dropped first.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to load the entity.
+        evictions (int): Entries evicted because their row changed.
+        flushes (int): Times the whole cache was emptied.
+
+    Methods:
+        get_or_load(self, entity: str, id: Hashable, loader: Callable[[], T]) -> T: Returns a cached or loaded snapshot.
+        evict(self, entity: str, id: Hashable): Forgets the snapshot of one row.
+        flush(self): Forgets every snapshot.
+        stats(self) -> dict: Returns the size and counters of the cache.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self._entries: "OrderedDict[Tuple[str, Hashable], object]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, entity: str, id: Hashable, loader: Callable[[], T]) -> T:
+        """
+        Returns the cached snapshot of a row, loading and caching it on a miss.
+
+        Args:
+            entity (str): Entity type, e.g. 'product'.
+            id (Hashable): Primary key of the row.
+            loader (Callable[[], T]): Loads the snapshot; exceptions propagate and nothing is cached.
+
+        Returns:
+            T: The snapshot.
+        """
+        key = (entity, id)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            if generation == self._generation and self.capacity > 0:
+                self._entries[key] = value
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+        return value
+
+    def evict(self, entity: str, id: Hashable):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop((entity, id), None) is not None:
+                self.evictions += 1
+
+    def flush(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.flushes += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "capacity": self.capacity, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions, "flushes": self.flushes}
+
+
+entity_cache = EntityCache(settings.ENTITY_CACHE_SIZE)
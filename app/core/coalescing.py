@@ -0,0 +1,149 @@
+"""
+This module implements single-flight coalescing of identical concurrent GET requests.
+
+When a request reaches an opted-in route while an identical one (same route, path parameters and query
+parameters) is already being handled, it waits for that request instead of running its own query, and
+is answered with a copy of the same response: status, headers and serialized body. A waiting request
+runs on its own once `max_wait` seconds pass, or if the request it waits for fails. Requests asking to be
+profiled always run on their own, and copied responses never carry the profile id of the request they copy.
+
+Routes opt in with the `coalesce` decorator:
+
+    @router.get("/{product_id}", response_model=Product)
+    @coalesce(max_wait=1.0)
+    def read_product(...):
+
+Attributes:
+    coalescing_stats (CoalescingStats): Per-route counters of coalesced requests.
+
+Classes:
+    CoalescingStats: Counters of leading, coalesced and timed out requests per route.
+    CoalescingMiddleware: ASGI middleware coalescing identical requests to opted-in routes.
+
+Functions:
+    coalesce(max_wait): Decorator opting an endpoint in.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from starlette.routing import Match
+
+from app.core.config import settings
+from app.core.profiling import PROFILE_HEADER, PROFILE_ID_HEADER
+
+_PROFILE_HEADER = PROFILE_HEADER.lower().encode()
+_PROFILE_ID_HEADER = PROFILE_ID_HEADER.lower().encode()
+
+
+def coalesce(max_wait: float = None):
+    """
+    Opts a GET endpoint into request coalescing.
+
+    Args:
+        max_wait (float): Maximum seconds a request waits for an identical in-flight one,
+                          defaults to `settings.COALESCE_MAX_WAIT`.
+    """
+    def decorator(endpoint):
+        endpoint.coalesce_max_wait = max_wait or settings.COALESCE_MAX_WAIT
+        return endpoint
+    return decorator
+
+
+class CoalescingStats:
+    """
+    Counters of coalescing per route path.
+
+    Methods:
+        increment(self, route: str, counter: str): Increments a counter of a route.
+        snapshot(self) -> Dict[str, Dict[str, int]]: Returns the counters of every route.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"leaders": 0, "coalesced": 0,
+                                                                          "timed_out": 0})
+
+    def increment(self, route: str, counter: str):
+        self._counters[route][counter] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {route: dict(counters) for route, counters in self._counters.items()}
+
+
+coalescing_stats = CoalescingStats()
+
+
+class CoalescingMiddleware:
+    """
+    ASGI middleware sharing one response among identical concurrent GET requests to opted-in routes.
+    It sits outside admission control, so coalesced requests do not hold a database slot while they wait.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        routes (list): Routes of the application, searched for the one a request targets.
+    """
+
+    def __init__(self, app, routes: list):
+        self.app = app
+        self.routes = routes
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+
+    def _match(self, scope) -> Optional[Tuple[str, dict, float]]:
+        for route in self.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                max_wait = getattr(getattr(route, "endpoint", None), "coalesce_max_wait", None)
+                return (route.path, child_scope.get("path_params", {}), max_wait) if max_wait else None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        coalescible = scope["type"] == "http" and scope["method"] == "GET" \
+            and not any(name == _PROFILE_HEADER for name, _ in scope["headers"])
+        matched = self._match(scope) if coalescible else None
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        route, path_params, max_wait = matched
+        key = (route, tuple(sorted((name, str(value)) for name, value in path_params.items())),
+               tuple(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))))
+        leader = self._in_flight.get(key)
+        if leader is None:
+            await self._lead(key, route, scope, receive, send)
+            return
+
+        try:
+            messages = await asyncio.wait_for(asyncio.shield(leader), max_wait)
+        except asyncio.TimeoutError:
+            coalescing_stats.increment(route, "timed_out")
+            messages = None
+        if messages is None:
+            await self.app(scope, receive, send)
+            return
+        coalescing_stats.increment(route, "coalesced")
+        for message in messages:
+            message = dict(message)
+            if message["type"] == "http.response.start":
+                message["headers"] = [(name, value) for name, value in message.get("headers", [])
+                                      if name.lower() != _PROFILE_ID_HEADER]
+            await send(message)
+
+    async def _lead(self, key: Tuple, route: str, scope, receive, send):
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        coalescing_stats.increment(route, "leaders")
+        messages: List[dict] = []
+
+        async def send_and_capture(message):
+            messages.append(dict(message))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_capture)
+        finally:
+            del self._in_flight[key]
+            complete = bool(messages) and messages[-1]["type"] == "http.response.body" \
+                and not messages[-1].get("more_body", False)
+            future.set_result(messages if complete else None)
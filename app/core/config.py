@@ -1,4 +1,6 @@
 import os
+from typing import List
+
 from dotenv import load_dotenv
 from pydantic import BaseModel, PostgresDsn
 
@@ -17,8 +19,64 @@ class Settings(BaseModel):
         ENVIRONMENT (str): Environment in which the application runs (e.g., 'development', 'production').
         PROJECT_NAME (str): Project or application name.
         DATABASE_URL (PostgresDsn): Connection URL to the PostgreSQL database.
+        DATABASE_SHARD_URLS (List[str]): Connection URLs of the invoice shards. Invoices are partitioned
+                                         by customer across them; empty keeps every table in DATABASE_URL.
+        SHARD_FANOUT_WORKERS (int): Maximum number of shards queried in parallel by cross-shard reads.
+        DATABASE_POOL_SIZE (int): Connections kept open in the pool of each worker.
+        DATABASE_MAX_OVERFLOW (int): Connections opened beyond the pool size under load.
+        DATABASE_POOL_TIMEOUT (int): Seconds a request waits for a pooled connection before failing.
+        DATABASE_INIT_MAX_ATTEMPTS (int): Attempts of the startup initialization of the database before the worker
+                                          stops itself, to be restarted; 0 retries forever.
+        DATABASE_INIT_RETRY_DELAY (float): Seconds before the second attempt, doubled after every failure up to 30.
+        THREADPOOL_SIZE (int): Threads running synchronous endpoints; 0 sizes it after the database pool.
+        ADMISSION_READ_QUEUE (int): Maximum number of read requests queued for a database slot.
+        ADMISSION_READ_MAX_WAIT (float): Maximum seconds a read request waits for a database slot.
+        ADMISSION_WRITE_QUEUE (int): Maximum number of invoice writes queued for a database slot.
+        ADMISSION_WRITE_MAX_WAIT (float): Maximum seconds an invoice write waits for a database slot.
+        COALESCE_MAX_WAIT (float): Default maximum seconds a GET request waits for an identical in-flight one.
+        ENTITY_CACHE_SIZE (int): Maximum number of products and persons cached per worker; 0 disables the cache.
+        OUTBOX_SINKS (List[str]): Destinations of the invoice events, 'file:<path>' or http(s) URLs; empty disables publishing.
+        OUTBOX_BATCH_SIZE (int): Maximum number of outbox events delivered per batch.
+        OUTBOX_POLL_INTERVAL (float): Seconds between two polls of an idle outbox.
+        OUTBOX_LEASE_SECONDS (float): Seconds a publisher owns the cursor of a sink while delivering a batch.
         LOG_LEVEL (str): Log level for the application log output.
+        LOG_FORMAT (str): Log output format, 'json' or 'text'.
+        LOG_SAMPLING (str): Kept fraction of DEBUG/INFO records per logger, e.g. "uvicorn.access=0.1".
+        LOG_QUEUE_SIZE (int): Capacity of the log queue; records are dropped rather than blocking when full.
         IMAGES_DIRECTORY (str): Directory for storing loaded images.
+        IMAGES_MAX_BYTES (int): Largest accepted product image upload, in bytes.
+        IMAGES_THUMBNAIL_SIZES (List[int]): Sizes, in pixels, of the square boxes product thumbnails are fitted in.
+        IMAGES_THUMBNAIL_WORKERS (int): Processes rendering thumbnails in each worker.
+        EXPORT_DIRECTORY (str): Directory receiving the Parquet exports for the data warehouse.
+        EXPORT_BATCH_SIZE (int): Number of rows streamed from the database per export record batch.
+        RENDER_WORKERS (int): Processes rendering invoice documents in bulk; 0 uses one per CPU.
+        RENDER_CHUNK_SIZE (int): Invoices per work unit of a bulk rendering.
+        BATCH_MAX_OPERATIONS (int): Maximum number of operations of a POST /batch request.
+        PRICE_LIST_BATCH_SIZE (int): Products written per statement by price list upserts.
+        SEARCH_MAX_CANDIDATES (int): Matches ranked per product or person search, the first the indexes return; more are not ranked.
+        JOBS_CONCURRENCY (int): Background jobs run at the same time by each worker; 0 disables the job runner.
+        JOBS_POLL_INTERVAL (float): Seconds between two polls of an empty job queue.
+        JOBS_DIRECTORY (str): Directory receiving the artifacts of the jobs, shared by every worker.
+        JOBS_HEARTBEAT_TIMEOUT (float): Seconds without heartbeat after which a running job is requeued.
+        JOBS_MAX_ATTEMPTS (int): Attempts of a job whose worker was lost before it is failed.
+        LIVE_SALES_CAPACITY (int): Products tracked per time bucket by the live top products sketches.
+        LIVE_SALES_SNAPSHOT_INTERVAL (float): Seconds between two snapshots of the live sales sketches.
+        ROLLUP_BACKFILL_WORKERS (int): Date ranges rebuilt in parallel by a rollup backfill.
+        ROLLUP_BACKFILL_CHUNK_SIZE (int): Months per range of a rollup backfill.
+        EXISTENCE_INDEX_PRELOAD (bool): Whether every worker loads all product and person ids into its existence
+                                        index at startup, rather than learning them as they are referenced.
+        PROFILING_TOKEN (str): Secret that a request must send in the `X-Debug-Profile` header to be profiled
+                               and to download profiles. Empty disables header-triggered profiling.
+        PROFILING_SAMPLE_RATE (float): Fraction of all requests profiled at random, between 0 and 1.
+        PROFILING_RETAIN (int): Number of most recent profiles kept in memory for download.
+        SLOW_QUERY_THRESHOLD_MS (float): Statements slower than this are logged and aggregated as slow queries.
+        SLOW_QUERY_EXPLAIN (bool): Whether to capture `EXPLAIN (ANALYZE, BUFFERS)` of slow SELECT statements.
+        SLOW_QUERY_EXPLAIN_INTERVAL (int): Minimum seconds between two EXPLAIN captures of the same statement.
+        SERVER_HOST (str): Address the production server binds to.
+        SERVER_PORT (int): Port the production server listens on.
+        SERVER_WORKERS (int): Number of worker processes; 0 derives it from the container's CPU quota.
+        SERVER_WORKER_STAGGER (float): Seconds between the startups of consecutive workers.
+        SERVER_GRACEFUL_TIMEOUT (int): Seconds a stopping worker gets to finish its in-flight requests.
     """
 
     # Project
@@ -27,10 +85,94 @@ class Settings(BaseModel):
 
     # DataBase
     DATABASE_URL: PostgresDsn = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/invoicedb")
+    DATABASE_SHARD_URLS: List[str] = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",")
+                                      if url.strip()]
+    SHARD_FANOUT_WORKERS: int = int(os.getenv("SHARD_FANOUT_WORKERS", "8"))
+    DATABASE_POOL_SIZE: int = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+    DATABASE_MAX_OVERFLOW: int = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+    DATABASE_POOL_TIMEOUT: int = int(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+    DATABASE_INIT_MAX_ATTEMPTS: int = int(os.getenv("DATABASE_INIT_MAX_ATTEMPTS", "10"))
+    DATABASE_INIT_RETRY_DELAY: float = float(os.getenv("DATABASE_INIT_RETRY_DELAY", "1"))
+
+    # Admission control
+    THREADPOOL_SIZE: int = int(os.getenv("THREADPOOL_SIZE", "0"))
+    ADMISSION_READ_QUEUE: int = int(os.getenv("ADMISSION_READ_QUEUE", "50"))
+    ADMISSION_READ_MAX_WAIT: float = float(os.getenv("ADMISSION_READ_MAX_WAIT", "2"))
+    ADMISSION_WRITE_QUEUE: int = int(os.getenv("ADMISSION_WRITE_QUEUE", "100"))
+    ADMISSION_WRITE_MAX_WAIT: float = float(os.getenv("ADMISSION_WRITE_MAX_WAIT", "5"))
+    COALESCE_MAX_WAIT: float = float(os.getenv("COALESCE_MAX_WAIT", "2"))
+
+    # Caching
+    ENTITY_CACHE_SIZE: int = int(os.getenv("ENTITY_CACHE_SIZE", "10000"))
+
+    # Outbox
+    OUTBOX_SINKS: List[str] = [sink.strip() for sink in os.getenv("OUTBOX_SINKS", "").split(",") if sink.strip()]
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+    OUTBOX_LEASE_SECONDS: float = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
 
     # General
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
     IMAGES_DIRECTORY: str = os.getenv("IMAGES_DIRECTORY", "app/images/")
+    IMAGES_MAX_BYTES: int = int(os.getenv("IMAGES_MAX_BYTES", str(10 * 1024 * 1024)))
+    IMAGES_THUMBNAIL_SIZES: List[int] = [int(size) for size in os.getenv("IMAGES_THUMBNAIL_SIZES", "128,512").split(",")
+                                         if size.strip()]
+    IMAGES_THUMBNAIL_WORKERS: int = int(os.getenv("IMAGES_THUMBNAIL_WORKERS", "1"))
+
+    # Warehouse export
+    EXPORT_DIRECTORY: str = os.getenv("EXPORT_DIRECTORY", "app/exports/")
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+
+    # Invoice documents
+    RENDER_WORKERS: int = int(os.getenv("RENDER_WORKERS", "0"))
+    RENDER_CHUNK_SIZE: int = int(os.getenv("RENDER_CHUNK_SIZE", "50"))
+
+    # Batch API
+    BATCH_MAX_OPERATIONS: int = int(os.getenv("BATCH_MAX_OPERATIONS", "500"))
+
+    # Price lists
+    PRICE_LIST_BATCH_SIZE: int = int(os.getenv("PRICE_LIST_BATCH_SIZE", "1000"))
+
+    # Search
+    SEARCH_MAX_CANDIDATES: int = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+
+    # Background jobs
+    JOBS_CONCURRENCY: int = int(os.getenv("JOBS_CONCURRENCY", "2"))
+    JOBS_POLL_INTERVAL: float = float(os.getenv("JOBS_POLL_INTERVAL", "1"))
+    JOBS_DIRECTORY: str = os.getenv("JOBS_DIRECTORY", "app/jobs/")
+    JOBS_HEARTBEAT_TIMEOUT: float = float(os.getenv("JOBS_HEARTBEAT_TIMEOUT", "60"))
+    JOBS_MAX_ATTEMPTS: int = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+
+    # Live sales
+    LIVE_SALES_CAPACITY: int = int(os.getenv("LIVE_SALES_CAPACITY", "100"))
+    LIVE_SALES_SNAPSHOT_INTERVAL: float = float(os.getenv("LIVE_SALES_SNAPSHOT_INTERVAL", "60"))
+
+    # Revenue rollups
+    ROLLUP_BACKFILL_WORKERS: int = int(os.getenv("ROLLUP_BACKFILL_WORKERS", "4"))
+    ROLLUP_BACKFILL_CHUNK_SIZE: int = int(os.getenv("ROLLUP_BACKFILL_CHUNK_SIZE", "1"))
+
+    # Existence index
+    EXISTENCE_INDEX_PRELOAD: bool = os.getenv("EXISTENCE_INDEX_PRELOAD", "true").lower() == "true"
+
+    # Profiling
+    PROFILING_TOKEN: str = os.getenv("PROFILING_TOKEN", "")
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_RETAIN: int = int(os.getenv("PROFILING_RETAIN", "50"))
+
+    # Slow-query log
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+    SLOW_QUERY_EXPLAIN: bool = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+    SLOW_QUERY_EXPLAIN_INTERVAL: int = int(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+
+    # Server
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", "0"))
+    SERVER_WORKER_STAGGER: float = float(os.getenv("SERVER_WORKER_STAGGER", "0.5"))
+    SERVER_GRACEFUL_TIMEOUT: int = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
 
 
 # Instancia de la configuración
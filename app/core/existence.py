@@ -0,0 +1,92 @@
+"""
+This module keeps, per worker, which product and person ids are known to exist, so the references of
+invoices and invoice lines are checked in memory instead of with a query each.
+
+Ids are bits of a bitmap per entity, one bit per possible id, so ten million persons take 1.25 MB and a
+lookup is an index into a bytearray. The bitmap is exact for the ids it holds but may lack some: an id
+that is not set must be confirmed by the database (see `app.repositories.existence`), and ids are
+unset when their row changes, by any worker, through the change notifications of `app.db.notifications`.
+
+Attributes:
+    existence_index (ExistenceIndex): The index of this worker.
+"""
+
+import threading
+from typing import Dict, Iterable, Set
+
+
+class IdBitmap:
+    """
+    Set of non-negative integer ids stored as a bitmap that grows with the largest id.
+    Lookups take no lock; writes are serialized.
+    """
+
+    def __init__(self):
+        self._bits = bytearray()
+        self._lock = threading.Lock()
+
+    def __contains__(self, id: int) -> bool:
+        byte = id >> 3
+        return 0 <= byte < len(self._bits) and bool(self._bits[byte] & (1 << (id & 7)))
+
+    def __len__(self) -> int:
+        return sum(bin(byte).count("1") for byte in self._bits)
+
+    def add_all(self, ids: Iterable[int]):
+        with self._lock:
+            bits = self._bits
+            for id in ids:
+                if id < 0:
+                    continue
+                byte = id >> 3
+                if byte >= len(bits):
+                    bits.extend(bytes(max(byte + 1 - len(bits), len(bits) // 2)))
+                bits[byte] |= 1 << (id & 7)
+
+    def discard(self, id: int):
+        with self._lock:
+            byte = id >> 3
+            if 0 <= byte < len(self._bits):
+                self._bits[byte] &= ~(1 << (id & 7)) & 0xFF
+
+    def clear(self):
+        with self._lock:
+            self._bits = bytearray()
+
+
+class ExistenceIndex:
+    """
+    Ids known to exist, per entity type.
+
+    Methods:
+        missing(self, entity: str, ids: Iterable[int]) -> Set[int]: Returns the ids not known to exist.
+        add(self, entity: str, ids: Iterable[int]): Records ids known to exist.
+        forget(self, entity: str, id: int): Forgets an id, which must be confirmed again before it is trusted.
+        clear(self): Forgets every id.
+        stats(self) -> dict: Returns the number of ids known per entity.
+    """
+
+    def __init__(self, entities: Iterable[str] = ("product", "person")):
+        self._bitmaps: Dict[str, IdBitmap] = {entity: IdBitmap() for entity in entities}
+
+    def missing(self, entity: str, ids: Iterable[int]) -> Set[int]:
+        bitmap = self._bitmaps[entity]
+        return {id for id in ids if id not in bitmap}
+
+    def add(self, entity: str, ids: Iterable[int]):
+        self._bitmaps[entity].add_all(ids)
+
+    def forget(self, entity: str, id: int):
+        bitmap = self._bitmaps.get(entity)
+        if bitmap is not None:
+            bitmap.discard(id)
+
+    def clear(self):
+        for bitmap in self._bitmaps.values():
+            bitmap.clear()
+
+    def stats(self) -> dict:
+        return {entity: len(bitmap) for entity, bitmap in self._bitmaps.items()}
+
+
+existence_index = ExistenceIndex()
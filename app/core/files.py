@@ -0,0 +1,134 @@
+"""
+This module serves files from disk with validators and byte ranges.
+
+`file_response` answers conditional requests (`If-None-Match`) with `304 Not Modified`, single byte
+ranges (`Range`, honouring `If-Range`) with `206 Partial Content` and unsatisfiable ranges with
+`416`. Multiple ranges are answered with the whole file, which the HTTP specification allows.
+
+The body is handed to the server with the ASGI zero-copy send extension when the server offers it,
+so the kernel copies the file to the socket (`sendfile`); otherwise it is read in chunks.
+
+Functions:
+    parse_range(header, size): Returns the byte range requested by a Range header.
+    file_response(request, path, media_type, etag, cache_control): Builds the response serving a file.
+"""
+
+import os
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import Request, status
+from starlette.responses import Response
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Returns the inclusive byte range requested by a Range header.
+
+    Args:
+        header (Optional[str]): The Range header.
+        size (int): Size of the file.
+
+    Returns:
+        Optional[Tuple[int, int]]: First and last byte, or None to serve the whole file.
+
+    Raises:
+        RangeNotSatisfiable: If the range starts beyond the end of the file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return (start, end) if start <= end else None
+
+
+class FileRangeResponse(Response):
+    """
+    Response streaming a byte range of a file, through `sendfile` when the server supports it.
+    """
+
+    def __init__(self, path: str, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        self.path = path
+        self.start = start
+        self.length = end - start + 1
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({**headers, "content-length": str(self.length)})
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or not self.length:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, "rb") as file:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": file.wrapped.fileno(),
+                            "offset": self.start, "count": self.length})
+                return
+            await file.seek(self.start)
+            remaining = self.length
+            while remaining:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def file_response(request: Request, path: str, media_type: str, etag: str,
+                  cache_control: str = "no-cache") -> Response:
+    """
+    Builds the response serving a file, honouring conditional and range requests.
+
+    Args:
+        request (Request): The request.
+        path (str): Path of the file.
+        media_type (str): Content type of the file.
+        etag (str): Strong entity tag of the file content, without quotes.
+        cache_control (str): Cache-Control header of the response.
+
+    Returns:
+        Response: 200, 206, 304 or 416 response.
+    """
+    stat = os.stat(path)
+    quoted = f'"{etag}"'
+    headers = {"etag": quoted, "accept-ranges": "bytes", "cache-control": cache_control,
+               "last-modified": formatdate(stat.st_mtime, usegmt=True)}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or quoted in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if_range = request.headers.get("if-range")
+    requested = request.headers.get("range") if if_range is None or if_range.strip() == quoted else None
+    try:
+        byte_range = parse_range(requested, stat.st_size)
+    except RangeNotSatisfiable:
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                        headers={**headers, "content-range": f"bytes */{stat.st_size}"})
+    if byte_range is None:
+        return FileRangeResponse(path, 0, stat.st_size - 1, status.HTTP_200_OK, headers, media_type)
+    start, end = byte_range
+    return FileRangeResponse(path, start, end, status.HTTP_206_PARTIAL_CONTENT,
+                             {**headers, "content-range": f"bytes {start}-{end}/{stat.st_size}"}, media_type)
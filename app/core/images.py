@@ -0,0 +1,240 @@
+"""
+This module stores product images on disk, addressed by the SHA-256 of their content, and renders their
+thumbnails.
+
+Uploads are copied to a temporary file in chunks of CHUNK_SIZE bytes while they are hashed, then renamed
+to `originals/<first two hex digits>/<digest>.<extension>`; an image uploaded twice is stored once.
+Thumbnails (`thumbnails/<size>/<first two hex digits>/<digest>.jpg`) are rendered with Pillow in a
+process pool, so resizing never holds a request thread nor the GIL of a worker. Pillow is only imported
+by the pool processes.
+
+Attributes:
+    CHUNK_SIZE (int): Bytes read and written per chunk.
+    IMAGE_TYPES (Tuple[Tuple[bytes, str, str], ...]): Magic number, content type and extension of accepted images.
+    image_store (ImageStore): The store of this worker, in `settings.IMAGES_DIRECTORY`.
+
+Classes:
+    UnsupportedImage: Raised for uploads that are not a JPEG, PNG, GIF or WebP image.
+    ImageTooLarge: Raised for uploads larger than the configured maximum.
+    StoredImage: Digest, extension, content type and size of a stored image.
+    ImageStore: Content-addressed image storage and thumbnail scheduling.
+
+Functions:
+    render_thumbnail(source, destination, size): Renders one thumbnail, run in the process pool.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import BinaryIO, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.logger import logger
+
+CHUNK_SIZE = 1024 * 1024
+
+IMAGE_TYPES = (
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (b"GIF87a", "image/gif", "gif"),
+    (b"GIF89a", "image/gif", "gif"),
+)
+
+NAME_PATTERN = re.compile(r"^(?P<digest>[0-9a-f]{64})\.(?P<extension>jpg|png|gif|webp)$")
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class StoredImage(NamedTuple):
+    digest: str
+    extension: str
+    content_type: str
+    size: int
+
+    @property
+    def name(self) -> str:
+        return f"{self.digest}.{self.extension}"
+
+
+def sniff_image_type(head: bytes) -> Tuple[str, str]:
+    """
+    Returns the content type and extension of an image from its first bytes.
+
+    Raises:
+        UnsupportedImage: If the bytes start no accepted image format.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    for magic, content_type, extension in IMAGE_TYPES:
+        if head.startswith(magic):
+            return content_type, extension
+    raise UnsupportedImage("Only JPEG, PNG, GIF and WebP images are accepted")
+
+
+def render_thumbnail(source: str, destination: str, size: int):
+    """
+    Renders a JPEG thumbnail fitting in a `size` x `size` square. Runs in the thumbnail process pool.
+
+    Args:
+        source (str): Path of the original image.
+        destination (str): Path of the thumbnail, written atomically.
+        size (int): Maximum width and height in pixels.
+    """
+    from PIL import Image, ImageOps
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with Image.open(source) as image:
+        image.draft("RGB", (size, size))  # Lets JPEG decoding downscale on the fly.
+        thumbnail = ImageOps.exif_transpose(image).convert("RGB")
+        thumbnail.thumbnail((size, size))
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(destination), suffix=".tmp", delete=False) as file:
+            thumbnail.save(file, "JPEG", quality=85, optimize=True)
+    os.replace(file.name, destination)
+
+
+class ImageStore:
+    """
+    Content-addressed storage of product images and their thumbnails.
+
+    Attributes:
+        directory (str): Root directory of the store.
+        max_bytes (int): Largest accepted upload.
+        thumbnail_sizes (Tuple[int, ...]): Sizes of the thumbnails rendered for every image.
+        workers (int): Processes of the thumbnail pool.
+
+    Methods:
+        save(self, stream: BinaryIO) -> StoredImage: Stores an uploaded image.
+        original_path(self, name: str) -> Optional[str]: Returns the path of a stored image.
+        thumbnail_path(self, digest: str, size: int) -> str: Returns the path of a thumbnail.
+        schedule_thumbnails(self, image: StoredImage): Renders the missing thumbnails of an image in the background.
+        shutdown(self): Stops the thumbnail pool.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, thumbnail_sizes: Sequence[int], workers: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.thumbnail_sizes = tuple(thumbnail_sizes)
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def save(self, stream: BinaryIO) -> StoredImage:
+        """
+        Copies an upload into the store in chunks, hashing it on the way; a duplicate is not stored twice.
+
+        Args:
+            stream (BinaryIO): The uploaded file, read from its current position.
+
+        Returns:
+            StoredImage: The stored image.
+
+        Raises:
+            UnsupportedImage: If the upload is not an accepted image format.
+            ImageTooLarge: If the upload exceeds `max_bytes`.
+        """
+        staging = os.path.join(self.directory, "staging")
+        os.makedirs(staging, exist_ok=True)
+        digest, size, content_type, extension = hashlib.sha256(), 0, None, None
+        with tempfile.NamedTemporaryFile(dir=staging, delete=False) as file:
+            try:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if content_type is None:
+                        content_type, extension = sniff_image_type(chunk)
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageTooLarge(f"Images are limited to {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    file.write(chunk)
+                if content_type is None:
+                    raise UnsupportedImage("The upload is empty")
+            except BaseException:
+                file.close()
+                os.unlink(file.name)
+                raise
+        image = StoredImage(digest.hexdigest(), extension, content_type, size)
+        path = self._original_path(image.name)
+        if os.path.exists(path):
+            os.unlink(file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(file.name, 0o644)
+            os.replace(file.name, path)
+        return image
+
+    def _original_path(self, name: str) -> str:
+        return os.path.join(self.directory, "originals", name[:2], name)
+
+    def original_path(self, name: str) -> Optional[str]:
+        """
+        Returns the path of a stored image from its name ('<digest>.<extension>'), or None if there is none.
+        """
+        if not NAME_PATTERN.match(name):
+            return None
+        path = self._original_path(name)
+        return path if os.path.exists(path) else None
+
+    def thumbnail_path(self, digest: str, size: int) -> str:
+        return os.path.join(self.directory, "thumbnails", str(size), digest[:2], f"{digest}.jpg")
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Spawned, not forked: the worker process runs threads a fork would copy in an unknown state.
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def schedule_thumbnails(self, image: StoredImage) -> Dict[int, Future]:
+        """
+        Submits the rendering of the missing thumbnails of an image to the process pool, once per thumbnail.
+
+        Args:
+            image (StoredImage): The stored image.
+
+        Returns:
+            Dict[int, Future]: The pending rendering of every missing thumbnail, by size.
+        """
+        futures = {}
+        for size in self.thumbnail_sizes:
+            destination = self.thumbnail_path(image.digest, size)
+            if os.path.exists(destination):
+                continue
+            with self._lock:
+                future = self._pending.get(destination)
+            if future is None:
+                future = self._executor().submit(render_thumbnail, self._original_path(image.name), destination, size)
+                with self._lock:
+                    self._pending[destination] = future
+                future.add_done_callback(lambda done, key=destination: self._finished(key, done))
+            futures[size] = future
+        return futures
+
+    def _finished(self, destination: str, future: Future):
+        with self._lock:
+            self._pending.pop(destination, None)
+        if future.exception() is not None:
+            logger.warning("Thumbnail rendering of %s failed", destination, exc_info=future.exception())
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+image_store = ImageStore(settings.IMAGES_DIRECTORY, settings.IMAGES_MAX_BYTES, settings.IMAGES_THUMBNAIL_SIZES,
+                         settings.IMAGES_THUMBNAIL_WORKERS)
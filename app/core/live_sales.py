@@ -0,0 +1,230 @@
+"""
+This module keeps the best-selling products of the last minutes, hour and day in memory, for live dashboards.
+
+Every window is a ring of time buckets, each holding a weighted Space-Saving sketch per metric (quantity
+and revenue) of at most `settings.LIVE_SALES_CAPACITY` products. Recording a sale updates one bucket per
+window and metric; reading a window merges its buckets, so neither depends on the number of invoice lines.
+A window covers its last full buckets and the current one, i.e. between its nominal length minus one
+bucket and its nominal length.
+
+Space-Saving never underestimates: a product's value is an upper bound and `value - error` a lower bound.
+Every product whose true value exceeds 1/capacity of the window's total is reported. Sales are counted
+when they happen; deleting an invoice line later does not take it out of the sketches.
+
+Attributes:
+    WINDOWS (Dict[str, Tuple[int, int]]): Length in seconds and number of buckets of every window.
+    METRICS (Tuple[str, ...]): The tracked metrics.
+    live_sales (LiveSales): The sketches of this worker.
+
+Classes:
+    SpaceSaving: Weighted, mergeable heavy-hitter sketch.
+    SlidingTopK: Ring of Space-Saving sketches over a sliding time window.
+    LiveSales: The windows and metrics of the live top products.
+"""
+
+import threading
+import time
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+WINDOWS = {"5m": (300, 10), "1h": (3600, 12), "1d": (86400, 24)}
+
+METRICS = ("quantity", "revenue")
+
+
+class SpaceSaving:
+    """
+    Weighted Space-Saving sketch: the heaviest items of a stream in a fixed number of counters.
+
+    When every counter is taken, a new item replaces the smallest one and inherits its count as error.
+
+    Attributes:
+        capacity (int): Number of counters.
+        counters (Dict[Hashable, List[float]]): Count and error of every tracked item.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counters: Dict[Hashable, List[float]] = {}
+
+    def add(self, item: Hashable, weight: float):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [weight, 0.0]
+        else:
+            smallest = min(self.counters, key=lambda key: self.counters[key][0])
+            floor = self.counters.pop(smallest)[0]
+            self.counters[item] = [floor + weight, floor]
+
+    def floor(self) -> float:
+        """
+        Returns the most an untracked item may have been counted: the smallest count once the sketch is full.
+        """
+        if len(self.counters) < self.capacity:
+            return 0.0
+        return min(counter[0] for counter in self.counters.values())
+
+    @classmethod
+    def merge(cls, sketches: Iterable["SpaceSaving"], capacity: int) -> "SpaceSaving":
+        """
+        Merges sketches of disjoint parts of a stream, keeping the `capacity` heaviest items.
+
+        An item missing from a full sketch may still have been counted there, up to that sketch's floor,
+        which is added to both its count and its error so the bounds keep holding.
+        """
+        sketches = list(sketches)
+        merged: Dict[Hashable, List[float]] = {}
+        for sketch in sketches:
+            for item, (count, error) in sketch.counters.items():
+                total = merged.setdefault(item, [0.0, 0.0])
+                total[0] += count
+                total[1] += error
+        for sketch in sketches:
+            floor = sketch.floor()
+            if floor:
+                for item, total in merged.items():
+                    if item not in sketch.counters:
+                        total[0] += floor
+                        total[1] += floor
+        result = cls(capacity)
+        result.counters = dict(sorted(merged.items(), key=lambda entry: -entry[1][0])[:capacity])
+        return result
+
+    def top(self, limit: int) -> List[Tuple[Hashable, float, float]]:
+        """
+        Returns the `limit` heaviest items as (item, count, error), heaviest first.
+        """
+        ranked = sorted(self.counters.items(), key=lambda entry: (-entry[1][0], entry[0]))
+        return [(item, count, error) for item, (count, error) in ranked[:limit]]
+
+
+class SlidingTopK:
+    """
+    Space-Saving sketches of the consecutive buckets of a sliding time window.
+
+    Attributes:
+        length (int): Length of the window, in seconds.
+        buckets (int): Number of buckets of the window.
+        capacity (int): Counters of every bucket's sketch.
+    """
+
+    def __init__(self, length: int, buckets: int, capacity: int):
+        self.length = length
+        self.buckets = buckets
+        self.capacity = capacity
+        self.width = length / buckets
+        self._sketches: Dict[int, SpaceSaving] = {}
+
+    def _prune(self, current: int):
+        for index in [index for index in self._sketches if index <= current - self.buckets]:
+            del self._sketches[index]
+
+    def add(self, item: Hashable, weight: float, at: float):
+        index = int(at // self.width)
+        sketch = self._sketches.get(index)
+        if sketch is None:
+            self._prune(index)
+            sketch = self._sketches[index] = SpaceSaving(self.capacity)
+        sketch.add(item, weight)
+
+    def window(self, now: float) -> SpaceSaving:
+        """
+        Returns the merged sketch of the buckets in the window ending at `now`.
+        """
+        current = int(now // self.width)
+        self._prune(current)
+        return SpaceSaving.merge((sketch for index, sketch in self._sketches.items() if index <= current),
+                                 self.capacity)
+
+    def since(self, now: float) -> float:
+        """
+        Returns the start of the oldest bucket of the window ending at `now`.
+        """
+        return (int(now // self.width) - self.buckets + 1) * self.width
+
+    def dump(self) -> Dict[str, list]:
+        return {str(index): [[item, count, error] for item, (count, error) in sketch.counters.items()]
+                for index, sketch in self._sketches.items()}
+
+    def load(self, state: Dict[str, list]):
+        """
+        Adds dumped buckets to the sketches, merging those this window already has.
+        """
+        for index, counters in state.items():
+            restored = SpaceSaving(self.capacity)
+            restored.counters = {item: [count, error] for item, count, error in counters}
+            index = int(index)
+            if index in self._sketches:
+                restored = SpaceSaving.merge([self._sketches[index], restored], self.capacity)
+            self._sketches[index] = restored
+
+
+class LiveSales:
+    """
+    Thread-safe best-selling products by quantity and by revenue over the windows of `WINDOWS`.
+
+    Attributes:
+        capacity (int): Products tracked per bucket.
+
+    Methods:
+        record(self, product_id: int, quantity: float, revenue: float, at: float = None): Counts a sale.
+        top(self, window: str, metric: str, limit: int, now: float = None) -> dict: Returns the best sellers.
+        dump(self) -> dict: Returns the state of every sketch, as JSON-serializable data.
+        load(self, state: dict): Adds a dumped state to the sketches.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._windows = {(window, metric): SlidingTopK(length, buckets, capacity)
+                         for window, (length, buckets) in WINDOWS.items() for metric in METRICS}
+        self._lock = threading.Lock()
+
+    def record(self, product_id: int, quantity: float, revenue: float, at: Optional[float] = None):
+        """
+        Counts a sale of a product in every window.
+
+        Args:
+            product_id (int): The product sold.
+            quantity (float): The quantity sold.
+            revenue (float): The invoiced amount.
+            at (float): When the sale happened, as a Unix time; defaults to now.
+        """
+        at = time.time() if at is None else at
+        weights = {"quantity": quantity, "revenue": revenue}
+        with self._lock:
+            for (window, metric), sketch in self._windows.items():
+                if weights[metric] > 0:
+                    sketch.add(product_id, weights[metric], at)
+
+    def top(self, window: str, metric: str, limit: int, now: Optional[float] = None) -> dict:
+        """
+        Returns the best-selling products of a window.
+
+        Args:
+            window (str): One of `WINDOWS`.
+            metric (str): One of `METRICS`.
+            limit (int): Number of products, at most `capacity`.
+            now (float): End of the window, as a Unix time; defaults to now.
+
+        Returns:
+            dict: Start of the window (`since`, Unix time) and `items`, as (product id, value, error), best first.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            sketch = self._windows[(window, metric)]
+            return {"since": sketch.since(now), "items": sketch.window(now).top(limit)}
+
+    def dump(self) -> dict:
+        with self._lock:
+            return {f"{window}:{metric}": sketch.dump() for (window, metric), sketch in self._windows.items()}
+
+    def load(self, state: dict):
+        with self._lock:
+            for (window, metric), sketch in self._windows.items():
+                sketch.load(state.get(f"{window}:{metric}", {}))
+
+
+live_sales = LiveSales(settings.LIVE_SALES_CAPACITY)
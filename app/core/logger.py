@@ -1,26 +1,264 @@
+"""
+Logging subsystem of the application.
+
+Records are handed to a `QueueHandler` and written by a `QueueListener` on a background thread, so a
+log call never blocks the request thread on stdout I/O. Records are emitted as structured JSON (or
+text, with `LOG_FORMAT=text`) enriched with the request id and path of the request that produced them,
+and `RequestLoggingMiddleware` writes one access record per request with its route, latency, DB time and,
+when it used the database, how long it held its session and pooled connection.
+High-volume loggers can be sampled: `LOG_SAMPLING="uvicorn.access=0.1,app.repositories=0.5"` keeps that
+fraction of their DEBUG and INFO records; warnings and errors are always kept.
+"""
+
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import random
+import sys
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+# Per-request logging state: request id, path, accumulated DB time and session hold times.
+request_state: ContextVar[Optional[dict]] = ContextVar("request_state", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is emitted as a field.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, including the `extra` fields of the record.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = "".join(traceback.format_exception(*record.exc_info))
+        elif record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds the request id and path of the current request to every record. Runs in the thread that logs,
+    before the record is queued, while the request context is still available.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        state = request_state.get()
+        if state is not None:
+            record.request_id = state["request_id"]
+            record.path = state["path"]
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the DEBUG and INFO records of the configured loggers (and their children).
+
+    Attributes:
+        rates (Dict[str, float]): Kept fraction per logger name.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        return random.random() < self._rate(record.name)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that drops records instead of blocking or failing when the queue is full.
+
+    Attributes:
+        dropped (int): Number of records dropped so far.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merges the message arguments and renders the traceback in the logging thread, since both may
+        reference objects that change later, and leaves all other formatting to the listener thread.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """
+    Parses a sampling specification such as "uvicorn.access=0.1,app.repositories=0.5".
+
+    Args:
+        value (str): Comma separated `logger=rate` pairs.
+
+    Returns:
+        Dict[str, float]: Kept fraction per logger name.
+    """
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
 
 
 def setup_logging():
     """
     Configures the logging system for the application.
 
-    This function sets the basic settings for logging, including the severity level,
-    the message format and the date and time format. The settings defined here apply
-    to all logs created in the application.
+    The root logger gets a single non-blocking queue handler at `settings.LOG_LEVEL`; a listener thread
+    writes the records to stdout as JSON (or text when `settings.LOG_FORMAT` is "text"). Uvicorn's
+    loggers are routed through the same queue. Calling it again is a no-op. A process forked afterwards
+    (a preloaded server worker) gets its own queue and listener thread.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "text":
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                                                      datefmt='%Y-%m-%d %H:%M:%S'))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sampling(settings.LOG_SAMPLING)))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+    _queue_handler = queue_handler
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
 
-    The logging level is set to INFO, which means that all events of this and higher levels (WAR) will be logged.
-    this level and higher levels (WARNING, ERROR, CRITICAL) will be logged.
+def _restart_listener_in_child():
+    # Threads do not survive fork and the parent's queue may have been locked mid-operation.
+    if _listener is None:
+        return
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler.queue = log_queue
+    _listener.queue = log_queue
+    _listener._thread = None
+    _listener.start()
 
-    Log message format:
-    - Date and time of the event.
-    - Name of the logger that generated the log
-    - Severity level of the event
-    - Log message
+
+os.register_at_fork(after_in_child=_restart_listener_in_child)
+
+
+def record_db_time(conn, statement, parameters, elapsed: float):
+    """
+    Statement observer adding the duration of a SQL statement to the DB time of the current request.
+
+    Args:
+        conn (Connection): The connection that executed the statement.
+        statement (str): The SQL statement.
+        parameters: Its bind parameters.
+        elapsed (float): Duration of the statement in seconds.
+    """
+    state = request_state.get()
+    if state is not None:
+        state["db_ms"] += elapsed * 1000
+
+
+class RequestLoggingMiddleware:
+    """
+    ASGI middleware assigning a request id (from `X-Request-ID` or generated), exposing it to log records
+    and the response, and writing one access record per request with its route, latency and DB time.
     """
-    logging.basicConfig(level=logging.INFO,
-                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                        datefmt='%Y-%m-%d %H:%M:%S')
+
+    def __init__(self, app):
+        self.app = app
+        self.access_logger = logging.getLogger("app.access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"x-request-id"),
+                          None) or uuid.uuid4().hex
+        state = {"request_id": request_id, "path": scope["path"], "db_ms": 0.0}
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        token = request_state.set(state)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            route = scope.get("route")
+            self.access_logger.info("%s %s %s", scope["method"], scope["path"], status_code, extra={
+                "method": scope["method"],
+                "route": getattr(route, "path", None),
+                "status_code": status_code,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+                "db_ms": round(state["db_ms"], 3),
+                "session_ms": round(state["session_ms"], 3) if "session_ms" in state else None,
+                "connection_ms": round(state["connection_ms"], 3) if "connection_ms" in state else None,
+            })
+            request_state.reset(token)
 
 
 logger = logging.getLogger(__name__)
@@ -0,0 +1,298 @@
+"""
+This module implements on-demand request profiling. A request is profiled when it carries the
+`X-Debug-Profile` header with the configured token, or when it is picked by random sampling.
+
+A profiled request runs under cProfile both on the event loop thread (middleware, JSON encoding) and
+on the worker thread executing its endpoint, every SQL statement it runs is recorded with its timing,
+and the result is kept in a bounded in-memory store for download as pstats (loadable by snakeviz,
+flameprof or gprof2dot) or as text. The response carries the profile id in `X-Profile-Id`.
+
+Attributes:
+    PROFILE_HEADER (str): Request header carrying the profiling token.
+    PROFILE_ID_HEADER (str): Response header carrying the profile id.
+    profile_store (ProfileStore): The most recent profiles, bounded by `settings.PROFILING_RETAIN`.
+
+Classes:
+    RequestProfile: Profile of a single request.
+    ProfileStore: Bounded store of the most recent profiles.
+    ProfilingMiddleware: ASGI middleware selecting and profiling requests.
+
+Functions:
+    instrument_routes(app): Makes synchronous endpoints profile themselves inside their worker thread.
+"""
+
+import asyncio
+import cProfile
+import functools
+import hmac
+import io
+import marshal
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from starlette.routing import request_response
+
+from app.core.config import settings
+from app.db.postgresql import statement_observers
+
+PROFILE_HEADER = "X-Debug-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Profile of the request being handled in the current context, propagated to worker threads by anyio.
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Profile of a single request: call statistics, SQL statements and timings.
+
+    Attributes:
+        id (str): Unique identifier of the profile.
+        method (str): HTTP method of the request.
+        path (str): Path of the request.
+        started_at (datetime): When the request started.
+        duration_ms (float): Wall time of the request.
+        endpoint_ms (float): Time spent inside the endpoint function.
+        statements (List[dict]): SQL statements executed, with their parameters and duration.
+        status_code (int): Response status code.
+    """
+
+    def __init__(self, method: str, path: str):
+        """
+        Initializes an empty profile for a request.
+
+        Args:
+            method (str): HTTP method of the request.
+            path (str): Path of the request.
+        """
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.duration_ms = 0.0
+        self.endpoint_ms = 0.0
+        self.statements: List[dict] = []
+        self.status_code = None
+        self._profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def profiler(self) -> cProfile.Profile:
+        """
+        Returns a new cProfile profiler whose statistics are merged into this profile. cProfile only
+        observes the thread that enables it, so every thread involved in the request gets its own.
+        """
+        profiler = cProfile.Profile()
+        with self._lock:
+            self._profilers.append(profiler)
+        return profiler
+
+    def record_statement(self, statement: str, parameters, elapsed: float):
+        """
+        Records a SQL statement executed while handling the request.
+        """
+        with self._lock:
+            self.statements.append({"statement": statement, "parameters": repr(parameters)[:500],
+                                    "duration_ms": round(elapsed * 1000, 3)})
+
+    @property
+    def sql_ms(self) -> float:
+        """
+        Total time spent executing SQL statements.
+        """
+        return round(sum(statement["duration_ms"] for statement in self.statements), 3)
+
+    def stats(self) -> pstats.Stats:
+        """
+        Returns the call statistics of every thread of the request merged together.
+        """
+        stats = pstats.Stats(self._profilers[0])
+        for profiler in self._profilers[1:]:
+            stats.add(profiler)
+        return stats
+
+    def pstats_dump(self) -> bytes:
+        """
+        Returns the statistics in the binary pstats format written by `cProfile.Profile.dump_stats`.
+        """
+        return marshal.dumps(self.stats().stats)
+
+    def text_report(self, limit: int = 60) -> str:
+        """
+        Returns a human readable report: timings breakdown, SQL statements and the top functions by cumulative time.
+        """
+        output = io.StringIO()
+        output.write(f"{self.method} {self.path} -> {self.status_code}\n"
+                     f"total {self.duration_ms:.3f} ms, endpoint {self.endpoint_ms:.3f} ms, "
+                     f"sql {self.sql_ms:.3f} ms in {len(self.statements)} statements\n\n")
+        for statement in self.statements:
+            output.write(f"[{statement['duration_ms']:.3f} ms] {statement['statement']}\n")
+        output.write("\n")
+        stats = self.stats()
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+    def summary(self) -> dict:
+        """
+        Returns the metadata of the profile, without call statistics.
+        """
+        return {"id": self.id, "method": self.method, "path": self.path, "started_at": self.started_at,
+                "status_code": self.status_code, "duration_ms": round(self.duration_ms, 3),
+                "endpoint_ms": round(self.endpoint_ms, 3), "sql_ms": self.sql_ms,
+                "statements": len(self.statements)}
+
+
+class ProfileStore:
+    """
+    Thread-safe store keeping the most recent request profiles.
+
+    Attributes:
+        capacity (int): Maximum number of profiles kept; the oldest are evicted first.
+
+    Methods:
+        add(self, profile: RequestProfile): Stores a profile, evicting the oldest beyond capacity.
+        get(self, profile_id: str) -> Optional[RequestProfile]: Returns a stored profile by id.
+        list(self) -> List[RequestProfile]: Returns the stored profiles, most recent first.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.capacity:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._profiles.values()))
+
+
+profile_store = ProfileStore(settings.PROFILING_RETAIN)
+
+
+def _record_statement(conn, statement, parameters, elapsed):
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record_statement(statement, parameters, elapsed)
+
+
+statement_observers.append(_record_statement)
+
+
+def is_authorized(token: Optional[str]) -> bool:
+    """
+    Whether a token matches the configured profiling token, compared in constant time. Always False when no
+    token is configured.
+    """
+    if not settings.PROFILING_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), settings.PROFILING_TOKEN.encode())
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling authorized or sampled requests. Requests that are not profiled only pay
+    a header lookup and a random draw.
+
+    Only one request is profiled at a time on the event loop thread, since a thread can run a single
+    cProfile profiler; requests arriving meanwhile are served unprofiled. While a request is profiled,
+    the event loop profile also contains whatever other requests run on the loop concurrently.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        sample_rate (float): Fraction of requests profiled at random.
+    """
+
+    def __init__(self, app, sample_rate: float = None):
+        self.app = app
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._profiling = False
+
+    def _should_profile(self, scope) -> bool:
+        token = next((value.decode("latin-1") for name, value in scope["headers"]
+                      if name == PROFILE_HEADER.lower().encode()), None)
+        if token is not None and is_authorized(token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._profiling or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(PROFILE_ID_HEADER.lower().encode(), profile.id.encode())]
+            await send(message)
+
+        token = current_profile.set(profile)
+        profiler = profile.profiler()
+        self._profiling = True
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            self._profiling = False
+            profile.duration_ms = (time.perf_counter() - started) * 1000
+            current_profile.reset(token)
+            profile_store.add(profile)
+
+
+def _profiled_endpoint(endpoint):
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        profiler = profile.profiler()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profile.endpoint_ms += (time.perf_counter() - started) * 1000
+
+    wrapper.profiled = True
+    return wrapper
+
+
+def instrument_routes(app: FastAPI):
+    """
+    Wraps every synchronous endpoint so that, when its request is profiled, cProfile also runs inside the
+    threadpool worker executing it. Must be called after all routers are included.
+
+    Args:
+        app (FastAPI): The application whose routes are instrumented.
+    """
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        call = route.dependant.call
+        if asyncio.iscoroutinefunction(call) or getattr(call, "profiled", False):
+            continue
+        route.dependant.call = _profiled_endpoint(call)
+        route.app = request_response(route.get_route_handler())
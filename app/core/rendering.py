@@ -0,0 +1,93 @@
+"""
+This module renders invoice documents from the Jinja2 templates in `app/templates`.
+
+HTML documents are `invoice.html`, a full page around `invoice_body.html`. PDF documents lay out
+`invoice_body.html` with fpdf2, whose core fonts only cover Latin-1, so other characters are replaced.
+Templates are compiled once per process, on first use, and reused for every document.
+
+It only depends on Jinja2 and fpdf2, so the processes of a rendering pool start quickly.
+
+Attributes:
+    FORMATS (Dict[str, str]): Content type of every supported output format.
+
+Functions:
+    compile_templates(): Compiles the templates of the current process.
+    render_document(document, format): Renders one invoice document.
+    render_chunk(documents, format): Renders a work unit of documents, run in the rendering pool.
+    document_name(document, format): Returns the file name of a rendered document.
+"""
+
+import os
+from functools import lru_cache
+from typing import List, Tuple
+
+FORMATS = {"html": "text/html", "pdf": "application/pdf"}
+
+TEMPLATES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+
+def _latin1(value) -> str:
+    return str(value).encode("latin-1", "replace").decode("latin-1") if value is not None else ""
+
+
+@lru_cache(maxsize=None)
+def _template(name: str, latin1: bool = False):
+    from jinja2 import Environment, FileSystemLoader
+
+    environment = Environment(loader=FileSystemLoader(TEMPLATES_DIRECTORY), autoescape=True,
+                              finalize=_latin1 if latin1 else None)
+    return environment.get_template(name)
+
+
+def compile_templates():
+    """
+    Compiles the templates of the current process ahead of the first document, e.g. in a pool initializer.
+    """
+    _template("invoice.html")
+    _template("invoice_body.html", latin1=True)
+
+
+def render_document(document: dict, format: str = "html") -> bytes:
+    """
+    Renders an invoice document.
+
+    Args:
+        document (dict): The invoice, as returned by `InvoiceDocumentRepository`.
+        format (str): 'html' or 'pdf'.
+
+    Returns:
+        bytes: The rendered document.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    if format == "html":
+        return _template("invoice.html").render(invoice=document).encode()
+    if format == "pdf":
+        from fpdf import FPDF
+
+        pdf = FPDF()
+        pdf.set_title(f"Invoice {document['number']}")
+        pdf.add_page()
+        pdf.set_font("Helvetica", size=10)
+        pdf.write_html(_template("invoice_body.html", latin1=True).render(invoice=document))
+        return bytes(pdf.output())
+    raise ValueError(f"Unsupported document format {format!r}")
+
+
+def document_name(document: dict, format: str) -> str:
+    return f"invoice-{document['number'] if document['number'] is not None else document['id']}.{format}"
+
+
+def render_chunk(documents: List[dict], format: str) -> List[Tuple[str, bytes]]:
+    """
+    Renders a work unit of invoice documents.
+
+    Args:
+        documents (List[dict]): The invoices.
+        format (str): 'html' or 'pdf'.
+
+    Returns:
+        List[Tuple[str, bytes]]: File name and content of every document.
+    """
+    return [(document_name(document, format), render_document(document, format)) for document in documents]
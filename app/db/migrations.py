@@ -0,0 +1,401 @@
+"""
+This module applies incremental schema migrations that `Base.metadata.create_all` cannot express,
+such as adding columns to existing tables and backfilling them. Applied versions are recorded in
+the `schema_version` table so every migration runs exactly once per database.
+
+Startup skips every schema check when a database is at `latest_version()`, so any schema change,
+including a new table, must come with a migration. On PostgreSQL, migrations run under an advisory lock,
+so when several workers start at once one migrates and the others wait, then find the database current.
+
+Attributes:
+    MIGRATIONS (List[Tuple[int, str, Callable]]): Ordered migrations as (version, description, function).
+                                                  Each function receives the engine it migrates.
+
+Functions:
+    current_version(engine): Returns the highest migration version applied to a database.
+    latest_version(): Returns the version of the newest migration.
+    migration_lock(engine): Context manager holding the lock of the migrations of a database.
+    apply_migrations(engine, prepare): Applies every pending migration, in version order.
+"""
+
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, inspect, select, func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from app.core.logger import logger
+
+# Number of rows updated per transaction by backfills, keeping locks and WAL bursts short.
+BACKFILL_BATCH_SIZE = 10000
+
+# Key of the PostgreSQL advisory lock serializing the migrations of a database.
+MIGRATION_LOCK_KEY = 4837201
+
+metadata = MetaData()
+
+schema_version = Table(
+    "schema_version", metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+)
+
+
+def _add_missing_columns(engine: Engine, table: str, columns: dict):
+    """
+    Adds the given columns to a table unless they already exist.
+
+    Args:
+        engine (Engine): The engine of the database to alter.
+        table (str): The table name.
+        columns (dict): Column name to SQL type.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(table)}
+    with engine.begin() as connection:
+        for name, sql_type in columns.items():
+            if name not in existing:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}"))
+
+
+def _backfill_by_id_range(engine: Engine, table: str, statement: str):
+    """
+    Runs an UPDATE over a table in id ranges of BACKFILL_BATCH_SIZE, one transaction per range.
+
+    Args:
+        engine (Engine): The engine of the database to backfill.
+        table (str): The table name.
+        statement (str): UPDATE statement filtering on the `:low` and `:high` id bounds.
+    """
+    with engine.connect() as connection:
+        max_id = connection.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0
+    for low in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+        with engine.begin() as connection:
+            connection.execute(text(statement), {"low": low, "high": low + BACKFILL_BATCH_SIZE})
+
+
+def _invalid_index(connection, name: str) -> bool:
+    return bool(connection.execute(text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                                   {"name": name}).scalar())
+
+
+def _create_index_concurrently(engine: Engine, name: str, definition: str, unique: bool = False):
+    """
+    Builds an index on PostgreSQL without blocking writes. A concurrent build that fails leaves an invalid
+    index behind, which `IF NOT EXISTS` would then keep and which cannot serve queries nor `ON CONFLICT`:
+    such a leftover is dropped before the build, and a failed build drops its own.
+
+    Args:
+        engine (Engine): The engine of the database to index.
+        name (str): The index name.
+        definition (str): What follows the index name, e.g. "ON products (sku)".
+        unique (bool): Whether the index is unique.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if _invalid_index(connection, name):
+            logger.warning("Dropping the invalid index %s left by a failed build", name)
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        try:
+            connection.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS "
+                                    f"{name} {definition}"))
+        except DBAPIError:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            raise
+
+
+def _snapshot_invoice_detail_prices(engine: Engine):
+    """
+    Adds `unit_price` and `unit_cost` to invoice details and backfills them from the current product catalog.
+    """
+    _add_missing_columns(engine, "invoice_details", {"unit_price": "FLOAT", "unit_cost": "FLOAT"})
+    _backfill_by_id_range(engine, "invoice_details", """
+        UPDATE invoice_details
+        SET unit_price = (SELECT price FROM products WHERE products.id = invoice_details.product_id),
+            unit_cost = (SELECT cost FROM products WHERE products.id = invoice_details.product_id)
+        WHERE id >= :low AND id < :high AND unit_price IS NULL
+    """)
+
+
+def _create_outbox(engine: Engine):
+    """
+    Creates the transactional outbox tables. On PostgreSQL, events record the id of the transaction that
+    wrote them, which lets the publisher read them in an order where no event can commit behind its cursor.
+    """
+    from app.models.outbox import OutboxCursor, OutboxEvent
+
+    OutboxEvent.__table__.create(bind=engine, checkfirst=True)
+    OutboxCursor.__table__.create(bind=engine, checkfirst=True)
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE outbox_events ALTER COLUMN transaction_id SET DEFAULT txid_current()"))
+
+
+def _track_changes(engine: Engine):
+    """
+    Adds the indexed change sequence and update time of the change feed to persons, products and invoices,
+    and creates the tombstone table of deleted rows. Existing rows get sequence 0, so a first sync returns them.
+    """
+    from app.models.change import ChangeTombstone
+
+    ChangeTombstone.__table__.create(bind=engine, checkfirst=True)
+    timestamp = "TIMESTAMP" if engine.dialect.name == "postgresql" else "DATETIME"
+    existing = inspect(engine).get_table_names()
+    for table in ("person", "products", "invoice_headers", "invoice_details"):
+        if table not in existing:
+            continue  # Created later by `create_all`, with the columns.
+        _add_missing_columns(engine, table, {"change_seq": "BIGINT", "updated_at": timestamp})
+        _backfill_by_id_range(engine, table, f"""
+            UPDATE {table} SET change_seq = 0 WHERE id >= :low AND id < :high AND change_seq IS NULL
+        """)
+        with engine.begin() as connection:
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_change_seq ON {table} (change_seq)"))
+
+
+def _create_product_images(engine: Engine):
+    """
+    Creates the table of product images.
+    """
+    from app.models.product_image import ProductImage
+
+    ProductImage.__table__.create(bind=engine, checkfirst=True)
+
+
+def _create_jobs(engine: Engine):
+    """
+    Creates the table of background jobs.
+    """
+    from app.models.job import Job
+
+    Job.__table__.create(bind=engine, checkfirst=True)
+
+
+def _index_search_documents(engine: Engine):
+    """
+    Indexes the searched text of products and persons: a GIN index on its `tsvector` for word and prefix
+    matching and, when the pg_trgm extension can be installed, a trigram GIN index for typo-tolerant matching.
+    Indexes are built concurrently, so large tables stay writable meanwhile. Other databases search unindexed.
+    """
+    from app.repositories.search import SEARCH_DOCUMENTS
+
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        trigram = True
+    except DBAPIError:
+        logger.warning("The pg_trgm extension is not available, searches will not tolerate typos")
+        trigram = False
+    existing = inspect(engine).get_table_names()
+    for table, document in SEARCH_DOCUMENTS.items():
+        if table not in existing:
+            continue
+        _create_index_concurrently(engine, f"ix_{table}_search_vector",
+                                   f"ON {table} USING gin (to_tsvector('simple'::regconfig, ({document})))")
+        if trigram:
+            _create_index_concurrently(engine, f"ix_{table}_search_trigram",
+                                       f"ON {table} USING gin (({document}) gin_trgm_ops)")
+
+
+def _unique_person_documents(engine: Engine):
+    """
+    Makes (document_type, document) unique among persons, the conflict target of the get-or-create upsert.
+    Duplicated documents are not merged automatically, since their invoices would need to be reassigned:
+    the migration stops and names them instead.
+    """
+    if "person" not in inspect(engine).get_table_names():
+        return
+    with engine.connect() as connection:
+        duplicates = connection.execute(text("""
+            SELECT document_type, document, COUNT(*) FROM person
+            GROUP BY document_type, document HAVING COUNT(*) > 1 ORDER BY document_type, document LIMIT 20
+        """)).fetchall()
+    if duplicates:
+        raise RuntimeError("Merge the persons sharing a document before upgrading: " +
+                           ", ".join(f"{type} {document} ({count} rows)" for type, document, count in duplicates))
+    if engine.dialect.name == "postgresql":
+        _create_index_concurrently(engine, "ux_person_document", "ON person (document_type, document)", unique=True)
+    else:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_person_document "
+                                    "ON person (document_type, document)"))
+
+
+def _add_product_skus(engine: Engine):
+    """
+    Adds the unique supplier SKU of products, the key of price list upserts. Existing products have none.
+    """
+    if "products" not in inspect(engine).get_table_names():
+        return
+    _add_missing_columns(engine, "products", {"sku": "VARCHAR"})
+    if engine.dialect.name == "postgresql":
+        _create_index_concurrently(engine, "ux_products_sku", "ON products (sku)", unique=True)
+    else:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_products_sku ON products (sku)"))
+
+
+def _create_sketch_snapshots(engine: Engine):
+    """
+    Creates the table of the snapshots of in-memory sketches.
+    """
+    from app.models.sketch_snapshot import SketchSnapshot
+
+    SketchSnapshot.__table__.create(bind=engine, checkfirst=True)
+
+
+def _build_revenue_rollups(engine: Engine):
+    """
+    Creates the revenue rollups and builds them from the existing invoice lines of this database, through
+    the backfill of `RevenueRollupService`, which on PostgreSQL holds invoice writes while it rebuilds a
+    month. Lines written after it by workers of the previous version are not rolled up: rebuild with
+    `python -m app.servicies.revenue_rollups` after such a deployment.
+    """
+    from sqlalchemy.orm import Session, sessionmaker
+
+    from app.models.revenue_rollup import RevenueRollup
+    from app.servicies.revenue_rollups import RevenueRollupService
+
+    RevenueRollup.__table__.create(bind=engine, checkfirst=True)
+    if not {"invoice_details", "invoice_headers"} <= set(inspect(engine).get_table_names()):
+        return
+    with Session(engine) as db:
+        RevenueRollupService(db).backfill(sources=[sessionmaker(bind=engine)])
+
+
+def _lease_outbox_cursors(engine: Engine):
+    """
+    Adds the claim of the outbox cursors, which lets a publisher deliver a batch without holding a transaction.
+    """
+    if "outbox_cursors" not in inspect(engine).get_table_names():
+        return
+    timestamp = "TIMESTAMP" if engine.dialect.name == "postgresql" else "DATETIME"
+    _add_missing_columns(engine, "outbox_cursors", {"claimed_by": "VARCHAR", "claimed_until": timestamp})
+
+
+def _rebuild_invalid_indexes(engine: Engine):
+    """
+    Builds again the indexes of migrations 6 to 8 that an interrupted concurrent build left invalid while the
+    migration was recorded as applied. Valid indexes are kept.
+    """
+    from app.repositories.search import SEARCH_DOCUMENTS
+
+    if engine.dialect.name != "postgresql":
+        return
+    names = [f"ix_{table}_search_{kind}" for table in SEARCH_DOCUMENTS for kind in ("vector", "trigram")]
+    with engine.connect() as connection:
+        invalid = {name for name in names + ["ux_person_document", "ux_products_sku"]
+                   if _invalid_index(connection, name)}
+    if invalid & set(names):
+        _index_search_documents(engine)
+    if "ux_person_document" in invalid:
+        _unique_person_documents(engine)
+    if "ux_products_sku" in invalid:
+        _add_product_skus(engine)
+
+
+def _index_invoice_references(engine: Engine):
+    """
+    Indexes the references of invoices to their persons and products, and of lines to their invoices, which
+    the warehouse export follows to export again the lines of a changed invoice, person or product.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    for table, column in (("invoice_details", "invoice_header_id"), ("invoice_details", "product_id"),
+                          ("invoice_headers", "person_id")):
+        if table not in tables or column not in {existing["name"] for existing in inspector.get_columns(table)}:
+            continue
+        if engine.dialect.name == "postgresql":
+            _create_index_concurrently(engine, f"ix_{table}_{column}", f"ON {table} ({column})")
+        else:
+            with engine.begin() as connection:
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "Snapshot unit price and cost onto invoice details", _snapshot_invoice_detail_prices),
+    (2, "Create the transactional outbox of invoice events", _create_outbox),
+    (3, "Track row changes for the change feed", _track_changes),
+    (4, "Create the product images table", _create_product_images),
+    (5, "Create the background jobs table", _create_jobs),
+    (6, "Index the searched text of products and persons", _index_search_documents),
+    (7, "Make person documents unique", _unique_person_documents),
+    (8, "Add the supplier SKU of products", _add_product_skus),
+    (9, "Create the snapshots of the live sales sketches", _create_sketch_snapshots),
+    (10, "Roll up revenue by day and month", _build_revenue_rollups),
+    (11, "Lease the outbox cursors", _lease_outbox_cursors),
+    (12, "Rebuild the indexes left invalid by interrupted builds", _rebuild_invalid_indexes),
+    (13, "Index the references of invoices and their lines", _index_invoice_references),
+]
+
+
+def current_version(engine: Engine) -> int:
+    """
+    Returns the highest migration version applied to a database.
+
+    Args:
+        engine (Engine): The engine of the database.
+
+    Returns:
+        int: The applied version, 0 when no migration was applied yet.
+    """
+    if not inspect(engine).has_table(schema_version.name):
+        return 0
+    with engine.connect() as connection:
+        return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def latest_version() -> int:
+    """
+    Returns the version of the newest migration, i.e. the version of an up to date database.
+    """
+    return MIGRATIONS[-1][0]
+
+
+@contextmanager
+def migration_lock(engine: Engine):
+    """
+    Holds the migration lock of a database: a session-level advisory lock on a dedicated PostgreSQL
+    connection, released on exit. Other databases are migrated by a single process and take no lock.
+
+    Args:
+        engine (Engine): The engine of the database.
+    """
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def apply_migrations(engine: Engine, prepare: Optional[Callable[[Engine], None]] = None):
+    """
+    Applies every migration newer than the database's current version, in version order, under the
+    migration lock. The version is read once the lock is held, so a migration another worker applied
+    meanwhile is not applied again. Tables must already exist, i.e. this runs after `Base.metadata.create_all`,
+    or `prepare` creates them.
+
+    Args:
+        engine (Engine): The engine of the database to migrate.
+        prepare (Callable[[Engine], None]): Called under the lock before the migrations when any is pending,
+                                            e.g. to create the tables.
+    """
+    with migration_lock(engine):
+        metadata.create_all(bind=engine)
+        version = current_version(engine)
+        if version >= latest_version():
+            return
+        if prepare is not None:
+            prepare(engine)
+        for migration_version, description, migrate in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            logger.info("Applying schema migration %s: %s", migration_version, description)
+            migrate(engine)
+            with engine.begin() as connection:
+                connection.execute(schema_version.insert().values(version=migration_version,
+                                                                  description=description))
@@ -0,0 +1,226 @@
+"""
+This module propagates row changes between workers through PostgreSQL `LISTEN`/`NOTIFY`.
+
+Repositories call `notify_change(db, entity, id)` inside the transaction of every update or delete of
+a cached entity, or `notify_changes(db, entity, ids)` for bulk changes, which packs many ids per notification. The notification is queued with `pg_notify`, so PostgreSQL only delivers it if the
+transaction commits, and the local cache entry is evicted at once. Changed ids are also forgotten by the
+existence index (`app.core.existence`), which confirms them again before it trusts them. Every worker runs a `ChangeListener`
+thread holding a dedicated connection (outside the pool) that listens on `CHANNEL` and evicts the
+entries named by incoming notifications. Notifications sent while a listener is disconnected are lost,
+so the listener flushes the whole cache and existence index when it loses its connection and again when
+it reconnects.
+
+On other databases (SQLite in tests) only the local eviction happens.
+
+Invoice lines announce their sale on `SALES_CHANNEL` the same way, and every listener counts it in the
+live top products of its worker (`app.core.live_sales`), so every worker sees every committed sale. Sales
+on invoice shards or on other databases are counted by the worker making them only, when they are made.
+
+Attributes:
+    CHANNEL (str): The notification channel.
+    SALES_CHANNEL (str): The channel of invoice line sales.
+    change_listener (ChangeListener): The listener of this worker, started once the database is ready.
+"""
+
+import json
+import os
+import select
+import threading
+from typing import Callable, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.cache import EntityCache, entity_cache
+from app.core.existence import existence_index
+from app.core.live_sales import live_sales
+from app.core.logger import logger
+from app.db.postgresql import engine
+
+CHANNEL = "entity_changes"
+
+SALES_CHANNEL = "invoice_sales"
+
+# Ids per bulk notification, keeping payloads well under the 8000 bytes NOTIFY accepts.
+IDS_PER_NOTIFICATION = 500
+
+
+def notify_change(db: Session, entity: str, id: int):
+    """
+    Announces a change of a row to every worker when the current transaction commits, and evicts it
+    from the local cache right away.
+
+    Args:
+        db (Session): The session whose transaction changes the row.
+        entity (str): Entity type, e.g. 'product'.
+        id (int): Primary key of the row.
+    """
+    entity_cache.evict(entity, id)
+    existence_index.forget(entity, id)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"),
+                   {"channel": CHANNEL, "payload": json.dumps({"entity": entity, "id": id})})
+
+
+def notify_changes(db: Session, entity: str, ids: List[int]):
+    """
+    Announces changes of many rows of an entity, like `notify_change` but with one notification per
+    IDS_PER_NOTIFICATION rows.
+
+    Args:
+        db (Session): The session whose transaction changes the rows.
+        entity (str): Entity type, e.g. 'product'.
+        ids (List[int]): Primary keys of the rows.
+    """
+    for id in ids:
+        entity_cache.evict(entity, id)
+        existence_index.forget(entity, id)
+    if db.get_bind().dialect.name == "postgresql":
+        for start in range(0, len(ids), IDS_PER_NOTIFICATION):
+            db.execute(text("SELECT pg_notify(:channel, :payload)"), {
+                "channel": CHANNEL,
+                "payload": json.dumps({"entity": entity, "ids": ids[start:start + IDS_PER_NOTIFICATION]})})
+
+
+def notify_sale(db: Session, product_id: int, quantity: float, revenue: float):
+    """
+    Announces the sale of an invoice line to every worker when the current transaction commits. On an
+    invoice shard or another database than the main PostgreSQL one, counts it in this worker right away.
+
+    Args:
+        db (Session): The session whose transaction creates the invoice line.
+        product_id (int): The product sold.
+        quantity (float): The quantity sold.
+        revenue (float): The invoiced amount.
+    """
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql" and bind.url == engine.url:
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {
+            "channel": SALES_CHANNEL,
+            "payload": json.dumps({"product_id": product_id, "quantity": quantity, "revenue": revenue})})
+    else:
+        live_sales.record(product_id, quantity, revenue)
+
+
+def _record_sale(payload: str):
+    sale = json.loads(payload)
+    live_sales.record(int(sale["product_id"]), float(sale["quantity"]), float(sale["revenue"]))
+
+
+class ChangeListener:
+    """
+    Background thread evicting cache entries named by change notifications.
+
+    Attributes:
+        engine (Engine): Engine of the database to listen to; its URL is used for a dedicated connection.
+        cache (EntityCache): The cache to evict from.
+        reconnect_delay (float): Seconds between two connection attempts.
+        connected (threading.Event): Set while the listener is listening.
+        handlers (Dict[str, Callable[[str], None]]): Handler of the payloads of every listened channel.
+
+    Methods:
+        subscribe(self, channel: str, handler: Callable[[str], None]): Listens to another channel.
+        start(self): Starts the listener thread.
+        stop(self): Stops the listener thread and closes its connection.
+    """
+
+    def __init__(self, engine: Engine, cache: EntityCache, reconnect_delay: float = 1.0):
+        self.engine = engine
+        self.cache = cache
+        self.reconnect_delay = reconnect_delay
+        self.connected = threading.Event()
+        self.handlers: Dict[str, Callable[[str], None]] = {CHANNEL: self._handle}
+        self._stopping = threading.Event()
+        self._thread = None
+        self._wakeup = None
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]):
+        """
+        Hands the payloads of another channel to a handler, from the next connection of the listener.
+        """
+        self.handlers[channel] = handler
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._wakeup = os.pipe()
+        self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        os.write(self._wakeup[1], b"x")
+        self._thread.join(timeout=5)
+        self._thread = None
+        for fd in self._wakeup:
+            os.close(fd)
+
+    def _connect(self):
+        # A connection of its own: LISTEN needs it for the whole life of the worker, not a pool slot.
+        cargs, cparams = self.engine.dialect.create_connect_args(self.engine.url)
+        connection = self.engine.dialect.connect(*cargs, **cparams)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            for channel in self.handlers:
+                cursor.execute(f"LISTEN {channel}")
+        return connection
+
+    def _handle(self, payload: str):
+        try:
+            change = json.loads(payload)
+            for id in change["ids"] if "ids" in change else [change["id"]]:
+                self.cache.evict(change["entity"], id)
+                existence_index.forget(change["entity"], id)
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed change notification %r", payload)
+
+    def _run(self):
+        reconnecting = False
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                if reconnecting:
+                    # Changes made while disconnected were not announced to this worker.
+                    self.cache.flush()
+                    existence_index.clear()
+                    logger.info("Change listener reconnected, flushed the entity cache")
+                self.connected.set()
+                while not self._stopping.is_set():
+                    readable, _, _ = select.select([connection, self._wakeup[0]], [], [], 30)
+                    if not readable:
+                        # Quiet channel: make sure the connection is still alive.
+                        with connection.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                    if connection not in readable:
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notification = connection.notifies.pop(0)
+                        try:
+                            self.handlers[notification.channel](notification.payload)
+                        except Exception:
+                            logger.warning("Ignoring malformed notification %r on %s", notification.payload,
+                                           notification.channel, exc_info=True)
+            except Exception:
+                if self.connected.is_set() or not reconnecting:
+                    logger.warning("Change listener lost its connection, flushing the entity cache", exc_info=True)
+                self.cache.flush()
+                existence_index.clear()
+                reconnecting = True
+            finally:
+                self.connected.clear()
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self._stopping.wait(self.reconnect_delay)
+
+
+change_listener = ChangeListener(engine, entity_cache)
+change_listener.subscribe(SALES_CHANNEL, _record_sale)
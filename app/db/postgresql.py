@@ -7,41 +7,83 @@ database sessions.
 Attributes:
     engine (Engine): SQLAlchemy engine instance created with the database URL from the application's
                      settings, configured to pre-ping the database to ensure connections are alive.
-    SessionLocal (scoped_session): A factory for producing new Session objects bound to the scope
-                                   of the web request, ensuring thread safety.
+    SessionLocal (sessionmaker): A factory for producing new Session objects. Sessions do not expire
+                                 their objects on commit, so committing releases the connection.
     Base (declarative_base): Base class for declarative class definitions. All entities in the
                              application should inherit from this class to gain ORM capabilities.
+    database_ready (threading.Event): Set once the startup initialization of the database has completed.
+    statement_observers (list): Callbacks invoked as `observer(conn, statement, parameters, elapsed)` after
+                                every SQL statement executed by any engine, `elapsed` being in seconds.
 
 Functions:
-    init_db(): Creates all tables in the database based on the models inherited from Base. This
-               should be called at application startup.
-    get_db(): Generator function that yields a new SQLAlchemy session for a request and ensures
-              it is closed when the request ends. This should be used as a dependency in FastAPI
+    init_db(): Creates all tables in the database based on the models inherited from Base and applies
+               pending schema migrations, unless the schema version is already current. This should
+               be called at application startup.
+    get_db(): Generator function that yields a lazily created SQLAlchemy session for a request and
+              ensures it is closed when the request ends. This should be used as a dependency in FastAPI
               endpoint functions to provide a session for database operations.
 """
 
-from sqlalchemy import create_engine
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.logger import record_db_time
+from app.db.migrations import apply_migrations, current_version, latest_version
+from app.db.session import LazySession, track_connection_time
 
 # Create an SQLAlchemy engine instance. `pool_pre_ping` enables pre-pinging the database to ensure connections are alive
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, pool_size=settings.DATABASE_POOL_SIZE,
+                       max_overflow=settings.DATABASE_MAX_OVERFLOW, pool_timeout=settings.DATABASE_POOL_TIMEOUT)
 
-# Create a scoped session factory bound to the scope of the web request for thread safety.
-SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+# Create the session factory. Requests get their own session through `get_db()`, never a thread-bound one.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+track_connection_time(SessionLocal)
 
 # Base class for declarative class definitions. Used to declare models.
 Base = declarative_base()
 
+# Set by the application once the database schema is checked and the pool is warm.
+database_ready = threading.Event()
+
+# Observers notified of every executed statement and its duration (profiling, slow-query log...).
+statement_observers = [record_db_time]
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _notify_statement_observers(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["statement_started_at"].pop()
+    for observer in statement_observers:
+        observer(conn, statement, parameters, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_statement_timer(exception_context):
+    timers = exception_context.connection.info.get("statement_started_at") if exception_context.connection else None
+    if timers:
+        timers.pop()
+
 
 def init_db():
     """
-    Initializes the database by creating all tables based on the models inherited from `Base`.
+    Initializes the database by creating all tables based on the models inherited from `Base` and
+    applying pending migrations to the tables that already existed.
     This function should be called at application startup to ensure the database schema is up to date.
+    When the database already records the latest schema version, it only costs that one lookup.
     """
-    Base.metadata.create_all(bind=engine)
+    if current_version(engine) >= latest_version():
+        return
+    apply_migrations(engine, prepare=lambda bind: Base.metadata.create_all(bind=bind))
 
 
 def get_db():
@@ -50,15 +92,18 @@ def get_db():
     closed when the request ends. This function is intended to be used as a dependency in FastAPI
     endpoint functions to provide a session for database operations.
 
+    The session is only built when the request first uses it and only checks out a pooled connection
+    when its first statement runs; its lifetime is recorded in the session metrics when it is closed.
+
     Yields:
-        Session: A new SQLAlchemy session for database operations.
+        LazySession: A new SQLAlchemy session for database operations, built on first use.
 
     Example:
         @app.get("/items/")
         async def read_items(db: Session = Depends(get_db)):
             ...
     """
-    db = SessionLocal()
+    db = LazySession(SessionLocal)
     try:
         yield db
     finally:
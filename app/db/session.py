@@ -0,0 +1,208 @@
+"""
+This module provides the request-scoped database session used by `get_db()`.
+
+A `LazySession` is created for every request, not for every thread: FastAPI runs the dependency and the
+endpoint on threadpool workers that are reused across requests, so a thread-keyed `scoped_session` can
+hand the same session to concurrent requests. The underlying SQLAlchemy session is only built when the
+request first uses it, and it only checks a connection out of the pool when the first statement runs.
+Sessions are built with `expire_on_commit=False`, so the connection goes back to the pool as soon as
+the transaction commits instead of being checked out again to reload the committed objects.
+
+How long every request held its session and its pooled connection is added to the request's access
+log record and aggregated in `session_metrics`.
+
+Attributes:
+    session_metrics (SessionMetrics): Process-wide session lifetime statistics.
+
+Classes:
+    LazySession: Proxy building a SQLAlchemy session on first use.
+    SavepointSession: Proxy running repositories that commit inside a larger transaction.
+    SessionMetrics: Aggregated session and connection hold times.
+
+Functions:
+    track_connection_time(factory): Makes sessions of a factory measure how long they hold a connection.
+"""
+
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.logger import request_state
+
+
+def _connection_checked_out(session: Session, transaction, connection):
+    session.info.setdefault("connection_checked_out_at", time.perf_counter())
+
+
+def _connection_released(session: Session, transaction):
+    if transaction.parent is not None:
+        return
+    checked_out_at = session.info.pop("connection_checked_out_at", None)
+    if checked_out_at is not None:
+        session.info["connection_ms"] = session.info.get("connection_ms", 0.0) + \
+            (time.perf_counter() - checked_out_at) * 1000
+
+
+def track_connection_time(factory: sessionmaker):
+    """
+    Makes the sessions of a factory accumulate in `session.info["connection_ms"]` the time during which
+    they held a pooled connection, from the first statement of each transaction to its commit or rollback.
+
+    Args:
+        factory (sessionmaker): The session factory.
+    """
+    event.listen(factory, "after_begin", _connection_checked_out)
+    event.listen(factory, "after_transaction_end", _connection_released)
+
+
+class SessionMetrics:
+    """
+    Thread-safe aggregate of the session lifetime and connection hold time of every request.
+
+    Attributes:
+        requests (int): Requests that were given a session.
+        sessions_opened (int): Requests that actually used their session.
+        total_session_ms (float): Sum of the lifetimes of the opened sessions.
+        max_session_ms (float): Longest lifetime of an opened session.
+        total_connection_ms (float): Sum of the times during which the sessions held a connection.
+        max_connection_ms (float): Longest time a session held a connection.
+
+    Methods:
+        record(self, opened: bool, session_ms: float, connection_ms: float): Adds the figures of a request.
+        snapshot(self) -> dict: Returns the current statistics.
+        reset(self): Sets every statistic back to zero.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.sessions_opened = 0
+            self.total_session_ms = 0.0
+            self.max_session_ms = 0.0
+            self.total_connection_ms = 0.0
+            self.max_connection_ms = 0.0
+
+    def record(self, opened: bool, session_ms: float, connection_ms: float):
+        with self._lock:
+            self.requests += 1
+            if not opened:
+                return
+            self.sessions_opened += 1
+            self.total_session_ms += session_ms
+            self.max_session_ms = max(self.max_session_ms, session_ms)
+            self.total_connection_ms += connection_ms
+            self.max_connection_ms = max(self.max_connection_ms, connection_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            opened = self.sessions_opened or 1
+            return {
+                "requests": self.requests,
+                "sessions_opened": self.sessions_opened,
+                "mean_session_ms": round(self.total_session_ms / opened, 3),
+                "max_session_ms": round(self.max_session_ms, 3),
+                "mean_connection_ms": round(self.total_connection_ms / opened, 3),
+                "max_connection_ms": round(self.max_connection_ms, 3),
+            }
+
+
+session_metrics = SessionMetrics()
+
+
+class LazySession:
+    """
+    Stand-in for a SQLAlchemy session that builds the real session on first attribute access, so
+    requests that never reach the database never create one.
+
+    Attributes:
+        factory (sessionmaker): Factory building the real session.
+        session (Optional[Session]): The real session, once built.
+        opened_at (Optional[float]): `time.perf_counter()` when the real session was built.
+
+    Methods:
+        close(self): Closes the real session, if any, and records the request's session metrics.
+    """
+
+    def __init__(self, factory: sessionmaker):
+        """
+        Initializes the proxy without building a session.
+
+        Args:
+            factory (sessionmaker): Factory building the real session on first use.
+        """
+        self.factory = factory
+        self.session = None
+        self.opened_at = None
+
+    def __getattr__(self, name):
+        # Only reached for attributes the proxy itself does not have, i.e. the Session API.
+        if self.session is None:
+            self.session = self.factory()
+            self.opened_at = time.perf_counter()
+        return getattr(self.session, name)
+
+    def close(self):
+        """
+        Closes the real session, returning its connection to the pool, and records how long the session
+        lived and held a connection in `session_metrics` and in the current request's access log record.
+        """
+        if self.session is None:
+            session_metrics.record(False, 0.0, 0.0)
+            return
+        self.session.close()
+        session_ms = (time.perf_counter() - self.opened_at) * 1000
+        connection_ms = self.session.info.get("connection_ms", 0.0)
+        session_metrics.record(True, session_ms, connection_ms)
+        state = request_state.get()
+        if state is not None:
+            state["session_ms"] = state.get("session_ms", 0.0) + session_ms
+            state["connection_ms"] = state.get("connection_ms", 0.0) + connection_ms
+
+
+class SavepointSession:
+    """
+    Stand-in for a SQLAlchemy session that lets repositories written to commit their own work run as steps
+    of a larger transaction. Each step runs in a savepoint: `commit()` only flushes, `rollback()` undoes the
+    current step and starts it afresh, and the caller decides when the whole transaction commits.
+
+    Attributes:
+        session (Session): The real session, owning the transaction.
+
+    Methods:
+        begin_step(self): Opens the savepoint of a step.
+        end_step(self, keep: bool): Releases the savepoint of the current step, or rolls back to it.
+        commit(self): Flushes the current step.
+        rollback(self): Rolls back the current step.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self._savepoint = None
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def begin_step(self):
+        self._savepoint = self.session.begin_nested()
+
+    def end_step(self, keep: bool):
+        savepoint, self._savepoint = self._savepoint, None
+        if not savepoint.is_active:
+            return
+        if keep:
+            savepoint.commit()
+        else:
+            savepoint.rollback()
+
+    def commit(self):
+        self.session.flush()
+
+    def rollback(self):
+        self._savepoint.rollback()
+        self._savepoint = self.session.begin_nested()
@@ -0,0 +1,337 @@
+"""
+This module implements horizontal sharding of invoices by customer. Invoice headers and their
+details live on one of N shard databases, chosen from the `person_id` of the invoice, while
+`Person` and `Product` rows are replicated reference data present on every shard so foreign
+keys keep holding locally.
+
+Attributes:
+    shard_router (ShardRouter): Router built from `settings.DATABASE_SHARD_URLS`. When no shard URLs
+                                are configured it is disabled and every table stays in the main database.
+
+Classes:
+    ShardRouter: Maps a `person_id` to a shard, hands out shard sessions, fans reads out to every
+                 shard in parallel and replicates reference data.
+
+Functions:
+    jump_hash(key, buckets): Jump consistent hash, used to map partition keys onto shards.
+    merge_ordered(results, key, reverse): Merges per-shard result lists that are already sorted.
+"""
+
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Sequence, TypeVar
+
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.migrations import apply_migrations, migration_lock
+from app.db.postgresql import Base
+from app.models.invoice_detail import InvoiceDetail
+from app.models.invoice_header import InvoiceHeader
+from app.models.person import Person
+from app.models.product import Product
+
+T = TypeVar("T")
+
+# Tables partitioned by customer. Every other table is reference data replicated on each shard.
+SHARDED_TABLES = ("invoice_headers", "invoice_details")
+
+# Sharded column referencing every replicated model.
+REFERENCES = {Person: InvoiceHeader.person_id, Product: InvoiceDetail.product_id}
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping & Veach). Maps a key onto one of `buckets` buckets so that growing
+    from N to N + 1 buckets only moves about 1 / (N + 1) of the keys.
+
+    Args:
+        key (int): The partition key, e.g. the person id.
+        buckets (int): The number of buckets (shards).
+
+    Returns:
+        int: The bucket index, in the range [0, buckets).
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def merge_ordered(results: Iterable[List[T]], key: Callable[[T], object], reverse: bool = False) -> List[T]:
+    """
+    Merges the result lists of several shards, each already sorted by `key`, into one sorted list.
+
+    Args:
+        results (Iterable[List[T]]): One sorted list per shard.
+        key (Callable): Sort key applied to every element.
+        reverse (bool): Whether the lists are sorted in descending order.
+
+    Returns:
+        List[T]: All elements in global order.
+    """
+    return list(heapq.merge(*results, key=key, reverse=reverse))
+
+
+class ShardRouter:
+    """
+    Routes invoice data to shard databases and runs cross-shard operations.
+
+    Attributes:
+        urls (List[str]): Connection URL of every shard, in shard index order.
+        engines (List[Engine]): One SQLAlchemy engine per shard.
+        session_factories (List[sessionmaker]): One session factory per shard.
+        max_workers (int): Maximum number of shards queried in parallel.
+
+    Methods:
+        enabled: Whether sharding is configured.
+        shard_for(self, person_id: int) -> int: Returns the shard holding the invoices of a person.
+        session_scope(self, shard: int): Context manager yielding a session on one shard.
+        fan_out(self, operation) -> List: Runs `operation(session)` on every shard in parallel.
+        init_shards(self): Creates and migrates the schema on every shard and interleaves invoice id sequences.
+        is_referenced(self, model, id: int) -> bool: Whether sharded rows reference a reference data row.
+        dispose(self): Closes the pooled connections of every shard.
+        replicate(self, instance): Upserts a reference data row on every shard.
+        replicate_rows(self, model, rows: List[dict]): Upserts many reference data rows on every shard.
+        remove_replica(self, model, id: int): Deletes a reference data row from every shard.
+        sync_reference_data(self, db: Session): Copies every Person and Product row onto every shard.
+    """
+
+    def __init__(self, urls: Sequence[str], max_workers: int = 8):
+        """
+        Initializes the router with one engine and session factory per shard URL.
+
+        Args:
+            urls (Sequence[str]): Connection URLs of the shards.
+            max_workers (int): Maximum number of shards queried in parallel.
+        """
+        self.urls = list(urls)
+        self.engines = [create_engine(url, pool_pre_ping=True) for url in self.urls]
+        self.session_factories = [sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                               bind=engine, info={"shard": index, "shards": len(self.urls)})
+                                  for index, engine in enumerate(self.engines)]
+        for engine, factory in zip(self.engines, self.session_factories):
+            if engine.dialect.name != "postgresql" and len(self.urls) > 1:
+                event.listen(factory, "before_flush", _interleave_ids)
+        self.max_workers = max(1, min(max_workers, len(self.urls) or 1))
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether invoices are sharded, i.e. at least one shard URL is configured.
+        """
+        return bool(self.urls)
+
+    def shard_for(self, person_id: int) -> int:
+        """
+        Returns the index of the shard that holds the invoices of a person.
+
+        Args:
+            person_id (int): The partition key of the invoice.
+
+        Returns:
+            int: The shard index.
+        """
+        return jump_hash(person_id, len(self.urls))
+
+    @contextmanager
+    def session_scope(self, shard: int):
+        """
+        Yields a new session bound to a shard and closes it afterwards.
+
+        Args:
+            shard (int): The shard index.
+
+        Yields:
+            Session: A session on the shard.
+        """
+        db = self.session_factories[shard]()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def fan_out(self, operation: Callable[[Session], T]) -> List[T]:
+        """
+        Runs an operation against every shard in parallel, each with its own session.
+
+        Args:
+            operation (Callable[[Session], T]): Function receiving a shard session.
+
+        Returns:
+            List[T]: The result of every shard, in shard index order.
+        """
+        def run(shard: int) -> T:
+            with self.session_scope(shard) as db:
+                return operation(db)
+
+        if len(self.urls) == 1:
+            return [run(0)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(run, range(len(self.urls))))
+
+    def init_shards(self):
+        """
+        Creates all tables on every shard and applies pending migrations. On PostgreSQL shards the id sequences of the sharded tables
+        are interleaved (shard i hands out i + 1, i + 1 + N, ...) so ids stay unique across shards. Other databases
+        have no sequences: their sessions assign the same interleaved ids when they flush new rows.
+        """
+        for engine in self.engines:
+            apply_migrations(engine, prepare=lambda bind: Base.metadata.create_all(bind=bind))
+        if len(self.urls) > 1:
+            self._interleave_sequences()
+
+    def _interleave_sequences(self):
+        # Sequences already handing out the ids of their shard are left alone. Otherwise, e.g. when shards
+        # holding rows are first interleaved or the number of shards changes, every sequence restarts at the
+        # first id of its shard above every id and sequence value of every shard, so no two streams overlap.
+        shards = len(self.urls)
+        postgres = [index for index, engine in enumerate(self.engines) if engine.dialect.name == "postgresql"]
+        if not postgres:
+            return
+        with migration_lock(self.engines[postgres[0]]):
+            for table in SHARDED_TABLES:
+                sequences = {}
+                for index in postgres:
+                    with self.engines[index].connect() as connection:
+                        sequences[index] = connection.execute(text(
+                            "SELECT last_value, increment_by FROM pg_sequences WHERE sequencename = :name"),
+                            {"name": f"{table}_id_seq"}).one()
+                if all(increment == shards and (last is None or last % shards == (index + 1) % shards)
+                       for index, (last, increment) in sequences.items()):
+                    continue
+                highest = [last or 0 for last, _ in sequences.values()]
+                for engine in self.engines:
+                    with engine.connect() as connection:
+                        highest.append(connection.exec_driver_sql(f"SELECT MAX(id) FROM {table}").scalar() or 0)
+                base = max(highest) + 1
+                for index in postgres:
+                    start = base + (index + 1 - base) % shards
+                    with self.engines[index].begin() as connection:
+                        connection.exec_driver_sql(f"ALTER SEQUENCE {table}_id_seq INCREMENT BY {shards} MINVALUE 1")
+                        connection.execute(text("SELECT setval(:name, :start, false)"),
+                                           {"name": f"{table}_id_seq", "start": start})
+
+    def is_referenced(self, model, id: int) -> bool:
+        """
+        Whether invoices or invoice lines of any shard reference a Person or Product, which then cannot be
+        removed from the shards. Checked before the row is deleted from the main database.
+
+        Args:
+            model: The ORM model class (Person or Product).
+            id (int): The primary key of the row.
+        """
+        column = REFERENCES[model]
+        return any(self.fan_out(lambda db: db.query(column).filter(column == id).first() is not None))
+
+    def dispose(self):
+        """
+        Closes the pooled connections of every shard engine.
+        """
+        for engine in self.engines:
+            engine.dispose()
+
+    def replicate(self, instance):
+        """
+        Upserts a copy of a reference data row (Person or Product) on every shard.
+
+        Args:
+            instance: The committed ORM instance to replicate.
+        """
+        mapper = instance.__mapper__
+        values = {column.key: getattr(instance, column.key) for column in mapper.column_attrs}
+
+        def upsert(db: Session):
+            db.merge(mapper.class_(**values))
+            db.commit()
+
+        self.fan_out(upsert)
+
+    def replicate_rows(self, model, rows: List[dict]):
+        """
+        Upserts copies of many reference data rows on every shard, in one transaction per shard.
+
+        Args:
+            model: The ORM model class (Person or Product).
+            rows (List[dict]): The committed rows, with a value for every column.
+        """
+        def upsert(db: Session):
+            for values in rows:
+                db.merge(model(**values))
+            db.commit()
+
+        if rows:
+            self.fan_out(upsert)
+
+    def remove_replica(self, model, id: int):
+        """
+        Deletes a reference data row from every shard. A shard where an invoice written since `is_referenced`
+        still references the row keeps its copy, with a warning, since the main database already deleted it.
+
+        Args:
+            model: The ORM model class (Person or Product).
+            id (int): The primary key of the row.
+        """
+        def delete(db: Session):
+            try:
+                db.query(model).filter(model.id == id).delete(synchronize_session=False)
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                logger.warning("Kept the replica of %s %s on shard %s: invoices reference it",
+                               model.__tablename__, id, db.info["shard"])
+
+        self.fan_out(delete)
+
+    def sync_reference_data(self, db: Session, batch_size: int = 1000):
+        """
+        Copies every Person and Product row of the main database onto every shard, so shards added
+        after the reference data was created satisfy their foreign keys.
+
+        Args:
+            db (Session): Session on the main database holding the authoritative reference data.
+            batch_size (int): Number of rows read and upserted per batch.
+        """
+        for model in (Person, Product):
+            columns = [column.key for column in model.__mapper__.column_attrs]
+            last_id = 0
+            while True:
+                rows = (db.query(model).filter(model.id > last_id).order_by(model.id)
+                        .limit(batch_size).all())
+                if not rows:
+                    break
+                values = [{key: getattr(row, key) for key in columns} for row in rows]
+                last_id = rows[-1].id
+
+                def upsert(shard_db: Session):
+                    for row in values:
+                        shard_db.merge(model(**row))
+                    shard_db.commit()
+
+                self.fan_out(upsert)
+
+
+def _interleave_ids(session: Session, flush_context, instances):
+    # Shard i of N hands out the ids i + 1, i + 1 + N, ... above the largest one it holds, like the
+    # interleaved sequences of PostgreSQL shards.
+    shard, shards = session.info["shard"], session.info["shards"]
+    last = {}
+    for instance in session.new:
+        table = instance.__table__
+        if table.name not in SHARDED_TABLES or instance.id is not None:
+            continue
+        if table.name not in last:
+            last[table.name] = session.connection().execute(select(func.max(table.c.id))).scalar() or 0
+        candidate = last[table.name] + 1
+        instance.id = last[table.name] = candidate + (shard + 1 - candidate) % shards
+
+
+# Router shared by the application, configured from the environment.
+shard_router = ShardRouter(settings.DATABASE_SHARD_URLS, max_workers=settings.SHARD_FANOUT_WORKERS)
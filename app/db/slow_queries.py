@@ -0,0 +1,231 @@
+"""
+This module implements the slow-query log. Every statement executed by any engine is timed through
+the statement observer hook of `app.db.postgresql`; statements slower than
+`settings.SLOW_QUERY_THRESHOLD_MS` are logged with their normalized text, the shape of their bind
+parameters, the repository method that issued them and their duration, and are aggregated per
+normalized statement template.
+
+When `settings.SLOW_QUERY_EXPLAIN` is enabled, slow SELECT statements on PostgreSQL are also run
+through `EXPLAIN (ANALYZE, BUFFERS)` by a background thread, at most once per template every
+`settings.SLOW_QUERY_EXPLAIN_INTERVAL` seconds, and the plan is kept with the template. ANALYZE executes
+the statement again, so SELECTs that lock rows or call functions with side effects (advisory locks,
+notifications, sequences) are only planned, with a plain `EXPLAIN`.
+
+Attributes:
+    slow_query_log (SlowQueryLog): The process-wide slow-query log.
+
+Functions:
+    normalize_statement(statement): Reduces a statement to its template.
+    parameter_shape(parameters): Describes bind parameters by type, without their values.
+"""
+
+import queue
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.postgresql import statement_observers
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\?|__\[POSTCOMPILE_\w+\]")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+# Locking clauses and calls of functions whose effects a re-execution would repeat, or keep on its connection.
+_SIDE_EFFECTS = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b"
+    r"|\b(?:pg_(?:try_)?advisory\w*|pg_notify|nextval|setval|txid_current|pg_current_xact_id|pg_sleep\w*"
+    r"|pg_cancel_backend|pg_terminate_backend|set_config|lo_\w+)\s*\(", re.IGNORECASE)
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Reduces a SQL statement to its template: literals and placeholders become `?`, lists of placeholders
+    collapse to `(...)` and whitespace is collapsed, so executions differing only by values group together.
+
+    Args:
+        statement (str): The SQL statement.
+
+    Returns:
+        str: The normalized statement.
+    """
+    template = _STRING_LITERAL.sub("?", statement)
+    template = _PLACEHOLDER.sub("?", template)
+    template = _NUMBER_LITERAL.sub("?", template)
+    template = _PLACEHOLDER_LIST.sub("(...)", template)
+    return _WHITESPACE.sub(" ", template).strip()
+
+
+def _type_names(values) -> object:
+    if isinstance(values, dict):
+        return {key: type(value).__name__ for key, value in values.items()}
+    return [type(value).__name__ for value in values]
+
+
+def parameter_shape(parameters) -> str:
+    """
+    Describes bind parameters by name and type, without their values (which may hold personal data).
+
+    Args:
+        parameters: The parameters passed to the DBAPI cursor: a dict, a sequence, or a list of those for executemany.
+
+    Returns:
+        str: The shape, e.g. "{'id_1': 'int'}" or "250 x {'name': 'str'}".
+    """
+    if not parameters:
+        return ""
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        return f"{len(parameters)} x {_type_names(parameters[0])}"
+    return str(_type_names(parameters))
+
+
+def _calling_repository_method() -> Optional[str]:
+    """
+    Returns `module.Class.method` of the innermost repository (or service) frame on the current stack.
+    """
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(("app.repositories.", "app.servicies.")):
+            owner = frame.f_locals.get("self")
+            name = f"{module}.{type(owner).__name__}.{frame.f_code.co_name}" if owner is not None \
+                else f"{module}.{frame.f_code.co_name}"
+            if module.startswith("app.repositories."):
+                return name
+            fallback = fallback or name
+        frame = frame.f_back
+    return fallback
+
+
+class SlowQueryLog:
+    """
+    Aggregates slow statements per normalized template and optionally captures their execution plans.
+
+    Attributes:
+        threshold_ms (float): Statements slower than this are considered slow.
+        explain (bool): Whether plans of slow SELECT statements are captured.
+        explain_interval (int): Minimum seconds between two plan captures of the same template.
+
+    Methods:
+        observe(self, conn, statement, parameters, elapsed): Statement observer recording slow statements.
+        worst(self, limit: int = 20, order_by: str = "total_ms") -> List[dict]: Returns the worst templates.
+        reset(self): Forgets every aggregated template.
+    """
+
+    def __init__(self, threshold_ms: float, explain: bool = False, explain_interval: int = 300):
+        """
+        Initializes an empty slow-query log.
+
+        Args:
+            threshold_ms (float): Slowness threshold in milliseconds.
+            explain (bool): Whether plans of slow SELECT statements are captured.
+            explain_interval (int): Minimum seconds between two plan captures of the same template.
+        """
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self._templates: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._explain_queue: "queue.Queue" = queue.Queue(maxsize=100)
+        self._explain_worker = None
+
+    def observe(self, conn, statement: str, parameters, elapsed: float):
+        """
+        Statement observer: records the statement when it exceeded the threshold.
+
+        Args:
+            conn (Connection): The connection that executed the statement.
+            statement (str): The SQL statement.
+            parameters: Its bind parameters.
+            elapsed (float): Its duration in seconds.
+        """
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < self.threshold_ms or statement.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        template = normalize_statement(statement)
+        shape = parameter_shape(parameters)
+        caller = _calling_repository_method()
+        logger.warning("Slow query (%.1f ms) from %s: %s params=%s", elapsed_ms, caller, template, shape)
+
+        now = time.time()
+        with self._lock:
+            entry = self._templates.setdefault(template, {
+                "template": template, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "callers": set(),
+                "parameter_shape": shape, "last_seen": now, "plan": None, "plan_captured_at": 0.0,
+            })
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["parameter_shape"] = shape
+            entry["last_seen"] = now
+            if caller:
+                entry["callers"].add(caller)
+            wants_plan = (self.explain and conn.engine.dialect.name == "postgresql"
+                          and statement.lstrip()[:6].upper() == "SELECT"
+                          and now - entry["plan_captured_at"] >= self.explain_interval)
+            if wants_plan:
+                entry["plan_captured_at"] = now
+                if self._explain_worker is None:
+                    self._explain_worker = threading.Thread(target=self._run_explains, name="slow-query-explain",
+                                                            daemon=True)
+                    self._explain_worker.start()
+
+        if wants_plan:
+            self._schedule_explain(conn.engine, template, statement, parameters)
+
+    def _schedule_explain(self, engine, template: str, statement: str, parameters):
+        try:
+            self._explain_queue.put_nowait((engine, template, statement, parameters))
+        except queue.Full:
+            pass
+
+    def _run_explains(self):
+        while True:
+            engine, template, statement, parameters = self._explain_queue.get()
+            options = "FORMAT JSON" if _SIDE_EFFECTS.search(statement) else "ANALYZE, BUFFERS, FORMAT JSON"
+            try:
+                with engine.connect() as connection:
+                    transaction = connection.begin()
+                    try:
+                        plan = connection.exec_driver_sql(f"EXPLAIN ({options}) " + statement, parameters).scalar()
+                    finally:
+                        transaction.rollback()
+                with self._lock:
+                    if template in self._templates:
+                        self._templates[template]["plan"] = plan
+            except Exception:
+                logger.exception("Could not capture the plan of a slow query")
+
+    def worst(self, limit: int = 20, order_by: str = "total_ms") -> List[dict]:
+        """
+        Returns the slowest statement templates.
+
+        Args:
+            limit (int): Maximum number of templates returned.
+            order_by (str): Ranking criterion: 'total_ms', 'max_ms', 'count' or 'mean_ms'.
+
+        Returns:
+            List[dict]: The templates with count, total, mean and max duration, callers and captured plan.
+        """
+        with self._lock:
+            entries = [{**entry, "callers": sorted(entry["callers"]),
+                        "mean_ms": entry["total_ms"] / entry["count"]} for entry in self._templates.values()]
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        """
+        Forgets every aggregated template.
+        """
+        with self._lock:
+            self._templates.clear()
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_THRESHOLD_MS, settings.SLOW_QUERY_EXPLAIN,
+                              settings.SLOW_QUERY_EXPLAIN_INTERVAL)
+statement_observers.append(slow_query_log.observe)
@@ -2,12 +2,33 @@
 This file is the main entry point for the FastAPI application.
 It configures the application, including routes, startup and shutdown events, and logging settings.
 """
+import os
+import signal
+import threading
+import time
+
+started = time.perf_counter()
+
 from fastapi import FastAPI
+from sqlalchemy.orm import configure_mappers
 
-from app.api.endpoints import person, product, invoice_header, invoice_detail
+from app.api.endpoints import (person, product, invoice_header, invoice_detail, reports, export, debug, health, changes,
+                               jobs, batch)
+from app.core.admission import AdmissionControlMiddleware, configure_threadpool
+from app.core.coalescing import CoalescingMiddleware
 from app.core.config import settings
-from app.core.logger import setup_logging
-from app.db.postgresql import init_db
+from app.core.images import image_store
+from app.core.logger import RequestLoggingMiddleware, logger, setup_logging
+from app.core.profiling import ProfilingMiddleware, instrument_routes
+from app.db.postgresql import SessionLocal, database_ready, engine, init_db
+from app.db.notifications import change_listener
+from app.db.sharding import shard_router
+from app.repositories.existence import load_existing
+from app.servicies.jobs import job_runner
+from app.servicies.live_sales import live_sales_snapshotter
+from app.servicies.outbox import outbox_publisher
+
+imported = time.perf_counter()
 
 app = FastAPI(title=settings.PROJECT_NAME)  # Create a FastAPI instance for the application.
 
@@ -16,10 +37,134 @@ app.include_router(person.router, prefix="/person", tags=["person"])
 app.include_router(product.router, prefix="/product", tags=["product"])
 app.include_router(invoice_header.router, prefix="/invoice", tags=["invoice"])
 app.include_router(invoice_detail.router, prefix="/invoice_detail", tags=["invoice_detail"])
+app.include_router(reports.router, prefix="/reports", tags=["reports"])
+app.include_router(export.router, prefix="/export", tags=["export"])
+app.include_router(changes.router, prefix="/changes", tags=["changes"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+app.include_router(batch.router, prefix="/batch", tags=["batch"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"])
+app.include_router(health.router, prefix="/health", tags=["health"])
+
+# Profile requests carrying the debug header or picked by sampling
+app.add_middleware(ProfilingMiddleware)
+instrument_routes(app)
+
+# Fast 503 for database-bound requests beyond what the connection pool can serve
+app.add_middleware(AdmissionControlMiddleware)
+
+# Identical concurrent GETs to opted-in routes share one query and response, without holding a DB slot
+app.add_middleware(CoalescingMiddleware, routes=app.routes)
+
+# Request id, access log with latency and DB time
+app.add_middleware(RequestLoggingMiddleware)
 
 setup_logging()  # Setup of logging module
 
+# Startup time breakdown, completed with the DB initialization of every worker
+startup_timings = {"imports_ms": round((imported - started) * 1000, 3),
+                   "app_construction_ms": round((time.perf_counter() - imported) * 1000, 3)}
+
+
+# Startup thread initializing the database, and how the shutdown stops it: services are only started
+# under the lock, and not once the stop event is set, so none is started after the shutdown stopped them.
+database_init_thread = None
+database_init_stopping = threading.Event()
+database_init_lock = threading.Lock()
+
+
+def _start_services(*services) -> bool:
+    with database_init_lock:
+        if database_init_stopping.is_set():
+            return False
+        for service in services:
+            service.start()
+        return True
+
+
+def _initialize_database_once() -> bool:
+    init_db()
+    if shard_router.enabled:
+        shard_router.init_shards()
+        db = SessionLocal()
+        try:
+            shard_router.sync_reference_data(db)
+        finally:
+            db.close()
+    configure_mappers()
+    engine.connect().close()
+    if engine.dialect.name == "postgresql" and not _start_services(change_listener):
+        return False
+    if settings.EXISTENCE_INDEX_PRELOAD:
+        # After the listener starts, so rows deleted while loading are forgotten again.
+        db = SessionLocal()
+        try:
+            logger.info("Loaded the existence index", extra=load_existing(db))
+        finally:
+            db.close()
+    return _start_services(live_sales_snapshotter, outbox_publisher, job_runner)
+
+
+def initialize_database():
+    """
+    Checks the database schema (skipped when its version is current), prepares the shards, opens a
+    first pooled connection, starts the cache invalidation listener, loads the existence index and starts the
+    live sales snapshots, the outbox publisher and the job runner, then marks the database ready. Runs in the
+    background so the server answers health checks while it does.
+
+    A failed attempt is retried with exponential backoff. After `settings.DATABASE_INIT_MAX_ATTEMPTS` failures
+    the worker sends itself SIGTERM, so the process manager restarts it instead of keeping it unready.
+    """
+    db_init_started = time.perf_counter()
+    delay = settings.DATABASE_INIT_RETRY_DELAY
+    attempt = 1
+    while True:
+        try:
+            if not _initialize_database_once():
+                return
+            break
+        except Exception:
+            logger.exception("Database initialization failed (attempt %s)", attempt)
+        if settings.DATABASE_INIT_MAX_ATTEMPTS and attempt >= settings.DATABASE_INIT_MAX_ATTEMPTS:
+            logger.critical("Giving up the database initialization, stopping the worker")
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+        if database_init_stopping.wait(delay):
+            return
+        delay = min(delay * 2, 30)
+        attempt += 1
+    with database_init_lock:
+        if database_init_stopping.is_set():
+            return
+        database_ready.set()
+    logger.info("Startup time breakdown", extra={
+        **startup_timings, "db_init_ms": round((time.perf_counter() - db_init_started) * 1000, 3)})
+
+
+@app.on_event("startup")
+async def startup_threadpool():
+    configure_threadpool()
+
 
 @app.on_event("startup")
 def startup_db_client():
-    init_db()
+    global database_init_thread
+    database_init_stopping.clear()
+    database_init_thread = threading.Thread(target=initialize_database, name="db-init", daemon=True)
+    database_init_thread.start()
+
+
+@app.on_event("shutdown")
+def shutdown_db_client():
+    # In-flight requests are done by now: close every pooled connection instead of letting them drop.
+    database_init_stopping.set()
+    if database_init_thread is not None:
+        database_init_thread.join(timeout=5)
+    database_ready.clear()
+    with database_init_lock:
+        change_listener.stop()
+        live_sales_snapshotter.stop()
+        outbox_publisher.stop()
+        job_runner.stop()
+    image_store.shutdown()
+    engine.dispose()
+    shard_router.dispose()
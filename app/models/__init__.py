@@ -1,4 +1,10 @@
 from .person import Person
 from .product import Product
 from .invoice_header import InvoiceHeader
-from .invoice_detail import InvoiceDetail
\ No newline at end of file
+from .invoice_detail import InvoiceDetail
+from .outbox import OutboxEvent, OutboxCursor
+from .change import ChangeTombstone
+from .product_image import ProductImage
+from .job import Job
+from .sketch_snapshot import SketchSnapshot
+from .revenue_rollup import RevenueRollup
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+from app.db.postgresql import Base
+
+
+class change_sequence(FunctionElement):
+    """
+    Change sequence number of a row written by the current statement.
+
+    On PostgreSQL it is the id of the writing transaction: every transaction still running, or started
+    later, has a higher id than the snapshot xmin, so the change feed can stop at that horizon without
+    ever skipping a change that commits later. Elsewhere (SQLite in tests, a single writer) it is the
+    current time in microseconds.
+    """
+    type = BigInteger()
+    name = "change_sequence"
+    inherit_cache = True
+
+
+@compiles(change_sequence)
+def _compile_change_sequence(element, compiler, **kw):
+    return "CAST((julianday('now') - 2440587.5) * 86400000000 AS INTEGER)"
+
+
+@compiles(change_sequence, "postgresql")
+def _compile_change_sequence_postgresql(element, compiler, **kw):
+    return "txid_current()"
+
+
+class ChangeTracked:
+    """
+    Mixin of the models exposed by the change feed: stamps every insert and update with a change
+    sequence number and time, and records a tombstone when a row is deleted through the session.
+    """
+    __change_entity__: str = None
+    __mapper_args__ = {"eager_defaults": True}
+
+    change_seq = Column(BigInteger, default=change_sequence(), onupdate=change_sequence(), index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ChangeTombstone(Base):
+    __tablename__ = 'change_tombstones'
+    id = Column(Integer, primary_key=True)
+    change_seq = Column(BigInteger, default=change_sequence(), nullable=False, index=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+@event.listens_for(Session, "before_flush")
+def _record_tombstones(session, flush_context, instances):
+    for instance in session.deleted:
+        if isinstance(instance, ChangeTracked):
+            session.add(ChangeTombstone(entity=instance.__change_entity__, entity_id=instance.id))
@@ -2,14 +2,19 @@ from sqlalchemy import Column, Integer, ForeignKey, Float
 from sqlalchemy.orm import relationship
 
 from app.db.postgresql import Base
+from app.models.change import ChangeTracked
 
 
-class InvoiceDetail(Base):
+class InvoiceDetail(ChangeTracked, Base):
     __tablename__ = 'invoice_details'
+    __change_entity__ = 'invoice_detail'
     id = Column(Integer, primary_key=True, index=True)
-    invoice_header_id = Column(Integer, ForeignKey('invoice_headers.id'))
-    product_id = Column(Integer, ForeignKey('products.id'))
+    invoice_header_id = Column(Integer, ForeignKey('invoice_headers.id'), index=True)
+    product_id = Column(Integer, ForeignKey('products.id'), index=True)
     quantity = Column(Float)
+    # Product price and cost captured when the line is written, immune to later catalog changes.
+    unit_price = Column(Float)
+    unit_cost = Column(Float)
 
     # Relationships
     invoice_header = relationship("InvoiceHeader", back_populates="details")
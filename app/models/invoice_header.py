@@ -2,14 +2,16 @@ from sqlalchemy import Column, Integer, Date, ForeignKey
 from sqlalchemy.orm import relationship
 
 from app.db.postgresql import Base
+from app.models.change import ChangeTracked
 
 
-class InvoiceHeader(Base):
+class InvoiceHeader(ChangeTracked, Base):
     __tablename__ = 'invoice_headers'
+    __change_entity__ = 'invoice_header'
     id = Column(Integer, primary_key=True, index=True)
     number = Column(Integer, unique=True)
     date = Column(Date)
-    person_id = Column(Integer, ForeignKey('person.id'))
+    person_id = Column(Integer, ForeignKey('person.id'), index=True)
 
     # Relationships
     person = relationship("Person", back_populates="invoices")
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer, String, Text
+
+from app.db.postgresql import Base
+
+
+class Job(Base):
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    params = Column(Text, nullable=False, default="{}")
+    # queued -> running -> succeeded | failed | cancelled; a running job whose runner died is queued again.
+    status = Column(String, nullable=False, default="queued")
+    progress = Column(Float, nullable=False, default=0.0)
+    message = Column(String)
+    result = Column(Text)
+    artifact = Column(String)
+    error = Column(Text)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (Index('ix_jobs_status_id', 'status', 'id'),)
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, FetchedValue, Index, Integer, String, Text
+
+from app.db.postgresql import Base
+
+
+class OutboxEvent(Base):
+    __tablename__ = 'outbox_events'
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # Id of the writing transaction, set by the database default on PostgreSQL; orders events commit-safely.
+    transaction_id = Column(BigInteger, server_default=FetchedValue())
+    event_type = Column(String, nullable=False)
+    aggregate_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (Index('ix_outbox_events_transaction_id_id', 'transaction_id', 'id'),)
+
+
+class OutboxCursor(Base):
+    __tablename__ = 'outbox_cursors'
+    sink = Column(String, primary_key=True)
+    transaction_id = Column(BigInteger, nullable=False, default=0)
+    event_id = Column(BigInteger, nullable=False, default=0)
+    # Publisher delivering the batch after the cursor, and when its claim lapses.
+    claimed_by = Column(String)
+    claimed_until = Column(DateTime)
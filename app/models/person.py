@@ -1,11 +1,13 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.db.postgresql import Base
+from app.models.change import ChangeTracked
 
 
-class Person(Base):
+class Person(ChangeTracked, Base):
     __tablename__ = 'person'
+    __change_entity__ = 'person'
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
@@ -15,3 +17,6 @@ class Person(Base):
 
     # Relationships
     invoices = relationship("InvoiceHeader", back_populates="person")
+
+    # A person is identified by their document: at most one row per document.
+    __table_args__ = (Index('ux_person_document', 'document_type', 'document', unique=True),)
@@ -1,16 +1,22 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Float, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.db.postgresql import Base
+from app.models.change import ChangeTracked
 
 
-class Product(Base):
+class Product(ChangeTracked, Base):
     __tablename__ = 'products'
+    __change_entity__ = 'product'
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String)
     price = Column(Float)
     cost = Column(Float)
     unit_of_measure = Column(String)
+    sku = Column(String)  # Key of the product in supplier price lists.
 
     # Relationships
     invoice_details = relationship("InvoiceDetail", back_populates="product")
+    images = relationship("ProductImage", back_populates="product", passive_deletes=True)
+
+    __table_args__ = (Index('ux_products_sku', 'sku', unique=True),)
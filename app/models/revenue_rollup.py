@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Date, Float, Index, Integer, String
+
+from app.db.postgresql import Base
+
+
+class RevenueRollup(Base):
+    __tablename__ = 'revenue_rollups'
+    # 'product' or 'person', and the id of that product or person.
+    dimension = Column(String, primary_key=True)
+    # 'day' or 'month'; `period` is the first day of the period.
+    grain = Column(String, primary_key=True)
+    key_id = Column(Integer, primary_key=True)
+    period = Column(Date, primary_key=True)
+    lines = Column(Integer, nullable=False, default=0)
+    quantity = Column(Float, nullable=False, default=0.0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    cost = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (Index('ix_revenue_rollups_period', 'dimension', 'grain', 'period'),)
@@ -0,0 +1,12 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String, Text
+
+from app.db.postgresql import Base
+
+
+class SketchSnapshot(Base):
+    __tablename__ = 'sketch_snapshots'
+    name = Column(String, primary_key=True)
+    state = Column(Text, nullable=False)
+    saved_at = Column(DateTime, default=datetime.utcnow, nullable=False)
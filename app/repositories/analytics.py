@@ -0,0 +1,203 @@
+from datetime import date
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.invoice_detail import InvoiceDetail
+from app.models.invoice_header import InvoiceHeader
+
+# Epoch of PostgreSQL's binary date representation (days since 2000-01-01).
+PG_DATE_EPOCH = np.datetime64("2000-01-01", "D")
+
+# Layout of one row of the binary COPY below: a field count, then a length prefix before every field.
+# Every column is coalesced to a non-null fixed-width value, so all rows have the same size and any run of
+# whole rows can be viewed as a NumPy structured array without parsing row by row.
+COPY_ROW_DTYPE = np.dtype([
+    ("fields", ">i2"),
+    ("product_id_len", ">i4"), ("product_id", ">i4"),
+    ("quantity_len", ">i4"), ("quantity", ">f8"),
+    ("date_len", ">i4"), ("date", ">i4"),
+    ("person_id_len", ">i4"), ("person_id", ">i4"),
+    ("unit_price_len", ">i4"), ("unit_price", ">f8"),
+    ("unit_cost_len", ">i4"), ("unit_cost", ">f8"),
+])
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+# Type of every column returned for the invoice lines.
+DETAIL_COLUMN_DTYPES = {"product_id": np.int64, "quantity": np.float64, "date": "datetime64[D]",
+                        "person_id": np.int64, "unit_price": np.float64, "unit_cost": np.float64}
+
+DETAIL_COLUMNS_QUERY = """
+    COPY (
+        SELECT COALESCE(d.product_id, 0)::int4, COALESCE(d.quantity, 0)::float8,
+               COALESCE(h.date, DATE '2000-01-01'), COALESCE(h.person_id, 0)::int4,
+               COALESCE(d.unit_price, 0)::float8, COALESCE(d.unit_cost, 0)::float8
+        FROM invoice_details d
+        JOIN invoice_headers h ON h.id = d.invoice_header_id
+        WHERE (%(start_date)s::date IS NULL OR h.date >= %(start_date)s::date)
+          AND (%(end_date)s::date IS NULL OR h.date <= %(end_date)s::date)
+    ) TO STDOUT WITH (FORMAT binary)
+"""
+
+
+# Rows parsed at once by DetailCopyParser: large enough for NumPy to amortize its per-call cost, small
+# enough that the raw bytes waiting to be parsed stay in the hundreds of kilobytes.
+COPY_CHUNK_ROWS = 8192
+
+
+class DetailCopyParser:
+    """
+    File-like sink of the binary COPY of invoice detail columns, given to `copy_expert`, that parses the
+    stream as it arrives: whole rows are converted into NumPy column chunks every COPY_CHUNK_ROWS rows, so
+    only the columns and less than a chunk of raw bytes are ever held, never the whole stream.
+
+    Methods:
+        write(self, data: bytes) -> int: Takes the next bytes of the stream.
+        columns(self) -> Dict[str, np.ndarray]: Returns the columns of every row written.
+    """
+
+    def __init__(self):
+        self._pending = bytearray()
+        self._header_read = False
+        self._chunks = {name: [] for name in DETAIL_COLUMN_DTYPES}
+
+    def write(self, data: bytes) -> int:
+        """
+        Takes the next bytes of the stream, parsing them once a chunk of rows is complete.
+
+        Raises:
+            ValueError: If the stream is not a binary COPY stream.
+        """
+        self._pending += data
+        if not self._header_read:
+            if len(self._pending) < 19:
+                return len(data)
+            if bytes(self._pending[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+                raise ValueError("Not a PostgreSQL binary COPY stream")
+            start = 19 + int.from_bytes(bytes(self._pending[15:19]), "big")
+            if len(self._pending) < start:
+                return len(data)
+            del self._pending[:start]
+            self._header_read = True
+        if len(self._pending) >= COPY_CHUNK_ROWS * COPY_ROW_DTYPE.itemsize:
+            self._parse_rows()
+        return len(data)
+
+    def _parse_rows(self):
+        count = len(self._pending) // COPY_ROW_DTYPE.itemsize
+        if count == 0:
+            return
+        rows = np.frombuffer(self._pending, dtype=COPY_ROW_DTYPE, count=count)
+        self._chunks["product_id"].append(rows["product_id"].astype(np.int64))
+        self._chunks["quantity"].append(rows["quantity"].astype(np.float64))
+        self._chunks["date"].append(PG_DATE_EPOCH + rows["date"].astype("timedelta64[D]"))
+        self._chunks["person_id"].append(rows["person_id"].astype(np.int64))
+        self._chunks["unit_price"].append(rows["unit_price"].astype(np.float64))
+        self._chunks["unit_cost"].append(rows["unit_cost"].astype(np.float64))
+        # The view must be released before the bytes it maps are dropped.
+        del rows
+        del self._pending[:count * COPY_ROW_DTYPE.itemsize]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        Parses the rows still pending and returns the columns of every row written.
+
+        Returns:
+            Dict[str, np.ndarray]: The product_id, quantity, date, person_id, unit_price and unit_cost columns.
+
+        Raises:
+            ValueError: If the stream is not a binary COPY stream or ends within a row.
+        """
+        if not self._header_read:
+            raise ValueError("Not a PostgreSQL binary COPY stream")
+        self._parse_rows()
+        if bytes(self._pending) not in (b"", b"\xff\xff"):
+            raise ValueError("Truncated PostgreSQL binary COPY stream")
+        return {name: np.concatenate(chunks) if chunks else np.array([], dtype=DETAIL_COLUMN_DTYPES[name])
+                for name, chunks in self._chunks.items()}
+
+
+def parse_detail_copy(buffer: bytes) -> Dict[str, np.ndarray]:
+    """
+    Converts the output of the binary COPY of invoice detail columns into NumPy column arrays.
+
+    Args:
+        buffer (bytes): The raw COPY stream (any bytes-like object), including its header and trailer.
+
+    Returns:
+        Dict[str, np.ndarray]: The product_id, quantity, date, person_id, unit_price and unit_cost columns.
+
+    Raises:
+        ValueError: If the buffer is not a binary COPY stream.
+    """
+    parser = DetailCopyParser()
+    parser.write(buffer)
+    return parser.columns()
+
+
+class AnalyticsRepository:
+    """
+    Repository class reading invoice detail lines in bulk, as NumPy columns, for vectorized analytics.
+
+    On PostgreSQL the lines are streamed with a binary COPY and parsed chunk by chunk into NumPy arrays
+    as they arrive; other databases fall back to a regular query.
+
+    Attributes:
+        db (Session): Database session through which the lines are read.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        get_detail_columns(self, start_date: date = None, end_date: date = None) -> Dict[str, np.ndarray]:
+            Reads the product, quantity, date, person, price and cost of every line in the date range.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the repository with a database session.
+
+        Args:
+            db (Session): The database session used to read the invoice lines.
+        """
+        self.db = db
+
+    def get_detail_columns(self, start_date: Optional[date] = None,
+                           end_date: Optional[date] = None) -> Dict[str, np.ndarray]:
+        """
+        Reads every invoice line whose invoice date is within the range, as NumPy columns.
+
+        Args:
+            start_date (date): First invoice date included, or None for no lower bound.
+            end_date (date): Last invoice date included, or None for no upper bound.
+
+        Returns:
+            Dict[str, np.ndarray]: The product_id, quantity, date, person_id, unit_price and unit_cost columns.
+        """
+        if self.db.get_bind().dialect.name == "postgresql":
+            return self._copy_detail_columns(start_date, end_date)
+
+        query = (self.db.query(InvoiceDetail.product_id, InvoiceDetail.quantity, InvoiceHeader.date,
+                               InvoiceHeader.person_id, InvoiceDetail.unit_price, InvoiceDetail.unit_cost)
+                 .join(InvoiceHeader, InvoiceHeader.id == InvoiceDetail.invoice_header_id))
+        if start_date is not None:
+            query = query.filter(InvoiceHeader.date >= start_date)
+        if end_date is not None:
+            query = query.filter(InvoiceHeader.date <= end_date)
+        rows = query.all()
+        return {
+            "product_id": np.array([row[0] or 0 for row in rows], dtype=np.int64),
+            "quantity": np.array([row[1] or 0 for row in rows], dtype=np.float64),
+            "date": np.array([row[2] for row in rows], dtype="datetime64[D]"),
+            "person_id": np.array([row[3] or 0 for row in rows], dtype=np.int64),
+            "unit_price": np.array([row[4] or 0 for row in rows], dtype=np.float64),
+            "unit_cost": np.array([row[5] or 0 for row in rows], dtype=np.float64),
+        }
+
+    def _copy_detail_columns(self, start_date: Optional[date], end_date: Optional[date]) -> Dict[str, np.ndarray]:
+        raw_connection = self.db.connection().connection
+        parser = DetailCopyParser()
+        with raw_connection.cursor() as cursor:
+            statement = cursor.mogrify(DETAIL_COLUMNS_QUERY, {"start_date": start_date, "end_date": end_date})
+            cursor.copy_expert(statement.decode(), parser)
+        return parser.columns()
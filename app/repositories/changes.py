@@ -0,0 +1,89 @@
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from app.db.sharding import merge_ordered
+from app.models.change import ChangeTombstone
+
+# Position of a change in the feed: (change sequence, rank of its source table, row id).
+ChangeKey = Tuple[int, int, int]
+
+
+class ChangeFeedRepository:
+    """
+    Repository reading the rows changed and deleted after a feed position.
+
+    Every change has a key (change sequence, table rank, row id) that totally orders the feed of a database:
+    rank is the position of the model in the requested list, tombstones coming last. Rows are read from
+    the `change_seq` index of every table and merged, so a page costs O(page size) whatever the table sizes.
+
+    Attributes:
+        db (Session): The database session.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        horizon(self) -> Optional[int]: Returns the sequence below which no change can still commit.
+        get_changes(self, models, after, limit, horizon): Returns the next changes after a feed position.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the ChangeFeedRepository with a database session.
+
+        Args:
+            db (Session): The database session.
+        """
+        self.db = db
+
+    def horizon(self) -> Optional[int]:
+        """
+        Returns the change sequence below which every change is committed, or None where the sequence is a
+        clock. On PostgreSQL it is the xmin of the current snapshot: every running or future transaction has
+        a higher id.
+        """
+        if self.db.get_bind().dialect.name != "postgresql":
+            return None
+        return self.db.query(func.txid_snapshot_xmin(func.txid_current_snapshot())).scalar()
+
+    @staticmethod
+    def _after(seq_column, id_column, rank: int, after: ChangeKey):
+        seq, after_rank, id = after
+        if rank > after_rank:
+            return seq_column >= seq
+        if rank < after_rank:
+            return seq_column > seq
+        return tuple_(seq_column, id_column) > tuple_(seq, id)
+
+    def get_changes(self, models: Sequence, after: ChangeKey, limit: int,
+                    horizon: Optional[int] = None) -> List[Tuple[ChangeKey, object]]:
+        """
+        Returns the rows changed and the tombstones recorded after a feed position, in feed order.
+
+        Args:
+            models (Sequence): The change-tracked models to read, in rank order.
+            after (ChangeKey): Key of the last change already read.
+            limit (int): Maximum number of changes.
+            horizon (Optional[int]): Exclusive upper bound of the change sequence, if any.
+
+        Returns:
+            List[Tuple[ChangeKey, object]]: Key and row (model instance or ChangeTombstone) of every change.
+        """
+        streams = []
+        for rank, model in enumerate(models):
+            query = self.db.query(model).filter(self._after(model.change_seq, model.id, rank, after))
+            if horizon is not None:
+                query = query.filter(model.change_seq < horizon)
+            rows = query.order_by(model.change_seq, model.id).limit(limit).all()
+            streams.append([((row.change_seq, rank, row.id), row) for row in rows])
+
+        rank = len(models)
+        query = self.db.query(ChangeTombstone).filter(
+            ChangeTombstone.entity.in_([model.__change_entity__ for model in models]),
+            self._after(ChangeTombstone.change_seq, ChangeTombstone.id, rank, after))
+        if horizon is not None:
+            query = query.filter(ChangeTombstone.change_seq < horizon)
+        rows = query.order_by(ChangeTombstone.change_seq, ChangeTombstone.id).limit(limit).all()
+        streams.append([((row.change_seq, rank, row.id), row) for row in rows])
+
+        return merge_ordered(streams, key=lambda change: change[0])[:limit]
@@ -0,0 +1,119 @@
+from typing import Iterable, Set
+
+from fastapi import HTTPException
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.core.existence import ExistenceIndex, existence_index
+from app.models.person import Person
+from app.models.product import Product
+
+MODELS = {"product": Product, "person": Person}
+
+# Ids confirmed by the database per query, keeping the statement well under the parameter limits.
+IDS_PER_QUERY = 1000
+
+
+def find_missing(db: Session, entity: str, ids: Iterable[int], index: ExistenceIndex = None) -> Set[int]:
+    """
+    Returns which of some product or person ids do not exist: those the existence index does not know and
+    that one query in the session's transaction does not find either.
+
+    Ids confirmed by the query enter the index at once when the transaction has written nothing yet, so
+    they were committed rows; otherwise when it commits, since they may be rows it created. Only PostgreSQL
+    tells whether a transaction has written, whether through the ORM or a Core statement: on other databases
+    confirmed ids always wait for the commit.
+
+    Args:
+        db (Session): The session whose transaction will reference the rows.
+        entity (str): 'product' or 'person'.
+        ids (Iterable[int]): The ids; None values are ignored.
+        index (ExistenceIndex): The index to use, defaults to the index of this worker.
+
+    Returns:
+        Set[int]: The ids that do not exist.
+    """
+    index = index or existence_index
+    missing = index.missing(entity, {id for id in ids if id is not None})
+    if not missing:
+        return missing
+    model = MODELS[entity]
+    found: Set[int] = set()
+    ordered = sorted(missing)
+    for start in range(0, len(ordered), IDS_PER_QUERY):
+        found.update(id for id, in db.query(model.id).filter(model.id.in_(ordered[start:start + IDS_PER_QUERY])))
+    if found:
+        if _has_written(db):
+            db.info.setdefault("existence_pending", []).append((index, entity, found))
+        else:
+            index.add(entity, found)
+    return missing - found
+
+
+def require_existing(db: Session, entity: str, ids: Iterable[int], index: ExistenceIndex = None):
+    """
+    Checks that products or persons exist before they are referenced, see `find_missing`.
+
+    Raises:
+        HTTPException: 422 naming the ids that do not exist.
+    """
+    unknown = find_missing(db, entity, ids, index)
+    if unknown:
+        raise HTTPException(status_code=422,
+                            detail=f"Unknown {entity} id(s): {', '.join(map(str, sorted(unknown)))}")
+
+
+def recheck_existing(db: Session, entity: str, ids: Iterable[int], index: ExistenceIndex = None):
+    """
+    Checks again that products or persons exist once the database rejected a reference to them: they are
+    forgotten first, since they may have been deleted, or never committed, after the index learned them.
+
+    Raises:
+        HTTPException: 422 naming the ids that do not exist.
+    """
+    index = index or existence_index
+    for id in ids:
+        if id is not None:
+            index.forget(entity, id)
+    require_existing(db, entity, ids, index)
+
+
+def load_existing(db: Session, index: ExistenceIndex = None, batch_size: int = 50000) -> dict:
+    """
+    Fills the existence index with every product and person id, streaming them in batches.
+
+    Args:
+        db (Session): A session on the main database.
+        index (ExistenceIndex): The index to fill, defaults to the index of this worker.
+        batch_size (int): Ids fetched per round trip.
+
+    Returns:
+        dict: The number of ids known per entity.
+    """
+    index = index or existence_index
+    for entity, model in MODELS.items():
+        ids = db.query(model.id).yield_per(batch_size)
+        index.add(entity, (id for id, in ids))
+    db.rollback()
+    return index.stats()
+
+
+def _has_written(db: Session) -> bool:
+    # A PostgreSQL transaction gets an id with its first write, whatever issued it.
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return db.execute(text("SELECT txid_current_if_assigned() IS NOT NULL")).scalar()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_confirmed(session: Session):
+    # Savepoints commit too: only the outermost transaction makes the confirmed rows visible.
+    if not session.in_nested_transaction():
+        for index, entity, ids in session.info.pop("existence_pending", ()):
+            index.add(entity, ids)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _end_transaction(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop("existence_pending", None)
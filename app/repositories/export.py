@@ -0,0 +1,143 @@
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select, tuple_, union
+from sqlalchemy.orm import Query, Session
+
+from app.models.change import ChangeTombstone
+from app.models.invoice_detail import InvoiceDetail
+from app.models.invoice_header import InvoiceHeader
+from app.models.person import Person
+from app.models.product import Product
+
+# Columns of an exported invoice line: the detail joined with its header, customer and product. Its
+# `change_seq` is the version of the whole row, labelled by `ExportRepository.stream_invoice_lines`.
+INVOICE_LINE_COLUMNS = (
+    InvoiceDetail.id.label("detail_id"),
+    InvoiceHeader.id.label("invoice_header_id"),
+    InvoiceHeader.number.label("invoice_number"),
+    InvoiceHeader.date.label("invoice_date"),
+    Person.id.label("person_id"),
+    Person.name.label("person_name"),
+    Person.surname.label("person_surname"),
+    Person.document_type.label("person_document_type"),
+    Person.document.label("person_document"),
+    Product.id.label("product_id"),
+    Product.description.label("product_description"),
+    Product.unit_of_measure.label("product_unit_of_measure"),
+    InvoiceDetail.quantity.label("quantity"),
+    InvoiceDetail.unit_price.label("unit_price"),
+    InvoiceDetail.unit_cost.label("unit_cost"),
+)
+
+# Deletions that take exported lines out of the warehouse: a deleted line, or an invoice whose lines lost it.
+DELETED_ENTITIES = ("invoice_detail", "invoice_header")
+
+# Export position of a line: (version, detail id).
+ExportKey = Tuple[int, int]
+
+
+class ExportRepository:
+    """
+    Repository class streaming denormalized invoice lines, and the deletions of exported lines, out of the
+    database for warehouse exports.
+
+    A line is exported with the attributes of its invoice, person and product, so its version is the highest
+    change sequence of the four rows: changing a person exports again every line of that person's invoices.
+
+    Attributes:
+        db (Session): Database session used to read the lines.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        stream_invoice_lines(self, after: ExportKey = (0, 0), batch_size: int = 50000, horizon: int = None)
+            -> Iterator[List]: Yields batches of invoice lines changed after a watermark, in version order.
+        stream_deletions(self, after: int = 0, batch_size: int = 50000, horizon: int = None)
+            -> Iterator[List]: Yields batches of the invoice and line deletions from a change sequence on.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the repository with a database session.
+
+        Args:
+            db (Session): The database session used to read the lines.
+        """
+        self.db = db
+
+    @staticmethod
+    def _batches(query: Query, batch_size: int) -> Iterator[List]:
+        batch = []
+        for row in query.execution_options(stream_results=True).yield_per(batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _changed_line_ids(since: int):
+        # One index range per table, rather than an OR over the join that could only be a full scan.
+        return union(
+            select(InvoiceDetail.id).where(InvoiceDetail.change_seq >= since),
+            select(InvoiceDetail.id)
+            .join(InvoiceHeader, InvoiceHeader.id == InvoiceDetail.invoice_header_id)
+            .where(InvoiceHeader.change_seq >= since),
+            select(InvoiceDetail.id)
+            .join(InvoiceHeader, InvoiceHeader.id == InvoiceDetail.invoice_header_id)
+            .join(Person, Person.id == InvoiceHeader.person_id)
+            .where(Person.change_seq >= since),
+            select(InvoiceDetail.id)
+            .join(Product, Product.id == InvoiceDetail.product_id)
+            .where(Product.change_seq >= since))
+
+    def stream_invoice_lines(self, after: ExportKey = (0, 0), batch_size: int = 50000,
+                             horizon: Optional[int] = None) -> Iterator[List]:
+        """
+        Streams invoice lines whose detail, header, person or product changed after a watermark, joined with
+        their header, person and product, ordered by (version, detail id). A server-side cursor is used, so
+        at most one batch is held in memory.
+
+        Args:
+            after (ExportKey): Watermark; only lines with a greater (version, detail id) are returned.
+            batch_size (int): Number of rows per yielded batch.
+            horizon (Optional[int]): Exclusive upper bound of the version, see `ChangeFeedRepository.horizon`,
+                                     so no change can still commit behind the returned lines.
+
+        Yields:
+            List: A batch of rows, each exposing the columns of INVOICE_LINE_COLUMNS and `change_seq`, the
+                  version of the line, by label.
+        """
+        greatest = func.greatest if self.db.get_bind().dialect.name == "postgresql" else func.max
+        version = greatest(*(func.coalesce(model.change_seq, 0)
+                             for model in (InvoiceDetail, InvoiceHeader, Person, Product)))
+        query = (self.db.query(*INVOICE_LINE_COLUMNS, version.label("change_seq"))
+                 .join(InvoiceHeader, InvoiceHeader.id == InvoiceDetail.invoice_header_id)
+                 .outerjoin(Person, Person.id == InvoiceHeader.person_id)
+                 .outerjoin(Product, Product.id == InvoiceDetail.product_id)
+                 .filter(tuple_(version, InvoiceDetail.id) > tuple_(*after)))
+        if after[0] > 0:
+            query = query.filter(InvoiceDetail.id.in_(self._changed_line_ids(after[0])))
+        if horizon is not None:
+            query = query.filter(version < horizon)
+        return self._batches(query.order_by(version, InvoiceDetail.id), batch_size)
+
+    def stream_deletions(self, after: int = 0, batch_size: int = 50000,
+                         horizon: Optional[int] = None) -> Iterator[List]:
+        """
+        Streams the tombstones of the deleted invoice lines and invoices with a change sequence of at least
+        `after`, in change order. Exporting a deletion twice is harmless, so the bound is inclusive.
+
+        Args:
+            after (int): First change sequence returned.
+            batch_size (int): Number of rows per yielded batch.
+            horizon (Optional[int]): Exclusive upper bound of the change sequence.
+
+        Yields:
+            List: A batch of ChangeTombstone rows.
+        """
+        query = self.db.query(ChangeTombstone).filter(ChangeTombstone.entity.in_(DELETED_ENTITIES),
+                                                      ChangeTombstone.change_seq >= after)
+        if horizon is not None:
+            query = query.filter(ChangeTombstone.change_seq < horizon)
+        return self._batches(query.order_by(ChangeTombstone.change_seq, ChangeTombstone.id), batch_size)
@@ -1,5 +1,14 @@
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from app.db.notifications import notify_sale
+from app.db.sharding import ShardRouter, merge_ordered
 from app.models.invoice_detail import InvoiceDetail
+from app.models.invoice_header import InvoiceHeader
+from app.models.product import Product
+from app.repositories.existence import recheck_existing, require_existing
+from app.repositories.outbox import OutboxRepository
+from app.repositories.revenue_rollup import RevenueRollupRepository
 from app.schemas.invoice_detail import InvoiceDetailCreate #InvoiceDetailUpdate
 
 
@@ -54,11 +63,13 @@ class InvoiceDetailRepository:
         Returns:
             A list of InvoiceDetail instances.
         """
-        return self.db.query(InvoiceDetail).offset(skip).limit(limit).all()
+        return self.db.query(InvoiceDetail).order_by(InvoiceDetail.id).offset(skip).limit(limit).all()
 
     def create_invoice_detail(self, invoice_detail: InvoiceDetailCreate):
         """
-        Creates a new invoice detail record in the database.
+        Creates a new invoice detail record in the database, snapshotting the product's current
+        price and cost onto the line, with its `invoice_detail.created` outbox event and its revenue
+        rollups, and announces the sale to the live top products.
 
         Args:
             invoice_detail (InvoiceDetailCreate): The invoice detail data transfer object containing
@@ -66,16 +77,42 @@ class InvoiceDetailRepository:
 
         Returns:
             The newly created InvoiceDetail instance.
+
+        Raises:
+            HTTPException: 422 if the product or the invoice header does not exist.
         """
-        db_invoice_detail = InvoiceDetail(**invoice_detail.dict())
+        require_existing(self.db, "product", [invoice_detail.product_id])
+        product = self.db.query(Product.price, Product.cost).filter(Product.id == invoice_detail.product_id).first()
+        if product is None:
+            raise HTTPException(status_code=422, detail=f"Unknown product id(s): {invoice_detail.product_id}")
+        header = (self.db.query(InvoiceHeader.date, InvoiceHeader.person_id)
+                  .filter(InvoiceHeader.id == invoice_detail.invoice_header_id).first())
+        db_invoice_detail = InvoiceDetail(**invoice_detail.dict(), unit_price=product.price, unit_cost=product.cost)
         self.db.add(db_invoice_detail)
+        try:
+            self.db.flush()
+        except IntegrityError:
+            self.db.rollback()
+            recheck_existing(self.db, "product", [invoice_detail.product_id])
+            raise HTTPException(status_code=422,
+                                detail=f"Unknown invoice header id: {invoice_detail.invoice_header_id}")
+        OutboxRepository(self.db).add_event("invoice_detail.created", db_invoice_detail.id, {
+            "id": db_invoice_detail.id, "invoice_header_id": db_invoice_detail.invoice_header_id,
+            "product_id": db_invoice_detail.product_id, "quantity": db_invoice_detail.quantity,
+            "unit_price": db_invoice_detail.unit_price, "unit_cost": db_invoice_detail.unit_cost})
+        if header is not None:
+            RevenueRollupRepository(self.db).add_lines([(
+                header.date, db_invoice_detail.product_id, header.person_id, db_invoice_detail.quantity,
+                db_invoice_detail.unit_price, db_invoice_detail.unit_cost)])
+        notify_sale(self.db, db_invoice_detail.product_id, db_invoice_detail.quantity,
+                    db_invoice_detail.quantity * (db_invoice_detail.unit_price or 0))
         self.db.commit()
-        self.db.refresh(db_invoice_detail)
         return db_invoice_detail
 
     def delete_invoice_detail(self, id: int):
         """
-        Deletes an invoice detail record from the database.
+        Deletes an invoice detail record from the database, with its `invoice_detail.deleted` outbox event,
+        and takes it out of the revenue rollups.
 
         Args:
             id (int): The unique identifier of the invoice detail to be deleted.
@@ -85,7 +122,16 @@ class InvoiceDetailRepository:
         """
         db_invoice_detail = self.get_invoice_detail(id)
         if db_invoice_detail:
+            header = db_invoice_detail.invoice_header
+            # Invoice rows are written before rollup rows, in the order a rollup backfill locks them.
             self.db.delete(db_invoice_detail)
+            self.db.flush()
+            if header is not None:
+                RevenueRollupRepository(self.db).add_lines([(
+                    header.date, db_invoice_detail.product_id, header.person_id, db_invoice_detail.quantity,
+                    db_invoice_detail.unit_price, db_invoice_detail.unit_cost)], sign=-1)
+            OutboxRepository(self.db).add_event("invoice_detail.deleted", id, {
+                "id": id, "invoice_header_id": db_invoice_detail.invoice_header_id})
             self.db.commit()
             return True
         return False
@@ -102,3 +148,96 @@ class InvoiceDetailRepository:
     #     return None
 
 
+class ShardedInvoiceDetailRepository:
+    """
+    Shard-routing repository for InvoiceDetail entities, exposing the same API as InvoiceDetailRepository.
+
+    Details live on the shard of their invoice header, so writes are routed there; reads by id and
+    listings fan out to every shard in parallel and are merged by id.
+
+    Attributes:
+        router (ShardRouter): Router providing the shard sessions.
+
+    Methods:
+        __init__(self, router: ShardRouter): Initializes the repository on top of a shard router.
+        get_invoice_detail(self, id: int): Fetches a single InvoiceDetail by its ID from any shard.
+        get_invoice_details(self, skip: int = 0, limit: int = 100): Retrieves a globally ordered page of InvoiceDetails.
+        create_invoice_detail(self, invoice_detail: InvoiceDetailCreate): Creates an InvoiceDetail on its header's shard.
+        delete_invoice_detail(self, id: int): Deletes an InvoiceDetail from whichever shard holds it.
+    """
+
+    def __init__(self, router: ShardRouter):
+        """
+        Initialize the repository with the router used to reach the shards.
+
+        Args:
+            router (ShardRouter): The shard router.
+        """
+        self.router = router
+
+    def _shard_holding(self, model, id: int):
+        hits = self.router.fan_out(lambda db: db.query(model.id).filter(model.id == id).first())
+        return next((shard for shard, hit in enumerate(hits) if hit is not None), None)
+
+    def get_invoice_detail(self, id: int):
+        """
+        Retrieves an invoice detail by its unique ID from whichever shard holds it.
+
+        Args:
+            id (int): The unique identifier of the invoice detail.
+
+        Returns:
+            An instance of InvoiceDetail if found, else None.
+        """
+        details = self.router.fan_out(lambda db: InvoiceDetailRepository(db).get_invoice_detail(id))
+        return next((detail for detail in details if detail is not None), None)
+
+    def get_invoice_details(self, skip: int = 0, limit: int = 100):
+        """
+        Retrieves a page of invoice details ordered by id across all shards.
+
+        Args:
+            skip (int): Number of records to skip (for pagination).
+            limit (int): Maximum number of records to return.
+
+        Returns:
+            A list of InvoiceDetail instances.
+        """
+        pages = self.router.fan_out(lambda db: InvoiceDetailRepository(db).get_invoice_details(0, skip + limit))
+        return merge_ordered(pages, key=lambda detail: detail.id)[skip:skip + limit]
+
+    def create_invoice_detail(self, invoice_detail: InvoiceDetailCreate):
+        """
+        Creates a new invoice detail on the shard holding its invoice header.
+
+        Args:
+            invoice_detail (InvoiceDetailCreate): The invoice detail data transfer object containing
+                                                  the necessary information to create a new invoice detail.
+
+        Returns:
+            The newly created InvoiceDetail instance.
+
+        Raises:
+            HTTPException: If the invoice header does not exist on any shard.
+        """
+        shard = self._shard_holding(InvoiceHeader, invoice_detail.invoice_header_id)
+        if shard is None:
+            raise HTTPException(status_code=404, detail="InvoiceHeader not found")
+        with self.router.session_scope(shard) as db:
+            return InvoiceDetailRepository(db).create_invoice_detail(invoice_detail)
+
+    def delete_invoice_detail(self, id: int):
+        """
+        Deletes an invoice detail record from the shard holding it.
+
+        Args:
+            id (int): The unique identifier of the invoice detail to be deleted.
+
+        Returns:
+            True if the deletion was successful, False otherwise.
+        """
+        shard = self._shard_holding(InvoiceDetail, id)
+        if shard is None:
+            return False
+        with self.router.session_scope(shard) as db:
+            return InvoiceDetailRepository(db).delete_invoice_detail(id)
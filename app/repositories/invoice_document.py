@@ -0,0 +1,115 @@
+from datetime import date
+from itertools import groupby
+from typing import Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.invoice_detail import InvoiceDetail
+from app.models.invoice_header import InvoiceHeader
+from app.models.person import Person
+from app.models.product import Product
+
+# Columns of a rendered invoice: the header, its customer, and each line with its product.
+INVOICE_DOCUMENT_COLUMNS = (
+    InvoiceHeader.id.label("id"),
+    InvoiceHeader.number.label("number"),
+    InvoiceHeader.date.label("date"),
+    Person.id.label("person_id"),
+    Person.name.label("person_name"),
+    Person.surname.label("person_surname"),
+    Person.document_type.label("person_document_type"),
+    Person.document.label("person_document"),
+    InvoiceDetail.id.label("detail_id"),
+    Product.id.label("product_id"),
+    Product.description.label("product_description"),
+    Product.unit_of_measure.label("product_unit_of_measure"),
+    InvoiceDetail.quantity.label("quantity"),
+    InvoiceDetail.unit_price.label("unit_price"),
+)
+
+
+def _document(rows: List) -> dict:
+    header = rows[0]
+    lines = [{"product_id": row.product_id, "description": row.product_description,
+              "unit_of_measure": row.product_unit_of_measure, "quantity": row.quantity or 0,
+              "unit_price": row.unit_price or 0, "amount": (row.quantity or 0) * (row.unit_price or 0)}
+             for row in rows if row.detail_id is not None]
+    return {"id": header.id, "number": header.number, "date": header.date,
+            "person": {"id": header.person_id, "name": header.person_name, "surname": header.person_surname,
+                       "document_type": header.person_document_type, "document": header.person_document},
+            "lines": lines, "total": sum(line["amount"] for line in lines)}
+
+
+class InvoiceDocumentRepository:
+    """
+    Repository reading invoices in the shape needed to render them: header, customer, lines and products,
+    fetched together in one query and returned as plain dictionaries that can be sent to other processes.
+
+    Attributes:
+        db (Session): Database session used to read the invoices.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        get_document(self, id: int) -> Optional[dict]: Returns one invoice document.
+        stream_documents(self, after_id, start_date, end_date, batch_size) -> Iterator[List[dict]]:
+            Yields batches of invoice documents ordered by invoice id.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the repository with a database session.
+
+        Args:
+            db (Session): The database session used to read the invoices.
+        """
+        self.db = db
+
+    def _query(self):
+        return (self.db.query(*INVOICE_DOCUMENT_COLUMNS)
+                .outerjoin(Person, Person.id == InvoiceHeader.person_id)
+                .outerjoin(InvoiceDetail, InvoiceDetail.invoice_header_id == InvoiceHeader.id)
+                .outerjoin(Product, Product.id == InvoiceDetail.product_id)
+                .order_by(InvoiceHeader.id, InvoiceDetail.id))
+
+    def get_document(self, id: int) -> Optional[dict]:
+        """
+        Returns an invoice with its customer, lines and products.
+
+        Args:
+            id (int): The invoice header id.
+
+        Returns:
+            Optional[dict]: The invoice document, or None if the invoice does not exist.
+        """
+        rows = self._query().filter(InvoiceHeader.id == id).all()
+        return _document(rows) if rows else None
+
+    def stream_documents(self, after_id: int = 0, start_date: date = None, end_date: date = None,
+                         batch_size: int = 100) -> Iterator[List[dict]]:
+        """
+        Streams the invoices with an id greater than `after_id`, optionally dated within a range, through a
+        server-side cursor, so only the current batch is held in memory.
+
+        Args:
+            after_id (int): Only invoices with a greater id are returned.
+            start_date (date): First invoice date included, if any.
+            end_date (date): Last invoice date included, if any.
+            batch_size (int): Number of invoices per yielded batch.
+
+        Yields:
+            List[dict]: A batch of invoice documents, in invoice id order.
+        """
+        query = self._query().filter(InvoiceHeader.id > after_id)
+        if start_date is not None:
+            query = query.filter(InvoiceHeader.date >= start_date)
+        if end_date is not None:
+            query = query.filter(InvoiceHeader.date <= end_date)
+        rows = query.execution_options(stream_results=True).yield_per(batch_size * 10)
+        batch = []
+        for _, document_rows in groupby(rows, key=lambda row: row.id):
+            batch.append(_document(list(document_rows)))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -1,5 +1,11 @@
-from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from app.db.sharding import ShardRouter, merge_ordered
 from app.models.invoice_header import InvoiceHeader
+from app.repositories.existence import recheck_existing, require_existing
+from app.repositories.outbox import OutboxRepository
+from app.repositories.revenue_rollup import RevenueRollupRepository
 from app.schemas.invoice_header import InvoiceHeaderCreate # InvoiceHeaderUpdate
 
 
@@ -54,27 +60,40 @@ class InvoiceHeaderRepository:
         Returns:
             A list of InvoiceHeader entities.
         """
-        return self.db.query(InvoiceHeader).offset(skip).limit(limit).all()
+        return self.db.query(InvoiceHeader).order_by(InvoiceHeader.id).offset(skip).limit(limit).all()
 
     def create_invoice_header(self, invoice_header: InvoiceHeaderCreate):
         """
-        Creates a new InvoiceHeader record in the database.
+        Creates a new InvoiceHeader record in the database, with its `invoice.created` outbox event.
 
         Args:
             invoice_header (InvoiceHeaderCreate): An instance containing all required data for creating a new InvoiceHeader.
 
         Returns:
             The newly created InvoiceHeader entity.
+
+        Raises:
+            HTTPException: 422 if the person does not exist, 409 if the invoice number is taken.
         """
+        require_existing(self.db, "person", [invoice_header.person_id])
         db_invoice_header = InvoiceHeader(**invoice_header.dict())
         self.db.add(db_invoice_header)
+        try:
+            self.db.flush()
+        except IntegrityError:
+            self.db.rollback()
+            recheck_existing(self.db, "person", [invoice_header.person_id])
+            raise HTTPException(status_code=409, detail="An invoice with this number already exists")
+        OutboxRepository(self.db).add_event("invoice.created", db_invoice_header.id, {
+            "id": db_invoice_header.id, "number": db_invoice_header.number,
+            "date": db_invoice_header.date, "person_id": db_invoice_header.person_id})
         self.db.commit()
-        self.db.refresh(db_invoice_header)
         return db_invoice_header
 
     def delete_invoice_header(self, id: int):
         """
-        Deletes an InvoiceHeader record identified by its ID.
+        Deletes an InvoiceHeader record identified by its ID, with its `invoice.deleted` outbox event,
+        and takes its lines out of the revenue rollups.
 
         Args:
             id (int): The unique identifier of the InvoiceHeader to delete.
@@ -84,7 +103,14 @@ class InvoiceHeaderRepository:
         """
         db_invoice_header = self.get_invoice_header(id)
         if db_invoice_header:
+            # Its lines lose their invoice, and with it their date: they leave the rollups.
+            lines = [(db_invoice_header.date, detail.product_id, db_invoice_header.person_id, detail.quantity,
+                      detail.unit_price, detail.unit_cost) for detail in db_invoice_header.details]
+            # Invoice rows are written before rollup rows, in the order a rollup backfill locks them.
             self.db.delete(db_invoice_header)
+            self.db.flush()
+            RevenueRollupRepository(self.db).add_lines(lines, sign=-1)
+            OutboxRepository(self.db).add_event("invoice.deleted", id, {"id": id})
             self.db.commit()
             return True
         return False
@@ -99,3 +125,110 @@ class InvoiceHeaderRepository:
     #         self.db.refresh(db_invoice_header)
     #         return db_invoice_header
     #     return None
+
+
+class ShardedInvoiceHeaderRepository:
+    """
+    Shard-routing repository for InvoiceHeader entities, exposing the same API as InvoiceHeaderRepository.
+
+    New headers are written to the shard owning their `person_id`. Reads by id and listings fan out to
+    every shard in parallel; listings are merged by id so pagination stays globally ordered.
+
+    Attributes:
+        router (ShardRouter): Router providing the shard sessions.
+
+    Methods:
+        __init__(self, router: ShardRouter): Constructs the repository on top of a shard router.
+        get_invoice_header(self, id: int): Retrieves a single InvoiceHeader by its ID from any shard.
+        get_invoice_headers(self, skip: int = 0, limit: int = 100): Fetches a globally ordered page of InvoiceHeaders.
+        create_invoice_header(self, invoice_header: InvoiceHeaderCreate): Creates an InvoiceHeader on its customer's shard.
+        delete_invoice_header(self, id: int): Removes an InvoiceHeader from whichever shard holds it.
+    """
+
+    def __init__(self, router: ShardRouter):
+        """
+        Initializes the repository with the router used to reach the shards.
+
+        Args:
+            router (ShardRouter): The shard router.
+        """
+        self.router = router
+
+    def find_shard(self, id: int):
+        """
+        Finds the shard holding an InvoiceHeader.
+
+        Args:
+            id (int): The unique identifier of the InvoiceHeader.
+
+        Returns:
+            The shard index, or None if no shard holds the header.
+        """
+        hits = self.router.fan_out(lambda db: db.query(InvoiceHeader.id).filter(InvoiceHeader.id == id).first())
+        return next((shard for shard, hit in enumerate(hits) if hit is not None), None)
+
+    def get_invoice_header(self, id: int):
+        """
+        Fetches an InvoiceHeader entity, with its details loaded, from whichever shard holds it.
+
+        Args:
+            id (int): The unique identifier of the InvoiceHeader.
+
+        Returns:
+            The InvoiceHeader entity if found, otherwise None.
+        """
+        def fetch(db: Session):
+            header = InvoiceHeaderRepository(db).get_invoice_header(id)
+            if header is not None:
+                header.details  # Load the details before the shard session closes.
+            return header
+
+        return next((header for header in self.router.fan_out(fetch) if header is not None), None)
+
+    def get_invoice_headers(self, skip: int = 0, limit: int = 100):
+        """
+        Retrieves a page of InvoiceHeader entities ordered by id across all shards.
+
+        Args:
+            skip (int): The number of records to skip from the start.
+            limit (int): The maximum number of records to return.
+
+        Returns:
+            A list of InvoiceHeader entities.
+        """
+        def fetch(db: Session):
+            return (db.query(InvoiceHeader).options(selectinload(InvoiceHeader.details))
+                    .order_by(InvoiceHeader.id).limit(skip + limit).all())
+
+        return merge_ordered(self.router.fan_out(fetch), key=lambda header: header.id)[skip:skip + limit]
+
+    def create_invoice_header(self, invoice_header: InvoiceHeaderCreate):
+        """
+        Creates a new InvoiceHeader record on the shard owning its customer.
+
+        Args:
+            invoice_header (InvoiceHeaderCreate): An instance containing all required data for creating a new InvoiceHeader.
+
+        Returns:
+            The newly created InvoiceHeader entity.
+        """
+        with self.router.session_scope(self.router.shard_for(invoice_header.person_id)) as db:
+            db_invoice_header = InvoiceHeaderRepository(db).create_invoice_header(invoice_header)
+            db_invoice_header.details
+            return db_invoice_header
+
+    def delete_invoice_header(self, id: int):
+        """
+        Deletes an InvoiceHeader record identified by its ID from the shard holding it.
+
+        Args:
+            id (int): The unique identifier of the InvoiceHeader to delete.
+
+        Returns:
+            True if the deletion was successful, False otherwise.
+        """
+        shard = self.find_shard(id)
+        if shard is None:
+            return False
+        with self.router.session_scope(shard) as db:
+            return InvoiceHeaderRepository(db).delete_invoice_header(id)
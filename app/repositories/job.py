@@ -0,0 +1,207 @@
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.models.job import Job
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class JobRepository:
+    """
+    Repository class for background jobs.
+
+    Jobs are claimed by selecting the oldest queued one with `FOR UPDATE SKIP LOCKED`, so concurrent runners
+    never wait for each other, and by a conditional update, so a job is never claimed twice even where
+    row locks are not available (SQLite).
+
+    Attributes:
+        db (Session): The database session.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        create_job(self, kind: str, params: dict) -> Job: Queues a job.
+        get_job(self, id: int) -> Job: Returns a job, raising an HTTPException if not found.
+        request_cancel(self, id: int) -> Job: Flags a job for cancellation, cancelling it at once if still queued.
+        claim_job(self, worker: str) -> Optional[Job]: Marks the oldest queued job as running for a worker.
+        heartbeat(self, ids: List[int]) -> Dict[int, bool]: Records that jobs are alive, returns their cancel flags.
+        report_progress(self, id: int, progress: float, message: Optional[str]): Stores the progress of a job.
+        finish_job(self, id: int, status: str, ...): Records the outcome of a job.
+        release_jobs(self, ids: List[int]): Queues again running jobs whose runner stops.
+        requeue_stale(self, timeout: float, max_attempts: int) -> int: Requeues the jobs of dead runners.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the JobRepository with a database session.
+
+        Args:
+            db (Session): The database session.
+        """
+        self.db = db
+
+    def create_job(self, kind: str, params: dict) -> Job:
+        """
+        Queues a job.
+
+        Args:
+            kind (str): The job kind.
+            params (dict): JSON-serializable parameters of the job.
+
+        Returns:
+            Job: The queued job.
+        """
+        job = Job(kind=kind, params=json.dumps(params, default=str), status="queued")
+        self.db.add(job)
+        self.db.commit()
+        return job
+
+    def get_job(self, id: int) -> Job:
+        """
+        Returns a job.
+
+        Args:
+            id (int): The job id.
+
+        Returns:
+            Job: The job.
+
+        Raises:
+            HTTPException: If no job has this id.
+        """
+        job = self.db.query(Job).filter(Job.id == id).first()
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    def request_cancel(self, id: int) -> Job:
+        """
+        Asks for a job to be cancelled: a queued job is cancelled at once, a running one stops at its next
+        progress check, a finished one is left as it is.
+
+        Args:
+            id (int): The job id.
+
+        Returns:
+            Job: The job.
+
+        Raises:
+            HTTPException: If no job has this id.
+        """
+        job = self.db.query(Job).filter(Job.id == id).with_for_update().first()
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.status == "queued":
+            job.status, job.finished_at = "cancelled", datetime.utcnow()
+        if job.status not in FINISHED:
+            job.cancel_requested = True
+        self.db.commit()
+        return job
+
+    def claim_job(self, worker: str) -> Optional[Job]:
+        """
+        Marks the oldest queued job as running for a worker.
+
+        Args:
+            worker (str): Name of the claiming worker.
+
+        Returns:
+            Optional[Job]: The claimed job, or None if no job is queued.
+        """
+        candidate = (self.db.query(Job.id).filter(Job.status == "queued").order_by(Job.id)
+                     .with_for_update(skip_locked=True).first())
+        if candidate is None:
+            self.db.rollback()
+            return None
+        now = datetime.utcnow()
+        claimed = self.db.query(Job).filter(Job.id == candidate.id, Job.status == "queued").update(
+            {Job.status: "running", Job.worker: worker, Job.started_at: now, Job.heartbeat_at: now,
+             Job.attempts: Job.attempts + 1}, synchronize_session=False)
+        self.db.commit()
+        return self.get_job(candidate.id) if claimed else None
+
+    def heartbeat(self, ids: List[int]) -> Dict[int, bool]:
+        """
+        Records that running jobs are alive.
+
+        Args:
+            ids (List[int]): Ids of the jobs held by a runner.
+
+        Returns:
+            Dict[int, bool]: Whether cancellation was requested, per job id.
+        """
+        if not ids:
+            return {}
+        self.db.query(Job).filter(Job.id.in_(ids), Job.status == "running").update(
+            {Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+        flags = dict(self.db.query(Job.id, Job.cancel_requested).filter(Job.id.in_(ids)).all())
+        self.db.commit()
+        return flags
+
+    def report_progress(self, id: int, progress: float, message: Optional[str] = None):
+        """
+        Stores the progress of a running job.
+
+        Args:
+            id (int): The job id.
+            progress (float): Completed fraction, between 0 and 1.
+            message (Optional[str]): Description of the current step.
+        """
+        self.db.query(Job).filter(Job.id == id, Job.status == "running").update(
+            {Job.progress: min(max(progress, 0.0), 1.0), Job.message: message, Job.heartbeat_at: datetime.utcnow()},
+            synchronize_session=False)
+        self.db.commit()
+
+    def finish_job(self, id: int, status: str, result: Optional[dict] = None, artifact: Optional[str] = None,
+                   error: Optional[str] = None):
+        """
+        Records the outcome of a running job.
+
+        Args:
+            id (int): The job id.
+            status (str): 'succeeded', 'failed' or 'cancelled'.
+            result (Optional[dict]): JSON-serializable result.
+            artifact (Optional[str]): Path of the file produced by the job.
+            error (Optional[str]): Description of the failure.
+        """
+        values = {Job.status: status, Job.finished_at: datetime.utcnow(), Job.artifact: artifact, Job.error: error,
+                  Job.result: json.dumps(result, default=str) if result is not None else None}
+        if status == "succeeded":
+            values[Job.progress] = 1.0
+        self.db.query(Job).filter(Job.id == id, Job.status == "running").update(values, synchronize_session=False)
+        self.db.commit()
+
+    def release_jobs(self, ids: List[int]):
+        """
+        Queues again running jobs whose runner stops before they finish.
+
+        Args:
+            ids (List[int]): The job ids.
+        """
+        self.db.query(Job).filter(Job.id.in_(ids), Job.status == "running").update(
+            {Job.status: "queued", Job.worker: None, Job.progress: 0.0}, synchronize_session=False)
+        self.db.commit()
+
+    def requeue_stale(self, timeout: float, max_attempts: int) -> int:
+        """
+        Queues again the running jobs whose runner stopped sending heartbeats, or fails them after
+        `max_attempts` attempts.
+
+        Args:
+            timeout (float): Seconds without heartbeat after which a runner is considered dead.
+            max_attempts (int): Maximum number of attempts of a job.
+
+        Returns:
+            int: The number of jobs requeued or failed.
+        """
+        stale = (Job.status == "running", Job.heartbeat_at < datetime.utcnow() - timedelta(seconds=timeout))
+        failed = self.db.query(Job).filter(*stale, Job.attempts >= max_attempts).update(
+            {Job.status: "failed", Job.finished_at: datetime.utcnow(), Job.error: "Worker lost"},
+            synchronize_session=False)
+        requeued = self.db.query(Job).filter(*stale).update(
+            {Job.status: "queued", Job.worker: None, Job.progress: 0.0}, synchronize_session=False)
+        self.db.commit()
+        return failed + requeued
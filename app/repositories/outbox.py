@@ -0,0 +1,163 @@
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.outbox import OutboxCursor, OutboxEvent
+
+
+class OutboxRepository:
+    """
+    Repository of the transactional outbox: invoice events written in the transaction of the change
+    they describe, and the delivery cursor of every sink.
+
+    Events are read in (transaction id, event id) order. On PostgreSQL only events of transactions older
+    than every transaction still running are read, so an event can never commit behind a cursor that
+    already moved past it; on other databases the transaction id is empty and events are read by id.
+
+    A publisher claims the cursor of a sink for a while, delivers the batch after it outside any transaction,
+    then advances it if it still holds the claim; a claim that lapses lets another publisher take over.
+
+    Attributes:
+        db (Session): The database session.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        add_event(self, event_type: str, aggregate_id: int, payload: dict): Adds an event to the current transaction.
+        claim_cursor(self, sink: str, owner: str, lease: timedelta) -> Optional[OutboxCursor]: Claims the cursor of a sink unless another publisher holds it.
+        get_events_after(self, cursor: OutboxCursor, limit: int) -> List[OutboxEvent]: Returns the next events of a sink.
+        advance_cursor(self, sink: str, owner: str, position: Tuple[int, int], delivered: Tuple[int, int]) -> bool: Moves a claimed cursor past the delivered events.
+        position_of(event: OutboxEvent) -> Tuple[int, int]: Returns the position of an event in delivery order.
+        release_cursor(self, sink: str, owner: str): Gives up the claim of a cursor.
+        purge_delivered(self, sinks: List[str]) -> int: Deletes the events every sink has received.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the OutboxRepository with a database session.
+
+        Args:
+            db (Session): The database session.
+        """
+        self.db = db
+
+    def add_event(self, event_type: str, aggregate_id: int, payload: dict):
+        """
+        Adds an event to the session; it is written by the commit of the change it describes.
+
+        Args:
+            event_type (str): Event type, e.g. 'invoice.created'.
+            aggregate_id (int): Id of the invoice or invoice line concerned.
+            payload (dict): JSON-serializable event data.
+        """
+        self.db.add(OutboxEvent(event_type=event_type, aggregate_id=aggregate_id,
+                                payload=json.dumps(payload, default=str)))
+
+    def claim_cursor(self, sink: str, owner: str, lease: timedelta) -> Optional[OutboxCursor]:
+        """
+        Claims the cursor of a sink until `lease` from now, creating it at the start of the outbox if needed.
+        The claim is written by the commit of the current transaction; the cursor row stays locked until then.
+
+        Args:
+            sink (str): The sink name.
+            owner (str): The claiming publisher.
+            lease (timedelta): How long the claim lasts.
+
+        Returns:
+            Optional[OutboxCursor]: The cursor, or None if another publisher holds it.
+        """
+        query = self.db.query(OutboxCursor).filter(OutboxCursor.sink == sink).with_for_update(skip_locked=True)
+        cursor = query.first()
+        if cursor is None:
+            try:
+                with self.db.begin_nested():
+                    self.db.add(OutboxCursor(sink=sink, transaction_id=0, event_id=0))
+            except IntegrityError:
+                pass
+            cursor = query.first()
+        now = datetime.utcnow()
+        if cursor is None or (cursor.claimed_by not in (None, owner) and cursor.claimed_until > now):
+            return None
+        cursor.claimed_by = owner
+        cursor.claimed_until = now + lease
+        return cursor
+
+    def get_events_after(self, cursor: OutboxCursor, limit: int) -> List[OutboxEvent]:
+        """
+        Returns the next committed events after a cursor, in delivery order.
+
+        Args:
+            cursor (OutboxCursor): The sink cursor.
+            limit (int): Maximum number of events.
+
+        Returns:
+            List[OutboxEvent]: The events.
+        """
+        order = (func.coalesce(OutboxEvent.transaction_id, 0), OutboxEvent.id)
+        query = self.db.query(OutboxEvent).filter(tuple_(*order) > tuple_(cursor.transaction_id, cursor.event_id))
+        if self.db.get_bind().dialect.name == "postgresql":
+            query = query.filter(OutboxEvent.transaction_id < func.txid_snapshot_xmin(func.txid_current_snapshot()))
+        return query.order_by(*order).limit(limit).all()
+
+    def advance_cursor(self, sink: str, owner: str, position: Tuple[int, int], delivered: Tuple[int, int]) -> bool:
+        """
+        Moves a cursor past the last delivered event and releases its claim, unless the claim was lost meanwhile, i.e. the
+        cursor is no longer claimed by `owner` at `position`. The move is committed with the current transaction.
+
+        Args:
+            sink (str): The sink name.
+            owner (str): The publisher that claimed the cursor.
+            position (Tuple[int, int]): The transaction and event ids of the cursor when it was claimed.
+            delivered (Tuple[int, int]): The transaction and event ids of the last delivered event, see `position_of`.
+
+        Returns:
+            bool: Whether the cursor moved.
+        """
+        moved = self.db.query(OutboxCursor).filter(
+            OutboxCursor.sink == sink, OutboxCursor.claimed_by == owner,
+            OutboxCursor.transaction_id == position[0], OutboxCursor.event_id == position[1],
+        ).update({OutboxCursor.transaction_id: delivered[0], OutboxCursor.event_id: delivered[1],
+                  OutboxCursor.claimed_by: None, OutboxCursor.claimed_until: None}, synchronize_session=False)
+        return moved == 1
+
+    @staticmethod
+    def position_of(event: OutboxEvent) -> Tuple[int, int]:
+        """
+        Returns the position of an event in delivery order, as stored by the cursors.
+        """
+        return event.transaction_id or 0, event.id
+
+    def release_cursor(self, sink: str, owner: str):
+        """
+        Gives up the claim of a cursor, so the next publisher delivers its batch at once; committed with the
+        current transaction.
+
+        Args:
+            sink (str): The sink name.
+            owner (str): The publisher that claimed the cursor.
+        """
+        self.db.query(OutboxCursor).filter(OutboxCursor.sink == sink, OutboxCursor.claimed_by == owner) \
+            .update({OutboxCursor.claimed_by: None, OutboxCursor.claimed_until: None}, synchronize_session=False)
+
+    def purge_delivered(self, sinks: List[str]) -> int:
+        """
+        Deletes the events that every given sink has already received.
+
+        Args:
+            sinks (List[str]): Names of every configured sink.
+
+        Returns:
+            int: The number of events deleted.
+        """
+        cursors = self.db.query(OutboxCursor).filter(OutboxCursor.sink.in_(sinks)).all()
+        if not sinks or len(cursors) < len(sinks):
+            return 0
+        oldest = min(cursors, key=lambda cursor: (cursor.transaction_id, cursor.event_id))
+        order = (func.coalesce(OutboxEvent.transaction_id, 0), OutboxEvent.id)
+        deleted = self.db.query(OutboxEvent).filter(tuple_(*order) <= tuple_(oldest.transaction_id, oldest.event_id)) \
+            .delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
@@ -1,7 +1,13 @@
-from typing import List
+from typing import List, Tuple
 from fastapi import HTTPException
+from sqlalchemy import case, literal_column, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.db.notifications import notify_change
+from app.db.sharding import shard_router
+from app.models.change import change_sequence
 from app.models.person import Person
 from app.schemas.person import PersonCreate, PersonUpdate
 
@@ -21,6 +27,8 @@ class PersonRepository:
         get_person_by_id(self, person_id: int) -> Person: Fetches a person by their unique ID.
         get_all_persons(self, skip: int = 0, limit: int = 100) -> List[Person]: Retrieves a list of persons with pagination.
         create_person(self, person: PersonCreate) -> Person: Adds a new person to the database.
+        upsert_person_by_document(self, person: PersonCreate) -> Tuple[Person, bool]: Creates or updates the person
+            holding a document.
         update_person(self, person_id: int, person: PersonUpdate) -> Person: Updates an existing person's information.
         delete_person(self, person_id: int): Removes a person from the database.
     """
@@ -71,10 +79,82 @@ class PersonRepository:
         """
         db_person = Person(**person.dict())
         self.db.add(db_person)
-        self.db.commit()
-        self.db.refresh(db_person)
+        self._commit()
+        if shard_router.enabled:
+            shard_router.replicate(db_person)
         return db_person
 
+    def _commit(self):
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            raise HTTPException(status_code=409, detail="A person with this document already exists")
+
+    def upsert_person_by_document(self, person: PersonCreate) -> Tuple[Person, bool]:
+        """
+        Creates the person holding a document, or updates their name and surname if they exist.
+
+        On PostgreSQL this is a single `INSERT ... ON CONFLICT (document_type, document) DO UPDATE ... RETURNING`
+        statement: concurrent calls for the same document never create duplicates nor fail, the losers of the
+        race update the row the winner inserted. Only a row whose name or surname actually changes gets a new
+        change sequence and a cache invalidation. Other databases look the person up first and retry once
+        when a concurrent call inserted it meanwhile.
+
+        Args:
+            person (PersonCreate): The person data transfer object; document_type and document identify the person.
+
+        Returns:
+            Tuple[Person, bool]: The person, and whether they were created.
+        """
+        if self.db.get_bind().dialect.name != "postgresql":
+            return self._get_or_create_person(person)
+
+        table = Person.__table__
+        statement = insert(table).values(**person.dict())
+        changed = tuple_(table.c.name, table.c.surname).is_distinct_from(
+            tuple_(statement.excluded.name, statement.excluded.surname))
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.document_type, table.c.document],
+            set_={"name": statement.excluded.name, "surname": statement.excluded.surname,
+                  "change_seq": case((changed, statement.excluded.change_seq), else_=table.c.change_seq),
+                  "updated_at": case((changed, statement.excluded.updated_at), else_=table.c.updated_at)},
+        ).returning(*table.c, literal_column("xmax = 0").label("created"),
+                    (table.c.change_seq == change_sequence()).label("changed"))
+        db_person, created, changed = self.db.execute(
+            select(Person, literal_column("created"), literal_column("changed")).from_statement(statement)).one()
+        if changed and not created:
+            notify_change(self.db, "person", db_person.id)
+        self.db.commit()
+        if changed and shard_router.enabled:
+            shard_router.replicate(db_person)
+        return db_person, created
+
+    def _get_or_create_person(self, person: PersonCreate) -> Tuple[Person, bool]:
+        for attempt in range(2):
+            db_person = self.db.query(Person).filter(Person.document_type == person.document_type,
+                                                     Person.document == person.document).first()
+            if db_person is None:
+                db_person = Person(**person.dict())
+                self.db.add(db_person)
+                try:
+                    self.db.commit()
+                except IntegrityError:
+                    # Inserted concurrently: update that row instead.
+                    self.db.rollback()
+                    continue
+                created = True
+            else:
+                created = False
+                if (db_person.name, db_person.surname) != (person.name, person.surname):
+                    db_person.name, db_person.surname = person.name, person.surname
+                    notify_change(self.db, "person", db_person.id)
+                    self.db.commit()
+            if shard_router.enabled:
+                shard_router.replicate(db_person)
+            return db_person, created
+        raise HTTPException(status_code=409, detail="A person with this document is being changed concurrently")
+
     def update_person(self, person_id: int, person: PersonUpdate) -> Person:
         """
         Updates an existing Person entity with new data.
@@ -94,8 +174,10 @@ class PersonRepository:
         update_data = person.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_person, key, value)
-        self.db.commit()
-        self.db.refresh(db_person)
+        notify_change(self.db, "person", person_id)
+        self._commit()
+        if shard_router.enabled:
+            shard_router.replicate(db_person)
         return db_person
 
     def delete_person(self, person_id: int):
@@ -109,11 +191,16 @@ class PersonRepository:
             A dictionary confirming the deletion.
 
         Raises:
-            HTTPException: If the person with the specified ID does not exist.
+            HTTPException: If the person with the specified ID does not exist, or if sharded invoices reference it.
         """
         db_person = self.get_person_by_id(person_id)
         if not db_person:
             raise HTTPException(status_code=404, detail="Person not found")
+        if shard_router.enabled and shard_router.is_referenced(Person, person_id):
+            raise HTTPException(status_code=409, detail="Person is referenced by invoices")
         self.db.delete(db_person)
+        notify_change(self.db, "person", person_id)
         self.db.commit()
+        if shard_router.enabled:
+            shard_router.remove_replica(Person, person_id)
         return {"ok": True}
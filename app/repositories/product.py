@@ -1,10 +1,20 @@
-from typing import List
+from datetime import datetime
+from typing import Dict, List, Tuple
 
 from fastapi import HTTPException
+from sqlalchemy import DateTime, Float, String, bindparam, column, func, literal_column, select, tuple_
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.db.notifications import notify_change, notify_changes
+from app.db.sharding import shard_router
+from app.models.change import change_sequence
 from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductUpdate
+from app.schemas.product import PriceListItem, ProductCreate, ProductUpdate
+
+PRICE_LIST_FIELDS = ("price", "cost", "unit_of_measure", "description")
 
 
 class ProductRepository:
@@ -29,6 +39,8 @@ class ProductRepository:
         update_product(self, product_id: int, product: ProductUpdate) -> Product: Updates an existing
                                                                                  product, identified by its ID.
         delete_product(self, product_id: int): Deletes a product by its ID, returning a confirmation upon success.
+        upsert_price_list(self, items: List[PriceListItem]) -> List[dict]: Creates or updates products by SKU
+                                                                           in bulk, returning every outcome.
     """
 
     def __init__(self, db: Session):
@@ -80,11 +92,15 @@ class ProductRepository:
 
         Returns:
             The newly created Product object.
+
+        Raises:
+            HTTPException: 409 if another product has the same SKU.
         """
         db_product = Product(**product.dict())
         self.db.add(db_product)
-        self.db.commit()
-        self.db.refresh(db_product)
+        self._commit()
+        if shard_router.enabled:
+            shard_router.replicate(db_product)
         return db_product
 
     def update_product(self, product_id: int, product: ProductUpdate) -> Product:
@@ -99,7 +115,7 @@ class ProductRepository:
             The updated Product object.
 
         Raises:
-            HTTPException: If the product to be updated is not found.
+            HTTPException: If the product to be updated is not found, 409 if another product has the same SKU.
         """
         db_product = self.get_product_by_id(product_id)
         if not db_product:
@@ -108,10 +124,19 @@ class ProductRepository:
         for var, value in vars(product).items():
             setattr(db_product, var, value) if value else None
 
-        self.db.commit()
-        self.db.refresh(db_product)
+        notify_change(self.db, "product", product_id)
+        self._commit()
+        if shard_router.enabled:
+            shard_router.replicate(db_product)
         return db_product
 
+    def _commit(self):
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            raise HTTPException(status_code=409, detail="A product with this SKU already exists")
+
     def delete_product(self, product_id: int):
         """
         Deletes a product from the database by its ID.
@@ -123,11 +148,128 @@ class ProductRepository:
             A confirmation message upon successful deletion.
 
         Raises:
-            HTTPException: If the product to be deleted is not found.
+            HTTPException: If the product to be deleted is not found, or if sharded invoices reference it.
         """
         db_product = self.get_product_by_id(product_id)
         if not db_product:
             raise HTTPException(status_code=404, detail="Product not found")
+        if shard_router.enabled and shard_router.is_referenced(Product, product_id):
+            raise HTTPException(status_code=409, detail="Product is referenced by invoices")
         self.db.delete(db_product)
+        notify_change(self.db, "product", product_id)
         self.db.commit()
+        if shard_router.enabled:
+            shard_router.remove_replica(Product, product_id)
         return {"ok": True}
+
+    def upsert_price_list(self, items: List[PriceListItem], batch_size: int = None) -> List[dict]:
+        """
+        Applies a supplier price list: creates the products whose SKU is unknown and updates the price, cost,
+        unit and, when given, the description of the others, all in one transaction.
+
+        Items are applied in batches of `batch_size`, each one lookup of the known SKUs and, on PostgreSQL, one
+        `INSERT ... SELECT FROM jsonb_to_recordset(...) ON CONFLICT (sku) DO UPDATE ... WHERE <values differ>
+        RETURNING` statement, so unchanged products are not written at all. Only updated products get a cache invalidation and are replicated.
+        When a SKU appears several times, its last item wins.
+
+        Args:
+            items (List[PriceListItem]): The price list.
+            batch_size (int): Items per statement, defaults to `settings.PRICE_LIST_BATCH_SIZE`.
+
+        Returns:
+            List[dict]: The outcome of every item, in order: sku, status ('created', 'updated', 'unchanged' or
+                        'skipped'), product id and, for skipped items, the reason.
+        """
+        batch_size = batch_size or settings.PRICE_LIST_BATCH_SIZE
+        outcomes: List[dict] = [None] * len(items)
+        last = {item.sku: index for index, item in enumerate(items)}
+        pending = []
+        for index, item in enumerate(items):
+            if last[item.sku] != index:
+                outcomes[index] = {"sku": item.sku, "status": "skipped",
+                                   "detail": "Superseded by a later item with the same SKU"}
+            else:
+                pending.append(index)
+
+        changed_rows: List[dict] = []
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            existing = dict(self.db.query(Product.sku, Product.id)
+                            .filter(Product.sku.in_([items[index].sku for index in batch])).all())
+            accepted = []
+            for index in batch:
+                item = items[index]
+                if item.sku not in existing and not item.description:
+                    outcomes[index] = {"sku": item.sku, "status": "skipped",
+                                       "detail": "A description is required to create a product"}
+                else:
+                    accepted.append(index)
+            if not accepted:
+                continue
+            if self.db.get_bind().dialect.name == "postgresql":
+                written = self._upsert_batch([items[index] for index in accepted])
+            else:
+                written = self._apply_batch([items[index] for index in accepted])
+            # A SKU inserted concurrently since the lookup, with the same values, is neither written nor known.
+            unknown = [items[index].sku for index in accepted
+                       if items[index].sku not in written and items[index].sku not in existing]
+            if unknown:
+                existing.update(self.db.query(Product.sku, Product.id).filter(Product.sku.in_(unknown)).all())
+            for index in accepted:
+                sku = items[index].sku
+                if sku not in written:
+                    outcomes[index] = {"sku": sku, "status": "unchanged", "id": existing[sku]}
+                else:
+                    row, created = written[sku]
+                    outcomes[index] = {"sku": sku, "status": "created" if created else "updated", "id": row["id"]}
+                    changed_rows.append(row)
+
+        updated = [outcome["id"] for outcome in outcomes if outcome["status"] == "updated"]
+        notify_changes(self.db, "product", updated)
+        self.db.commit()
+        if shard_router.enabled:
+            shard_router.replicate_rows(Product, changed_rows)
+        return outcomes
+
+    def _upsert_batch(self, items: List[PriceListItem]) -> Dict[str, Tuple[dict, bool]]:
+        # The batch travels as one JSON parameter, so the statement is compiled once and cached, however many
+        # items it holds. Whether a row was inserted comes from the statement itself (`xmax = 0`), not from the
+        # lookup, which concurrent price lists may have made stale.
+        table = Product.__table__
+        source = func.jsonb_to_recordset(bindparam("items", type_=JSONB)).table_valued(
+            column("sku", String), column("price", Float), column("cost", Float), column("unit_of_measure", String),
+            column("description", String)).render_derived(with_types=True)
+        statement = insert(table).from_select(
+            ["sku", "price", "cost", "unit_of_measure", "description", "change_seq", "updated_at"],
+            select(source.c.sku, source.c.price, source.c.cost, source.c.unit_of_measure, source.c.description,
+                   change_sequence(), bindparam("updated_at", type_=DateTime)))
+        excluded = statement.excluded
+        description = func.coalesce(excluded.description, table.c.description)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.sku],
+            set_={"price": excluded.price, "cost": excluded.cost, "unit_of_measure": excluded.unit_of_measure,
+                  "description": description, "change_seq": excluded.change_seq, "updated_at": excluded.updated_at},
+            where=tuple_(table.c.price, table.c.cost, table.c.unit_of_measure, table.c.description).is_distinct_from(
+                tuple_(excluded.price, excluded.cost, excluded.unit_of_measure, description)),
+        ).returning(*table.c, literal_column("xmax = 0").label("created"))
+        rows = self.db.execute(statement, {"items": [item.dict() for item in items], "updated_at": datetime.utcnow()})
+        return {row.sku: ({column.key: row._mapping[column] for column in table.c}, row.created) for row in rows}
+
+    def _apply_batch(self, items: List[PriceListItem]) -> Dict[str, Tuple[dict, bool]]:
+        products = {product.sku: product for product in
+                    self.db.query(Product).filter(Product.sku.in_([item.sku for item in items])).all()}
+        changed = []
+        for item in items:
+            values = {field: getattr(item, field) for field in PRICE_LIST_FIELDS if getattr(item, field) is not None}
+            product = products.get(item.sku)
+            if product is None:
+                product = Product(sku=item.sku, **values)
+                self.db.add(product)
+                changed.append((product, True))
+            elif any(getattr(product, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(product, field, value)
+                changed.append((product, False))
+        self.db.flush()
+        return {product.sku: ({column.key: getattr(product, column.key) for column in Product.__mapper__.column_attrs},
+                              created) for product, created in changed}
@@ -0,0 +1,69 @@
+from typing import List
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.images import StoredImage
+from app.models.product_image import ProductImage
+
+
+class ProductImageRepository:
+    """
+    Repository class for the images attached to products.
+
+    Attributes:
+        db (Session): The database session.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        get_images(self, product_id: int) -> List[ProductImage]: Returns the images of a product.
+        add_image(self, product_id: int, image: StoredImage) -> ProductImage: Attaches a stored image to a product.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the ProductImageRepository with a database session.
+
+        Args:
+            db (Session): The database session.
+        """
+        self.db = db
+
+    def get_images(self, product_id: int) -> List[ProductImage]:
+        """
+        Returns the images of a product, oldest first.
+
+        Args:
+            product_id (int): The product id.
+
+        Returns:
+            List[ProductImage]: The images.
+        """
+        return self.db.query(ProductImage).filter(ProductImage.product_id == product_id).order_by(ProductImage.id).all()
+
+    def add_image(self, product_id: int, image: StoredImage) -> ProductImage:
+        """
+        Attaches a stored image to a product; attaching the same content twice returns the existing row.
+
+        Args:
+            product_id (int): The product id.
+            image (StoredImage): The stored image.
+
+        Returns:
+            ProductImage: The attached image.
+        """
+        existing = self.db.query(ProductImage).filter(ProductImage.product_id == product_id,
+                                                      ProductImage.digest == image.digest).first()
+        if existing is not None:
+            return existing
+        db_image = ProductImage(product_id=product_id, digest=image.digest, extension=image.extension,
+                                content_type=image.content_type, size=image.size)
+        self.db.add(db_image)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # The same image was attached concurrently.
+            self.db.rollback()
+            return self.db.query(ProductImage).filter(ProductImage.product_id == product_id,
+                                                      ProductImage.digest == image.digest).one()
+        return db_image
@@ -0,0 +1,163 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, cast, func, literal, select, true, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.invoice_detail import InvoiceDetail
+from app.models.invoice_header import InvoiceHeader
+from app.models.revenue_rollup import RevenueRollup
+
+MEASURES = ("lines", "quantity", "revenue", "cost")
+
+# An invoice line as the rollups see it: invoice date, product id, person id, quantity, unit price and unit cost.
+RollupLine = Tuple[Optional[date], Optional[int], Optional[int], Optional[float], Optional[float], Optional[float]]
+
+
+class RevenueRollupRepository:
+    """
+    Repository of the revenue rollups: lines, quantity, revenue and cost of the invoice lines per product and
+    per person, by day and by month of their invoice date.
+
+    Rollup rows are only ever incremented, with `INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x`, so
+    concurrent writers never lose an update; rows are written in key order, so they lock them in the same order.
+
+    Attributes:
+        db (Session): The database session.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        add_lines(self, lines: Iterable[RollupLine], sign: int = 1): Adds or, with sign -1, removes invoice lines.
+        rebuild_period(self, start: Optional[date], end: Optional[date]): Rebuilds the rollups of a date range.
+        invoice_date_range(self) -> Tuple[Optional[date], Optional[date]]: Returns the first and last invoice date.
+        get_series(self, dimension: str, grain: str, key_id: int = None, start_date: date = None,
+                   end_date: date = None) -> List[dict]: Returns the totals of every period in a range.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the RevenueRollupRepository with a database session.
+
+        Args:
+            db (Session): The database session.
+        """
+        self.db = db
+
+    def _accumulating_insert(self, rows_or_select, columns: List[str] = None):
+        table = RevenueRollup.__table__
+        insert = postgresql.insert if self.db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        statement = (insert(table).from_select(columns, rows_or_select) if columns is not None
+                     else insert(table).values(rows_or_select))
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.dimension, table.c.grain, table.c.key_id, table.c.period],
+            set_={name: table.c[name] + statement.excluded[name] for name in MEASURES})
+
+    def add_lines(self, lines: Iterable[RollupLine], sign: int = 1):
+        """
+        Adds invoice lines to the rollups in the current transaction, without committing. Lines without an
+        invoice date are ignored.
+
+        Args:
+            lines (Iterable[RollupLine]): The lines.
+            sign (int): 1 to add the lines, -1 to remove lines added before.
+        """
+        totals: Dict[tuple, List[float]] = {}
+        for day, product_id, person_id, quantity, unit_price, unit_cost in lines:
+            if day is None:
+                continue
+            quantity = quantity or 0.0
+            values = (sign, sign * quantity, sign * quantity * (unit_price or 0.0), sign * quantity * (unit_cost or 0.0))
+            for dimension, key_id in (("product", product_id), ("person", person_id)):
+                if key_id is None:
+                    continue
+                for grain, period in (("day", day), ("month", day.replace(day=1))):
+                    total = totals.setdefault((dimension, grain, key_id, period), [0, 0.0, 0.0, 0.0])
+                    for index, value in enumerate(values):
+                        total[index] += value
+        if not totals:
+            return
+        rows = [{"dimension": dimension, "grain": grain, "key_id": key_id, "period": period,
+                 **dict(zip(MEASURES, total))}
+                for (dimension, grain, key_id, period), total in sorted(totals.items())]
+        self.db.execute(self._accumulating_insert(rows))
+
+    def rebuild_period(self, start: Optional[date], end: Optional[date]):
+        """
+        Replaces the rollups of the periods in [start, end) with the totals of the invoice lines dated in that
+        range, aggregated by the database with one `INSERT ... SELECT`, without committing. The bounds must be
+        first days of months, so month rollups are rebuilt whole.
+
+        Args:
+            start (Optional[date]): First date, None for no lower bound.
+            end (Optional[date]): Date after the last one, None for no upper bound.
+        """
+        if self.db.get_bind().dialect.name == "postgresql":
+            month = cast(func.date_trunc("month", InvoiceHeader.date), Date)
+        else:
+            month = func.date(InvoiceHeader.date, "start of month")
+        stale = self.db.query(RevenueRollup)
+        dated = [InvoiceHeader.date.isnot(None)]
+        if start is not None:
+            stale = stale.filter(RevenueRollup.period >= start)
+            dated.append(InvoiceHeader.date >= start)
+        if end is not None:
+            stale = stale.filter(RevenueRollup.period < end)
+            dated.append(InvoiceHeader.date < end)
+        stale.delete(synchronize_session=False)
+
+        quantity = func.coalesce(InvoiceDetail.quantity, 0.0)
+        parts = []
+        for dimension, key in (("product", InvoiceDetail.product_id), ("person", InvoiceHeader.person_id)):
+            for grain, period in (("day", InvoiceHeader.date), ("month", month)):
+                parts.append(
+                    select(literal(dimension).label("dimension"), literal(grain).label("grain"), key.label("key_id"),
+                           period.label("period"), func.count().label("lines"), func.sum(quantity).label("quantity"),
+                           func.sum(quantity * func.coalesce(InvoiceDetail.unit_price, 0.0)).label("revenue"),
+                           func.sum(quantity * func.coalesce(InvoiceDetail.unit_cost, 0.0)).label("cost"))
+                    .select_from(InvoiceDetail)
+                    .join(InvoiceHeader, InvoiceHeader.id == InvoiceDetail.invoice_header_id)
+                    .where(key.isnot(None), *dated)
+                    .group_by(key, period))
+        totals = union_all(*parts).subquery()
+        # SQLite needs a WHERE clause to tell the ON CONFLICT of an upsert from a join constraint.
+        source = (select(*totals.c).where(true())
+                  .order_by(totals.c.dimension, totals.c.grain, totals.c.key_id, totals.c.period))
+        self.db.execute(self._accumulating_insert(source, [column.name for column in totals.c]))
+
+    def invoice_date_range(self) -> Tuple[Optional[date], Optional[date]]:
+        """
+        Returns the first and last invoice date, (None, None) without dated invoices.
+        """
+        first, last = self.db.query(func.min(InvoiceHeader.date), func.max(InvoiceHeader.date)).one()
+        return first, last
+
+    def get_series(self, dimension: str, grain: str, key_id: Optional[int] = None,
+                   start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[dict]:
+        """
+        Returns the totals of every period with invoice lines in a date range, for one product or person or,
+        without `key_id`, for all of them.
+
+        Args:
+            dimension (str): 'product' or 'person'.
+            grain (str): 'day' or 'month'.
+            key_id (int): The product or person id, or None for every product or person.
+            start_date (date): First date included; the month containing it at month grain. None for no bound.
+            end_date (date): Last date included, or None for no bound.
+
+        Returns:
+            List[dict]: Period, lines, quantity, revenue and cost of every period, in period order.
+        """
+        query = (self.db.query(RevenueRollup.period, *(func.sum(getattr(RevenueRollup, name)).label(name)
+                                                       for name in MEASURES))
+                 .filter(RevenueRollup.dimension == dimension, RevenueRollup.grain == grain,
+                         RevenueRollup.lines != 0))
+        if key_id is not None:
+            query = query.filter(RevenueRollup.key_id == key_id)
+        if start_date is not None:
+            query = query.filter(RevenueRollup.period >= (start_date.replace(day=1) if grain == "month" else start_date))
+        if end_date is not None:
+            query = query.filter(RevenueRollup.period <= end_date)
+        rows = query.group_by(RevenueRollup.period).order_by(RevenueRollup.period).all()
+        return [{"period": row.period, "lines": int(row.lines), "quantity": float(row.quantity),
+                 "revenue": float(row.revenue), "cost": float(row.cost)} for row in rows]
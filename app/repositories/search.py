@@ -0,0 +1,127 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, and_, cast, func, literal, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+# Text searched in every table, as SQL. The expression indexes created by the migrations are built on
+# these exact expressions, which is what lets PostgreSQL use them.
+SEARCH_DOCUMENTS = {
+    "products": "coalesce(description, '') || ' ' || coalesce(unit_of_measure, '')",
+    "person": "coalesce(name, '') || ' ' || coalesce(surname, '') || ' ' || coalesce(document, '')",
+}
+
+TERM = re.compile(r"\w+")
+MAX_TERMS = 8
+
+# Scores are ts_rank_cd / word_similarity values scaled to integers, so keyset positions compare exactly.
+SCORE_SCALE = 1000000
+
+SearchKey = Tuple[int, int]
+
+_trigram_available: Dict[str, bool] = {}
+
+
+def search_terms(query: str) -> List[str]:
+    """
+    Splits a search query into lowercase words, dropping punctuation.
+    """
+    return [term.lower() for term in TERM.findall(query)][:MAX_TERMS]
+
+
+def trigram_available(db: Session) -> bool:
+    """
+    Returns whether the pg_trgm extension, and so the typo-tolerant matching, is installed in a database.
+    """
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _trigram_available:
+        _trigram_available[key] = db.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+    return _trigram_available[key]
+
+
+class SearchRepository:
+    """
+    Repository ranking rows of a table against a text query.
+
+    On PostgreSQL, every query word is matched as a prefix (`milk & choc:*`-style) against a `tsvector` of the
+    searched columns, through a GIN expression index; when pg_trgm is installed, rows whose words are similar
+    to the query (`<%`, word similarity) match as well, through a trigram GIN index, which tolerates typos.
+    Matches are ordered by the best of the two scores, then by id, and paged by keyset on that order.
+
+    Ranking costs in proportion to the rows matched, so only the first `settings.SEARCH_MAX_CANDIDATES` matches
+    the indexes return are ranked: a query matching more rows, such as one or two typed letters, returns good
+    matches rather than the best ones, until more is typed. The candidates are collected in a `MATERIALIZED`
+    CTE, so the planner cannot trade the index scan for a walk of the table in id order. Their order is the
+    one of the index scan, not a sort key: when a query matches more rows than the cap, pages fetched while
+    matching rows change may rank different candidates, and the cursor does not guarantee a consistent walk.
+
+    Other databases match every word as a case-insensitive substring, unranked, ordered by id.
+
+    Attributes:
+        db (Session): The database session.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        search(self, model, query: str, limit: int, after: Optional[SearchKey]) -> List[Tuple[object, SearchKey]]:
+            Returns the rows matching a query after a keyset position, with their positions.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the SearchRepository with a database session.
+
+        Args:
+            db (Session): The database session.
+        """
+        self.db = db
+
+    def _score_and_match(self, document, terms: List[str]):
+        if self.db.get_bind().dialect.name != "postgresql":
+            lowered = func.lower(document)
+            return literal(0, Integer), and_(*[lowered.contains(term, autoescape=True) for term in terms])
+
+        vector = func.to_tsvector(literal_column("'simple'::regconfig"), document)
+        tsquery = func.to_tsquery(literal_column("'simple'::regconfig"), " & ".join(f"{term}:*" for term in terms))
+        score, match = func.ts_rank_cd(vector, tsquery), vector.op("@@")(tsquery)
+        if trigram_available(self.db):
+            phrase = " ".join(terms)
+            score = func.greatest(score, func.word_similarity(phrase, document))
+            match = or_(match, literal(phrase).op("<%")(document))
+        return cast(score * SCORE_SCALE, Integer), match
+
+    def search(self, model, query: str, limit: int,
+               after: Optional[SearchKey] = None) -> List[Tuple[object, SearchKey]]:
+        """
+        Returns the rows of a model matching a query, best first.
+
+        Args:
+            model: The model, one of the tables of SEARCH_DOCUMENTS.
+            query (str): The text typed by the user.
+            limit (int): Maximum number of rows returned.
+            after (Optional[SearchKey]): Position of the last row of the previous page, if any.
+
+        Returns:
+            List[Tuple[object, SearchKey]]: The rows with their keyset positions.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        document = literal_column(f"({SEARCH_DOCUMENTS[model.__tablename__]})")
+        score, match = self._score_and_match(document, terms)
+        # Candidates are ranked as the index scan returns them, then only the page is joined back to the table.
+        candidates = (select(model.id.label("id"), score.label("score")).where(match)
+                      .limit(settings.SEARCH_MAX_CANDIDATES).cte("candidates"))
+        if self.db.get_bind().dialect.name == "postgresql":
+            candidates = candidates.prefix_with("MATERIALIZED")
+        page = select(candidates.c.id, candidates.c.score)
+        if after is not None:
+            page = page.where(or_(candidates.c.score < after[0],
+                                  and_(candidates.c.score == after[0], candidates.c.id > after[1])))
+        page = page.order_by(candidates.c.score.desc(), candidates.c.id).limit(limit).subquery()
+        rows = (self.db.query(model, page.c.score).join(page, model.id == page.c.id)
+                .order_by(page.c.score.desc(), page.c.id).all())
+        return [(row, (score_value, row.id)) for row, score_value in rows]
@@ -0,0 +1,54 @@
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.sketch_snapshot import SketchSnapshot
+
+
+class SketchSnapshotRepository:
+    """
+    Repository of the snapshots of in-memory sketches, one row per sketch name.
+
+    Attributes:
+        db (Session): The database session.
+
+    Methods:
+        __init__(self, db: Session): Initializes the repository with a database session.
+        save(self, name: str, state: dict): Replaces the snapshot of a sketch.
+        load(self, name: str) -> Optional[dict]: Returns the snapshot of a sketch.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Initializes the SketchSnapshotRepository with a database session.
+
+        Args:
+            db (Session): The database session.
+        """
+        self.db = db
+
+    def save(self, name: str, state: dict):
+        """
+        Replaces the snapshot of a sketch.
+
+        Args:
+            name (str): The sketch name.
+            state (dict): JSON-serializable state of the sketch.
+        """
+        self.db.merge(SketchSnapshot(name=name, state=json.dumps(state), saved_at=datetime.utcnow()))
+        self.db.commit()
+
+    def load(self, name: str) -> Optional[dict]:
+        """
+        Returns the snapshot of a sketch.
+
+        Args:
+            name (str): The sketch name.
+
+        Returns:
+            Optional[dict]: The saved state, or None if the sketch was never saved.
+        """
+        snapshot = self.db.get(SketchSnapshot, name)
+        return json.loads(snapshot.state) if snapshot is not None else None
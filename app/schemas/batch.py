@@ -0,0 +1,30 @@
+from typing import Any, Dict, List, Literal, Optional, Union
+
+from pydantic import BaseModel, Field
+
+
+class BatchOperation(BaseModel):
+    entity: Literal["person", "product", "invoice", "invoice_detail"]
+    op: Literal["create", "get", "update", "delete", "upsert"]
+    id: Optional[Union[int, str]] = Field(None, description="Id of the target row, or '$<ref>' of an earlier operation")
+    data: Dict[str, Any] = Field(default_factory=dict,
+                                 description="Body of the operation; '$<ref>' values are replaced by the id it produced")
+    ref: Optional[str] = Field(None, pattern=r"^\w+$", description="Name later operations use to refer to this one")
+
+
+class BatchRequest(BaseModel):
+    mode: Literal["atomic", "continue"] = Field("atomic", description="'atomic' commits all operations or none, "
+                                                                       "'continue' commits every operation that succeeds")
+    operations: List[BatchOperation] = Field(min_length=1)
+
+
+class BatchResult(BaseModel):
+    status: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchResult]
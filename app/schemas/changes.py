@@ -0,0 +1,16 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class Change(BaseModel):
+    entity: str
+    id: int
+    op: str
+    data: Optional[Dict[str, Any]] = None
+
+
+class ChangePage(BaseModel):
+    changes: List[Change]
+    watermark: str
+    has_more: bool
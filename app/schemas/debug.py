@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Any, List, Optional
+
+from pydantic import BaseModel
+
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    started_at: datetime
+    status_code: Optional[int] = None
+    duration_ms: float
+    endpoint_ms: float
+    sql_ms: float
+    statements: int
+
+
+class SlowQueryTemplate(BaseModel):
+    template: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    parameter_shape: str
+    callers: List[str]
+    last_seen: float
+    plan: Optional[Any] = None
+
+
+class SessionStats(BaseModel):
+    requests: int
+    sessions_opened: int
+    mean_session_ms: float
+    max_session_ms: float
+    mean_connection_ms: float
+    max_connection_ms: float
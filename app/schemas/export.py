@@ -0,0 +1,10 @@
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+
+class ExportSummary(BaseModel):
+    rows: int
+    deletes: int
+    files: List[str]
+    watermarks: Dict[str, List[int]]
@@ -24,6 +24,8 @@ class InvoiceDetailCreate(InvoiceDetailBase):
 
 class InvoiceDetail(InvoiceDetailBase):
     id: int
+    unit_price: Optional[float] = None
+    unit_cost: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,42 @@
+from datetime import date, datetime
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobCreate(BaseModel):
+    kind: str = Field(description="One of 'export.invoice_lines', 'invoices.render', 'reports.margin' or "
+                                  "'reports.rollups'")
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ExportJobParams(BaseModel):
+    full: bool = False
+
+
+class RenderJobParams(BaseModel):
+    format: Literal["pdf", "html"] = "pdf"
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+
+class RollupJobParams(BaseModel):
+    workers: Optional[int] = Field(None, ge=1)
+    chunk_size: Optional[int] = Field(None, ge=1)
+
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    params: Dict[str, Any]
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    progress: float
+    message: Optional[str] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    cancel_requested: bool
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    artifact_url: Optional[str] = None
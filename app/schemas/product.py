@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ProductBase(BaseModel):
@@ -8,6 +8,7 @@ class ProductBase(BaseModel):
     price: float
     cost: float
     unit_of_measure: str
+    sku: Optional[str] = None
 
 
 class ProductCreate(ProductBase):
@@ -19,6 +20,7 @@ class ProductUpdate(BaseModel):
     price: Optional[float] = None
     cost: Optional[float] = None
     unit_of_measure: Optional[str] = None
+    sku: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -28,4 +30,26 @@ class Product(ProductBase):
     id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PriceListItem(BaseModel):
+    sku: str = Field(min_length=1)
+    price: float = Field(ge=0)
+    cost: float = Field(ge=0)
+    unit_of_measure: str
+    description: Optional[str] = Field(None, description="Required for products not in the catalog yet")
+
+
+class PriceListOutcome(BaseModel):
+    sku: str
+    status: Literal["created", "updated", "unchanged", "skipped"]
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class PriceListResult(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    skipped: int
+    items: List[PriceListOutcome]
@@ -0,0 +1,15 @@
+from datetime import datetime
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class ProductImage(BaseModel):
+    id: int
+    product_id: int
+    digest: str
+    content_type: str
+    size: int
+    created_at: datetime
+    url: str
+    thumbnails: Dict[int, str]
@@ -0,0 +1,60 @@
+from datetime import date, datetime
+from typing import Annotated, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+# A product id as the database stores it: a positive 32-bit integer.
+ProductId = Annotated[int, Field(gt=0, le=2**31 - 1)]
+
+
+class MarginReportRequest(BaseModel):
+    group_by: Literal["product", "person", "period"] = "product"
+    period: Literal["day", "month", "quarter"] = "month"
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    price_overrides: Dict[ProductId, float] = Field(default_factory=dict, description="Unit price per product id")
+    cost_overrides: Dict[ProductId, float] = Field(default_factory=dict, description="Unit cost per product id")
+
+
+class MarginReportRow(BaseModel):
+    key: str
+    lines: int
+    quantity: float
+    revenue: float
+    cost: float
+    margin: float
+
+
+class MarginReport(BaseModel):
+    group_by: str
+    rows: List[MarginReportRow]
+
+
+class LiveTopProduct(BaseModel):
+    product_id: int
+    description: Optional[str] = None
+    value: float = Field(description="Estimated quantity or revenue, never below the true value")
+    error: float = Field(description="Maximum overestimation of the value")
+
+
+class LiveTopProducts(BaseModel):
+    window: str
+    metric: str
+    since: datetime
+    items: List[LiveTopProduct]
+
+
+class RevenuePoint(BaseModel):
+    period: date
+    lines: int
+    quantity: float
+    revenue: float
+    cost: float
+    margin: float
+
+
+class RevenueSeries(BaseModel):
+    dimension: str
+    grain: str
+    key_id: Optional[int] = None
+    points: List[RevenuePoint]
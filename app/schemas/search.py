@@ -0,0 +1,16 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from app.schemas.person import Person
+from app.schemas.product import Product
+
+
+class ProductSearchPage(BaseModel):
+    items: List[Product]
+    next_cursor: Optional[str] = None
+
+
+class PersonSearchPage(BaseModel):
+    items: List[Person]
+    next_cursor: Optional[str] = None
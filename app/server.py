@@ -0,0 +1,135 @@
+"""
+Production entry point of the application: `python -m app.server`.
+
+Runs the application under gunicorn with uvicorn workers:
+
+- the number of workers follows the CPU quota of the container (cgroup v2 or v1), falling back to the
+  CPUs the process may run on, unless `settings.SERVER_WORKERS` sets it;
+- workers use uvloop and httptools when they are installed, asyncio and h11 otherwise;
+- the application is imported once in the master before forking, so workers share its pages copy-on-write;
+- the initial workers start `settings.SERVER_WORKER_STAGGER` seconds apart, so their database
+  initialization does not open every pool connection at the same moment;
+- on SIGTERM a worker stops accepting connections, finishes its in-flight requests within
+  `settings.SERVER_GRACEFUL_TIMEOUT` seconds, then disposes of its connection pools.
+
+For development, `uvicorn app.main:app --reload` is still the simplest way to run it.
+"""
+
+import importlib.util
+import math
+import os
+import time
+
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+
+from app.core.config import settings
+
+
+def cpu_quota() -> float:
+    """
+    Returns the number of CPUs the process may use: the cgroup CPU quota when one is set, otherwise the
+    number of CPUs in its affinity mask.
+
+    Returns:
+        float: Available CPUs, possibly fractional under a quota.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as quota_file, \
+                open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as period_file:
+            quota, period = int(quota_file.read()), int(period_file.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return float(len(os.sched_getaffinity(0)))
+    return float(os.cpu_count() or 1)
+
+
+def worker_count() -> int:
+    """
+    Returns the number of worker processes: `settings.SERVER_WORKERS` when set, otherwise one per
+    available CPU, rounded up.
+    """
+    if settings.SERVER_WORKERS > 0:
+        return settings.SERVER_WORKERS
+    return max(1, math.ceil(cpu_quota()))
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class Worker(UvicornWorker):
+    """
+    Uvicorn worker using uvloop and httptools when they are installed.
+    """
+
+    CONFIG_KWARGS = {"loop": "uvloop" if _installed("uvloop") else "asyncio",
+                     "http": "httptools" if _installed("httptools") else "h11",
+                     "lifespan": "on"}
+
+
+def post_fork(server, worker):
+    """
+    Gunicorn hook run in every new worker: drops the connection pools inherited from the master and
+    delays the startup of the initial workers according to their rank.
+    """
+    from app.db.postgresql import engine
+    from app.db.sharding import shard_router
+
+    engine.dispose()
+    shard_router.dispose()
+    if worker.age <= server.num_workers:
+        time.sleep((worker.age - 1) * settings.SERVER_WORKER_STAGGER)
+
+
+class Server(BaseApplication):
+    """
+    Gunicorn application serving `app.main:app`, preloaded in the master process.
+
+    Attributes:
+        options (dict): Gunicorn settings.
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.core.logger import logger
+
+        started = time.perf_counter()
+        from app.main import app, startup_timings
+
+        logger.info("Preloaded the application in %.1f ms", (time.perf_counter() - started) * 1000,
+                    extra={**startup_timings, "workers": self.cfg.workers,
+                           "loop": Worker.CONFIG_KWARGS["loop"], "http": Worker.CONFIG_KWARGS["http"]})
+        return app
+
+
+def main():
+    Server({
+        "bind": f"{settings.SERVER_HOST}:{settings.SERVER_PORT}",
+        "workers": worker_count(),
+        "worker_class": Worker,
+        "preload_app": True,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+        "post_fork": post_fork,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SavepointSession
+from app.db.sharding import shard_router
+from app.repositories.existence import find_missing
+from app.repositories.invoice_detail import InvoiceDetailRepository
+from app.repositories.invoice_header import InvoiceHeaderRepository
+from app.repositories.person import PersonRepository
+from app.repositories.product import ProductRepository
+from app.schemas.batch import BatchOperation, BatchRequest
+from app.schemas.invoice_detail import InvoiceDetail, InvoiceDetailCreate
+from app.schemas.invoice_header import InvoiceHeader, InvoiceHeaderCreate
+from app.schemas.person import Person, PersonCreate, PersonUpdate
+from app.schemas.product import Product, ProductCreate, ProductUpdate
+
+# A handler receives the session, the target id and the validated body, and returns the status and the row.
+Handler = Callable[[Session, Optional[int], Optional[BaseModel]], Tuple[int, Any]]
+
+
+def _found(row, entity: str):
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"{entity} not found")
+    return row
+
+
+def _deleted(done, entity: str) -> Tuple[int, Any]:
+    if done is False:
+        raise HTTPException(status_code=404, detail=f"{entity} not found")
+    return 204, None
+
+
+def _upsert_person(db: Session, id: Optional[int], body: PersonCreate) -> Tuple[int, Any]:
+    person, created = PersonRepository(db).upsert_person_by_document(body)
+    return (201 if created else 200), person
+
+
+# Body schema, handler and response schema of every operation. Reads go to the repositories rather than to
+# the cached services: a row written by the batch must not be cached before the batch commits.
+OPERATIONS: Dict[Tuple[str, str], Tuple[Optional[type], Handler, Optional[type]]] = {
+    ("person", "create"): (
+        PersonCreate, lambda db, id, body: (201, PersonRepository(db).create_person(body)), None),
+    ("person", "upsert"): (PersonCreate, _upsert_person, None),
+    ("person", "get"): (
+        None, lambda db, id, body: (200, _found(PersonRepository(db).get_person_by_id(id), "Person")), Person),
+    ("person", "update"): (
+        PersonUpdate, lambda db, id, body: (200, PersonRepository(db).update_person(id, body)), None),
+    ("person", "delete"): (
+        None, lambda db, id, body: _deleted(PersonRepository(db).delete_person(id), "Person"), None),
+    ("product", "create"): (
+        ProductCreate, lambda db, id, body: (201, ProductRepository(db).create_product(body)), None),
+    ("product", "get"): (
+        None, lambda db, id, body: (200, ProductRepository(db).get_product_by_id(id)), Product),
+    ("product", "update"): (
+        ProductUpdate, lambda db, id, body: (200, ProductRepository(db).update_product(id, body)), None),
+    ("product", "delete"): (
+        None, lambda db, id, body: _deleted(ProductRepository(db).delete_product(id), "Product"), None),
+    ("invoice", "create"): (
+        InvoiceHeaderCreate, lambda db, id, body: (201, InvoiceHeaderRepository(db).create_invoice_header(body)), None),
+    ("invoice", "get"): (
+        None, lambda db, id, body: (200, _found(InvoiceHeaderRepository(db).get_invoice_header(id), "InvoiceHeader")),
+        InvoiceHeader),
+    ("invoice", "delete"): (
+        None, lambda db, id, body: _deleted(InvoiceHeaderRepository(db).delete_invoice_header(id), "InvoiceHeader"),
+        None),
+    ("invoice_detail", "create"): (
+        InvoiceDetailCreate, lambda db, id, body: (201, InvoiceDetailRepository(db).create_invoice_detail(body)), None),
+    ("invoice_detail", "get"): (
+        None, lambda db, id, body: (200, _found(InvoiceDetailRepository(db).get_invoice_detail(id), "InvoiceDetail")),
+        InvoiceDetail),
+    ("invoice_detail", "delete"): (
+        None, lambda db, id, body: _deleted(InvoiceDetailRepository(db).delete_invoice_detail(id), "InvoiceDetail"),
+        None),
+}
+
+NEEDS_ID = {"get", "update", "delete"}
+
+# Referenced entity of the foreign keys checked by the create operations.
+REFERENCES = {("invoice", "person_id"): "person", ("invoice_detail", "product_id"): "product"}
+
+
+class UnresolvedReference(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+
+
+class BatchService:
+    """
+    Service running many person, product, invoice and invoice detail operations in one transaction.
+
+    Operations run in order, each in a savepoint of the request's transaction, through the same repositories
+    as the single-operation endpoints; their commits only flush, so one commit ends the whole batch. An
+    operation may refer to the id produced by an earlier one as '$<ref>' (its `ref`, or its index) in its
+    `id` or in a value of its `data`.
+
+    In 'atomic' mode the first failure rolls everything back and the remaining operations are not run
+    (status 424). In 'continue' mode a failed operation is rolled back to its savepoint, operations
+    referring to it fail with 424, and the others are committed.
+
+    Attributes:
+        db_session (Session): Database session owning the transaction of the batch.
+
+    Methods:
+        __init__(self, db_session: Session): Initializes the service.
+        run(self, request: BatchRequest) -> dict: Runs a batch and returns the result of every operation.
+    """
+
+    def __init__(self, db_session: Session):
+        """
+        Initializes the BatchService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session for database transactions.
+        """
+        self.db_session = db_session
+
+    @staticmethod
+    def _resolve(value, ids: Dict[str, Optional[int]]):
+        if not isinstance(value, str) or not value.startswith("$"):
+            return value
+        name = value[1:]
+        if name not in ids:
+            raise UnresolvedReference(422, f"Unknown reference {value}: operations may only refer to earlier ones")
+        if ids[name] is None:
+            raise UnresolvedReference(424, f"Referenced operation {value} failed")
+        return ids[name]
+
+    def _run_operation(self, db: SavepointSession, operation: BatchOperation,
+                       ids: Dict[str, Optional[int]]) -> dict:
+        if (operation.entity, operation.op) not in OPERATIONS:
+            return {"status": 422, "error": f"Unsupported operation {operation.op!r} on {operation.entity!r}"}
+        body_schema, handler, response_schema = OPERATIONS[(operation.entity, operation.op)]
+        try:
+            id = self._resolve(operation.id, ids)
+            data = {key: self._resolve(value, ids) for key, value in operation.data.items()}
+        except UnresolvedReference as error:
+            return {"status": error.status, "error": str(error)}
+        if operation.op in NEEDS_ID and not isinstance(id, int):
+            return {"status": 422, "error": f"Operation {operation.op!r} needs an integer id or a reference"}
+        try:
+            body = body_schema.model_validate(data) if body_schema is not None else None
+        except ValidationError as error:
+            first = error.errors()[0]
+            return {"status": 422, "error": f"{'.'.join(map(str, first['loc']))}: {first['msg']}"}
+
+        db.begin_step()
+        kept = False
+        try:
+            status, row = handler(db, id, body)
+            kept = True
+        except HTTPException as error:
+            return {"status": error.status_code, "error": str(error.detail)}
+        except IntegrityError:
+            return {"status": 409, "error": "Conflicts with existing data"}
+        finally:
+            db.end_step(kept)
+        result = {"status": status, "id": row.id if row is not None else id}
+        if response_schema is not None:
+            result["data"] = response_schema.model_validate(row).model_dump(mode="json")
+        return result
+
+    def _confirm_references(self, operations: List[BatchOperation]):
+        # One query for the literal ids the existence index does not know yet, before anything is written,
+        # so every operation then checks its references in memory.
+        referenced: Dict[str, set] = {}
+        for operation in operations:
+            if operation.op != "create":
+                continue
+            for (entity, key), target in REFERENCES.items():
+                value = operation.data.get(key)
+                if operation.entity == entity and isinstance(value, int):
+                    referenced.setdefault(target, set()).add(value)
+        for target, ids in referenced.items():
+            find_missing(self.db_session, target, ids)
+
+    def run(self, request: BatchRequest) -> dict:
+        """
+        Runs the operations of a batch in one transaction.
+
+        Args:
+            request (BatchRequest): The mode and the operations.
+
+        Returns:
+            dict: Whether the batch was committed and, per operation, its status, the id of its row, the error
+                  of a failed one and the row read by a `get`.
+
+        Raises:
+            ValueError: If the batch has more than `settings.BATCH_MAX_OPERATIONS` operations.
+            HTTPException: If the invoices are sharded, which rules out a single transaction.
+        """
+        if len(request.operations) > settings.BATCH_MAX_OPERATIONS:
+            raise ValueError(f"A batch holds at most {settings.BATCH_MAX_OPERATIONS} operations")
+        if shard_router.enabled:
+            raise HTTPException(status_code=501, detail="Batches need the invoices in the main database")
+
+        self._confirm_references(request.operations)
+        db = SavepointSession(self.db_session)
+        ids: Dict[str, Optional[int]] = {}
+        results: List[dict] = []
+        failed = False
+        for index, operation in enumerate(request.operations):
+            if failed and request.mode == "atomic":
+                result = {"status": 424, "error": "Not run: an earlier operation failed"}
+            else:
+                result = self._run_operation(db, operation, ids)
+            succeeded = result["status"] < 400
+            failed = failed or not succeeded
+            ids[str(index)] = result.get("id") if succeeded else None
+            if operation.ref is not None:
+                ids[operation.ref] = ids[str(index)]
+            results.append(result)
+
+        committed = not (failed and request.mode == "atomic")
+        if committed:
+            self.db_session.commit()
+        else:
+            self.db_session.rollback()
+        return {"committed": committed, "results": results}
@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.db.sharding import shard_router
+from app.models import InvoiceDetail, InvoiceHeader, Person, Product
+from app.models.change import ChangeTombstone
+from app.repositories.changes import ChangeFeedRepository, ChangeKey
+
+REFERENCE_MODELS = (Person, Product)
+INVOICE_MODELS = (InvoiceHeader, InvoiceDetail)
+
+START: ChangeKey = (0, 0, 0)
+
+
+def encode_watermark(positions: Dict[str, ChangeKey]) -> str:
+    """
+    Encodes the feed position of every source database into the opaque watermark handed to clients.
+    """
+    return base64.urlsafe_b64encode(json.dumps(positions, separators=(",", ":")).encode()).decode()
+
+
+def decode_watermark(watermark: str) -> Dict[str, ChangeKey]:
+    """
+    Decodes a watermark produced by `encode_watermark`.
+
+    Raises:
+        ValueError: If the watermark is malformed.
+    """
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(watermark.encode()))
+        return {source: (int(seq), int(rank), int(id)) for source, (seq, rank, id) in positions.items()}
+    except (binascii.Error, UnicodeError, AttributeError, TypeError, ValueError) as error:
+        raise ValueError("Malformed watermark") from error
+
+
+def serialize_change(row) -> dict:
+    """
+    Returns the feed entry of a changed row or a tombstone.
+    """
+    if isinstance(row, ChangeTombstone):
+        return {"entity": row.entity, "id": row.entity_id, "op": "delete", "data": None}
+    data = {column.key: getattr(row, column.key) for column in row.__mapper__.column_attrs
+            if column.key != "change_seq"}
+    return {"entity": row.__change_entity__, "id": row.id, "op": "upsert", "data": data}
+
+
+class ChangeFeedService:
+    """
+    Service returning the persons, products and invoices changed since a client-held watermark.
+
+    A sync costs in proportion to the changes since the previous one: each page reads at most `limit` rows
+    from the change sequence index of every table. Deleted rows are reported as `delete` entries. Clients
+    repeat the call with the returned watermark until `has_more` is false, and keep the last watermark for
+    their next sync; a missing watermark starts from the beginning (a full initial sync).
+
+    The watermark holds one position per source database (the main database, and every shard when invoices
+    are sharded), since change sequences are only ordered within a database.
+
+    Attributes:
+        db_session (Session): Database session on the main database.
+
+    Methods:
+        __init__(self, db_session: Session): Initializes the service with a database session.
+        get_changes(self, since: Optional[str], limit: int) -> dict: Returns the next page of changes.
+    """
+
+    def __init__(self, db_session: Session):
+        """
+        Initializes the ChangeFeedService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session on the main database.
+        """
+        self.db_session = db_session
+
+    def _read_source(self, db: Session, models: Sequence, position: ChangeKey,
+                     limit: int) -> Tuple[List[dict], ChangeKey, bool]:
+        repository = ChangeFeedRepository(db)
+        horizon = repository.horizon()
+        changes = repository.get_changes(models, position, limit + 1, horizon)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        if changes:
+            position = changes[-1][0]
+        if not has_more and horizon is not None and horizon > position[0]:
+            # Every change below the horizon was read: skip straight to it.
+            position = (horizon, 0, 0)
+        return [serialize_change(row) for _, row in changes], position, has_more
+
+    def get_changes(self, since: Optional[str] = None, limit: int = 500) -> dict:
+        """
+        Returns the changes after a watermark.
+
+        Args:
+            since (Optional[str]): Watermark returned by the previous call, None for a full sync.
+            limit (int): Maximum number of changes in the page.
+
+        Returns:
+            dict: The changes, the watermark to send next and whether more changes are pending.
+
+        Raises:
+            ValueError: If the watermark is malformed.
+        """
+        positions = decode_watermark(since) if since else {}
+        if shard_router.enabled:
+            sources = [("main", None, REFERENCE_MODELS)] + [(f"shard-{shard}", shard, INVOICE_MODELS)
+                                                            for shard in range(len(shard_router.urls))]
+        else:
+            sources = [("main", None, REFERENCE_MODELS + INVOICE_MODELS)]
+
+        changes, has_more = [], False
+        for source, shard, models in sources:
+            remaining = limit - len(changes)
+            if remaining <= 0:
+                has_more = True
+                break
+            position = positions.get(source, START)
+            if shard is None:
+                page, position, more = self._read_source(self.db_session, models, position, remaining)
+            else:
+                with shard_router.session_scope(shard) as db:
+                    page, position, more = self._read_source(db, models, position, remaining)
+            changes.extend(page)
+            positions[source] = position
+            has_more = has_more or more
+        return {"changes": changes, "watermark": encode_watermark(positions), "has_more": has_more}
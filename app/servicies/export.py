@@ -0,0 +1,218 @@
+"""
+Nightly export of invoice lines to the data warehouse as month-partitioned Parquet files.
+
+Run it as a job with `python -m app.servicies.export [--full]`, or through `POST /export/invoice-lines`.
+"""
+import fcntl
+import json
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.sharding import shard_router
+from app.repositories.changes import ChangeFeedRepository
+from app.repositories.export import ExportKey, ExportRepository
+
+INVOICE_LINES_SCHEMA = pa.schema([
+    ("detail_id", pa.int64()),
+    ("invoice_header_id", pa.int64()),
+    ("invoice_number", pa.int64()),
+    ("invoice_date", pa.date32()),
+    ("person_id", pa.int64()),
+    ("person_name", pa.string()),
+    ("person_surname", pa.string()),
+    ("person_document_type", pa.string()),
+    ("person_document", pa.string()),
+    ("product_id", pa.int64()),
+    ("product_description", pa.string()),
+    ("product_unit_of_measure", pa.string()),
+    ("quantity", pa.float64()),
+    ("unit_price", pa.float64()),
+    ("unit_cost", pa.float64()),
+    ("change_seq", pa.int64()),
+])
+
+DELETIONS_SCHEMA = pa.schema([
+    ("entity", pa.string()),
+    ("entity_id", pa.int64()),
+    ("change_seq", pa.int64()),
+])
+
+WATERMARK_FILE = "_watermark.json"
+
+LOCK_FILE = "_export.lock"
+
+
+class WarehouseExportService:
+    """
+    Service exporting invoice lines, joined with invoice, person and product attributes, to Parquet.
+
+    Files are written under `<EXPORT_DIRECTORY>/invoice_lines/month=YYYY-MM/`, one file per partition and run.
+    Rows are streamed from the database in record batches, so memory stays bounded by the batch size.
+    Exports are incremental: the (version, detail id) of the last exported line of every source database is
+    kept as a watermark and the next run only exports lines whose line, invoice, person or product changed
+    after it. On PostgreSQL a run stops at the snapshot xmin, like the change feed, so a change committing
+    late is exported by a later run instead of being skipped, and the watermark moves up to that horizon.
+    A changed line is exported again: readers keep, per `detail_id`, the row with the highest `change_seq`.
+
+    Deleted lines and invoices are written to `<EXPORT_DIRECTORY>/invoice_line_deletes/`, one file per run
+    and source database: readers drop the rows of a deleted `detail_id` ('invoice_detail') or
+    `invoice_header_id` ('invoice_header') whose `change_seq` is lower than the deletion's. Runs sharing a
+    directory take turns on a file lock.
+
+    Attributes:
+        db_session (Session): Database session on the main database.
+        directory (str): Root directory of the invoice lines dataset.
+        deletions_directory (str): Root directory of the deleted lines and invoices.
+        batch_size (int): Number of rows per record batch.
+
+    Methods:
+        __init__(self, db_session: Session, directory: str = None, batch_size: int = None): Initializes the service.
+        read_watermarks(self) -> Dict[str, ExportKey]: Returns the last exported line per source database.
+        export_invoice_lines(self, full: bool = False) -> dict: Runs an export and returns its summary.
+    """
+
+    def __init__(self, db_session: Session, directory: str = None, batch_size: int = None):
+        """
+        Initializes the WarehouseExportService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session on the main database.
+            directory (str): Export root directory, defaults to `settings.EXPORT_DIRECTORY`.
+            batch_size (int): Rows per record batch, defaults to `settings.EXPORT_BATCH_SIZE`.
+        """
+        self.db_session = db_session
+        self.directory = os.path.join(directory or settings.EXPORT_DIRECTORY, "invoice_lines")
+        self.deletions_directory = os.path.join(directory or settings.EXPORT_DIRECTORY, "invoice_line_deletes")
+        self.batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+
+    def read_watermarks(self) -> Dict[str, ExportKey]:
+        """
+        Returns the (version, detail id) of the last exported line of every source database. A watermark of
+        an earlier version, a bare detail id, counts as a line of version 0.
+
+        Returns:
+            Dict[str, ExportKey]: Watermark per source ('main' or 'shard-N').
+        """
+        path = os.path.join(self.directory, WATERMARK_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as watermark_file:
+            watermarks = json.load(watermark_file)
+        return {source: (0, position) if isinstance(position, int) else tuple(position)
+                for source, position in watermarks.items()}
+
+    def _write_watermarks(self, watermarks: Dict[str, ExportKey]):
+        path = os.path.join(self.directory, WATERMARK_FILE)
+        with open(path + ".tmp", "w") as watermark_file:
+            json.dump({source: list(position) for source, position in watermarks.items()}, watermark_file)
+        os.replace(path + ".tmp", path)
+
+    @contextmanager
+    def _lock(self):
+        with open(os.path.join(self.directory, LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _export_deletions(self, source: str, repository: ExportRepository, after: ExportKey, horizon: Optional[int],
+                          run_id: str, summary: dict):
+        writer = None
+        try:
+            for batch in repository.stream_deletions(after[0], self.batch_size, horizon):
+                table = pa.Table.from_pydict({name: [getattr(row, name) for row in batch]
+                                              for name in DELETIONS_SCHEMA.names}, schema=DELETIONS_SCHEMA)
+                if writer is None:
+                    os.makedirs(self.deletions_directory, exist_ok=True)
+                    path = os.path.join(self.deletions_directory, f"part-{run_id}-{source}.parquet")
+                    writer = pq.ParquetWriter(path, DELETIONS_SCHEMA, compression="zstd")
+                    summary["files"].append(path)
+                writer.write_table(table)
+                summary["deletes"] += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _export_source(self, source: str, db: Session, after: ExportKey, run_id: str, summary: dict) -> ExportKey:
+        repository = ExportRepository(db)
+        writers = {}
+        last = after
+        horizon = ChangeFeedRepository(db).horizon()
+        try:
+            for batch in repository.stream_invoice_lines(after, self.batch_size, horizon):
+                columns = {name: [getattr(row, name) for row in batch] for name in INVOICE_LINES_SCHEMA.names}
+                table = pa.Table.from_pydict(columns, schema=INVOICE_LINES_SCHEMA)
+                months = pc.fill_null(pc.strftime(table["invoice_date"], format="%Y-%m"), "unknown")
+                for month in pc.unique(months).to_pylist():
+                    if month not in writers:
+                        folder = os.path.join(self.directory, f"month={month}")
+                        os.makedirs(folder, exist_ok=True)
+                        path = os.path.join(folder, f"part-{run_id}-{source}.parquet")
+                        writers[month] = pq.ParquetWriter(path, INVOICE_LINES_SCHEMA, compression="zstd")
+                        summary["files"].append(path)
+                    writers[month].write_table(table.filter(pc.equal(months, month)))
+                summary["rows"] += table.num_rows
+                last = (batch[-1].change_seq, batch[-1].detail_id)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        self._export_deletions(source, repository, after, horizon, run_id, summary)
+        # Every change below the horizon is exported: the next run starts there even when no line moved.
+        return last if horizon is None else max(last, (horizon, 0))
+
+    def export_invoice_lines(self, full: bool = False) -> dict:
+        """
+        Exports the invoice lines changed since the last run (or all of them) to month-partitioned Parquet
+        files, and the lines and invoices deleted since then to a deletions file, then advances the watermarks.
+        Waits for a run already exporting to the same directory.
+
+        Args:
+            full (bool): Ignore the watermarks and export every line.
+
+        Returns:
+            dict: The number of rows and deletions exported, the files written and the new watermarks.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock():
+            watermarks = {} if full else self.read_watermarks()
+            # Runs are serialized by the lock, so two of them never share an id.
+            run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            summary = {"rows": 0, "deletes": 0, "files": []}
+
+            if shard_router.enabled:
+                for shard in range(len(shard_router.urls)):
+                    source = f"shard-{shard}"
+                    with shard_router.session_scope(shard) as db:
+                        watermarks[source] = self._export_source(source, db, watermarks.get(source, (0, 0)),
+                                                                 run_id, summary)
+            else:
+                watermarks["main"] = self._export_source("main", self.db_session, watermarks.get("main", (0, 0)),
+                                                         run_id, summary)
+
+            self._write_watermarks(watermarks)
+        logger.info("Exported %s invoice lines and %s deletions into %s files", summary["rows"], summary["deletes"],
+                    len(summary["files"]))
+        return {**summary, "watermarks": {source: list(position) for source, position in watermarks.items()}}
+
+
+if __name__ == "__main__":
+    from app.db.postgresql import SessionLocal
+    from app.core.logger import setup_logging
+
+    setup_logging()
+    session = SessionLocal()
+    try:
+        WarehouseExportService(session).export_invoice_lines(full="--full" in sys.argv[1:])
+    finally:
+        session.close()
@@ -1,7 +1,8 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from app.models.invoice_detail import InvoiceDetail
-from app.repositories.invoice_detail import InvoiceDetailRepository
+from app.db.sharding import shard_router
+from app.repositories.invoice_detail import InvoiceDetailRepository, ShardedInvoiceDetailRepository
 from app.schemas.invoice_detail import InvoiceDetailCreate  # InvoiceDetailUpdate
 
 
@@ -15,6 +16,7 @@ class InvoiceDetailService:
     Attributes:
         db_session (Session): Database session for executing transactions.
         repository (InvoiceDetailRepository): Repository handling the persistence operations of invoice detail.
+                                              A ShardedInvoiceDetailRepository when sharding is enabled.
 
     Methods:
         __init__(self, db_session: Session): Initializes the service with a database session.
@@ -32,7 +34,8 @@ class InvoiceDetailService:
                 db_session (Session): The SQLAlchemy session for interacting with the database.
             """
         self.db_session = db_session
-        self.repository = InvoiceDetailRepository(db_session)
+        self.repository = (ShardedInvoiceDetailRepository(shard_router) if shard_router.enabled
+                           else InvoiceDetailRepository(db_session))
 
     def create_invoice_detail(self, invoice_detail_create: InvoiceDetailCreate) -> InvoiceDetail:
         """
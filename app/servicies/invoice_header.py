@@ -1,6 +1,7 @@
 from typing import List, Optional
 
-from app.repositories.invoice_header import InvoiceHeaderRepository
+from app.db.sharding import shard_router
+from app.repositories.invoice_header import InvoiceHeaderRepository, ShardedInvoiceHeaderRepository
 from sqlalchemy.orm import Session
 
 from app.models.invoice_header import InvoiceHeader
@@ -18,6 +19,7 @@ class InvoiceHeaderService:
     Attributes:
         db_session (Session): Database session for executing transactions.
         repository (InvoiceHeaderRepository): Repository handling the persistence operations of invoice headers.
+                                              A ShardedInvoiceHeaderRepository when sharding is enabled.
 
     Methods:
         __init__(self, db_session: Session): Constructs an InvoiceHeaderService with the given database session.
@@ -34,7 +36,8 @@ class InvoiceHeaderService:
             db_session (Session): The SQLAlchemy session for database transactions.
         """
         self.db_session = db_session
-        self.repository = InvoiceHeaderRepository(db_session)
+        self.repository = (ShardedInvoiceHeaderRepository(shard_router) if shard_router.enabled
+                           else InvoiceHeaderRepository(db_session))
 
     def create_invoice_header(self, invoice_header_create: InvoiceHeaderCreate) -> InvoiceHeader:
         """
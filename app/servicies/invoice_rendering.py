@@ -0,0 +1,196 @@
+"""
+Rendering of printable invoices, one at a time or in bulk for statement runs.
+
+Run a bulk rendering with `python -m app.servicies.invoice_rendering --output <file.zip or directory>
+[--format pdf|html] [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--workers N]`.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.rendering import FORMATS, compile_templates, render_chunk, render_document
+from app.db.sharding import shard_router
+from app.repositories.invoice_document import InvoiceDocumentRepository
+
+
+class DocumentWriter:
+    """
+    Destination of a bulk rendering: a zip archive when the output ends with '.zip', a directory otherwise.
+    Documents are written as they are rendered, so memory does not grow with the size of the run.
+    """
+
+    def __init__(self, output: str, format: str):
+        self.output = output
+        if output.endswith(".zip"):
+            directory = os.path.dirname(output)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # PDF streams are already compressed; HTML compresses well.
+            compression = zipfile.ZIP_STORED if format == "pdf" else zipfile.ZIP_DEFLATED
+            self._archive = zipfile.ZipFile(output, "w", compression=compression)
+        else:
+            os.makedirs(output, exist_ok=True)
+            self._archive = None
+
+    def write(self, documents: List[Tuple[str, bytes]]):
+        for name, content in documents:
+            if self._archive is not None:
+                self._archive.writestr(name, content)
+            else:
+                with open(os.path.join(self.output, name), "wb") as file:
+                    file.write(content)
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+
+
+class InvoiceRenderingService:
+    """
+    Service rendering invoices to HTML or PDF.
+
+    Bulk runs stream invoices out of the database in chunks of `chunk_size`, each fetched with its customer,
+    lines and products in the same query, and hand every chunk to a pool of `workers` processes as one work
+    unit. The database read, the rendering and the writing of the output overlap, and at most two work units
+    per process are in flight, so memory stays bounded. Rendering is CPU-bound and shares nothing between
+    processes, so throughput grows with the number of workers until the database read becomes the bottleneck.
+
+    Attributes:
+        db_session (Session): Database session on the main database.
+        workers (int): Processes of the rendering pool.
+        chunk_size (int): Invoices per work unit.
+
+    Methods:
+        __init__(self, db_session: Session, workers: int = None, chunk_size: int = None): Initializes the service.
+        render_invoice(self, id: int, format: str = "pdf") -> Optional[bytes]: Renders one invoice.
+        render_batch(self, output: str, format: str = "pdf", start_date: date = None, end_date: date = None,
+                     progress: Callable[[int], None] = None) -> dict: Renders every invoice, or those dated within a range, into a zip archive or a directory.
+    """
+
+    def __init__(self, db_session: Session, workers: int = None, chunk_size: int = None):
+        """
+        Initializes the InvoiceRenderingService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session on the main database.
+            workers (int): Rendering processes, defaults to `settings.RENDER_WORKERS` or the number of CPUs.
+            chunk_size (int): Invoices per work unit, defaults to `settings.RENDER_CHUNK_SIZE`.
+        """
+        self.db_session = db_session
+        self.workers = workers or settings.RENDER_WORKERS or len(os.sched_getaffinity(0))
+        self.chunk_size = chunk_size or settings.RENDER_CHUNK_SIZE
+
+    def _sources(self):
+        if shard_router.enabled:
+            for shard in range(len(shard_router.urls)):
+                with shard_router.session_scope(shard) as db:
+                    yield db
+        else:
+            yield self.db_session
+
+    def render_invoice(self, id: int, format: str = "pdf") -> Optional[bytes]:
+        """
+        Renders one invoice in the calling process.
+
+        Args:
+            id (int): The invoice header id.
+            format (str): 'html' or 'pdf'.
+
+        Returns:
+            Optional[bytes]: The document, or None if the invoice does not exist.
+
+        Raises:
+            ValueError: If the format is not supported.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported document format {format!r}")
+        for db in self._sources():
+            document = InvoiceDocumentRepository(db).get_document(id)
+            if document is not None:
+                return render_document(document, format)
+        return None
+
+    def render_batch(self, output: str, format: str = "pdf", start_date: date = None, end_date: date = None,
+                     progress: Callable[[int], None] = None) -> dict:
+        """
+        Renders invoices in bulk on a process pool.
+
+        Args:
+            output (str): Zip archive ('.zip') or directory receiving one file per invoice.
+            format (str): 'html' or 'pdf'.
+            start_date (date): First invoice date included, if any.
+            end_date (date): Last invoice date included, if any.
+            progress (Callable[[int], None]): Called with the number of documents written after every work unit;
+                an exception it raises aborts the run.
+
+        Returns:
+            dict: The number of documents, the output, the elapsed seconds and the documents per second.
+
+        Raises:
+            ValueError: If the format is not supported.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported document format {format!r}")
+        started = time.perf_counter()
+        documents = 0
+        writer = DocumentWriter(output, format)
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=compile_templates)
+        try:
+            in_flight = deque()
+            for db in self._sources():
+                for chunk in InvoiceDocumentRepository(db).stream_documents(0, start_date, end_date, self.chunk_size):
+                    in_flight.append(pool.submit(render_chunk, chunk, format))
+                    if len(in_flight) >= 2 * self.workers:
+                        rendered = in_flight.popleft().result()
+                        writer.write(rendered)
+                        documents += len(rendered)
+                        if progress is not None:
+                            progress(documents)
+            while in_flight:
+                rendered = in_flight.popleft().result()
+                writer.write(rendered)
+                documents += len(rendered)
+                if progress is not None:
+                    progress(documents)
+        finally:
+            pool.shutdown(cancel_futures=True)
+            writer.close()
+
+        seconds = time.perf_counter() - started
+        summary = {"documents": documents, "format": format, "output": output, "workers": self.workers,
+                   "seconds": round(seconds, 3), "documents_per_second": round(documents / seconds, 1) if seconds else 0.0}
+        logger.info("Rendered %s invoices at %s documents/s", documents, summary["documents_per_second"],
+                    extra=summary)
+        return summary
+
+
+if __name__ == "__main__":
+    from app.db.postgresql import SessionLocal
+    from app.core.logger import setup_logging
+
+    parser = argparse.ArgumentParser(description="Render invoices in bulk.")
+    parser.add_argument("--output", required=True, help="zip archive (.zip) or directory")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="pdf")
+    parser.add_argument("--start", type=date.fromisoformat, help="first invoice date, YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, help="last invoice date, YYYY-MM-DD")
+    parser.add_argument("--workers", type=int, help="rendering processes")
+    arguments = parser.parse_args()
+
+    setup_logging()
+    session = SessionLocal()
+    try:
+        InvoiceRenderingService(session, workers=arguments.workers).render_batch(
+            arguments.output, arguments.format, arguments.start, arguments.end)
+    finally:
+        session.close()
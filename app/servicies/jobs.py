@@ -0,0 +1,385 @@
+"""
+Background jobs: long exports, renderings and reports run outside of the request that asked for them.
+
+Jobs are rows of the `jobs` table. Every worker runs a `JobRunner`, whose threads claim queued jobs with
+`SKIP LOCKED`, so any number of workers share the queue without contending for it. A handler reports its
+progress through its `JobContext`, which is also where a cancellation is noticed, and writes its artifacts
+in `settings.JOBS_DIRECTORY/<job id>/`, a directory every worker must share for the artifacts to be served.
+A job whose runner stops sending heartbeats is queued again, up to `settings.JOBS_MAX_ATTEMPTS` times.
+
+Attributes:
+    HANDLERS (Dict[str, Tuple[Callable, Type[BaseModel]]]): Handler and parameters model of every job kind.
+    job_runner (JobRunner): The runner of this worker.
+
+Classes:
+    JobCancelled: Raised inside a handler once its job is cancelled.
+    JobContext: Progress reporting, cancellation and artifacts of a running job.
+    JobService: Submission, inspection and cancellation of jobs.
+    JobRunner: Pool of threads running queued jobs.
+"""
+
+import json
+import os
+import socket
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.job import Job
+from app.repositories.job import JobRepository
+from app.schemas.job import ExportJobParams, JobCreate, RenderJobParams, RollupJobParams
+from app.schemas.reports import MarginReportRequest
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """
+    What a handler knows of the job it runs.
+
+    Attributes:
+        job_id (int): The job id.
+        directory (str): Directory of the artifacts of the job.
+        cancelled (threading.Event): Set once the cancellation of the job is requested.
+        artifact (Optional[str]): Path of the artifact produced by the job, if any.
+
+    Methods:
+        report(self, progress: Optional[float] = None, message: Optional[str] = None): Stores the progress of the job.
+        check(self): Raises JobCancelled if the job was cancelled.
+        artifact_path(self, name: str) -> str: Returns the path where the job writes its artifact.
+    """
+
+    def __init__(self, job_id: int, session_factory: Callable[[], Session], directory: str):
+        self.job_id = job_id
+        self.directory = directory
+        self.cancelled = threading.Event()
+        self.artifact: Optional[str] = None
+        self._session_factory = session_factory
+        self._progress = 0.0
+
+    def check(self):
+        """
+        Raises:
+            JobCancelled: If the cancellation of the job was requested.
+        """
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def report(self, progress: Optional[float] = None, message: Optional[str] = None):
+        """
+        Stores the progress of the job, then checks whether it was cancelled.
+
+        Args:
+            progress (Optional[float]): Completed fraction, between 0 and 1; unchanged if None.
+            message (Optional[str]): Description of the current step.
+
+        Raises:
+            JobCancelled: If the cancellation of the job was requested.
+        """
+        self.check()
+        if progress is not None:
+            self._progress = progress
+        db = self._session_factory()
+        try:
+            JobRepository(db).report_progress(self.job_id, self._progress, message)
+        finally:
+            db.close()
+
+    def artifact_path(self, name: str) -> str:
+        """
+        Returns the path of the artifact of the job, creating its directory.
+
+        Args:
+            name (str): File name of the artifact.
+
+        Returns:
+            str: The path, recorded as the artifact of the job once it succeeds.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.artifact = os.path.join(self.directory, name)
+        return self.artifact
+
+
+def export_invoice_lines(context: JobContext, db: Session, params: ExportJobParams) -> dict:
+    from app.servicies.export import WarehouseExportService
+
+    context.report(0.0, "Exporting invoice lines")
+    return WarehouseExportService(db).export_invoice_lines(full=params.full)
+
+
+def render_invoices(context: JobContext, db: Session, params: RenderJobParams) -> dict:
+    from app.servicies.invoice_rendering import InvoiceRenderingService
+
+    output = context.artifact_path("invoices.zip")
+    return InvoiceRenderingService(db).render_batch(
+        output, params.format, params.start_date, params.end_date,
+        progress=lambda documents: context.report(message=f"{documents} invoices rendered"))
+
+
+def margin_report(context: JobContext, db: Session, params: MarginReportRequest) -> dict:
+    from app.servicies.analytics import AnalyticsService
+
+    context.report(0.0, "Computing margins")
+    rows = AnalyticsService(db).margin_report(params.group_by, params.period, params.start_date, params.end_date,
+                                              params.price_overrides, params.cost_overrides)
+    context.check()
+    with open(context.artifact_path("margin-report.json"), "w") as file:
+        json.dump({"group_by": params.group_by, "rows": rows}, file, default=str)
+    return {"rows": len(rows)}
+
+
+def rebuild_rollups(context: JobContext, db: Session, params: RollupJobParams) -> dict:
+    from app.servicies.revenue_rollups import RevenueRollupService
+
+    return RevenueRollupService(db, params.workers, params.chunk_size).backfill(
+        progress=lambda done, total: context.report(done / total, f"{done} of {total} date ranges rebuilt"))
+
+
+HANDLERS: Dict[str, Tuple[Callable[[JobContext, Session, BaseModel], Optional[dict]], Type[BaseModel]]] = {
+    "export.invoice_lines": (export_invoice_lines, ExportJobParams),
+    "invoices.render": (render_invoices, RenderJobParams),
+    "reports.margin": (margin_report, MarginReportRequest),
+    "reports.rollups": (rebuild_rollups, RollupJobParams),
+}
+
+
+class JobService:
+    """
+    Service submitting, inspecting and cancelling background jobs.
+
+    Attributes:
+        db_session (Session): Database session for executing transactions.
+        repository (JobRepository): Repository of the jobs.
+
+    Methods:
+        __init__(self, db_session: Session): Initializes the service.
+        submit(self, job_create: JobCreate) -> dict: Validates and queues a job.
+        get_job(self, id: int) -> dict: Returns a job.
+        cancel(self, id: int) -> dict: Requests the cancellation of a job.
+        artifact(self, id: int) -> Optional[str]: Returns the path of the artifact of a succeeded job.
+    """
+
+    def __init__(self, db_session: Session):
+        """
+        Initializes the JobService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session for database transactions.
+        """
+        self.db_session = db_session
+        self.repository = JobRepository(db_session)
+
+    def describe(self, job: Job) -> dict:
+        """
+        Returns a job with its parameters and result decoded and the URL of its artifact.
+        """
+        return {"id": job.id, "kind": job.kind, "params": json.loads(job.params), "status": job.status,
+                "progress": job.progress, "message": job.message, "error": job.error,
+                "result": json.loads(job.result) if job.result is not None else None,
+                "cancel_requested": job.cancel_requested, "attempts": job.attempts, "created_at": job.created_at,
+                "started_at": job.started_at, "finished_at": job.finished_at,
+                "artifact_url": f"/jobs/{job.id}/artifact" if job.artifact and job.status == "succeeded" else None}
+
+    def submit(self, job_create: JobCreate) -> dict:
+        """
+        Validates the parameters of a job and queues it.
+
+        Args:
+            job_create (JobCreate): Kind and parameters of the job.
+
+        Returns:
+            dict: The queued job.
+
+        Raises:
+            ValueError: If the kind is unknown or the parameters are invalid for it.
+        """
+        if job_create.kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind {job_create.kind!r}, expected one of {sorted(HANDLERS)}")
+        params = HANDLERS[job_create.kind][1].model_validate(job_create.params)
+        return self.describe(self.repository.create_job(job_create.kind, params.model_dump(mode="json")))
+
+    def get_job(self, id: int) -> dict:
+        """
+        Returns a job.
+
+        Raises:
+            HTTPException: If the job does not exist.
+        """
+        return self.describe(self.repository.get_job(id))
+
+    def cancel(self, id: int) -> dict:
+        """
+        Requests the cancellation of a job. A queued job is cancelled at once, a running one when its handler
+        next reports progress.
+
+        Raises:
+            HTTPException: If the job does not exist.
+        """
+        return self.describe(self.repository.request_cancel(id))
+
+    def artifact(self, id: int) -> Optional[str]:
+        """
+        Returns the path of the artifact of a succeeded job, or None if it has none (yet).
+
+        Raises:
+            HTTPException: If the job does not exist.
+        """
+        job = self.repository.get_job(id)
+        if job.status != "succeeded" or not job.artifact or not os.path.exists(job.artifact):
+            return None
+        return job.artifact
+
+
+class JobRunner:
+    """
+    Pool of threads running the queued jobs.
+
+    Each of the `concurrency` threads claims the oldest queued job, runs its handler with a session of its own
+    and records the outcome. A monitor thread sends the heartbeats of the running jobs, relays their
+    cancellations and requeues the jobs of the runners that stopped sending theirs. Handlers spend their time in
+    the database, in process pools or in I/O, so threads are enough to run them side by side.
+
+    Attributes:
+        session_factory (Callable[[], Session]): Factory of the sessions on the main database.
+        concurrency (int): Jobs run at the same time.
+        poll_interval (float): Seconds between two polls of an empty queue.
+        directory (str): Root directory of the artifacts.
+        handlers (Dict[str, Tuple[Callable, Type[BaseModel]]]): Handler and parameters model per job kind.
+
+    Methods:
+        run_once(self) -> bool: Claims and runs one job, returns whether there was one.
+        start(self): Starts the runner threads.
+        stop(self): Stops the runner threads, queueing again the jobs still running after 10 seconds.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = None, concurrency: int = None,
+                 poll_interval: float = None, directory: str = None, handlers: Dict[str, tuple] = None):
+        self.session_factory = session_factory
+        self.concurrency = concurrency if concurrency is not None else settings.JOBS_CONCURRENCY
+        self.poll_interval = poll_interval if poll_interval is not None else settings.JOBS_POLL_INTERVAL
+        self.directory = directory or settings.JOBS_DIRECTORY
+        self.handlers = handlers if handlers is not None else HANDLERS
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        self._running: Dict[int, JobContext] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.postgresql import SessionLocal
+
+            self.session_factory = SessionLocal
+        return self.session_factory()
+
+    def run_once(self) -> bool:
+        """
+        Claims the oldest queued job and runs it in the calling thread.
+
+        Returns:
+            bool: Whether a job was claimed.
+        """
+        db = self._session()
+        try:
+            job = JobRepository(db).claim_job(self.worker)
+            if job is None:
+                return False
+            job_id, kind, params = job.id, job.kind, json.loads(job.params)
+            context = JobContext(job_id, self._session, os.path.join(self.directory, str(job_id)))
+            if job.cancel_requested:
+                context.cancelled.set()
+            with self._lock:
+                self._running[job_id] = context
+            try:
+                handler, model = self.handlers[kind]
+                result = handler(context, db, model.model_validate(params))
+                context.check()
+            except JobCancelled:
+                logger.info("Job %s cancelled", job_id, extra={"job_id": job_id, "kind": kind})
+                db.rollback()
+                JobRepository(db).finish_job(job_id, "cancelled")
+            except Exception as error:
+                logger.exception("Job %s failed", job_id, extra={"job_id": job_id, "kind": kind})
+                db.rollback()
+                JobRepository(db).finish_job(job_id, "failed", error=f"{type(error).__name__}: {error}")
+            else:
+                JobRepository(db).finish_job(job_id, "succeeded", result=result, artifact=context.artifact)
+                logger.info("Job %s succeeded", job_id, extra={"job_id": job_id, "kind": kind})
+            finally:
+                with self._lock:
+                    self._running.pop(job_id, None)
+            return True
+        finally:
+            db.close()
+
+    def heartbeat(self):
+        """
+        Records that the running jobs are alive, relays their cancellations and requeues the jobs of lost runners.
+        """
+        with self._lock:
+            running = dict(self._running)
+        db = self._session()
+        try:
+            repository = JobRepository(db)
+            for job_id, cancel_requested in repository.heartbeat(list(running)).items():
+                if cancel_requested:
+                    running[job_id].cancelled.set()
+            if repository.requeue_stale(settings.JOBS_HEARTBEAT_TIMEOUT, settings.JOBS_MAX_ATTEMPTS):
+                logger.warning("Requeued the jobs of a lost job runner")
+        finally:
+            db.close()
+
+    def start(self):
+        if self._threads or self.concurrency <= 0:
+            return
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        self._stopping.clear()
+        self._threads = [threading.Thread(target=self._work, name=f"job-runner-{index}", daemon=True)
+                         for index in range(self.concurrency)]
+        self._threads.append(threading.Thread(target=self._monitor, name="job-monitor", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        if not self._threads:
+            return
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+        with self._lock:
+            abandoned = list(self._running)
+        if abandoned:
+            db = self._session()
+            try:
+                JobRepository(db).release_jobs(abandoned)
+            finally:
+                db.close()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                logger.exception("Job runner failed")
+                claimed = False
+            if not claimed:
+                self._stopping.wait(self.poll_interval)
+
+    def _monitor(self):
+        # Heartbeats come often enough that a live runner never looks lost, even after a missed beat or two.
+        interval = min(self.poll_interval, settings.JOBS_HEARTBEAT_TIMEOUT / 4)
+        while not self._stopping.wait(interval):
+            try:
+                self.heartbeat()
+            except Exception:
+                logger.exception("Job heartbeat failed")
+
+
+job_runner = JobRunner()
@@ -0,0 +1,145 @@
+import threading
+from datetime import datetime, timezone
+from typing import Callable
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.live_sales import LiveSales, live_sales
+from app.core.logger import logger
+from app.db.postgresql import SessionLocal
+from app.repositories.sketch_snapshot import SketchSnapshotRepository
+from app.servicies.product import ProductService
+
+SNAPSHOT_NAME = "live_sales"
+
+
+class LiveSalesService:
+    """
+    Service answering the live best-selling products from the in-memory sketches of `app.core.live_sales`,
+    without reading a single invoice line.
+
+    Attributes:
+        db_session (Session): Database session, only used to describe the products, through the entity cache.
+        sales (LiveSales): The sketches.
+
+    Methods:
+        __init__(self, db_session: Session, sales: LiveSales = None): Initializes the service.
+        top_products(self, window: str, metric: str, limit: int) -> dict: Returns the best sellers of a window.
+    """
+
+    def __init__(self, db_session: Session, sales: LiveSales = None):
+        """
+        Initializes the LiveSalesService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session for describing the products.
+            sales (LiveSales): The sketches, defaults to those of this worker.
+        """
+        self.db_session = db_session
+        self.sales = sales or live_sales
+
+    def _description(self, product_id: int):
+        try:
+            return ProductService(self.db_session).get_product(product_id).description
+        except HTTPException:
+            return None  # Deleted since it was sold.
+
+    def top_products(self, window: str = "1h", metric: str = "revenue", limit: int = 10) -> dict:
+        """
+        Returns the best-selling products of a window.
+
+        Args:
+            window (str): '5m', '1h' or '1d'.
+            metric (str): 'quantity' or 'revenue'.
+            limit (int): Number of products, at most `settings.LIVE_SALES_CAPACITY`.
+
+        Returns:
+            dict: The window, the metric, its start and the products, best first, with their estimated value
+                  (an upper bound) and its maximum overestimation.
+        """
+        top = self.sales.top(window, metric, min(limit, self.sales.capacity))
+        return {"window": window, "metric": metric,
+                "since": datetime.fromtimestamp(top["since"], tz=timezone.utc),
+                "items": [{"product_id": product_id, "description": self._description(product_id),
+                           "value": value, "error": error}
+                          for product_id, value, error in top["items"]]}
+
+
+class LiveSalesSnapshotter:
+    """
+    Background thread saving the live sales sketches every `interval` seconds and when stopped, and
+    restoring the last snapshot when started, so a restarted worker does not start from empty windows.
+    Sales made while no worker was running are missing from the restored windows.
+
+    Every worker sees every sale, so the snapshots of the workers are interchangeable and the last one wins.
+
+    Attributes:
+        sales (LiveSales): The sketches.
+        session_factory (Callable[[], Session]): Opens a session on the database keeping the snapshots.
+        interval (float): Seconds between two snapshots.
+
+    Methods:
+        restore(self): Adds the last snapshot to the sketches.
+        save(self): Saves a snapshot of the sketches.
+        start(self): Restores the last snapshot and starts the snapshot thread.
+        stop(self): Stops the snapshot thread, saving a last snapshot.
+    """
+
+    def __init__(self, sales: LiveSales, session_factory: Callable[[], Session] = None, interval: float = None):
+        self.sales = sales
+        self.session_factory = session_factory or SessionLocal
+        self.interval = interval if interval is not None else settings.LIVE_SALES_SNAPSHOT_INTERVAL
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def restore(self):
+        db = self.session_factory()
+        try:
+            state = SketchSnapshotRepository(db).load(SNAPSHOT_NAME)
+        finally:
+            db.close()
+        if state is not None:
+            self.sales.load(state)
+
+    def save(self):
+        db = self.session_factory()
+        try:
+            SketchSnapshotRepository(db).save(SNAPSHOT_NAME, self.sales.dump())
+        finally:
+            db.close()
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        try:
+            self.restore()
+        except Exception:
+            logger.warning("Could not restore the live sales snapshot", exc_info=True)
+        self._stopping.clear()
+        # Published once started: a shutdown racing the startup must not join a thread not started yet.
+        thread = threading.Thread(target=self._run, name="live-sales-snapshotter", daemon=True)
+        thread.start()
+        self._thread = thread
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        try:
+            self.save()
+        except Exception:
+            logger.warning("Could not save the live sales snapshot", exc_info=True)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.save()
+            except Exception:
+                logger.exception("Live sales snapshot failed")
+
+
+live_sales_snapshotter = LiveSalesSnapshotter(live_sales)
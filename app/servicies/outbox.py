@@ -0,0 +1,256 @@
+"""
+Publisher of the invoice lifecycle events recorded in the transactional outbox.
+
+Repositories add an event row (`invoice.created`, `invoice.deleted`, `invoice_detail.created`,
+`invoice_detail.deleted`) in the transaction of every invoice change, so an event exists if and only if
+its change committed. A background thread drains the outbox of every source database (the shards when
+invoices are sharded, the main database otherwise) in batches and hands them to each configured sink.
+
+Every sink has its own cursor row. A publisher claims the cursor for `settings.OUTBOX_LEASE_SECONDS` and
+reads the batch after it in one short transaction, delivers the batch outside any transaction, then
+advances the cursor in another, so a slow sink holds no row lock or connection. The publishers of several
+workers share the sinks instead of delivering the same batch twice, and a worker dying mid-batch leaves
+the cursor where it was until its claim lapses. Delivery is at least once: a batch is delivered again if
+the cursor could not be advanced after delivering it, or if the claim lapsed during a delivery slower
+than the lease, and consumers should deduplicate on the event id. Events every sink has received are purged.
+
+Sinks are configured with `settings.OUTBOX_SINKS`, e.g. "file:/var/spool/invoices.jsonl,http://erp/events".
+
+Attributes:
+    outbox_publisher (OutboxPublisher): The publisher of this worker, started once the database is ready.
+
+Classes:
+    OutboxSink: Base class of the event sinks.
+    FileSink: Appends events to a JSON lines file.
+    HttpSink: POSTs batches of events as JSON.
+    OutboxPublisher: Background thread delivering the outbox to the sinks.
+
+Functions:
+    sink_from_spec(spec): Builds a sink from its configuration string.
+"""
+import json
+import os
+import threading
+import uuid
+from datetime import timedelta
+from typing import Callable, List, Sequence, Tuple
+
+import requests
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.postgresql import SessionLocal
+from app.db.sharding import shard_router
+from app.models.outbox import OutboxEvent
+from app.repositories.outbox import OutboxRepository
+
+
+def serialize_event(source: str, event: OutboxEvent) -> dict:
+    """
+    Returns the delivered form of an event.
+
+    Args:
+        source (str): The source database ('main' or 'shard-N').
+        event (OutboxEvent): The outbox row.
+
+    Returns:
+        dict: The event, its payload decoded.
+    """
+    return {"id": f"{source}:{event.id}", "type": event.event_type, "aggregate_id": event.aggregate_id,
+            "occurred_at": event.created_at.isoformat(), "data": json.loads(event.payload)}
+
+
+class OutboxSink:
+    """
+    Destination of the outbox events. `deliver` must raise if the batch was not delivered.
+
+    Attributes:
+        name (str): Name of the sink, which keys its cursor.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def deliver(self, events: List[dict]):
+        raise NotImplementedError
+
+
+class FileSink(OutboxSink):
+    """
+    Sink appending one JSON object per event to a file, flushed to disk before the batch counts as delivered.
+
+    Attributes:
+        path (str): The JSON lines file.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(f"file:{path}")
+        self.path = path
+
+    def deliver(self, events: List[dict]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as file:
+            file.writelines(json.dumps(event) + "\n" for event in events)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class HttpSink(OutboxSink):
+    """
+    Sink POSTing every batch as `{"events": [...]}`; any non-2xx response fails the batch.
+
+    Attributes:
+        url (str): The endpoint receiving the batches.
+        timeout (float): Seconds to wait for the endpoint.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        super().__init__(url)
+        self.url = url
+        self.timeout = timeout
+        self._http = requests.Session()
+
+    def deliver(self, events: List[dict]):
+        self._http.post(self.url, json={"events": events}, timeout=self.timeout).raise_for_status()
+
+
+def sink_from_spec(spec: str) -> OutboxSink:
+    """
+    Builds a sink from its configuration: 'file:<path>' or an http(s) URL.
+
+    Args:
+        spec (str): The sink configuration.
+
+    Returns:
+        OutboxSink: The sink.
+
+    Raises:
+        ValueError: If the configuration names no known sink.
+    """
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return HttpSink(spec)
+    raise ValueError(f"Unknown outbox sink {spec!r}")
+
+
+def default_sources() -> List[Tuple[str, Callable[[], Session]]]:
+    """
+    Returns the databases holding invoice events: every shard when sharding is enabled, otherwise the main database.
+    """
+    if shard_router.enabled:
+        return [(f"shard-{shard}", factory) for shard, factory in enumerate(shard_router.session_factories)]
+    return [("main", SessionLocal)]
+
+
+class OutboxPublisher:
+    """
+    Background thread delivering outbox events to the sinks in batches.
+
+    Attributes:
+        sinks (List[OutboxSink]): The destinations.
+        sources (List[Tuple[str, Callable[[], Session]]]): Name and session factory of every source database.
+        batch_size (int): Maximum number of events per delivery.
+        poll_interval (float): Seconds between two polls of an idle outbox.
+
+    Methods:
+        publish_once(self) -> int: Delivers one batch per source and sink, returns the number of events delivered.
+        start(self): Starts the publisher thread.
+        stop(self): Stops the publisher thread.
+    """
+
+    def __init__(self, sinks: Sequence[OutboxSink], sources: Sequence[Tuple[str, Callable[[], Session]]] = None,
+                 batch_size: int = None, poll_interval: float = None):
+        self.sinks = list(sinks)
+        self.sources = list(sources) if sources is not None else None
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval if poll_interval is not None else settings.OUTBOX_POLL_INTERVAL
+        self._owner = uuid.uuid4().hex
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _deliver_batch(self, source: str, factory: Callable[[], Session], sink: OutboxSink) -> int:
+        db = factory()
+        try:
+            repository = OutboxRepository(db)
+            cursor = repository.claim_cursor(sink.name, self._owner, timedelta(seconds=settings.OUTBOX_LEASE_SECONDS))
+            if cursor is None:
+                return 0  # Another worker is delivering to this sink.
+            events = repository.get_events_after(cursor, self.batch_size)
+            if not events:
+                db.rollback()
+                return 0
+            position = (cursor.transaction_id, cursor.event_id)
+            delivered = repository.position_of(events[-1])
+            batch = [serialize_event(source, event) for event in events]
+            db.commit()
+            try:
+                sink.deliver(batch)
+            except Exception:
+                repository.release_cursor(sink.name, self._owner)
+                db.commit()
+                raise
+            if not repository.advance_cursor(sink.name, self._owner, position, delivered):
+                logger.warning("Outbox claim of %s on %s lapsed during delivery; the batch may be delivered again",
+                               sink.name, source)
+            db.commit()
+            return len(events)
+        finally:
+            db.close()
+
+    def _purge(self, factory: Callable[[], Session]):
+        db = factory()
+        try:
+            OutboxRepository(db).purge_delivered([sink.name for sink in self.sinks])
+        finally:
+            db.close()
+
+    def publish_once(self) -> int:
+        """
+        Delivers at most one batch from every source to every sink, then purges the events all sinks received.
+        A failing sink is logged and retried on the next call; it does not hold back the other sinks.
+
+        Returns:
+            int: The number of events delivered.
+        """
+        delivered = 0
+        for source, factory in self.sources if self.sources is not None else default_sources():
+            for sink in self.sinks:
+                try:
+                    delivered += self._deliver_batch(source, factory, sink)
+                except Exception:
+                    logger.warning("Outbox delivery from %s to %s failed", source, sink.name, exc_info=True)
+            if delivered:
+                self._purge(factory)
+        return delivered
+
+    def start(self):
+        if self._thread is not None or not self.sinks:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                delivered = self.publish_once()
+            except Exception:
+                logger.exception("Outbox publisher failed")
+                delivered = 0
+            # A full batch means a backlog: drain it without waiting.
+            if delivered < self.batch_size:
+                self._stopping.wait(self.poll_interval)
+
+
+outbox_publisher = OutboxPublisher([sink_from_spec(spec) for spec in settings.OUTBOX_SINKS])
@@ -1,10 +1,11 @@
-from typing import List, Optional
+from typing import List, Tuple
 
 from sqlalchemy.orm import Session
 
+from app.core.cache import entity_cache
 from app.models.person import Person
 from app.repositories.person import PersonRepository
-from app.schemas.person import PersonCreate, PersonUpdate
+from app.schemas.person import Person as PersonSnapshot, PersonCreate, PersonUpdate
 
 
 class PersonService:
@@ -22,8 +23,10 @@ class PersonService:
     Methods:
         __init__(self, db_session: Session): Initializes a PersonService with the given database session.
         create_person(self, person_create: PersonCreate) -> Person: Creates a new Person entity.
-        get_person(self, person_id: int) -> Optional[Person]: Retrieves a Person entity by its ID.
+        get_person(self, person_id: int) -> PersonSnapshot: Retrieves a Person snapshot by its ID, cached.
         get_all_persons(self) -> List[Person]: Retrieves all Person entities.
+        upsert_person_by_document(self, person: PersonCreate) -> Tuple[Person, bool]: Gets or creates the Person
+            holding a document.
         update_person(self, person_id: int, person_update: PersonUpdate) -> Person: Updates an existing Person entity.
         delete_person(self, person_id: int): Deletes a Person entity by its ID.
     """
@@ -51,17 +54,22 @@ class PersonService:
         """
         return self.repository.create_person(person_create)
 
-    def get_person(self, person_id: int) -> Optional[Person]:
+    def get_person(self, person_id: int) -> PersonSnapshot:
         """
-        Retrieves a single Person entity by its ID.
+        Retrieves a single Person entity by its ID, from the entity cache when possible. Cached snapshots are
+        evicted by every worker when the row is updated or deleted.
 
         Args:
             person_id (int): The unique identifier of the Person.
 
         Returns:
-            Optional[Person]: The found Person entity or None if not found.
+            PersonSnapshot: A snapshot of the found Person.
+
+        Raises:
+            HTTPException: If the Person does not exist.
         """
-        return self.repository.get_person_by_id(person_id)
+        return entity_cache.get_or_load("person", person_id, lambda: PersonSnapshot.model_validate(
+            self.repository.get_person_by_id(person_id)))
 
     def get_all_persons(self) -> List[Person]:
         """
@@ -72,6 +80,19 @@ class PersonService:
         """
         return self.repository.get_all_persons()
 
+    def upsert_person_by_document(self, person: PersonCreate) -> Tuple[Person, bool]:
+        """
+        Creates the Person holding a document, or updates their name and surname, in a single statement that is
+        safe when many clients register the same customer at once.
+
+        Args:
+            person (PersonCreate): The Person data; document_type and document identify the Person.
+
+        Returns:
+            Tuple[Person, bool]: The Person, and whether it was created.
+        """
+        return self.repository.upsert_person_by_document(person)
+
     def update_person(self, person_id: int, person_update: PersonUpdate) -> Person:
         """
         Updates an existing Person record in the database.
@@ -1,10 +1,11 @@
-from typing import List, Optional
+from typing import List
 
 from sqlalchemy.orm import Session
 
+from app.core.cache import entity_cache
 from app.models.product import Product
 from app.repositories.product import ProductRepository
-from app.schemas.product import ProductCreate, ProductUpdate
+from app.schemas.product import PriceListItem, Product as ProductSnapshot, ProductCreate, ProductUpdate
 
 
 class ProductService:
@@ -23,10 +24,11 @@ class ProductService:
     Methods:
         __init__(self, db_session: Session): Constructs a ProductService with the given database session.
         create_product(self, product_create: ProductCreate) -> Product: Creates a new Product entity.
-        get_product(self, product_id: int) -> Optional[Product]: Retrieves a Product entity by its ID.
+        get_product(self, product_id: int) -> ProductSnapshot: Retrieves a Product snapshot by its ID, cached.
         get_all_products(self) -> List[Product]: Retrieves all Product entities.
         update_product(self, product_id: int, product_update: ProductUpdate) -> Product: Updates an existing Product entity.
         delete_product(self, product_id: int): Deletes a Product entity by its ID.
+        apply_price_list(self, items: List[PriceListItem]) -> dict: Creates or updates Product entities by SKU.
     """
 
     def __init__(self, db_session: Session):
@@ -52,17 +54,22 @@ class ProductService:
         """
         return self.repository.create_product(product_create)
 
-    def get_product(self, product_id: int) -> Optional[Product]:
+    def get_product(self, product_id: int) -> ProductSnapshot:
         """
-        Retrieves a single Product entity by its ID.
+        Retrieves a single Product entity by its ID, from the entity cache when possible. Cached snapshots are
+        evicted by every worker when the row is updated or deleted.
 
         Args:
             product_id (int): The unique identifier of the Product.
 
         Returns:
-            Optional[Product]: The found Product entity or None if not found.
+            ProductSnapshot: A snapshot of the found Product.
+
+        Raises:
+            HTTPException: If the Product does not exist.
         """
-        return self.repository.get_product_by_id(product_id)
+        return entity_cache.get_or_load("product", product_id, lambda: ProductSnapshot.model_validate(
+            self.repository.get_product_by_id(product_id)))
 
     def get_all_products(self) -> List[Product]:
         """
@@ -98,3 +105,20 @@ class ProductService:
             The result of the delete operation.
         """
         return self.repository.delete_product(product_id)
+
+    def apply_price_list(self, items: List[PriceListItem]) -> dict:
+        """
+        Applies a supplier price list in one transaction, creating the Products with unknown SKUs and updating
+        the others.
+
+        Args:
+            items (List[PriceListItem]): The price list, one item per SKU.
+
+        Returns:
+            dict: The number of Products created, updated, unchanged and skipped, and the outcome of every item.
+        """
+        outcomes = self.repository.upsert_price_list(items)
+        summary = {status: 0 for status in ("created", "updated", "unchanged", "skipped")}
+        for outcome in outcomes:
+            summary[outcome["status"]] += 1
+        return {**summary, "items": outcomes}
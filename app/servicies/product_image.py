@@ -0,0 +1,127 @@
+import mimetypes
+import os
+from typing import BinaryIO, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.images import NAME_PATTERN, ImageStore, StoredImage, image_store
+from app.models.product_image import ProductImage
+from app.repositories.product import ProductRepository
+from app.repositories.product_image import ProductImageRepository
+
+
+class ProductImageService:
+    """
+    Service attaching images to products and locating the files serving them.
+
+    Images are stored once per content in the image store and served under immutable URLs named after
+    their digest, so clients and proxies may cache them forever. Thumbnails are rendered in the background
+    after an upload; a thumbnail requested before it is ready is reported missing and rendered again if needed.
+
+    Attributes:
+        db_session (Session): Database session for executing transactions.
+        store (ImageStore): The image store.
+        repository (ProductImageRepository): Repository of the product images.
+
+    Methods:
+        __init__(self, db_session: Session, store: ImageStore = None): Initializes the service.
+        add_image(self, product_id: int, stream: BinaryIO) -> dict: Stores an upload and attaches it to a product.
+        get_images(self, product_id: int) -> List[dict]: Returns the images of a product.
+        original(self, name: str) -> Optional[Tuple[str, str, str]]: Locates a stored image.
+        thumbnail(self, digest: str, size: int) -> Optional[str]: Locates a thumbnail.
+    """
+
+    def __init__(self, db_session: Session, store: ImageStore = None):
+        """
+        Initializes the ProductImageService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session for database transactions.
+            store (ImageStore): The image store, defaults to the one in `settings.IMAGES_DIRECTORY`.
+        """
+        self.db_session = db_session
+        self.store = store or image_store
+        self.repository = ProductImageRepository(db_session)
+
+    def describe(self, image: ProductImage) -> dict:
+        """
+        Returns an image with the URLs of its original and thumbnails.
+        """
+        name = f"{image.digest}.{image.extension}"
+        return {"id": image.id, "product_id": image.product_id, "digest": image.digest,
+                "content_type": image.content_type, "size": image.size, "created_at": image.created_at,
+                "url": f"/product/images/{name}",
+                "thumbnails": {size: f"/product/images/{image.digest}/thumbnails/{size}.jpg"
+                               for size in self.store.thumbnail_sizes}}
+
+    def add_image(self, product_id: int, stream: BinaryIO) -> dict:
+        """
+        Stores an uploaded image and attaches it to a product, then schedules its thumbnails.
+
+        Args:
+            product_id (int): The product id.
+            stream (BinaryIO): The uploaded file.
+
+        Returns:
+            dict: The attached image.
+
+        Raises:
+            HTTPException: If the product does not exist.
+            UnsupportedImage: If the upload is not an accepted image format.
+            ImageTooLarge: If the upload is too large.
+        """
+        ProductRepository(self.db_session).get_product_by_id(product_id)
+        stored = self.store.save(stream)
+        image = self.repository.add_image(product_id, stored)
+        self.store.schedule_thumbnails(stored)
+        return self.describe(image)
+
+    def get_images(self, product_id: int) -> List[dict]:
+        """
+        Returns the images of a product.
+
+        Args:
+            product_id (int): The product id.
+
+        Returns:
+            List[dict]: The images.
+        """
+        return [self.describe(image) for image in self.repository.get_images(product_id)]
+
+    def original(self, name: str) -> Optional[Tuple[str, str, str]]:
+        """
+        Locates a stored image.
+
+        Args:
+            name (str): The image name, '<digest>.<extension>'.
+
+        Returns:
+            Optional[Tuple[str, str, str]]: Path, content type and digest of the image, or None if it does not exist.
+        """
+        path = self.store.original_path(name)
+        if path is None:
+            return None
+        return path, mimetypes.guess_type(name)[0] or "application/octet-stream", name.split(".")[0]
+
+    def thumbnail(self, digest: str, size: int) -> Optional[str]:
+        """
+        Locates a thumbnail, scheduling its rendering when the image exists but the thumbnail does not yet.
+
+        Args:
+            digest (str): The image digest.
+            size (int): The thumbnail size.
+
+        Returns:
+            Optional[str]: Path of the thumbnail, or None if it is not available (yet).
+        """
+        if size not in self.store.thumbnail_sizes:
+            return None
+        path = self.store.thumbnail_path(digest, size)
+        if os.path.exists(path):
+            return path
+        for extension in ("jpg", "png", "gif", "webp"):
+            name = f"{digest}.{extension}"
+            if NAME_PATTERN.match(name) and self.store.original_path(name) is not None:
+                self.store.schedule_thumbnails(StoredImage(digest, extension, "", 0))
+                break
+        return None
@@ -0,0 +1,192 @@
+"""
+Revenue time series read from the day and month rollups, and the backfill rebuilding those rollups.
+
+Invoice line writes keep the rollups current in their own transaction; the backfill is for repairs and
+for lines written outside the application. Run it with `python -m app.servicies.revenue_rollups
+[--workers N] [--chunk-size N]`, or as a 'reports.rollups' background job.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.sharding import shard_router
+from app.repositories.revenue_rollup import MEASURES, RevenueRollupRepository
+
+# Key of the PostgreSQL advisory lock serializing the rollup backfills of a database.
+BACKFILL_LOCK_KEY = 4837202
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1)
+
+
+class RevenueRollupService:
+    """
+    Service answering revenue time series from the rollups and rebuilding them.
+
+    A series reads one rollup row per period, key and source database, never an invoice line, so two years
+    of daily revenue of a product is about 730 rows whatever the number of lines.
+
+    A backfill rebuilds the rollups of every source database (the shards when invoices are sharded, the
+    main database otherwise) in date ranges of `chunk_size` months, `workers` ranges at a time. Each range is
+    one transaction deleting its rollups and adding them back with one `INSERT ... SELECT ... GROUP BY`, so
+    series read before or after it commits, never an empty or half-built range. On PostgreSQL a range locks
+    invoice headers and lines in SHARE mode until it commits, which lets ranges run in parallel but makes
+    invoice writes wait for the range being rebuilt, so no line is counted twice or missed; backfills of a
+    database run one at a time. A failed backfill leaves the ranges it did not reach as they were.
+
+    Attributes:
+        db_session (Session): Database session on the main database.
+        workers (int): Date ranges rebuilt in parallel.
+        chunk_size (int): Months per range.
+
+    Methods:
+        __init__(self, db_session: Session, workers: int = None, chunk_size: int = None): Initializes the service.
+        series(self, dimension: str, grain: str, key_id: int = None, start_date: date = None,
+               end_date: date = None) -> List[dict]: Returns the revenue of every period in a range.
+        backfill(self, progress: Callable[[int, int], None] = None,
+                 sources: List[Callable[[], Session]] = None) -> dict: Rebuilds every rollup.
+    """
+
+    def __init__(self, db_session: Session, workers: int = None, chunk_size: int = None):
+        """
+        Initializes the RevenueRollupService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session on the main database.
+            workers (int): Ranges rebuilt in parallel, defaults to `settings.ROLLUP_BACKFILL_WORKERS`.
+            chunk_size (int): Months per range, defaults to `settings.ROLLUP_BACKFILL_CHUNK_SIZE`.
+        """
+        self.db_session = db_session
+        self.workers = workers or settings.ROLLUP_BACKFILL_WORKERS
+        self.chunk_size = chunk_size or settings.ROLLUP_BACKFILL_CHUNK_SIZE
+
+    def series(self, dimension: str = "product", grain: str = "day", key_id: Optional[int] = None,
+               start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[dict]:
+        """
+        Returns lines, quantity, revenue, cost and margin of every period with invoice lines in a range.
+
+        Args:
+            dimension (str): 'product' or 'person'.
+            grain (str): 'day' or 'month'.
+            key_id (int): The product or person id, or None for the totals of every product or person.
+            start_date (date): First date included, or None.
+            end_date (date): Last date included, or None.
+
+        Returns:
+            List[dict]: One row per period, in period order.
+        """
+        if not shard_router.enabled:
+            rows = RevenueRollupRepository(self.db_session).get_series(dimension, grain, key_id, start_date,
+                                                                      end_date)
+        else:
+            totals: Dict[date, dict] = {}
+            for part in shard_router.fan_out(lambda db: RevenueRollupRepository(db).get_series(
+                    dimension, grain, key_id, start_date, end_date)):
+                for row in part:
+                    total = totals.setdefault(row["period"], dict.fromkeys(MEASURES, 0))
+                    for name in MEASURES:
+                        total[name] += row[name]
+            rows = [{"period": period, **totals[period]} for period in sorted(totals)]
+        return [{**row, "margin": row["revenue"] - row["cost"]} for row in rows]
+
+    def _sources(self) -> List[Callable[[], Session]]:
+        if shard_router.enabled:
+            return list(shard_router.session_factories)
+        return [sessionmaker(bind=self.db_session.get_bind())]
+
+    def _ranges(self, factory: Callable[[], Session]) -> List[Tuple[Optional[date], Optional[date]]]:
+        with factory() as db:
+            first, last = RevenueRollupRepository(db).invoice_date_range()
+        if first is None:
+            return [(None, None)]
+        bounds = [first.replace(day=1)]
+        while bounds[-1] <= last:
+            bounds.append(_add_months(bounds[-1], self.chunk_size))
+        # The outer ranges are open, so rollups of periods without invoices anymore are deleted too.
+        bounds[0], bounds[-1] = None, None
+        return list(zip(bounds, bounds[1:]))
+
+    def _rebuild_range(self, factory: Callable[[], Session], start: Optional[date], end: Optional[date]):
+        db = factory()
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                # Held until the range commits: invoice writes wait, reads of other sessions do not.
+                db.execute(text("LOCK TABLE invoice_headers, invoice_details IN SHARE MODE"))
+            RevenueRollupRepository(db).rebuild_period(start, end)
+            db.commit()
+        finally:
+            db.close()
+
+    def backfill(self, progress: Callable[[int, int], None] = None,
+                 sources: List[Callable[[], Session]] = None) -> dict:
+        """
+        Rebuilds the rollups of every source database from the invoice lines.
+
+        Args:
+            progress (Callable[[int, int], None]): Called with the ranges done and the ranges in total after every
+                range; an exception it raises aborts the backfill.
+            sources (List[Callable[[], Session]]): Session factories of the databases to rebuild, defaults to
+                every source database.
+
+        Returns:
+            dict: The number of ranges, the elapsed seconds and the settings of the run.
+        """
+        started = time.perf_counter()
+        plans = [(factory, self._ranges(factory))
+                 for factory in (sources if sources is not None else self._sources())]
+        total = sum(len(ranges) for _, ranges in plans)
+
+        done = 0
+        for factory, ranges in plans:
+            guard = factory()
+            parallel = guard.get_bind().dialect.name == "postgresql"
+            executor = None
+            try:
+                if parallel:
+                    # Two backfills rebuilding the same months would both add their lines.
+                    guard.execute(text("SELECT pg_advisory_lock(:key)"), {"key": BACKFILL_LOCK_KEY})
+                    guard.commit()
+                executor = ThreadPoolExecutor(max_workers=self.workers if parallel else 1)
+                for _ in executor.map(lambda bounds: self._rebuild_range(factory, *bounds), ranges):
+                    done += 1
+                    if progress is not None:
+                        progress(done, total)
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+                if parallel:
+                    guard.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BACKFILL_LOCK_KEY})
+                    guard.commit()
+                guard.close()
+
+        seconds = time.perf_counter() - started
+        summary = {"ranges": done, "workers": self.workers, "chunk_size": self.chunk_size,
+                   "seconds": round(seconds, 3)}
+        logger.info("Rebuilt the revenue rollups in %s s", summary["seconds"], extra=summary)
+        return summary
+
+
+if __name__ == "__main__":
+    from app.db.postgresql import SessionLocal
+    from app.core.logger import setup_logging
+
+    parser = argparse.ArgumentParser(description="Rebuild the revenue rollups from the invoice lines.")
+    parser.add_argument("--workers", type=int, help="date ranges rebuilt in parallel")
+    parser.add_argument("--chunk-size", type=int, help="months per range")
+    arguments = parser.parse_args()
+
+    setup_logging()
+    session = SessionLocal()
+    try:
+        RevenueRollupService(session, workers=arguments.workers, chunk_size=arguments.chunk_size).backfill()
+    finally:
+        session.close()
@@ -0,0 +1,100 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.person import Person
+from app.models.product import Product
+from app.repositories.search import SearchKey, SearchRepository
+
+
+def encode_cursor(key: SearchKey) -> str:
+    """
+    Encodes the position of the last row of a page into the opaque cursor handed to clients.
+    """
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> SearchKey:
+    """
+    Decodes a cursor produced by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        score, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(score), int(id)
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as error:
+        raise ValueError("Malformed cursor") from error
+
+
+class SearchService:
+    """
+    Service searching products and persons for pickers and typeahead fields.
+
+    Results are ranked, every word of the query matches as a prefix, so a partially typed word already finds
+    its rows, and pages are chained with the returned cursor: a page costs the same however deep it is.
+
+    Attributes:
+        db_session (Session): Database session for executing queries.
+        repository (SearchRepository): Repository running the searches.
+
+    Methods:
+        __init__(self, db_session: Session): Initializes the service.
+        search_products(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> dict: Searches products.
+        search_persons(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> dict: Searches persons.
+    """
+
+    def __init__(self, db_session: Session):
+        """
+        Initializes the SearchService.
+
+        Args:
+            db_session (Session): The SQLAlchemy session for database queries.
+        """
+        self.db_session = db_session
+        self.repository = SearchRepository(db_session)
+
+    def _search(self, model, query: str, limit: int, cursor: Optional[str]) -> dict:
+        after = decode_cursor(cursor) if cursor else None
+        rows = self.repository.search(model, query, limit + 1, after)
+        page = rows[:limit]
+        return {"items": [row for row, _ in page],
+                "next_cursor": encode_cursor(page[-1][1]) if len(rows) > limit else None}
+
+    def search_products(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> dict:
+        """
+        Searches products by description and unit of measure.
+
+        Args:
+            query (str): The text typed by the user.
+            limit (int): Maximum number of products returned.
+            cursor (Optional[str]): Cursor of the previous page, if any.
+
+        Returns:
+            dict: The matching products, best first, and the cursor of the next page, None on the last one.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        return self._search(Product, query, limit, cursor)
+
+    def search_persons(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> dict:
+        """
+        Searches persons by name, surname and document.
+
+        Args:
+            query (str): The text typed by the user.
+            limit (int): Maximum number of persons returned.
+            cursor (Optional[str]): Cursor of the previous page, if any.
+
+        Returns:
+            dict: The matching persons, best first, and the cursor of the next page, None on the last one.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        return self._search(Person, query, limit, cursor)
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.db.postgresql import Base
+from app.models import InvoiceDetail, InvoiceHeader, Person, Product
+from app.schemas.batch import BatchRequest
+from app.servicies.batch import BatchService
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Provides a session on a local SQLite database with one product, whose driver is set up to honour
+    SAVEPOINT: pysqlite otherwise manages transactions itself and never emits BEGIN.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}")
+
+    @event.listens_for(engine, "connect")
+    def _connect(connection, record):
+        connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _operations():
+    return [
+        {"entity": "person", "op": "create", "ref": "customer",
+         "data": {"name": "Ada", "surname": "Lovelace", "document_type": "DNI", "document": "1"}},
+        {"entity": "invoice", "op": "create", "ref": "invoice",
+         "data": {"number": 1, "date": "2024-01-01", "person_id": "$customer"}},
+        {"entity": "invoice_detail", "op": "create",
+         "data": {"invoice_header_id": "$invoice", "product_id": 1, "quantity": 2}},
+        {"entity": "invoice", "op": "get", "id": "$1"},
+    ]
+
+
+def test_batch_creates_related_rows_in_one_transaction(db):
+    result = BatchService(db).run(BatchRequest(operations=_operations()))
+
+    assert result["committed"] is True
+    assert [row["status"] for row in result["results"]] == [201, 201, 201, 200]
+    invoice = result["results"][3]["data"]
+    assert invoice["person_id"] == result["results"][0]["id"]
+    assert [(detail["product_id"], detail["unit_price"]) for detail in invoice["details"]] == [(1, 1.5)]
+    db.expire_all()
+    assert db.query(InvoiceDetail).count() == 1
+
+
+def test_atomic_batch_rolls_back_on_first_failure(db):
+    operations = _operations() + [
+        {"entity": "person", "op": "create",
+         "data": {"name": "Grace", "surname": "Hopper", "document_type": "DNI", "document": "1"}},
+        {"entity": "product", "op": "get", "id": 1},
+    ]
+    result = BatchService(db).run(BatchRequest(operations=operations))
+
+    assert result["committed"] is False
+    assert [row["status"] for row in result["results"]] == [201, 201, 201, 200, 409, 424]
+    assert db.query(Person).count() == 0
+    assert db.query(InvoiceHeader).count() == 0
+    assert db.query(InvoiceDetail).count() == 0
+
+
+def test_continue_batch_keeps_the_operations_that_succeed(db):
+    operations = [
+        {"entity": "product", "op": "update", "id": 1, "data": {"price": 1.8}},
+        {"entity": "person", "op": "get", "id": 99, "ref": "missing"},
+        {"entity": "invoice", "op": "create", "data": {"number": 2, "date": "2024-01-02", "person_id": "$missing"}},
+        {"entity": "invoice", "op": "create", "data": {"number": 3, "date": "2024-01-02", "person_id": "$later"}},
+        {"entity": "person", "op": "upsert",
+         "data": {"name": "Ada", "surname": "Lovelace", "document_type": "DNI", "document": "1"}},
+        {"entity": "product", "op": "create", "data": {"description": "Bread", "price": "free"}},
+    ]
+    result = BatchService(db).run(BatchRequest(mode="continue", operations=operations))
+
+    assert result["committed"] is True
+    assert [row["status"] for row in result["results"]] == [200, 404, 424, 422, 201, 422]
+    db.expire_all()
+    assert db.get(Product, 1).price == 1.8
+    assert db.query(Person).count() == 1
+    assert db.query(InvoiceHeader).count() == 0
@@ -0,0 +1,73 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.postgresql import Base
+from app.models import InvoiceHeader, Person, Product
+from app.servicies.changes import ChangeFeedService, decode_watermark
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Provides a session on a local SQLite database with two products, one customer and one invoice.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'changes.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add_all([
+        Person(id=1, name="Jorge", surname="Quin", document_type="CC", document="1"),
+        Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"),
+        Product(id=2, description="Bread", price=2.0, cost=1.2, unit_of_measure="Unit"),
+    ])
+    session.commit()
+    session.add(InvoiceHeader(id=1, number=1, date=date(2024, 1, 10), person_id=1))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _sync(service, watermark, limit):
+    changes = []
+    while True:
+        page = service.get_changes(watermark, limit)
+        changes.extend(page["changes"])
+        watermark = page["watermark"]
+        if not page["has_more"]:
+            return changes, watermark
+
+
+def test_full_sync_is_paged(db):
+    service = ChangeFeedService(db)
+
+    changes, watermark = _sync(service, None, limit=2)
+
+    assert sorted((change["entity"], change["id"]) for change in changes) == [
+        ("invoice_header", 1), ("person", 1), ("product", 1), ("product", 2)]
+    assert "change_seq" not in changes[0]["data"]
+    assert service.get_changes(watermark, 2) == {"changes": [], "watermark": watermark, "has_more": False}
+
+
+def test_incremental_sync_returns_updates_and_tombstones_only(db):
+    service = ChangeFeedService(db)
+    _, watermark = _sync(service, None, limit=100)
+
+    milk = db.get(Product, 1)
+    milk.price = 1.7
+    db.delete(db.get(Product, 2))
+    db.commit()
+
+    changes, _ = _sync(service, watermark, limit=1)
+
+    assert [(change["entity"], change["id"], change["op"]) for change in changes] == [
+        ("product", 1, "upsert"), ("product", 2, "delete")]
+    assert changes[0]["data"]["price"] == 1.7
+
+
+def test_malformed_watermark_is_rejected(db):
+    with pytest.raises(ValueError):
+        ChangeFeedService(db).get_changes("not-a-watermark")
+    assert decode_watermark(ChangeFeedService(db).get_changes(None)["watermark"]).keys() == {"main"}
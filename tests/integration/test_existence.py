@@ -0,0 +1,165 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.existence import ExistenceIndex
+from app.db.migrations import _unique_person_documents
+from app.db.postgresql import Base
+from app.models import InvoiceDetail, InvoiceHeader, Person, Product
+from app.repositories.existence import find_missing, load_existing
+from app.repositories.invoice_detail import InvoiceDetailRepository
+from app.repositories.invoice_header import InvoiceHeaderRepository
+from app.repositories.product import ProductRepository
+from app.schemas.batch import BatchRequest
+from app.schemas.invoice_detail import InvoiceDetailCreate
+from app.schemas.invoice_header import InvoiceHeaderCreate
+from app.servicies.batch import BatchService
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = ExistenceIndex()
+    monkeypatch.setattr("app.repositories.existence.existence_index", index)
+    monkeypatch.setattr("app.db.notifications.existence_index", index)
+    return index
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'existence.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Person(id=1, name="Ada", surname="Lovelace", document_type="DNI", document="1"),
+                     Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"),
+                     Product(id=2, description="Cheese", price=8.0, cost=5.0, unit_of_measure="Kilogram")])
+    session.flush()
+    session.add(InvoiceHeader(id=1, number=1, date=date(2024, 1, 1), person_id=1))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def postgres_db():
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    Base.metadata.create_all(bind=engine)
+    _unique_person_documents(engine)
+    session = Session(engine)
+    yield session
+    session.close()
+    with Session(engine) as cleanup:
+        cleanup.query(InvoiceHeader).filter(InvoiceHeader.number >= OFFSET, InvoiceHeader.number < OFFSET + 10).delete()
+        cleanup.query(Person).filter(Person.document_type == "EXISTENCE").delete()
+        cleanup.commit()
+    engine.dispose()
+
+
+OFFSET = 940000
+
+
+def test_unknown_references_are_rejected_before_any_write(db, index):
+    with pytest.raises(HTTPException) as product_error:
+        InvoiceDetailRepository(db).create_invoice_detail(
+            InvoiceDetailCreate(invoice_header_id=1, product_id=99, quantity=1))
+    with pytest.raises(HTTPException) as person_error:
+        InvoiceHeaderRepository(db).create_invoice_header(
+            InvoiceHeaderCreate(number=2, date=date(2024, 1, 2), person_id=42))
+
+    assert (product_error.value.status_code, product_error.value.detail) == (422, "Unknown product id(s): 99")
+    assert (person_error.value.status_code, person_error.value.detail) == (422, "Unknown person id(s): 42")
+    assert not db.new
+    assert db.query(InvoiceDetail).count() == 0 and db.query(InvoiceHeader).count() == 1
+
+
+def test_confirmed_ids_are_then_checked_in_memory(db, index):
+    InvoiceDetailRepository(db).create_invoice_detail(InvoiceDetailCreate(invoice_header_id=1, product_id=1, quantity=1))
+    assert index.missing("product", [1, 2]) == {2}
+
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert find_missing(db, "product", [1]) == set()
+    assert statements == []
+
+
+def test_ids_confirmed_after_writes_are_trusted_once_committed(db, index):
+    db.add(Product(id=3, description="Bread", price=2.0, cost=1.2, unit_of_measure="Unit"))
+    db.flush()
+    assert find_missing(db, "product", [3]) == set()
+    assert index.missing("product", [3]) == {3}
+    db.rollback()
+    assert index.missing("product", [3]) == {3}
+
+    db.add(Product(id=3, description="Bread", price=2.0, cost=1.2, unit_of_measure="Unit"))
+    db.flush()
+    find_missing(db, "product", [3])
+    db.commit()
+    assert index.missing("product", [3]) == set()
+
+
+def test_deleted_ids_are_confirmed_again(db, index):
+    index.add("product", [2])
+    ProductRepository(db).delete_product(2)
+
+    with pytest.raises(HTTPException) as error:
+        InvoiceDetailRepository(db).create_invoice_detail(
+            InvoiceDetailCreate(invoice_header_id=1, product_id=2, quantity=1))
+    assert error.value.status_code == 422
+
+
+def test_load_existing_knows_every_row(db, index):
+    assert load_existing(db) == {"product": 2, "person": 1}
+    assert index.missing("product", [1, 2, 3]) == {3}
+
+
+def test_batches_reject_unknown_lines(db, index):
+    result = BatchService(db).run(BatchRequest.model_validate({"mode": "continue", "operations": [
+        {"entity": "invoice_detail", "op": "create", "data": {"invoice_header_id": 1, "product_id": product_id,
+                                                              "quantity": 1}}
+        for product_id in (1, 2, 7)]}))
+
+    assert [row["status"] for row in result["results"]] == [201, 201, 422]
+    assert result["results"][2]["error"] == "Unknown product id(s): 7"
+    assert index.missing("product", [1, 2]) == set()
+
+
+def test_rows_of_a_rolled_back_batch_are_not_trusted(postgres_db, index):
+    # The upsert writes through a Core statement, which flushes nothing.
+    result = BatchService(postgres_db).run(BatchRequest.model_validate({"mode": "atomic", "operations": [
+        {"entity": "person", "op": "upsert",
+         "data": {"name": "Ada", "surname": "Lovelace", "document_type": "EXISTENCE", "document": "1"}},
+        {"entity": "invoice", "op": "create", "data": {"number": OFFSET + 1, "date": "2024-01-01", "person_id": "$0"}},
+        {"entity": "invoice", "op": "get", "id": 0},
+    ]}))
+    person_id = result["results"][0]["id"]
+
+    assert result["committed"] is False
+    assert index.missing("person", [person_id]) == {person_id}
+    with pytest.raises(HTTPException) as error:
+        InvoiceHeaderRepository(postgres_db).create_invoice_header(
+            InvoiceHeaderCreate(number=OFFSET + 2, date=date(2024, 1, 2), person_id=person_id))
+    assert error.value.status_code == 422
+
+
+def test_references_rejected_by_the_database_are_forgotten(postgres_db, index):
+    missing = postgres_db.query(Person.id).order_by(Person.id.desc()).first()
+    person_id = (missing[0] if missing else 0) + 1
+    index.add("person", [person_id])
+
+    with pytest.raises(HTTPException) as error:
+        InvoiceHeaderRepository(postgres_db).create_invoice_header(
+            InvoiceHeaderCreate(number=OFFSET + 3, date=date(2024, 1, 3), person_id=person_id))
+
+    assert (error.value.status_code, error.value.detail) == (422, f"Unknown person id(s): {person_id}")
+    assert index.missing("person", [person_id]) == {person_id}
@@ -0,0 +1,174 @@
+import json
+import os
+from datetime import date
+
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.db.postgresql import Base
+from app.models import InvoiceDetail, InvoiceHeader, Person, Product
+from app.servicies.export import WarehouseExportService
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Provides a session on a local SQLite database with one customer, one product and two invoices in different months.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Person(id=1, name="Jorge", surname="Quin", document_type="CC", document="1"),
+        Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"),
+        InvoiceHeader(id=1, number=1, date=date(2024, 1, 10), person_id=1),
+        InvoiceHeader(id=2, number=2, date=date(2024, 2, 10), person_id=1),
+        InvoiceDetail(id=1, invoice_header_id=1, product_id=1, quantity=2, unit_price=1.5, unit_cost=1.0),
+        InvoiceDetail(id=2, invoice_header_id=2, product_id=1, quantity=1, unit_price=1.5, unit_cost=1.0),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_export_writes_month_partitions(db, tmp_path):
+    summary = WarehouseExportService(db, directory=str(tmp_path / "out"), batch_size=1).export_invoice_lines()
+
+    assert summary["rows"] == 2
+    assert summary["watermarks"]["main"][1] == 2
+    dataset = pq.read_table(str(tmp_path / "out" / "invoice_lines" / "month=2024-01"))
+    assert dataset.column("person_name").to_pylist() == ["Jorge"]
+    assert dataset.column("product_description").to_pylist() == ["Milk"]
+
+
+def test_export_is_incremental(db, tmp_path):
+    service = WarehouseExportService(db, directory=str(tmp_path / "out"))
+    service.export_invoice_lines()
+    db.add(InvoiceDetail(id=3, invoice_header_id=2, product_id=1, quantity=5, unit_price=1.5, unit_cost=1.0))
+    db.commit()
+
+    summary = service.export_invoice_lines()
+
+    assert summary["rows"] == 1
+    assert summary["watermarks"]["main"][1] == 3
+    assert service.export_invoice_lines()["rows"] == 0
+
+
+def test_updated_lines_are_exported_again(db, tmp_path):
+    service = WarehouseExportService(db, directory=str(tmp_path / "out"))
+    service.export_invoice_lines()
+    db.get(InvoiceDetail, 1).quantity = 7
+    db.commit()
+
+    summary = service.export_invoice_lines()
+
+    assert summary["rows"] == 1
+    latest = pq.read_table(summary["files"][0])
+    assert latest.column("detail_id").to_pylist() == [1]
+    assert latest.column("quantity").to_pylist() == [7.0]
+
+
+def test_lines_of_changed_products_are_exported_again(db, tmp_path):
+    service = WarehouseExportService(db, directory=str(tmp_path / "out"))
+    first = pq.read_table(service.export_invoice_lines()["files"][0])
+    db.get(Product, 1).description = "Whole milk"
+    db.commit()
+
+    summary = service.export_invoice_lines()
+
+    assert summary["rows"] == 2
+    latest = [pq.read_table(path) for path in summary["files"]]
+    assert {name for table in latest for name in table.column("product_description").to_pylist()} == {"Whole milk"}
+    assert min(seq for table in latest for seq in table.column("change_seq").to_pylist()) > \
+        max(first.column("change_seq").to_pylist())
+    assert service.export_invoice_lines()["rows"] == 0
+
+
+def test_deleted_lines_are_exported_as_deletions(db, tmp_path):
+    service = WarehouseExportService(db, directory=str(tmp_path / "out"))
+    service.export_invoice_lines()
+    db.delete(db.get(InvoiceDetail, 2))
+    db.commit()
+
+    summary = service.export_invoice_lines()
+
+    assert summary["rows"] == 0 and summary["deletes"] == 1
+    deletions = pq.read_table(summary["files"][0])
+    assert os.path.dirname(summary["files"][0]) == os.path.join(str(tmp_path / "out"), "invoice_line_deletes")
+    assert deletions.column("entity").to_pylist() == ["invoice_detail"]
+    assert deletions.column("entity_id").to_pylist() == [2]
+    assert pq.read_table(service.directory).num_rows == 2
+
+
+def test_legacy_watermarks_are_read_as_detail_ids(db, tmp_path):
+    service = WarehouseExportService(db, directory=str(tmp_path / "out"))
+    os.makedirs(service.directory)
+    with open(os.path.join(service.directory, "_watermark.json"), "w") as watermark_file:
+        json.dump({"main": 1}, watermark_file)
+    for model in (InvoiceDetail, InvoiceHeader, Person, Product):
+        db.query(model).update({model.change_seq: 0})
+    db.commit()
+
+    assert service.read_watermarks() == {"main": (0, 1)}
+    assert service.export_invoice_lines()["rows"] == 1
+
+
+OFFSET = 930000
+
+
+@pytest.fixture
+def postgres_db():
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as seed:
+        seed.add_all([Person(id=OFFSET + 1, name="Jorge", surname="Quin", document_type="CC", document="export-1"),
+                      Product(id=OFFSET + 1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter")])
+        seed.flush()
+        seed.add(InvoiceHeader(id=OFFSET + 1, number=OFFSET + 1, date=date(2024, 1, 10), person_id=OFFSET + 1))
+        seed.commit()
+    yield engine
+    with Session(engine) as cleanup:
+        cleanup.query(InvoiceDetail).filter(InvoiceDetail.product_id > OFFSET).delete()
+        cleanup.query(InvoiceHeader).filter(InvoiceHeader.id > OFFSET).delete()
+        cleanup.query(Product).filter(Product.id > OFFSET).delete()
+        cleanup.query(Person).filter(Person.id > OFFSET).delete()
+        cleanup.commit()
+    engine.dispose()
+
+
+def test_lines_committing_late_are_not_skipped(postgres_db, tmp_path):
+    def line(id):
+        return InvoiceDetail(id=OFFSET + id, invoice_header_id=OFFSET + 1, product_id=OFFSET + 1, quantity=1,
+                             unit_price=1.5, unit_cost=1.0)
+
+    with Session(postgres_db) as reader:
+        service = WarehouseExportService(reader, directory=str(tmp_path / "out"))
+        service.export_invoice_lines(full=True)
+        exported = set()
+
+        slow = Session(postgres_db)
+        slow.add(line(1))
+        slow.flush()  # Takes the lower transaction id, commits last.
+        with Session(postgres_db) as fast:
+            fast.add(line(2))
+            fast.commit()
+        summary = service.export_invoice_lines()
+        exported.update(*(pq.read_table(path).column("detail_id").to_pylist() for path in summary["files"]))
+        reader.rollback()
+
+        slow.commit()
+        slow.close()
+        summary = service.export_invoice_lines()
+        exported.update(*(pq.read_table(path).column("detail_id").to_pylist() for path in summary["files"]))
+
+    assert {OFFSET + 1, OFFSET + 2} <= exported
@@ -0,0 +1,65 @@
+import zipfile
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.postgresql import Base
+from app.models import InvoiceDetail, InvoiceHeader, Person, Product
+from app.servicies.invoice_rendering import InvoiceRenderingService
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Provides a session on a local SQLite database with one customer, one product and three invoices,
+    the last one without lines.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'rendering.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Person(id=1, name="Jorge", surname="Quiñones", document_type="CC", document="1"),
+        Product(id=1, description="Milk <1L>", price=1.5, cost=1.0, unit_of_measure="Liter"),
+        InvoiceHeader(id=1, number=101, date=date(2024, 1, 10), person_id=1),
+        InvoiceHeader(id=2, number=102, date=date(2024, 2, 10), person_id=1),
+        InvoiceHeader(id=3, number=103, date=date(2024, 2, 11), person_id=1),
+        InvoiceDetail(id=1, invoice_header_id=1, product_id=1, quantity=2, unit_price=1.5, unit_cost=1.0),
+        InvoiceDetail(id=2, invoice_header_id=2, product_id=1, quantity=1, unit_price=1.5, unit_cost=1.0),
+        InvoiceDetail(id=3, invoice_header_id=2, product_id=1, quantity=4, unit_price=1.5, unit_cost=1.0),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_render_invoice_as_html(db):
+    html = InvoiceRenderingService(db).render_invoice(2, "html").decode()
+
+    assert "Invoice 102" in html
+    assert "Quiñones" in html
+    assert "Milk &lt;1L&gt;" in html
+    assert "Total: 7.50" in html
+    assert InvoiceRenderingService(db).render_invoice(99, "html") is None
+
+
+def test_render_batch_into_zip(db, tmp_path):
+    output = str(tmp_path / "statements.zip")
+
+    summary = InvoiceRenderingService(db, workers=2, chunk_size=1).render_batch(
+        output, "pdf", start_date=date(2024, 2, 1))
+
+    assert summary["documents"] == 2
+    assert summary["documents_per_second"] > 0
+    with zipfile.ZipFile(output) as archive:
+        assert sorted(archive.namelist()) == ["invoice-102.pdf", "invoice-103.pdf"]
+        assert archive.read("invoice-102.pdf").startswith(b"%PDF")
+
+
+def test_render_batch_into_directory(db, tmp_path):
+    summary = InvoiceRenderingService(db, workers=1).render_batch(str(tmp_path / "out"), "html")
+
+    assert summary["documents"] == 3
+    assert sorted(path.name for path in (tmp_path / "out").iterdir()) == [
+        "invoice-101.html", "invoice-102.html", "invoice-103.html"]
@@ -0,0 +1,151 @@
+import json
+import threading
+import zipfile
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.postgresql import Base
+from app.models import InvoiceDetail, InvoiceHeader, Job, Person, Product
+from app.schemas.job import ExportJobParams, JobCreate
+from app.servicies.jobs import JobRunner, JobService
+
+
+@pytest.fixture
+def factory(tmp_path):
+    """
+    Provides a session factory on a local SQLite database with one invoice of one line.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    with factory() as db:
+        db.add_all([Person(id=1, name="Jorge", surname="Quin", document_type="CC", document="1"),
+                    Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"),
+                    InvoiceHeader(id=1, number=101, date=date(2024, 1, 10), person_id=1),
+                    InvoiceDetail(id=1, invoice_header_id=1, product_id=1, quantity=2, unit_price=1.5, unit_cost=1.0)])
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+def _runner(factory, tmp_path, handlers=None):
+    return JobRunner(factory, concurrency=1, poll_interval=0.05, directory=str(tmp_path / "jobs"), handlers=handlers)
+
+
+def test_submit_validates_kind_and_params(factory):
+    with factory() as db:
+        service = JobService(db)
+        with pytest.raises(ValueError):
+            service.submit(JobCreate(kind="nope"))
+        with pytest.raises(ValueError):
+            service.submit(JobCreate(kind="reports.margin", params={"group_by": "color"}))
+        job = service.submit(JobCreate(kind="reports.margin", params={"start_date": "2024-01-01"}))
+        assert job["status"] == "queued"
+        assert job["params"]["start_date"] == "2024-01-01"
+        with pytest.raises(HTTPException):
+            service.get_job(job["id"] + 1)
+
+
+def test_run_margin_report_job(factory, tmp_path):
+    with factory() as db:
+        job_id = JobService(db).submit(JobCreate(kind="reports.margin", params={"group_by": "product"}))["id"]
+
+    runner = _runner(factory, tmp_path)
+    assert runner.run_once() is True
+    assert runner.run_once() is False
+
+    with factory() as db:
+        service = JobService(db)
+        job = service.get_job(job_id)
+        assert job["status"] == "succeeded"
+        assert job["progress"] == 1.0
+        assert job["result"] == {"rows": 1}
+        assert job["artifact_url"] == f"/jobs/{job_id}/artifact"
+        with open(service.artifact(job_id)) as file:
+            assert json.load(file)["rows"][0]["revenue"] == 3.0
+
+
+def test_run_render_job_reports_progress(factory, tmp_path):
+    with factory() as db:
+        job_id = JobService(db).submit(JobCreate(kind="invoices.render", params={"format": "html"}))["id"]
+
+    _runner(factory, tmp_path).run_once()
+
+    with factory() as db:
+        service = JobService(db)
+        job = service.get_job(job_id)
+        assert job["status"] == "succeeded"
+        assert job["message"] == "1 invoices rendered"
+        with zipfile.ZipFile(service.artifact(job_id)) as archive:
+            assert archive.namelist() == ["invoice-101.html"]
+
+
+def test_failed_job_records_error(factory, tmp_path):
+    def explode(context, db, params):
+        raise RuntimeError("disk full")
+
+    with factory() as db:
+        job_id = JobService(db).submit(JobCreate(kind="export.invoice_lines"))["id"]
+
+    _runner(factory, tmp_path, {"export.invoice_lines": (explode, ExportJobParams)}).run_once()
+
+    with factory() as db:
+        job = JobService(db).get_job(job_id)
+        assert job["status"] == "failed"
+        assert job["error"] == "RuntimeError: disk full"
+        assert job["artifact_url"] is None
+
+
+def test_cancel_queued_and_running_jobs(factory, tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def wait_for_cancel(context, db, params):
+        context.report(0.25, "waiting")
+        started.set()
+        release.wait(5)
+        context.report(0.5)
+        return {}
+
+    with factory() as db:
+        service = JobService(db)
+        running_id = service.submit(JobCreate(kind="export.invoice_lines"))["id"]
+        queued_id = service.submit(JobCreate(kind="export.invoice_lines"))["id"]
+
+    runner = _runner(factory, tmp_path, {"export.invoice_lines": (wait_for_cancel, ExportJobParams)})
+    worker = threading.Thread(target=runner.run_once)
+    worker.start()
+    assert started.wait(5)
+
+    with factory() as db:
+        service = JobService(db)
+        assert service.get_job(running_id)["progress"] == 0.25
+        assert service.cancel(queued_id)["status"] == "cancelled"
+        assert service.cancel(running_id)["cancel_requested"] is True
+    runner.heartbeat()
+    release.set()
+    worker.join(5)
+
+    with factory() as db:
+        assert JobService(db).get_job(running_id)["status"] == "cancelled"
+    assert runner.run_once() is False
+
+
+def test_stale_jobs_are_requeued_then_failed(factory, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.servicies.jobs.settings.JOBS_HEARTBEAT_TIMEOUT", -1)
+    monkeypatch.setattr("app.servicies.jobs.settings.JOBS_MAX_ATTEMPTS", 2)
+    with factory() as db:
+        db.add(Job(id=1, kind="export.invoice_lines", params="{}", status="running", attempts=1,
+                   heartbeat_at=date(2024, 1, 1)))
+        db.add(Job(id=2, kind="export.invoice_lines", params="{}", status="running", attempts=2,
+                   heartbeat_at=date(2024, 1, 1)))
+        db.commit()
+
+    _runner(factory, tmp_path).heartbeat()
+
+    with factory() as db:
+        assert db.get(Job, 1).status == "queued"
+        assert db.get(Job, 2).status == "failed"
@@ -0,0 +1,53 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.live_sales import LiveSales
+from app.db.postgresql import Base
+from app.models import InvoiceHeader, Person, Product
+from app.repositories.invoice_detail import InvoiceDetailRepository
+from app.schemas.invoice_detail import InvoiceDetailCreate
+from app.servicies.live_sales import LiveSalesService, LiveSalesSnapshotter
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add_all([Person(id=1, name="Ada", surname="Lovelace", document_type="DNI", document="1"),
+                    Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"),
+                    Product(id=2, description="Cheese", price=8.0, cost=5.0, unit_of_measure="Kilogram")])
+        db.flush()
+        db.add(InvoiceHeader(id=1, number=1, date=date(2024, 1, 1), person_id=1))
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+def test_created_lines_are_counted_live(session_factory, monkeypatch):
+    sales = LiveSales(capacity=10)
+    monkeypatch.setattr("app.db.notifications.live_sales", sales)
+    with session_factory() as db:
+        repository = InvoiceDetailRepository(db)
+        repository.create_invoice_detail(InvoiceDetailCreate(invoice_header_id=1, product_id=1, quantity=4))
+        repository.create_invoice_detail(InvoiceDetailCreate(invoice_header_id=1, product_id=2, quantity=1))
+
+        by_quantity = LiveSalesService(db, sales).top_products("5m", "quantity", 5)
+        by_revenue = LiveSalesService(db, sales).top_products("5m", "revenue", 5)
+
+    assert [(item["description"], item["value"]) for item in by_quantity["items"]] == [("Milk", 4.0), ("Cheese", 1.0)]
+    assert [(item["description"], item["value"]) for item in by_revenue["items"]] == [("Cheese", 8.0), ("Milk", 6.0)]
+
+
+def test_snapshots_survive_a_restart(session_factory):
+    sales = LiveSales(capacity=10)
+    sales.record(1, quantity=3, revenue=4.5)
+    LiveSalesSnapshotter(sales, session_factory, interval=60).save()
+
+    restarted = LiveSales(capacity=10)
+    LiveSalesSnapshotter(restarted, session_factory, interval=60).restore()
+    assert restarted.top("1h", "quantity", 5)["items"] == [(1, 3.0, 0.0)]
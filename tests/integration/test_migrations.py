@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from app.core.config import settings
+from app.db.migrations import (MIGRATIONS, _create_index_concurrently, apply_migrations, current_version,
+                                migration_lock)
+
+
+def test_invoice_detail_prices_are_backfilled_from_products(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE products (id INTEGER PRIMARY KEY, price FLOAT, cost FLOAT)"))
+        connection.execute(text("CREATE TABLE invoice_details (id INTEGER PRIMARY KEY, product_id INTEGER, "
+                                "quantity FLOAT)"))
+        connection.execute(text("INSERT INTO products VALUES (1, 2.5, 1.0), (2, 4.0, 3.0)"))
+        connection.execute(text("INSERT INTO invoice_details VALUES (1, 1, 2), (2, 2, 1), (3, 99, 1)"))
+
+    apply_migrations(engine)
+
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT id, unit_price, unit_cost FROM invoice_details ORDER BY id")).all()
+    assert [tuple(row) for row in rows] == [(1, 2.5, 1.0), (2, 4.0, 3.0), (3, None, None)]
+    assert current_version(engine) == MIGRATIONS[-1][0]
+
+
+def test_migrations_are_applied_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE products (id INTEGER PRIMARY KEY, price FLOAT, cost FLOAT)"))
+        connection.execute(text("CREATE TABLE invoice_details (id INTEGER PRIMARY KEY, product_id INTEGER, "
+                                "quantity FLOAT)"))
+
+    apply_migrations(engine)
+    apply_migrations(engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM schema_version")).scalar() == len(MIGRATIONS)
+
+
+def test_workers_migrate_one_at_a_time_and_reread_the_version(monkeypatch):
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    apply_migrations(engine)
+    applied = []
+    monkeypatch.setattr("app.db.migrations.MIGRATIONS", MIGRATIONS + [(10**6, "Test", applied.append)])
+    finished = threading.Event()
+
+    def worker():
+        apply_migrations(engine)
+        finished.set()
+
+    try:
+        with migration_lock(engine):
+            threads = [threading.Thread(target=worker) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            assert not finished.wait(0.3)
+        for thread in threads:
+            thread.join(timeout=10)
+        assert applied == [engine]
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM schema_version WHERE version = :version"), {"version": 10**6})
+        engine.dispose()
+
+
+def test_failed_concurrent_index_builds_leave_no_invalid_index():
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    autocommit = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    index = "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass('ux_index_build_test')"
+    try:
+        autocommit.execute(text("DROP TABLE IF EXISTS index_build_test"))
+        autocommit.execute(text("CREATE TABLE index_build_test (value INTEGER)"))
+        autocommit.execute(text("INSERT INTO index_build_test VALUES (1), (1)"))
+
+        with pytest.raises(DBAPIError):
+            _create_index_concurrently(engine, "ux_index_build_test", "ON index_build_test (value)", unique=True)
+        assert autocommit.execute(text(index)).first() is None
+
+        # A build interrupted elsewhere leaves an invalid index, which the next build replaces.
+        with pytest.raises(DBAPIError):
+            autocommit.execute(text("CREATE UNIQUE INDEX CONCURRENTLY ux_index_build_test ON index_build_test (value)"))
+        assert autocommit.execute(text(index)).scalar() is False
+        autocommit.execute(text("DELETE FROM index_build_test"))
+        _create_index_concurrently(engine, "ux_index_build_test", "ON index_build_test (value)", unique=True)
+        assert autocommit.execute(text(index)).scalar() is True
+    finally:
+        autocommit.execute(text("DROP TABLE IF EXISTS index_build_test"))
+        autocommit.close()
+        engine.dispose()
@@ -0,0 +1,88 @@
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.cache import EntityCache
+from app.core.config import settings
+from app.db.notifications import SALES_CHANNEL, ChangeListener, notify_change, notify_sale
+
+
+@pytest.fixture
+def postgres_engine():
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    yield engine
+    engine.dispose()
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_committed_changes_evict_the_entries_of_other_workers(postgres_engine):
+    cache = EntityCache(capacity=10)
+    listener = ChangeListener(postgres_engine, cache, reconnect_delay=0.05)
+    listener.start()
+    try:
+        assert listener.connected.wait(2)
+        cache.get_or_load("product", 42, lambda: "cached")
+
+        with Session(postgres_engine) as db:
+            notify_change(db, "product", 42)
+            db.rollback()
+        time.sleep(0.1)
+        assert cache.stats()["size"] == 1
+
+        with Session(postgres_engine) as db:
+            notify_change(db, "product", 42)
+            db.commit()
+        assert _wait_until(lambda: cache.stats()["size"] == 0)
+    finally:
+        listener.stop()
+
+
+def test_reconnect_flushes_the_cache(postgres_engine):
+    cache = EntityCache(capacity=10)
+    listener = ChangeListener(postgres_engine, cache, reconnect_delay=0.05)
+    listener.start()
+    try:
+        assert listener.connected.wait(2)
+        cache.get_or_load("person", 1, lambda: "cached")
+        with postgres_engine.begin() as connection:
+            connection.execute(text("SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                                    "WHERE query = 'LISTEN entity_changes'"))
+        assert _wait_until(lambda: cache.stats()["flushes"] >= 1 and listener.connected.is_set())
+        assert cache.stats()["size"] == 0
+    finally:
+        listener.stop()
+
+
+def test_committed_sales_reach_the_subscribers_of_other_workers(postgres_engine):
+    sales = []
+    listener = ChangeListener(postgres_engine, EntityCache(capacity=10), reconnect_delay=0.05)
+    listener.subscribe(SALES_CHANNEL, sales.append)
+    listener.start()
+    try:
+        assert listener.connected.wait(2)
+        with Session(postgres_engine) as db:
+            notify_sale(db, 7, 2.0, 3.0)
+            db.rollback()
+        with Session(postgres_engine) as db:
+            notify_sale(db, 8, 1.0, 4.5)
+            db.commit()
+        assert _wait_until(lambda: len(sales) == 1)
+        assert json.loads(sales[0]) == {"product_id": 8, "quantity": 1.0, "revenue": 4.5}
+    finally:
+        listener.stop()
@@ -0,0 +1,134 @@
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.postgresql import Base
+from app.models import OutboxEvent, Person, Product
+from app.repositories.invoice_detail import InvoiceDetailRepository
+from app.repositories.invoice_header import InvoiceHeaderRepository
+from app.schemas.invoice_detail import InvoiceDetailCreate
+from app.schemas.invoice_header import InvoiceHeaderCreate
+from app.servicies.outbox import FileSink, OutboxPublisher, OutboxSink
+
+
+@pytest.fixture
+def factory(tmp_path):
+    """
+    Provides a session factory on a local SQLite database with one customer and one product.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    with factory() as db:
+        db.add_all([Person(id=1, name="Jorge", surname="Quin", document_type="CC", document="1"),
+                    Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter")])
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+class FailingSink(OutboxSink):
+    def deliver(self, events):
+        raise ConnectionError("sink down")
+
+
+class RecordingSink(OutboxSink):
+    def __init__(self, name):
+        super().__init__(name)
+        self.events = []
+
+    def deliver(self, events):
+        self.events.extend(events)
+
+
+def _read_lines(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_invoice_changes_are_published_to_every_sink(factory, tmp_path):
+    with factory() as db:
+        header = InvoiceHeaderRepository(db).create_invoice_header(
+            InvoiceHeaderCreate(number=1, date=date(2024, 1, 10), person_id=1))
+        InvoiceDetailRepository(db).create_invoice_detail(
+            InvoiceDetailCreate(invoice_header_id=header.id, product_id=1, quantity=2))
+        InvoiceHeaderRepository(db).delete_invoice_header(header.id)
+    first, second = tmp_path / "first.jsonl", tmp_path / "second.jsonl"
+    publisher = OutboxPublisher([FileSink(str(first)), FileSink(str(second))], sources=[("main", factory)],
+                                batch_size=2)
+
+    assert publisher.publish_once() == 4
+    assert publisher.publish_once() == 2
+    assert publisher.publish_once() == 0
+
+    events = _read_lines(first)
+    assert [event["type"] for event in events] == ["invoice.created", "invoice_detail.created", "invoice.deleted"]
+    assert events[1]["data"]["unit_price"] == 1.5
+    assert _read_lines(second) == events
+    with factory() as db:
+        assert db.query(OutboxEvent).count() == 0
+
+
+def test_failed_delivery_is_retried_and_holds_back_the_purge(factory, tmp_path):
+    with factory() as db:
+        InvoiceHeaderRepository(db).create_invoice_header(
+            InvoiceHeaderCreate(number=1, date=date(2024, 1, 10), person_id=1))
+    delivered = tmp_path / "delivered.jsonl"
+    failing = FailingSink("flaky")
+    publisher = OutboxPublisher([FileSink(str(delivered)), failing], sources=[("main", factory)])
+
+    assert publisher.publish_once() == 1
+    with factory() as db:
+        assert db.query(OutboxEvent).count() == 1
+
+    failing.deliver = lambda events: None
+    assert publisher.publish_once() == 1
+    assert len(_read_lines(delivered)) == 1
+    with factory() as db:
+        assert db.query(OutboxEvent).count() == 0
+
+
+def test_batches_are_delivered_outside_the_claim_transaction(factory):
+    with factory() as db:
+        InvoiceHeaderRepository(db).create_invoice_header(
+            InvoiceHeaderCreate(number=1, date=date(2024, 1, 10), person_id=1))
+    other = RecordingSink("probe")
+    competitor = OutboxPublisher([other], sources=[("main", factory)])
+
+    class ProbingSink(OutboxSink):
+        def deliver(self, events):
+            # The claimed cursor is not locked, but another publisher must not take it.
+            assert competitor.publish_once() == 0
+            with factory() as db:
+                db.query(OutboxEvent).update({OutboxEvent.payload: OutboxEvent.payload})
+                db.commit()
+
+    publisher = OutboxPublisher([ProbingSink("probe")], sources=[("main", factory)])
+
+    assert publisher.publish_once() == 1
+    assert publisher.publish_once() == 0
+    assert other.events == []
+
+
+def test_lapsed_claim_is_taken_over(factory, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.servicies.outbox.settings.OUTBOX_LEASE_SECONDS", 0)
+    with factory() as db:
+        InvoiceHeaderRepository(db).create_invoice_header(
+            InvoiceHeaderCreate(number=1, date=date(2024, 1, 10), person_id=1))
+    path = tmp_path / "events.jsonl"
+    other = OutboxPublisher([FileSink(str(path))], sources=[("main", factory)])
+
+    class SlowSink(FileSink):
+        def deliver(self, events):
+            assert other.publish_once() == 1
+            super().deliver(events)
+
+    publisher = OutboxPublisher([SlowSink(str(path))], sources=[("main", factory)])
+
+    assert publisher.publish_once() == 1
+    assert len(_read_lines(path)) == 2
+    assert publisher.publish_once() == 0
+    assert other.publish_once() == 0
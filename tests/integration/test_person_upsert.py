@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.db.migrations import _unique_person_documents
+from app.db.postgresql import Base
+from app.models import Person
+from app.repositories.person import PersonRepository
+from app.schemas.person import PersonCreate, PersonUpdate
+
+
+@pytest.fixture
+def factory(tmp_path):
+    """
+    Provides a session factory on a local SQLite database.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'persons.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def postgres_engine():
+    engine = create_engine(settings.DATABASE_URL, pool_size=10)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    Base.metadata.create_all(bind=engine)
+    _unique_person_documents(engine)
+    yield engine
+    with Session(engine) as db:
+        db.query(Person).filter(Person.document_type == "TEST").delete()
+        db.commit()
+    engine.dispose()
+
+
+def _person(name="Jorge", document="80123"):
+    return PersonCreate(name=name, surname="Quin", document_type="TEST", document=document)
+
+
+def test_upsert_creates_then_updates(factory):
+    with factory() as db:
+        repository = PersonRepository(db)
+        created, was_created = repository.upsert_person_by_document(_person())
+        same, second = repository.upsert_person_by_document(_person())
+        renamed, third = repository.upsert_person_by_document(_person(name="Jorge Luis"))
+
+    assert (was_created, second, third) == (True, False, False)
+    assert created.id == same.id == renamed.id
+    assert renamed.name == "Jorge Luis"
+
+
+def test_duplicate_documents_are_rejected(factory):
+    with factory() as db:
+        repository = PersonRepository(db)
+        repository.create_person(_person())
+        other = repository.create_person(_person(document="52001"))
+        with pytest.raises(HTTPException) as error:
+            repository.create_person(_person())
+        assert error.value.status_code == 409
+        with pytest.raises(HTTPException):
+            repository.update_person(other.id, PersonUpdate(document="80123"))
+
+
+def test_concurrent_upserts_create_one_person(postgres_engine):
+    barrier, errors, ids = threading.Barrier(8), [], []
+
+    def register(index):
+        with Session(postgres_engine) as db:
+            barrier.wait()
+            try:
+                person, _ = PersonRepository(db).upsert_person_by_document(_person(name=f"Jorge {index % 2}"))
+                ids.append(person.id)
+            except Exception as error:
+                errors.append(error)
+
+    threads = [threading.Thread(target=register, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(ids)) == 1
+    with Session(postgres_engine) as db:
+        assert db.query(Person).filter(Person.document_type == "TEST").count() == 1
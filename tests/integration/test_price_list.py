@@ -0,0 +1,123 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.db.migrations import _add_product_skus
+from app.db.postgresql import Base
+from app.models import Product
+from app.repositories.product import ProductRepository
+from app.schemas.product import PriceListItem, ProductCreate, ProductUpdate
+
+
+def _items():
+    return [
+        PriceListItem(sku="MILK-1L", price=1.6, cost=1.0, unit_of_measure="Liter"),
+        PriceListItem(sku="BREAD", price=1.0, cost=0.5, unit_of_measure="Unit"),
+        PriceListItem(sku="CHEESE", price=5.0, cost=3.0, unit_of_measure="Kilogram", description="Cheese"),
+        PriceListItem(sku="RICE", price=2.0, cost=1.0, unit_of_measure="Kilogram"),
+        PriceListItem(sku="BREAD", price=1.2, cost=0.5, unit_of_measure="Unit"),
+    ]
+
+
+def _seed(db, offset=0):
+    db.add_all([Product(id=offset + 1, sku="MILK-1L", description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"),
+                Product(id=offset + 2, sku="BREAD", description="Bread", price=1.0, cost=0.5, unit_of_measure="Unit"),
+                Product(id=offset + 3, description="No SKU", price=9.0, cost=9.0, unit_of_measure="Unit")])
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Provides a session on a local SQLite database with two products with a SKU and one without.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'prices.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    _seed(session)
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def postgres_db():
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    Base.metadata.create_all(bind=engine)
+    _add_product_skus(engine)
+    session = Session(engine)
+    _seed(session, offset=910000)
+    session.flush()
+    yield session
+    session.close()
+    with Session(engine) as cleanup:
+        cleanup.query(Product).filter(Product.id >= 910000).delete()
+        cleanup.query(Product).filter(Product.sku.in_(["MILK-1L", "BREAD", "CHEESE", "RICE"])).delete()
+        cleanup.commit()
+    engine.dispose()
+
+
+def test_duplicate_skus_are_rejected(db):
+    repository = ProductRepository(db)
+
+    with pytest.raises(HTTPException) as created:
+        repository.create_product(ProductCreate(sku="BREAD", description="Bread", price=1.0, cost=0.5,
+                                                unit_of_measure="Unit"))
+    with pytest.raises(HTTPException) as updated:
+        repository.update_product(3, ProductUpdate(sku="MILK-1L"))
+
+    assert created.value.status_code == updated.value.status_code == 409
+    assert db.query(Product).filter(Product.id == 3).one().sku is None
+
+
+def _statuses(outcomes):
+    return [(outcome["sku"], outcome["status"]) for outcome in outcomes]
+
+
+@pytest.mark.parametrize("fixture", ["db", "postgres_db"])
+def test_price_list_outcomes(fixture, request):
+    db = request.getfixturevalue(fixture)
+    repository = ProductRepository(db)
+
+    outcomes = repository.upsert_price_list(_items(), batch_size=2)
+
+    assert _statuses(outcomes) == [("MILK-1L", "updated"), ("BREAD", "skipped"), ("CHEESE", "created"),
+                                   ("RICE", "skipped"), ("BREAD", "updated")]
+    prices = {product.sku: product.price for product in db.query(Product).filter(Product.sku.isnot(None))}
+    assert prices == {"MILK-1L": 1.6, "BREAD": 1.2, "CHEESE": 5.0}
+    assert db.query(Product).filter(Product.sku == "MILK-1L").one().description == "Milk"
+
+    again = repository.upsert_price_list(_items()[2:3])
+    assert _statuses(again) == [("CHEESE", "unchanged")]
+    assert again[0]["id"] == outcomes[2]["id"]
+
+
+def test_price_list_statuses_follow_concurrent_inserts(postgres_db):
+    repository = ProductRepository(postgres_db)
+    upsert_batch = repository._upsert_batch
+
+    def insert_concurrently(items):
+        # Another price list commits both SKUs after this one looked them up.
+        with Session(postgres_db.get_bind()) as other:
+            other.add_all([Product(sku="CHEESE", description="Cheese", price=5.0, cost=3.0, unit_of_measure="Kilogram"),
+                           Product(sku="RICE", description="Rice", price=1.0, cost=1.0, unit_of_measure="Kilogram")])
+            other.commit()
+        return upsert_batch(items)
+
+    repository._upsert_batch = insert_concurrently
+    outcomes = repository.upsert_price_list([
+        PriceListItem(sku="CHEESE", price=5.0, cost=3.0, unit_of_measure="Kilogram", description="Cheese"),
+        PriceListItem(sku="RICE", price=2.0, cost=1.0, unit_of_measure="Kilogram", description="Rice"),
+    ])
+
+    assert _statuses(outcomes) == [("CHEESE", "unchanged"), ("RICE", "updated")]
+    ids = dict(postgres_db.query(Product.sku, Product.id).filter(Product.sku.in_(["CHEESE", "RICE"])).all())
+    assert [outcome["id"] for outcome in outcomes] == [ids["CHEESE"], ids["RICE"]]
@@ -0,0 +1,66 @@
+import io
+import os
+from concurrent.futures import wait
+
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.images import ImageStore, UnsupportedImage
+from app.db.postgresql import Base
+from app.models import Product
+from app.servicies.product_image import ProductImageService
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Provides a session on a local SQLite database with one product.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'images.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add(Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ImageStore(str(tmp_path / "images"), max_bytes=1024 * 1024, thumbnail_sizes=(16,), workers=1)
+    yield store
+    store.shutdown()
+
+
+def _png(width=64, height=32):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def test_uploads_are_stored_once_and_thumbnailed(db, store):
+    service = ProductImageService(db, store=store)
+
+    image = service.add_image(1, _png())
+    again = service.add_image(1, _png())
+
+    assert again["id"] == image["id"]
+    assert image["content_type"] == "image/png"
+    originals = [files for _, _, files in os.walk(os.path.join(store.directory, "originals")) if files]
+    assert originals == [[f"{image['digest']}.png"]]
+    assert service.original(f"{image['digest']}.png")[1] == "image/png"
+
+    wait(store.schedule_thumbnails(store.save(_png())).values(), timeout=60)
+    with Image.open(service.thumbnail(image["digest"], 16)) as thumbnail:
+        assert thumbnail.size == (16, 8)
+    assert service.get_images(1) == [image]
+
+
+def test_non_images_are_rejected(db, store):
+    with pytest.raises(UnsupportedImage):
+        ProductImageService(db, store=store).add_image(1, io.BytesIO(b"%PDF-1.4"))
+    assert os.listdir(os.path.join(store.directory, "staging")) == []
@@ -0,0 +1,141 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.db.migrations import _build_revenue_rollups
+from app.db.postgresql import Base
+from app.models import InvoiceDetail, InvoiceHeader, Person, Product, RevenueRollup
+from app.repositories.invoice_detail import InvoiceDetailRepository
+from app.repositories.invoice_header import InvoiceHeaderRepository
+from app.schemas.invoice_detail import InvoiceDetailCreate
+from app.servicies.revenue_rollups import RevenueRollupService
+
+OFFSET = 920000
+
+
+def _seed(db):
+    db.add_all([Person(id=OFFSET + 1, name="Ada", surname="Lovelace", document_type="DNI", document="rollup-1"),
+                Person(id=OFFSET + 2, name="Grace", surname="Hopper", document_type="DNI", document="rollup-2"),
+                Product(id=OFFSET + 1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"),
+                Product(id=OFFSET + 2, description="Cheese", price=8.0, cost=5.0, unit_of_measure="Kilogram")])
+    db.flush()
+    db.add_all([InvoiceHeader(id=OFFSET + 1, number=OFFSET + 1, date=date(2024, 1, 30), person_id=OFFSET + 1),
+                InvoiceHeader(id=OFFSET + 2, number=OFFSET + 2, date=date(2024, 1, 31), person_id=OFFSET + 2),
+                InvoiceHeader(id=OFFSET + 3, number=OFFSET + 3, date=date(2024, 2, 1), person_id=OFFSET + 1)])
+    db.commit()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Provides a session on a local SQLite database with two persons, two products and three invoices.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollups.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    _seed(session)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def postgres_db():
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    Base.metadata.create_all(bind=engine)
+    session = Session(engine)
+    _seed(session)
+    yield session
+    session.close()
+    with Session(engine) as cleanup:
+        cleanup.query(InvoiceDetail).filter(InvoiceDetail.product_id > OFFSET).delete()
+        cleanup.query(InvoiceHeader).filter(InvoiceHeader.id > OFFSET).delete()
+        cleanup.query(Product).filter(Product.id > OFFSET).delete()
+        cleanup.query(Person).filter(Person.id > OFFSET).delete()
+        cleanup.query(RevenueRollup).filter(RevenueRollup.key_id > OFFSET).delete()
+        cleanup.commit()
+    engine.dispose()
+
+
+def _write_lines(db):
+    repository = InvoiceDetailRepository(db)
+    for header, product, quantity in [(1, 1, 2), (1, 2, 1), (2, 1, 4), (3, 1, 1), (3, 2, 2)]:
+        repository.create_invoice_detail(InvoiceDetailCreate(invoice_header_id=OFFSET + header,
+                                                             product_id=OFFSET + product, quantity=quantity))
+
+
+def _revenue(service, dimension, grain, key):
+    return [(point["period"], point["lines"], point["revenue"])
+            for point in service.series(dimension, grain, OFFSET + key)]
+
+
+@pytest.mark.parametrize("fixture", ["db", "postgres_db"])
+def test_line_writes_keep_the_rollups_current(fixture, request):
+    db = request.getfixturevalue(fixture)
+    _write_lines(db)
+    service = RevenueRollupService(db)
+
+    assert _revenue(service, "product", "day", 1) == [
+        (date(2024, 1, 30), 1, 3.0), (date(2024, 1, 31), 1, 6.0), (date(2024, 2, 1), 1, 1.5)]
+    assert _revenue(service, "product", "month", 1) == [(date(2024, 1, 1), 2, 9.0), (date(2024, 2, 1), 1, 1.5)]
+    assert _revenue(service, "person", "month", 1) == [(date(2024, 1, 1), 2, 11.0), (date(2024, 2, 1), 2, 17.5)]
+    january = service.series("person", "day", OFFSET + 1, end_date=date(2024, 1, 31))
+    assert [(point["period"], point["margin"]) for point in january] == [(date(2024, 1, 30), 4.0)]
+
+    cheese = db.query(InvoiceDetail).filter(InvoiceDetail.invoice_header_id == OFFSET + 3,
+                                            InvoiceDetail.product_id == OFFSET + 2).one()
+    InvoiceDetailRepository(db).delete_invoice_detail(cheese.id)
+    assert _revenue(service, "person", "month", 1) == [(date(2024, 1, 1), 2, 11.0), (date(2024, 2, 1), 1, 1.5)]
+
+    InvoiceHeaderRepository(db).delete_invoice_header(OFFSET + 1)
+    assert _revenue(service, "person", "month", 1) == [(date(2024, 2, 1), 1, 1.5)]
+    assert _revenue(service, "product", "day", 1) == [(date(2024, 1, 31), 1, 6.0), (date(2024, 2, 1), 1, 1.5)]
+
+
+@pytest.mark.parametrize("fixture", ["db", "postgres_db"])
+def test_backfill_rebuilds_the_rollups_of_the_lines(fixture, request):
+    db = request.getfixturevalue(fixture)
+    _write_lines(db)
+    service = RevenueRollupService(db, workers=2, chunk_size=1)
+    expected = {(dimension, grain, key): service.series(dimension, grain, OFFSET + key)
+                for dimension in ("product", "person") for grain in ("day", "month") for key in (1, 2)}
+
+    db.query(RevenueRollup).filter(RevenueRollup.key_id > OFFSET).update({"revenue": 0.0})
+    db.add(RevenueRollup(dimension="product", grain="month", key_id=OFFSET + 1, period=date(2023, 6, 1),
+                         lines=1, quantity=1.0, revenue=1.5, cost=1.0))
+    db.commit()
+    progress = []
+
+    def report(done, total):
+        # Every range is swapped in whole: readers see each month either stale or rebuilt, never empty.
+        progress.append((done, total, len(service.series("product", "month", OFFSET + 1))))
+        db.commit()
+
+    summary = service.backfill(progress=report)
+
+    db.expire_all()
+    assert {key: service.series(*key[:2], OFFSET + key[2]) for key in expected} == expected
+    assert summary["ranges"] == len(progress) and progress[-1][0] == progress[-1][1]
+    assert progress[0][2] >= 2
+
+
+def test_migration_builds_the_rollups_of_its_database(db):
+    _write_lines(db)
+    service = RevenueRollupService(db)
+    expected = service.series("person", "month", OFFSET + 1)
+
+    db.query(RevenueRollup).delete()
+    db.commit()
+    _build_revenue_rollups(db.get_bind())
+
+    db.expire_all()
+    assert service.series("person", "month", OFFSET + 1) == expected
@@ -0,0 +1,131 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.db.postgresql import Base
+from app.models import Person, Product
+from app.servicies.search import SearchService, decode_cursor
+
+def _products(offset=0):
+    return [
+        Product(id=offset + 1, description="Chocolate milk", price=2.0, cost=1.0, unit_of_measure="Liter"),
+        Product(id=offset + 2, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"),
+        Product(id=offset + 3, description="Milk chocolate bar", price=3.0, cost=2.0, unit_of_measure="Unit"),
+        Product(id=offset + 4, description="Bread", price=1.0, cost=0.5, unit_of_measure="Unit"),
+    ]
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Provides a session on a local SQLite database with four products and two persons.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(_products() + [Person(id=1, name="Jorge", surname="Quiñones", document_type="CC", document="80123"),
+                                Person(id=2, name="Ana", surname="Jorgensen", document_type="CC", document="52001")])
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def postgres_db():
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    Base.metadata.create_all(bind=engine)
+    session = Session(engine)
+    session.add_all(_products(offset=900000))
+    session.flush()
+    yield session
+    session.rollback()
+    session.close()
+    engine.dispose()
+
+
+def test_search_matches_every_word(db):
+    service = SearchService(db)
+
+    assert [product.id for product in service.search_products("milk")["items"]] == [1, 2, 3]
+    assert [product.id for product in service.search_products("choc MILK")["items"]] == [1, 3]
+    assert [product.id for product in service.search_products("unit")["items"]] == [3, 4]
+    assert service.search_products("!!")["items"] == []
+    assert [person.id for person in service.search_persons("jorge")["items"]] == [1, 2]
+    assert [person.id for person in service.search_persons("801")["items"]] == [1]
+
+
+def test_search_pages_by_cursor(db):
+    service = SearchService(db)
+
+    first = service.search_products("milk", limit=2)
+    second = service.search_products("milk", limit=2, cursor=first["next_cursor"])
+
+    assert [product.id for product in first["items"]] == [1, 2]
+    assert [product.id for product in second["items"]] == [3]
+    assert second["next_cursor"] is None
+    with pytest.raises(ValueError):
+        decode_cursor("garbage")
+
+
+def test_search_ranks_at_most_the_candidate_cap(db, monkeypatch):
+    monkeypatch.setattr("app.repositories.search.settings.SEARCH_MAX_CANDIDATES", 2)
+    service = SearchService(db)
+
+    first = service.search_products("milk", limit=1)
+    second = service.search_products("milk", limit=10, cursor=first["next_cursor"])
+
+    found = [product.id for product in first["items"] + second["items"]]
+    assert len(found) == 2 and set(found) <= {1, 2, 3}
+
+
+def test_postgres_search_ranks_prefix_matches(postgres_db):
+    service = SearchService(postgres_db)
+
+    page = service.search_products("choc mil", limit=1)
+    rest = service.search_products("choc mil", limit=10, cursor=page["next_cursor"])
+
+    found = [product.id - 900000 for product in page["items"] + rest["items"]]
+    assert sorted(found) == [1, 3]
+    assert rest["next_cursor"] is None
+    assert [product.id - 900000 for product in service.search_products("bre")["items"]] == [4]
+
+
+def test_postgres_search_uses_the_text_index_on_a_large_table(postgres_db):
+    # 100,000 products, one of them with a rare word, analyzed so the planner knows the table is large.
+    postgres_db.execute(text("""
+        INSERT INTO products (id, description, price, cost, unit_of_measure)
+        SELECT 1000000 + n, 'Bulk item ' || n, 1.0, 0.5, 'Unit' FROM generate_series(1, 100000) AS n
+    """))
+    postgres_db.execute(text("UPDATE products SET description = 'Zebra cake' WHERE id = 1050000"))
+    postgres_db.execute(text("ANALYZE products"))
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "candidates" in statement:
+            statements.append((statement, parameters))
+
+    bind = postgres_db.get_bind()
+    event.listen(bind, "before_cursor_execute", capture)
+    try:
+        started = time.perf_counter()
+        page = SearchService(postgres_db).search_products("zebr")
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(bind, "before_cursor_execute", capture)
+    statement, parameters = statements[-1]
+    plan = "\n".join(row for row, in postgres_db.connection().exec_driver_sql("EXPLAIN " + statement, parameters))
+
+    assert [product.id for product in page["items"]] == [1050000]
+    assert "Bitmap Index Scan on ix_products_search" in plan
+    assert "Seq Scan on products" not in plan
+    assert elapsed < 0.5
@@ -0,0 +1,175 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.postgresql import Base
+from app.db.sharding import ShardRouter, jump_hash
+from app.models.invoice_detail import InvoiceDetail
+from app.models.invoice_header import InvoiceHeader
+from app.models.person import Person
+from app.models.product import Product
+from app.repositories.invoice_detail import ShardedInvoiceDetailRepository
+from app.repositories.invoice_header import ShardedInvoiceHeaderRepository
+from app.repositories.person import PersonRepository
+from app.schemas.invoice_detail import InvoiceDetailCreate
+from app.schemas.invoice_header import InvoiceHeaderCreate
+
+
+# Customers whose invoices live on shards 0, 2 and 1.
+CUSTOMERS = (1, 3, 4)
+
+
+@pytest.fixture
+def router(tmp_path):
+    """
+    Provides a router over three local SQLite shards with three customers, one per shard, and one product
+    replicated on each.
+    """
+    router = ShardRouter([f"sqlite:///{tmp_path / f'shard_{index}.db'}" for index in range(3)])
+    router.init_shards()
+    assert sorted(router.shard_for(person_id) for person_id in CUSTOMERS) == [0, 1, 2]
+    for person_id in CUSTOMERS:
+        router.replicate(Person(id=person_id, name="Jorge", surname="Quin", document_type="CC",
+                                document=str(person_id)))
+    router.replicate(Product(id=1, description="Milk", price=1.5, cost=1.0, unit_of_measure="Liter"))
+    yield router
+    for engine in router.engines:
+        engine.dispose()
+
+
+def test_jump_hash_is_stable_and_in_range():
+    assert [jump_hash(key, 5) for key in range(100)] == [jump_hash(key, 5) for key in range(100)]
+    assert all(0 <= jump_hash(key, 5) < 5 for key in range(1000))
+    assert all(jump_hash(key, 1) == 0 for key in range(100))
+
+
+def test_reference_data_is_replicated_on_every_shard(router):
+    assert router.fan_out(lambda db: db.query(Person).count()) == [3, 3, 3]
+    router.remove_replica(Person, 3)
+    assert router.fan_out(lambda db: db.query(Person).count()) == [2, 2, 2]
+
+
+def test_invoice_header_is_written_to_its_customer_shard(router):
+    repository = ShardedInvoiceHeaderRepository(router)
+    for person_id in CUSTOMERS:
+        repository.create_invoice_header(InvoiceHeaderCreate(number=person_id, date=date(2024, 1, 1),
+                                                             person_id=person_id))
+
+    owners = router.fan_out(lambda db: [header.person_id for header in db.query(InvoiceHeader).all()])
+    for person_id in CUSTOMERS:
+        assert owners[router.shard_for(person_id)] == [person_id]
+
+
+def test_invoice_ids_are_unique_across_shards(router):
+    repository = ShardedInvoiceHeaderRepository(router)
+    headers = [repository.create_invoice_header(InvoiceHeaderCreate(number=number, date=date(2024, 1, 1),
+                                                                    person_id=CUSTOMERS[number % 3]))
+               for number in range(9)]
+
+    assert len({header.id for header in headers}) == 9
+    for header in headers:
+        assert (header.id - 1) % 3 == router.shard_for(header.person_id)
+
+
+def test_invoice_header_listing_is_merged_in_id_order(router):
+    repository = ShardedInvoiceHeaderRepository(router)
+    for number in range(6):
+        repository.create_invoice_header(InvoiceHeaderCreate(number=number, date=date(2024, 1, 1),
+                                                             person_id=CUSTOMERS[number % 3]))
+
+    headers = repository.get_invoice_headers(skip=0, limit=4)
+    assert [header.id for header in headers] == [1, 2, 3, 4]
+    assert {router.shard_for(header.person_id) for header in headers} == {0, 1, 2}
+
+
+def test_invoice_detail_follows_its_header_shard(router):
+    first = ShardedInvoiceHeaderRepository(router).create_invoice_header(
+        InvoiceHeaderCreate(number=1, date=date(2024, 1, 1), person_id=1))
+    header = ShardedInvoiceHeaderRepository(router).create_invoice_header(
+        InvoiceHeaderCreate(number=2, date=date(2024, 1, 1), person_id=4))
+    assert router.shard_for(1) != router.shard_for(4)
+    detail = ShardedInvoiceDetailRepository(router).create_invoice_detail(
+        InvoiceDetailCreate(invoice_header_id=header.id, product_id=1, quantity=3))
+
+    assert (detail.unit_price, detail.unit_cost) == (1.5, 1.0)
+    assert first.id != header.id
+
+    counts = router.fan_out(lambda db: db.query(InvoiceDetail).count())
+    assert counts[router.shard_for(4)] == 1
+    assert sum(counts) == 1
+
+
+def test_referenced_reference_data_is_not_deleted(router, tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr("app.repositories.person.shard_router", router)
+    ShardedInvoiceHeaderRepository(router).create_invoice_header(
+        InvoiceHeaderCreate(number=1, date=date(2024, 1, 1), person_id=3))
+    with sessionmaker(bind=engine)() as db:
+        for person_id in (3, 4):
+            db.add(Person(id=person_id, name="Jorge", surname="Quin", document_type="CC", document=str(person_id)))
+        db.commit()
+
+        with pytest.raises(HTTPException) as error:
+            PersonRepository(db).delete_person(3)
+        assert error.value.status_code == 409
+        assert db.query(Person).filter(Person.id == 3).count() == 1
+
+        PersonRepository(db).delete_person(4)
+    assert router.fan_out(lambda db: sorted(id for id, in db.query(Person.id))) == [[1, 3]] * 3
+    engine.dispose()
+
+
+@pytest.fixture
+def postgres_shard_urls():
+    """
+    Provides two empty PostgreSQL databases, next to the one of DATABASE_URL, to use as shards.
+    """
+    engine = create_engine(settings.DATABASE_URL, isolation_level="AUTOCOMMIT")
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    names = ["shard_sequence_test_0", "shard_sequence_test_1"]
+    with engine.connect() as connection:
+        for name in names:
+            connection.execute(text(f"DROP DATABASE IF EXISTS {name}"))
+            connection.execute(text(f"CREATE DATABASE {name}"))
+    yield [str(make_url(settings.DATABASE_URL).set(database=name)) for name in names]
+    with engine.connect() as connection:
+        for name in names:
+            connection.execute(text(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)"))
+    engine.dispose()
+
+
+def test_sequences_of_shards_holding_rows_do_not_overlap(postgres_shard_urls):
+    single = [ShardRouter([url]) for url in postgres_shard_urls]
+    for router, start in zip(single, (100, 50)):
+        router.init_shards()
+        with router.engines[0].begin() as connection:
+            connection.execute(text("SELECT setval('invoice_headers_id_seq', :start)"), {"start": start})
+            connection.execute(text("INSERT INTO invoice_headers (number, date) VALUES (:start, '2024-01-01')"),
+                               {"start": start})
+        router.dispose()
+
+    router = ShardRouter(postgres_shard_urls)
+    router.init_shards()
+    router.init_shards()
+    ids = []
+    for index, engine in enumerate(router.engines):
+        with engine.begin() as connection:
+            ids.append([connection.execute(text("INSERT INTO invoice_headers (number, date) "
+                                                "VALUES (:number, '2024-01-02') RETURNING id"),
+                                           {"number": 1000 + 10 * index + attempt}).scalar() for attempt in range(3)])
+    router.dispose()
+
+    assert [id % 2 for id in ids[0]] == [1, 1, 1] and [id % 2 for id in ids[1]] == [0, 0, 0]
+    assert min(ids[0] + ids[1]) > 101
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController, Rejected, RouteClass
+
+
+def _controller(capacity=1, max_queue=2, max_wait=0.5):
+    return AdmissionController(capacity, (RouteClass("write", max_queue, max_wait),
+                                          RouteClass("read", max_queue, max_wait)))
+
+
+def test_classify_routes():
+    controller = _controller()
+    assert controller.classify("GET", "/health/ready") is None
+    assert controller.classify("POST", "/invoice_detail/").name == "write"
+    assert controller.classify("POST", "/batch").name == "write"
+    assert controller.classify("GET", "/invoice/1").name == "read"
+    assert controller.classify("POST", "/product/").name == "read"
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = _controller(max_queue=1, max_wait=5)
+        read = controller.classes["read"]
+        await controller.acquire(read)
+        queued = asyncio.ensure_future(controller.acquire(read))
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire(read)
+        assert rejected.value.retry_after >= 1
+        controller.release(0.01)
+        await queued
+        assert controller.in_flight == 1
+        assert read.rejected == 1 and read.admitted == 2
+
+    asyncio.run(scenario())
+
+
+def test_writes_are_granted_before_reads():
+    async def scenario():
+        controller = _controller(max_wait=5)
+        read, write = controller.classes["read"], controller.classes["write"]
+        await controller.acquire(read)
+        queued_read = asyncio.ensure_future(controller.acquire(read))
+        queued_write = asyncio.ensure_future(controller.acquire(write))
+        await asyncio.sleep(0)
+        controller.release(0.01)
+        await queued_write
+        assert not queued_read.done()
+        controller.release(0.01)
+        await queued_read
+
+    asyncio.run(scenario())
+
+
+def test_waiting_past_the_deadline_is_rejected():
+    async def scenario():
+        controller = _controller(max_wait=0.05)
+        controller.service_time = 0.001
+        read = controller.classes["read"]
+        await controller.acquire(read)
+        with pytest.raises(Rejected):
+            await controller.acquire(read)
+        assert not read.waiters
+        controller.release(0.01)
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,37 @@
+from app.core.cache import EntityCache
+
+
+def test_snapshots_are_loaded_once():
+    cache = EntityCache(capacity=10)
+    loads = []
+    for _ in range(3):
+        assert cache.get_or_load("product", 1, lambda: loads.append(1) or "snapshot") == "snapshot"
+    assert loads == [1]
+    assert cache.stats()["hits"] == 2
+
+
+def test_evicted_entries_are_reloaded():
+    cache = EntityCache(capacity=10)
+    cache.get_or_load("product", 1, lambda: "old")
+    cache.evict("product", 1)
+    assert cache.get_or_load("product", 1, lambda: "new") == "new"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_load_racing_with_an_eviction_is_not_cached():
+    cache = EntityCache(capacity=10)
+
+    def stale_load():
+        cache.evict("person", 7)
+        return "stale"
+
+    assert cache.get_or_load("person", 7, stale_load) == "stale"
+    assert cache.get_or_load("person", 7, lambda: "fresh") == "fresh"
+
+
+def test_least_recently_used_entries_are_dropped():
+    cache = EntityCache(capacity=2)
+    for id in (1, 2, 3):
+        cache.get_or_load("product", id, lambda: id)
+    assert cache.stats()["size"] == 2
+    assert cache.get_or_load("product", 1, lambda: "reloaded") == "reloaded"
@@ -0,0 +1,69 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Response
+
+from app.core.coalescing import CoalescingMiddleware, coalesce, coalescing_stats
+
+
+def _app(calls):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    @coalesce(max_wait=1.0)
+    async def read_item(item_id: int, verbose: bool = False):
+        calls.append(item_id)
+        await asyncio.sleep(0.05)
+        return {"id": item_id, "verbose": verbose, "call": len(calls)}
+
+    @app.get("/profiled/{item_id}")
+    @coalesce(max_wait=1.0)
+    async def read_profiled(item_id: int, response: Response):
+        calls.append(item_id)
+        response.headers["X-Profile-Id"] = f"profile-{len(calls)}"
+        await asyncio.sleep(0.05)
+        return {"id": item_id}
+
+    @app.get("/other/{item_id}")
+    async def read_other(item_id: int):
+        calls.append(item_id)
+        await asyncio.sleep(0.05)
+        return {"id": item_id}
+
+    app.add_middleware(CoalescingMiddleware, routes=app.routes)
+    return app
+
+
+async def _get_all(app, urls, headers=None):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(url, headers=headers) for url in urls))
+
+
+def test_identical_concurrent_requests_share_one_response():
+    calls = []
+    before = coalescing_stats.snapshot().get("/items/{item_id}", {}).get("coalesced", 0)
+    responses = asyncio.run(_get_all(_app(calls), ["/items/1?verbose=true"] * 5))
+    assert calls == [1]
+    assert {response.json()["call"] for response in responses} == {1}
+    assert all(response.status_code == 200 for response in responses)
+    assert coalescing_stats.snapshot()["/items/{item_id}"]["coalesced"] == before + 4
+
+
+def test_different_parameters_and_routes_are_not_coalesced():
+    calls = []
+    asyncio.run(_get_all(_app(calls), ["/items/1", "/items/2", "/items/1?verbose=true", "/other/3", "/other/3"]))
+    assert sorted(calls) == [1, 1, 2, 3, 3]
+
+
+def test_profiled_requests_are_not_coalesced():
+    calls = []
+    asyncio.run(_get_all(_app(calls), ["/items/1"] * 3, headers={"X-Debug-Profile": "token"}))
+    assert calls == [1, 1, 1]
+
+
+def test_copied_responses_do_not_carry_the_profile_id():
+    calls = []
+    responses = asyncio.run(_get_all(_app(calls), ["/profiled/1"] * 3))
+    assert calls == [1]
+    assert sorted(response.headers.get("x-profile-id") for response in responses
+                  if "x-profile-id" in response.headers) == ["profile-1"]
@@ -0,0 +1,31 @@
+from app.core.existence import ExistenceIndex, IdBitmap
+
+
+def test_bitmap_grows_and_answers_membership():
+    bitmap = IdBitmap()
+    bitmap.add_all([0, 7, 8, 1_000_003, -1])
+
+    assert [id in bitmap for id in (0, 7, 8, 9, 1_000_003, 1_000_004, 50_000_000, -1)] == \
+        [True, True, True, False, True, False, False, False]
+    assert len(bitmap) == 4
+
+    bitmap.discard(7)
+    bitmap.discard(99_999_999)
+    assert 7 not in bitmap and 8 in bitmap
+
+
+def test_index_reports_unknown_ids_per_entity():
+    index = ExistenceIndex()
+    index.add("product", [1, 2, 3])
+    index.add("person", [2])
+
+    assert index.missing("product", [1, 3, 4]) == {4}
+    assert index.missing("person", [1, 2]) == {1}
+
+    index.forget("product", 3)
+    index.forget("invoice", 3)
+    assert index.missing("product", [1, 3]) == {3}
+    assert index.stats() == {"product": 2, "person": 1}
+
+    index.clear()
+    assert index.missing("person", [2]) == {2}
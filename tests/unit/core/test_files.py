@@ -0,0 +1,52 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.files import RangeNotSatisfiable, file_response, parse_range
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=95-200", 100) == (95, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "blob.bin"
+    path.write_bytes(bytes(range(256)) * 4)
+    app = FastAPI()
+
+    @app.get("/blob")
+    def blob(request: Request):
+        return file_response(request, str(path), "application/octet-stream", "abc")
+
+    return TestClient(app)
+
+
+def test_whole_file_with_strong_etag(client):
+    response = client.get("/blob")
+    assert response.status_code == 200
+    assert len(response.content) == 1024
+    assert response.headers["etag"] == '"abc"'
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_byte_range(client):
+    response = client.get("/blob", headers={"Range": "bytes=256-259"})
+    assert response.status_code == 206
+    assert response.content == bytes([0, 1, 2, 3])
+    assert response.headers["content-range"] == "bytes 256-259/1024"
+
+
+def test_conditional_requests(client):
+    assert client.get("/blob", headers={"If-None-Match": '"abc"'}).status_code == 304
+    assert client.get("/blob", headers={"Range": "bytes=0-1", "If-Range": '"old"'}).status_code == 200
+    unsatisfiable = client.get("/blob", headers={"Range": "bytes=5000-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == "bytes */1024"
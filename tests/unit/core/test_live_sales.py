@@ -0,0 +1,63 @@
+import random
+
+from app.core.live_sales import LiveSales, SlidingTopK, SpaceSaving
+
+
+def test_space_saving_is_exact_within_capacity():
+    sketch = SpaceSaving(capacity=3)
+    for item, weight in [(1, 2.0), (2, 1.0), (1, 3.0), (3, 0.5)]:
+        sketch.add(item, weight)
+    assert sketch.top(2) == [(1, 5.0, 0.0), (2, 1.0, 0.0)]
+
+
+def test_space_saving_finds_the_heavy_hitters_with_bounded_error():
+    generator = random.Random(7)
+    sketch = SpaceSaving(capacity=20)
+    totals = {}
+    stream = [1] * 500 + [2] * 300 + [generator.randrange(3, 1000) for _ in range(2000)]
+    generator.shuffle(stream)
+    for item in stream:
+        sketch.add(item, 1.0)
+        totals[item] = totals.get(item, 0) + 1
+
+    top = sketch.top(2)
+    assert [item for item, _, _ in top] == [1, 2]
+    for item, count, error in top:
+        assert count - error <= totals[item] <= count
+
+
+def test_merged_sketches_keep_their_bounds():
+    left, right = SpaceSaving(capacity=2), SpaceSaving(capacity=2)
+    for item, weight in [(1, 5.0), (2, 4.0), (3, 1.0)]:
+        left.add(item, weight)
+    for item, weight in [(1, 2.0), (3, 6.0)]:
+        right.add(item, weight)
+    merged = dict((item, (count, error)) for item, count, error in SpaceSaving.merge([left, right], 2).top(2))
+    assert set(merged) == {1, 3}
+    assert merged[1][0] - merged[1][1] <= 7.0 <= merged[1][0]
+    assert merged[3][0] - merged[3][1] <= 7.0 <= merged[3][0]
+
+
+def test_old_buckets_leave_the_window():
+    window = SlidingTopK(length=60, buckets=6, capacity=10)
+    window.add(1, 5.0, at=0)
+    window.add(2, 1.0, at=55)
+    assert window.window(now=59).top(10) == [(1, 5.0, 0.0), (2, 1.0, 0.0)]
+    assert window.window(now=65).top(10) == [(2, 1.0, 0.0)]
+    assert window.since(now=65) == 10
+
+
+def test_live_sales_windows_and_snapshots():
+    sales = LiveSales(capacity=10)
+    sales.record(1, quantity=10, revenue=5.0, at=1020)
+    sales.record(2, quantity=1, revenue=50.0, at=1290)
+
+    assert [item for item, _, _ in sales.top("5m", "quantity", 10, now=1299)["items"]] == [1, 2]
+    assert [item for item, _, _ in sales.top("5m", "revenue", 10, now=1299)["items"]] == [2, 1]
+    assert [item for item, _, _ in sales.top("5m", "revenue", 10, now=1330)["items"]] == [2]
+    assert [item for item, _, _ in sales.top("1h", "revenue", 10, now=1330)["items"]] == [2, 1]
+
+    restored = LiveSales(capacity=10)
+    restored.record(1, quantity=1, revenue=1.0, at=1295)
+    restored.load(sales.dump())
+    assert restored.top("1d", "quantity", 1, now=1300)["items"] == [(1, 11.0, 0.0)]
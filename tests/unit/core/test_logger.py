@@ -0,0 +1,54 @@
+import json
+import logging
+import queue
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.logger import (DroppingQueueHandler, JsonFormatter, RequestLoggingMiddleware, SamplingFilter,
+                             parse_sampling)
+
+
+def _record(name="app.test", level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_includes_extra_fields():
+    payload = json.loads(JsonFormatter().format(_record(request_id="abc", latency_ms=1.5)))
+    assert payload["message"] == "hello world"
+    assert payload["level"] == "INFO"
+    assert payload["request_id"] == "abc"
+    assert payload["latency_ms"] == 1.5
+
+
+def test_sampling_filter_only_samples_info_and_below():
+    sampling = SamplingFilter(parse_sampling("uvicorn.access=0, app=1"))
+    assert not sampling.filter(_record(name="uvicorn.access"))
+    assert sampling.filter(_record(name="uvicorn.access", level=logging.WARNING))
+    assert sampling.filter(_record(name="app.repositories.person"))
+    assert sampling.filter(_record(name="other"))
+
+
+def test_queue_handler_drops_records_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record())
+    handler.handle(_record())
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().msg == "hello world"
+
+
+def test_request_logging_middleware_propagates_request_id():
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {}
+
+    app.add_middleware(RequestLoggingMiddleware)
+    client = TestClient(app)
+
+    assert client.get("/ping", headers={"X-Request-ID": "abc"}).headers["x-request-id"] == "abc"
+    assert client.get("/ping").headers["x-request-id"]
@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.profiling import ProfileStore, ProfilingMiddleware, RequestProfile, instrument_routes, is_authorized
+
+
+def _client(sample_rate=0.0):
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": sum(range(1000))}
+
+    app.add_middleware(ProfilingMiddleware, sample_rate=sample_rate)
+    instrument_routes(app)
+    return TestClient(app)
+
+
+def test_request_with_debug_token_is_profiled():
+    store = ProfileStore(10)
+    with patch("app.core.profiling.settings.PROFILING_TOKEN", "secret"), \
+            patch("app.core.profiling.profile_store", store):
+        response = _client().get("/ping", headers={"X-Debug-Profile": "secret"})
+
+    assert response.status_code == 200
+    profile = store.get(response.headers["x-profile-id"])
+    assert profile.status_code == 200
+    assert profile.endpoint_ms > 0
+    assert "ping" in profile.text_report()
+
+
+def test_request_without_token_is_not_profiled():
+    store = ProfileStore(10)
+    with patch("app.core.profiling.settings.PROFILING_TOKEN", "secret"), \
+            patch("app.core.profiling.profile_store", store):
+        response = _client().get("/ping", headers={"X-Debug-Profile": "wrong"})
+
+    assert "x-profile-id" not in response.headers
+    assert store.list() == []
+
+
+def test_sampled_request_is_profiled():
+    store = ProfileStore(10)
+    with patch("app.core.profiling.profile_store", store):
+        response = _client(sample_rate=1.0).get("/ping")
+
+    assert store.get(response.headers["x-profile-id"]) is not None
+
+
+def test_profile_store_keeps_most_recent_profiles():
+    store = ProfileStore(2)
+    profiles = [RequestProfile("GET", f"/{index}") for index in range(3)]
+    for profile in profiles:
+        store.add(profile)
+
+    assert store.list() == [profiles[2], profiles[1]]
+    assert store.get(profiles[0].id) is None
+
+
+def test_token_check():
+    with patch("app.core.profiling.settings.PROFILING_TOKEN", "secret"):
+        assert is_authorized("secret")
+        assert not is_authorized("secreT") and not is_authorized("") and not is_authorized(None)
+        assert not is_authorized("sécret")
+    with patch("app.core.profiling.settings.PROFILING_TOKEN", ""):
+        assert not is_authorized("")
@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from app.core.logger import request_state
+from app.db.session import LazySession, SessionMetrics, session_metrics, track_connection_time
+
+
+def _factory():
+    engine = create_engine("sqlite://", poolclass=QueuePool)
+    factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    track_connection_time(factory)
+    return engine, factory
+
+
+def test_unused_session_is_never_built():
+    engine, factory = _factory()
+    db = LazySession(factory)
+    db.close()
+    assert db.session is None
+    assert engine.pool.checkedout() == 0
+
+
+def test_connection_is_checked_out_on_first_statement_and_released_on_commit():
+    engine, factory = _factory()
+    db = LazySession(factory)
+    db.in_transaction()
+    assert db.session is not None
+    assert engine.pool.checkedout() == 0
+
+    db.execute(text("SELECT 1"))
+    assert engine.pool.checkedout() == 1
+    db.commit()
+    assert engine.pool.checkedout() == 0
+    assert db.info["connection_ms"] > 0
+    db.close()
+
+
+def test_close_records_request_session_metrics():
+    _, factory = _factory()
+    state = {"request_id": "1", "path": "/", "db_ms": 0.0}
+    token = request_state.set(state)
+    before = session_metrics.snapshot()["sessions_opened"]
+    try:
+        db = LazySession(factory)
+        db.execute(text("SELECT 1"))
+        db.close()
+    finally:
+        request_state.reset(token)
+
+    assert state["session_ms"] >= state["connection_ms"] > 0
+    assert session_metrics.snapshot()["sessions_opened"] == before + 1
+
+
+def test_session_metrics_snapshot():
+    metrics = SessionMetrics()
+    metrics.record(False, 0.0, 0.0)
+    metrics.record(True, 10.0, 4.0)
+    metrics.record(True, 20.0, 6.0)
+    assert metrics.snapshot() == {"requests": 3, "sessions_opened": 2, "mean_session_ms": 15.0,
+                                  "max_session_ms": 20.0, "mean_connection_ms": 5.0, "max_connection_ms": 6.0}
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+from app.db.postgresql import statement_observers
+from app.db.slow_queries import SlowQueryLog, normalize_statement, parameter_shape
+
+
+def test_normalize_statement():
+    statement = ("SELECT id FROM person WHERE name = 'Jorge' AND id IN (%(id_1)s, %(id_2)s)\n"
+                 "  AND created::date > %(since)s LIMIT 10")
+    assert normalize_statement(statement) == \
+        "SELECT id FROM person WHERE name = ? AND id IN (...) AND created::date > ? LIMIT ?"
+
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape({"document": "123", "id": 1}) == "{'document': 'str', 'id': 'int'}"
+    assert parameter_shape([{"id": 1}, {"id": 2}]) == "2 x {'id': 'int'}"
+    assert parameter_shape(()) == ""
+
+
+def test_slow_statements_are_aggregated_per_template():
+    log = SlowQueryLog(threshold_ms=0)
+    engine = create_engine("sqlite://")
+    statement_observers.append(log.observe)
+    try:
+        with engine.connect() as connection:
+            for value in range(3):
+                connection.execute(text("SELECT :value"), {"value": value})
+    finally:
+        statement_observers.remove(log.observe)
+
+    worst = log.worst(limit=1, order_by="count")
+    assert worst[0]["template"] == "SELECT ?"
+    assert worst[0]["count"] == 3
+    assert worst[0]["mean_ms"] <= worst[0]["max_ms"]
+
+
+def test_fast_statements_are_ignored():
+    log = SlowQueryLog(threshold_ms=10_000)
+    log.observe(None, "SELECT 1", (), 0.001)
+    assert log.worst() == []
+
+
+def test_plans_replay_only_side_effect_free_statements():
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("No PostgreSQL reachable at DATABASE_URL")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a PostgreSQL database")
+    log = SlowQueryLog(threshold_ms=0, explain=True)
+    statement_observers.append(log.observe)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": 7331})
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": 7331})
+            connection.execute(text("SELECT count(*) FROM pg_class WHERE relkind = :kind"), {"kind": "r"})
+    finally:
+        statement_observers.remove(log.observe)
+    for _ in range(50):
+        plans = {entry["template"]: entry["plan"] for entry in log.worst()}
+        if all(plan is not None for plan in plans.values()):
+            break
+        time.sleep(0.1)
+
+    assert "Actual Total Time" not in plans["SELECT pg_advisory_lock(...)"][0]["Plan"]
+    assert "Actual Total Time" in plans["SELECT count(*) FROM pg_class WHERE relkind = ?"][0]["Plan"]
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' "
+                                       "AND objid = 7331")).scalar() == 0
+    engine.dispose()
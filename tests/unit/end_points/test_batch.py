@@ -0,0 +1,31 @@
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+
+def test_run_batch(test_client):
+    with patch("app.api.endpoints.batch.BatchService") as mock_service:
+        mock_service.return_value.run.return_value = {"committed": True, "results": [{"status": 201, "id": 3}]}
+        response = test_client.post("/batch/", json={"operations": [
+            {"entity": "person", "op": "create", "ref": "customer",
+             "data": {"name": "Ada", "surname": "Lovelace", "document_type": "DNI", "document": "1"}}]})
+        assert response.status_code == 200
+        assert response.json() == {"committed": True,
+                                   "results": [{"status": 201, "id": 3, "error": None, "data": None}]}
+        request = mock_service.return_value.run.call_args.args[0]
+        assert request.mode == "atomic"
+        assert request.operations[0].ref == "customer"
+
+
+def test_run_batch_rejects_invalid_requests(test_client):
+    with patch("app.api.endpoints.batch.BatchService") as mock_service:
+        assert test_client.post("/batch/", json={"operations": []}).status_code == 422
+        assert test_client.post("/batch/", json={"operations": [{"entity": "job", "op": "get"}]}).status_code == 422
+
+        mock_service.return_value.run.side_effect = ValueError("A batch holds at most 500 operations")
+        response = test_client.post("/batch/", json={"operations": [{"entity": "person", "op": "get", "id": 1}]})
+        assert response.status_code == 422
+
+        mock_service.return_value.run.side_effect = HTTPException(status_code=501, detail="Sharded")
+        response = test_client.post("/batch/", json={"operations": [{"entity": "person", "op": "get", "id": 1}]})
+        assert response.status_code == 501
@@ -0,0 +1,19 @@
+from unittest.mock import patch
+
+
+def test_read_changes(test_client):
+    page = {"changes": [{"entity": "product", "id": 1, "op": "delete", "data": None}],
+            "watermark": "abc", "has_more": False}
+    with patch("app.api.endpoints.changes.ChangeFeedService") as mock_service:
+        mock_service.return_value.get_changes.return_value = page
+        response = test_client.get("/changes/?since=xyz&limit=10")
+        assert response.status_code == 200
+        assert response.json() == page
+        mock_service.return_value.get_changes.assert_called_once_with("xyz", 10)
+
+
+def test_read_changes_rejects_malformed_watermark(test_client):
+    with patch("app.api.endpoints.changes.ChangeFeedService") as mock_service:
+        mock_service.return_value.get_changes.side_effect = ValueError("Malformed watermark")
+        response = test_client.get("/changes/?since=garbage")
+        assert response.status_code == 400
@@ -0,0 +1,11 @@
+from unittest.mock import patch
+
+
+def test_export_invoice_lines(test_client):
+    summary = {"rows": 2, "deletes": 0, "files": ["app/exports/invoice_lines/month=2024-01/part.parquet"], "watermarks": {"main": [0, 2]}}
+    with patch("app.servicies.export.WarehouseExportService") as mock_service:
+        mock_service.return_value.export_invoice_lines.return_value = summary
+        response = test_client.post("/export/invoice-lines?full=true")
+        assert response.status_code == 200
+        assert response.json() == summary
+        mock_service.return_value.export_invoice_lines.assert_called_once_with(full=True)
@@ -0,0 +1,65 @@
+import signal
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.db.postgresql import database_ready
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_liveness_does_not_need_the_database():
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_readiness_waits_for_database_initialization():
+    # No initialization thread of an earlier test may still be running and mark the database ready.
+    assert main.database_init_thread is None or not main.database_init_thread.is_alive()
+    database_ready.clear()
+    assert client.get("/health/ready").status_code == 503
+    database_ready.set()
+    try:
+        assert client.get("/health/ready").json() == {"status": "ready"}
+    finally:
+        database_ready.clear()
+
+
+def test_initialization_is_retried_until_it_succeeds():
+    main.database_init_stopping.clear()
+    with patch("app.main._initialize_database_once", side_effect=[RuntimeError("down"), True]) as attempt, \
+            patch("app.main.settings.DATABASE_INIT_RETRY_DELAY", 0.01):
+        main.initialize_database()
+    try:
+        assert attempt.call_count == 2
+        assert database_ready.is_set()
+    finally:
+        database_ready.clear()
+
+
+def test_initialization_stops_the_worker_after_the_last_attempt():
+    main.database_init_stopping.clear()
+    with patch("app.main._initialize_database_once", side_effect=RuntimeError("duplicate documents")) as attempt, \
+            patch("app.main.settings.DATABASE_INIT_RETRY_DELAY", 0.01), \
+            patch("app.main.settings.DATABASE_INIT_MAX_ATTEMPTS", 3), patch("app.main.os.kill") as kill:
+        main.initialize_database()
+
+    assert attempt.call_count == 3
+    assert kill.call_args.args[1] == signal.SIGTERM
+    assert not database_ready.is_set()
+
+
+def test_shutdown_stops_a_pending_initialization():
+    with patch("app.main._initialize_database_once", side_effect=RuntimeError("down")), \
+            patch("app.main.settings.DATABASE_INIT_RETRY_DELAY", 60), \
+            patch("app.main.settings.DATABASE_INIT_MAX_ATTEMPTS", 0), \
+            patch("app.main._start_services") as start:
+        main.startup_db_client()
+        main.shutdown_db_client()
+
+    assert not main.database_init_thread.is_alive()
+    assert not start.called
+    assert not database_ready.is_set()
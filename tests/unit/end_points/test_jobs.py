@@ -0,0 +1,48 @@
+from datetime import datetime
+from unittest.mock import patch
+
+
+def _job(**overrides):
+    return {"id": 7, "kind": "reports.margin", "params": {"group_by": "product"}, "status": "queued", "progress": 0.0,
+            "message": None, "result": None, "error": None, "cancel_requested": False, "attempts": 0,
+            "created_at": datetime(2024, 1, 1), "started_at": None, "finished_at": None, "artifact_url": None,
+            **overrides}
+
+
+def test_create_job(test_client):
+    with patch("app.api.endpoints.jobs.JobService") as mock_service:
+        mock_service.return_value.submit.return_value = _job()
+        response = test_client.post("/jobs/", json={"kind": "reports.margin", "params": {"group_by": "product"}})
+        assert response.status_code == 202
+        assert response.json()["id"] == 7
+        assert response.json()["status"] == "queued"
+
+
+def test_create_job_rejects_unknown_kind(test_client):
+    with patch("app.api.endpoints.jobs.JobService") as mock_service:
+        mock_service.return_value.submit.side_effect = ValueError("Unknown job kind 'nope'")
+        response = test_client.post("/jobs/", json={"kind": "nope"})
+        assert response.status_code == 422
+
+
+def test_read_and_cancel_job(test_client):
+    with patch("app.api.endpoints.jobs.JobService") as mock_service:
+        mock_service.return_value.get_job.return_value = _job(status="running", progress=0.5)
+        mock_service.return_value.cancel.return_value = _job(status="running", cancel_requested=True)
+        assert test_client.get("/jobs/7").json()["progress"] == 0.5
+        assert test_client.post("/jobs/7/cancel").json()["cancel_requested"] is True
+        mock_service.return_value.cancel.assert_called_once_with(7)
+
+
+def test_read_job_artifact(test_client, tmp_path):
+    artifact = tmp_path / "margin-report.json"
+    artifact.write_text('{"rows": []}')
+    with patch("app.api.endpoints.jobs.JobService") as mock_service:
+        mock_service.return_value.artifact.return_value = str(artifact)
+        response = test_client.get("/jobs/7/artifact")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == {"rows": []}
+
+        mock_service.return_value.artifact.return_value = None
+        assert test_client.get("/jobs/7/artifact").status_code == 404
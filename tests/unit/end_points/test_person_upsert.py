@@ -0,0 +1,14 @@
+from unittest.mock import patch
+
+PERSON = {"name": "Jorge", "surname": "Quin", "document_type": "CC", "document": "80123"}
+
+
+def test_upsert_person_by_document(test_client):
+    with patch("app.api.endpoints.person.PersonService") as mock_service:
+        mock_service.return_value.upsert_person_by_document.return_value = ({**PERSON, "id": 1}, True)
+        response = test_client.put("/person/by-document", json=PERSON)
+        assert response.status_code == 201
+        assert response.json()["id"] == 1
+
+        mock_service.return_value.upsert_person_by_document.return_value = ({**PERSON, "id": 1}, False)
+        assert test_client.put("/person/by-document", json=PERSON).status_code == 200
@@ -0,0 +1,19 @@
+from unittest.mock import patch
+
+
+def test_apply_price_list(test_client):
+    result = {"created": 0, "updated": 1, "unchanged": 0, "skipped": 0,
+              "items": [{"sku": "MILK-1L", "status": "updated", "id": 1, "detail": None}]}
+    with patch("app.api.endpoints.product.ProductService") as mock_service:
+        mock_service.return_value.apply_price_list.return_value = result
+        response = test_client.put("/product/price-list",
+                                   json=[{"sku": "MILK-1L", "price": 1.6, "cost": 1.0, "unit_of_measure": "Liter"}])
+        assert response.status_code == 200
+        assert response.json() == result
+        assert mock_service.return_value.apply_price_list.call_args.args[0][0].sku == "MILK-1L"
+
+
+def test_apply_price_list_rejects_negative_prices(test_client):
+    response = test_client.put("/product/price-list",
+                               json=[{"sku": "MILK-1L", "price": -1, "cost": 1.0, "unit_of_measure": "Liter"}])
+    assert response.status_code == 422
@@ -0,0 +1,25 @@
+from unittest.mock import patch
+
+from app.core.images import UnsupportedImage
+
+
+def test_upload_product_image(test_client):
+    image = {"id": 1, "product_id": 1, "digest": "ab" * 32, "content_type": "image/png", "size": 3,
+             "created_at": "2024-01-10T00:00:00", "url": f"/product/images/{'ab' * 32}.png",
+             "thumbnails": {"128": f"/product/images/{'ab' * 32}/thumbnails/128.jpg"}}
+    with patch("app.api.endpoints.product.ProductImageService") as mock_service:
+        mock_service.return_value.add_image.return_value = image
+        response = test_client.post("/product/1/images", files={"file": ("milk.png", b"png", "image/png")})
+        assert response.status_code == 201
+        assert response.json() == image
+
+
+def test_upload_rejects_unsupported_media(test_client):
+    with patch("app.api.endpoints.product.ProductImageService") as mock_service:
+        mock_service.return_value.add_image.side_effect = UnsupportedImage("Only images")
+        response = test_client.post("/product/1/images", files={"file": ("a.pdf", b"%PDF", "application/pdf")})
+        assert response.status_code == 415
+
+
+def test_missing_image_is_not_found(test_client):
+    assert test_client.get("/product/images/unknown.png").status_code == 404
@@ -0,0 +1,43 @@
+from datetime import date
+from unittest.mock import patch
+
+
+def test_margin_report(test_client):
+    row = {"key": "1", "lines": 2, "quantity": 5.0, "revenue": 7.5, "cost": 5.0, "margin": 2.5}
+    with patch("app.servicies.analytics.AnalyticsService") as mock_service:
+        mock_service.return_value.margin_report.return_value = [row]
+        response = test_client.post("/reports/margin", json={"group_by": "product", "cost_overrides": {"1": 1.5}})
+        assert response.status_code == 200
+        assert response.json()["rows"] == [row]
+
+        for overrides in ({"-1": 100}, {"0": 1}, {str(10**12): 1}):
+            response = test_client.post("/reports/margin", json={"price_overrides": overrides})
+            assert response.status_code == 422
+
+
+def test_live_top_products(test_client):
+    top = {"window": "5m", "metric": "quantity", "since": "2024-01-01T12:00:00Z",
+           "items": [{"product_id": 3, "description": "Milk", "value": 12.0, "error": 0.0}]}
+    with patch("app.api.endpoints.reports.LiveSalesService") as mock_service:
+        mock_service.return_value.top_products.return_value = top
+        response = test_client.get("/reports/top-products/live", params={"window": "5m", "metric": "quantity"})
+        assert response.status_code == 200
+        assert response.json()["items"] == top["items"]
+        mock_service.return_value.top_products.assert_called_once_with("5m", "quantity", 10)
+
+        assert test_client.get("/reports/top-products/live", params={"window": "2h"}).status_code == 422
+        assert test_client.get("/reports/top-products/live", params={"limit": 0}).status_code == 422
+
+
+def test_revenue_series(test_client):
+    point = {"period": "2024-01-01", "lines": 3, "quantity": 4.0, "revenue": 6.0, "cost": 4.0, "margin": 2.0}
+    with patch("app.api.endpoints.reports.RevenueRollupService") as mock_service:
+        mock_service.return_value.series.return_value = [point]
+        response = test_client.get("/reports/revenue/product", params={"grain": "month", "key_id": 5,
+                                                                         "start_date": "2024-01-01"})
+        assert response.status_code == 200
+        assert response.json() == {"dimension": "product", "grain": "month", "key_id": 5, "points": [point]}
+        mock_service.return_value.series.assert_called_once_with("product", "month", 5, date(2024, 1, 1), None)
+
+        assert test_client.get("/reports/revenue/invoice").status_code == 422
+        assert test_client.get("/reports/revenue/person", params={"grain": "week"}).status_code == 422
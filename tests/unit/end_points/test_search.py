@@ -0,0 +1,19 @@
+from unittest.mock import patch
+
+
+def test_search_products(test_client):
+    page = {"items": [{"id": 1, "description": "Milk", "price": 1.5, "cost": 1.0, "unit_of_measure": "Liter"}],
+            "next_cursor": "abc"}
+    with patch("app.api.endpoints.product.SearchService") as mock_service:
+        mock_service.return_value.search_products.return_value = page
+        response = test_client.get("/product/search?q=mil&limit=1")
+        assert response.status_code == 200
+        assert response.json()["next_cursor"] == "abc"
+        mock_service.return_value.search_products.assert_called_once_with("mil", 1, None)
+
+
+def test_search_persons_rejects_malformed_cursor(test_client):
+    with patch("app.api.endpoints.person.SearchService") as mock_service:
+        mock_service.return_value.search_persons.side_effect = ValueError("Malformed cursor")
+        assert test_client.get("/person/search?q=jorge&cursor=garbage").status_code == 400
+        assert test_client.get("/person/search?q=j").status_code == 422
@@ -0,0 +1,50 @@
+import struct
+
+import numpy as np
+import pytest
+
+from app.repositories.analytics import COPY_SIGNATURE, DetailCopyParser, parse_detail_copy
+
+
+def _copy_row(product_id, quantity, days, person_id, unit_price, unit_cost):
+    return struct.pack(">hiiidiiiiidid", 6, 4, product_id, 8, quantity, 4, days, 4, person_id,
+                       8, unit_price, 8, unit_cost)
+
+
+def test_parse_detail_copy():
+    stream = (COPY_SIGNATURE + struct.pack(">ii", 0, 0)
+              + _copy_row(1, 2.0, 8775, 10, 1.5, 1.0)
+              + _copy_row(3, 4.0, 8857, 20, 1.0, 0.5)
+              + struct.pack(">h", -1))
+
+    columns = parse_detail_copy(stream)
+
+    assert columns["product_id"].tolist() == [1, 3]
+    assert columns["quantity"].tolist() == [2.0, 4.0]
+    assert columns["date"].tolist() == list(np.array(["2024-01-10", "2024-04-01"], dtype="datetime64[D]").tolist())
+    assert columns["person_id"].tolist() == [10, 20]
+    assert columns["unit_cost"].tolist() == [1.0, 0.5]
+
+
+def test_detail_copy_parser_takes_the_stream_in_pieces(monkeypatch):
+    monkeypatch.setattr("app.repositories.analytics.COPY_CHUNK_ROWS", 2)
+    rows = [(id, float(id), 8775 + id, 10 * id, 1.5, 1.0) for id in range(1, 6)]
+    stream = (COPY_SIGNATURE + struct.pack(">ii", 0, 0) + b"".join(_copy_row(*row) for row in rows)
+              + struct.pack(">h", -1))
+    parser = DetailCopyParser()
+
+    for start in range(0, len(stream), 7):
+        parser.write(stream[start:start + 7])
+    columns = parser.columns()
+
+    assert columns["product_id"].tolist() == [1, 2, 3, 4, 5]
+    assert columns["person_id"].tolist() == [10, 20, 30, 40, 50]
+    assert columns["quantity"].dtype == np.float64
+
+
+def test_detail_copy_parser_rejects_truncated_streams():
+    parser = DetailCopyParser()
+    parser.write(COPY_SIGNATURE + struct.pack(">ii", 0, 0) + _copy_row(1, 2.0, 8775, 10, 1.5, 1.0)[:-3])
+
+    with pytest.raises(ValueError):
+        parser.columns()
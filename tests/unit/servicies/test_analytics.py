@@ -0,0 +1,55 @@
+import numpy as np
+
+from app.servicies.analytics import aggregate_margins
+
+
+def _columns():
+    return {
+        "product_id": np.array([1, 2, 1, 3]),
+        "quantity": np.array([2.0, 1.0, 3.0, 4.0]),
+        "date": np.array(["2024-01-10", "2024-01-20", "2024-02-05", "2024-04-01"], dtype="datetime64[D]"),
+        "person_id": np.array([10, 10, 20, 20]),
+        "unit_price": np.array([1.5, 2.0, 1.5, 1.0]),
+        "unit_cost": np.array([1.0, 1.5, 1.0, 0.5]),
+    }
+
+
+def test_aggregate_margins_by_product():
+    rows = aggregate_margins(_columns(), group_by="product")
+    assert [row["key"] for row in rows] == ["1", "2", "3"]
+    assert rows[0] == {"key": "1", "lines": 2, "quantity": 5.0, "revenue": 7.5, "cost": 5.0, "margin": 2.5}
+
+
+def test_aggregate_margins_by_person():
+    rows = aggregate_margins(_columns(), group_by="person")
+    assert [(row["key"], row["revenue"]) for row in rows] == [("10", 5.0), ("20", 8.5)]
+
+
+def test_aggregate_margins_by_period():
+    months = aggregate_margins(_columns(), group_by="period", period="month")
+    assert [row["key"] for row in months] == ["2024-01", "2024-02", "2024-04"]
+    quarters = aggregate_margins(_columns(), group_by="period", period="quarter")
+    assert [(row["key"], row["lines"]) for row in quarters] == [("2024-Q1", 3), ("2024-Q2", 1)]
+
+
+def test_aggregate_margins_with_cost_overrides():
+    rows = aggregate_margins(_columns(), group_by="product", cost_overrides={1: 1.5})
+    assert rows[0]["cost"] == 7.5
+    assert rows[0]["margin"] == 0.0
+    assert rows[1]["cost"] == 1.5
+
+
+def test_aggregate_margins_without_lines():
+    empty = {name: values[:0] for name, values in _columns().items()}
+    assert aggregate_margins(empty) == []
+
+
+def test_aggregate_margins_ignores_overrides_of_other_products():
+    baseline = aggregate_margins(_columns(), group_by="product")
+    overrides = {-1: 100.0, 10**12: 1.0, 10**30: 1.0, 99: 5.0}
+
+    rows = aggregate_margins(_columns(), group_by="product", price_overrides=overrides, cost_overrides=overrides)
+    assert rows == baseline
+
+    rows = aggregate_margins(_columns(), group_by="product", price_overrides={**overrides, 3: 2.0})
+    assert [row["revenue"] for row in rows] == [7.5, 2.0, 8.0]
@@ -0,0 +1,17 @@
+from unittest.mock import patch
+
+from app import server
+
+
+def test_cpu_quota_is_positive():
+    assert server.cpu_quota() > 0
+
+
+def test_worker_count_follows_cpu_quota():
+    with patch.object(server.settings, "SERVER_WORKERS", 0), patch("app.server.cpu_quota", return_value=1.5):
+        assert server.worker_count() == 2
+
+
+def test_worker_count_setting_wins():
+    with patch.object(server.settings, "SERVER_WORKERS", 3), patch("app.server.cpu_quota", return_value=16.0):
+        assert server.worker_count() == 3